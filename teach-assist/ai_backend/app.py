@@ -1,17 +1,65 @@
-from flask import Flask, request, jsonify, Response, stream_with_context
+from flask import Flask, g, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
+import contextvars
 import json
-import base64
-from PIL import Image
-import io
-import re
-import pytesseract
-from config import OPENAI_MODELS, ENDPOINT_MODELS, API_SETTINGS
-
-load_dotenv()
+import queue
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from config import API_SETTINGS, ROSTER_SETTINGS, OCR_SETTINGS
+from cascade import cascade_complete, cascade_stats, cascade_stream, check_chat_opening
+from completions import stream_text, complete_text
+from metrics import METRICS_CONTENT_TYPE, upstream_metrics
+from openai_client import get_client
+from preflight import InputTooLarge, preflight_stats
+from profiling import PROFILE_HEADER, profiler
+from prompts import prompt_stats, render_prompt
+from resumable_streams import iter_stream, resume_or_start
+from scheduler import scheduler
+from stream_aborts import abort_stats
+from student_parsing import (
+    RosterMerger,
+    clean_json_response,
+    decode_student_elements,
+    iter_student_events,
+    image_page_messages,
+    parse_students_messages,
+    prepare_image_student,
+    prepare_image_students,
+    split_roster,
+    student_list_events,
+    validate_student,
+)
+from tracing import trace_flask_app
+from logs import get_logger
+from roster_ingest import parse_text_roster, parse_xlsx_roster, xlsx_to_text
+from batch_jobs import job_summary
+from route_helpers import (
+    batch_runner,
+    chat_messages,
+    clean_observation,
+    collect_students,
+    exit_ticket_messages,
+    format_bundle_event,
+    graphic_organizer_messages,
+    guided_reading_intro_messages,
+    image_roster_check,
+    map_ordered,
+    observation_messages,
+    ordered_student_events,
+    parse_practice_story,
+    passage_messages,
+    practice_messages,
+    repair_student_events,
+    roster_check,
+    roster_format_params,
+    roster_repairer,
+    story_messages,
+    story_title_messages,
+    warmup_messages,
+)
+
+log = get_logger("app")
 
 app = Flask(__name__)
 CORS(app, resources={
@@ -23,97 +71,50 @@ CORS(app, resources={
             "https://teach-ai-db-backend.vercel.app"
         ],
         "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"],
+        "allow_headers": ["Content-Type", "Authorization", "traceparent"],
+        "expose_headers": ["X-Trace-Id"],
         "supports_credentials": True,
         "max_age": 3600
     }
 })
-
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-
-# Add this mapping at the top with other constants
-LEXILE_SPECIFICATIONS = {
-    "BR": {
-        "category": "elementary",
-        "paragraphs": 2,
-        "word_count": "25 to 50 words",
-        "range": "0L to 200L"
-    },
-    "0-200": {
-        "category": "elementary",
-        "paragraphs": 2,
-        "word_count": "25 to 50 words",
-        "range": "0L to 200L"
-    },
-    "200-300": {
-        "category": "elementary",
-        "paragraphs": 2,
-        "word_count": "40 to 70 words",
-        "range": "200L to 300L"
-    },
-    "300-400": {
-        "category": "elementary",
-        "paragraphs": 3,
-        "word_count": "50 to 100 words",
-        "range": "300L to 400L"
-    },
-    "400-500": {
-        "category": "elementary",
-        "paragraphs": 3,
-        "word_count": "60 to 110 words",
-        "range": "400L to 500L"
-    },
-    "500-600": {
-        "category": "elementary",
-        "paragraphs": 4,
-        "word_count": "70 to 120 words",
-        "range": "500L to 600L"
-    },
-    "600-700": {
-        "category": "elementary",
-        "paragraphs": 4,
-        "word_count": "80 to 130 words",
-        "range": "600L to 700L"
-    },
-    "700-800": {
-        "category": "middle",
-        "paragraphs": 5,
-        "word_count": "100 to 200 words",
-        "range": "700L to 800L"
-    },
-    "800-900": {
-        "category": "middle",
-        "paragraphs": 5,
-        "word_count": "100 to 200 words",
-        "range": "800L to 900L"
-    },
-    "900-1000": {
-        "category": "middle",
-        "paragraphs": 5,
-        "word_count": "100 to 200 words",
-        "range": "900L to 1000L"
-    },
-    "1000-1100": {
-        "category": "high",
-        "paragraphs": 6,
-        "word_count": "150 to 250 words",
-        "range": "1000L to 1100L"
-    },
-    "1100-1200": {
-        "category": "high",
-        "paragraphs": 6,
-        "word_count": "150 to 250 words",
-        "range": "1100L to 1200L"
-    }
-}
+trace_flask_app(app)
+
+@app.before_request
+def start_profile():
+    if profiler.should_profile(request.path, request.headers.get(PROFILE_HEADER)):
+        g.profile = profiler.start(request.path)
+
+@app.after_request
+def attach_profile(response):
+    # Streamed bodies are sent after this returns, so the profile stops when the response closes
+    profile = g.get('profile')
+    if profile is not None:
+        response.headers['X-Profile-Id'] = profile.id
+        response.call_on_close(lambda: profiler.stop(profile))
+    return response
+
+def resumable_response(fmt, mimetype, start):
+    """
+    Serve a generation as a resumable SSE or NDJSON stream.
+
+    `start` returns the route's event payloads; it is only called for new
+    streams. A request with a Last-Event-ID header replays the events that
+    followed it instead.
+    """
+    resumed = resume_or_start(request.headers.get('Last-Event-ID'), start)
+    if resumed is None:
+        return jsonify({"error": "Stream has expired; start a new request"}), 404
+    stream, last_seq = resumed
+    return Response(
+        iter_stream(fmt, stream, last_seq),
+        mimetype=mimetype,
+        headers={'X-Stream-Id': stream.id}
+    )
 
 @app.route('/generate-passage', methods=['POST'])
 def generate_passage():
     data = request.json
-    print("Received data:", data)
     reading_level = data.get('reading_level')
-    print("Initial reading level:", reading_level)
     topic = data.get('topic')
     genre = data.get('genre', 'Informational')
     generate_questions = data.get('generateQuestions', False)
@@ -121,184 +122,34 @@ def generate_passage():
     include_answer_key = data.get('includeAnswerKey', False)
 
     def generate():
-        nonlocal reading_level
         try:
-            print("Processing reading level:", reading_level)
-            
-            # Get specifications based on reading level
-            spec = LEXILE_SPECIFICATIONS.get(reading_level)
-            if not spec:
-                raise ValueError(f"Reading level '{reading_level}' is not supported.")
-            
-            # Use the range from specifications
-            lexile_range = spec["range"]
-            category = spec["category"]
-            num_paragraphs = spec["paragraphs"]
-            word_count = spec["word_count"]
-
-            # Define paragraph instructions
-            paragraph_instructions = f"Include exactly {num_paragraphs} cohesive paragraphs, each containing approximately {word_count}."
-
-            # Create genre-specific guidance
-            genre_guidance = {
-                'Fiction': 'Create a narrative with strong character development, a coherent plot, and vivid sensory details.',
-                'Historical Fiction': 'Blend accurate historical facts with an engaging narrative that brings the past to life.',
-                'Science Fiction': 'Incorporate scientific or technological concepts suitable for the Lexile level, focusing on imagination and curiosity.',
-                'Informational': 'Present factual, well-structured information that clearly explains the topic and provides key details.',
-                'Expository': 'Offer a clear, logical explanation of the topic, supported by relevant facts and examples.',
-                'Persuasive': 'Present a reasoned argument with evidence, guiding readers towards a particular stance or conclusion.'
-            }.get(genre, 'Create an engaging passage that effectively addresses the given topic.')
-
-            # Adjust technical requirements based on Lexile specifications
-            if category == 'elementary':
-                technical_requirements = f"""
-- Maintain an approximate Lexile level of {reading_level}.
-- Use simple and clear language appropriate for this reading level.
-- {paragraph_instructions}
-- Ensure precise organization and a polished tone.
-- Follow standard test passage formatting conventions (e.g., a clear, bold title; well-structured paragraphs).
-"""
-            elif category == 'middle':
-                technical_requirements = f"""
-- Maintain an approximate Lexile level of {reading_level}.
-- Use clear, coherent, and engaging language appropriate for this reading level.
-- {paragraph_instructions}
-- Include descriptive details and logical transitions between ideas.
-- Ensure precise organization, logical progression of ideas, and a polished tone.
-- Follow standard test passage formatting conventions (e.g., a clear, bold title; well-structured paragraphs).
-"""
-            else:  # high
-                technical_requirements = f"""
-- Maintain an approximate Lexile level of {reading_level}.
-- Use sophisticated language that is clear, coherent, and engaging.
-- {paragraph_instructions}
-- Include vivid descriptive details, strong transitions between ideas, and a well-structured narrative or informational flow.
-- Incorporate subtle figurative language, relevant examples, and carefully chosen vocabulary.
-- Ensure precise organization, logical progression of ideas, and a polished tone.
-- Follow standard test passage formatting conventions (e.g., a clear, bold title; well-structured paragraphs).
-"""
-
-            # Create question guidance based on question style
-            question_guidance = ""
-            answer_key_guidance = ""
-            if generate_questions:
-                if question_style.upper() == "STAAR":
-                    question_guidance = """
-After the passage, include 4-5 STAAR-style questions that:
-- Follow the exact STAAR format with specific question stems.
-- Align to Lexile-level readiness and supporting standards.
-- Include a balanced mix of:
-    * Key Ideas and Details (main idea, inference, character analysis)
-    * Author's Purpose and Craft (understanding text structure, point of view, and author's choices)
-    * Integration of Knowledge and Ideas (using evidence, making connections, analyzing information)
-- Use academic and precise vocabulary such as "central idea," "text structure," "according to the passage," and "which sentence."
-- Provide four answer choices (A-D) with plausible distractors representing common misconceptions.
-- Maintain Lexile-level appropriate complexity and align with the reading level specified.
-"""
-                    if include_answer_key:
-                        answer_key_guidance = """
-After the questions, include an answer key section marked with [[ANSWER_KEY_START]] on its own line, followed by:
-- The correct answer for each question (1-5)
-- A detailed explanation for why each answer is correct
-- References to specific text evidence supporting each answer
-- Common misconceptions addressed by the incorrect options
-
-Format as:
-[[ANSWER_KEY_START]]
-Question 1: [Correct Answer Letter]
-Explanation: [Detailed explanation with text evidence]
-
-Question 2: [Correct Answer Letter]
-Explanation: [Detailed explanation with text evidence]
-
-[etc.]
-"""
-
-            # Construct the prompt
-            prompt = f"""Generate a {genre} passage about "{topic}" at a {reading_level} Lexile level.
-The passage should be presented in a standardized {question_style} test format and maintain appropriate complexity for {reading_level} Lexile level readers.
-
-Genre-specific requirements:
-{genre_guidance}
-
-Technical requirements:
-{technical_requirements}
-
-{question_guidance}
-{answer_key_guidance}
-
-Return the content in this exact markdown format:
-
-# **[Title]**
-
-[Passage content with proper paragraphs]
-
-## Questions
-
-1. [Question text]
-   A. [Answer choice]
-   B. [Answer choice]
-   C. [Answer choice]
-   D. [Answer choice]
-
-2. [Question text]
-   A. [Answer choice]
-   B. [Answer choice]
-   C. [Answer choice]
-   D. [Answer choice]
-
-[etc...]
-
-If includeAnswerKey is true, add this section with a special marker:
-[[ANSWER_KEY_START]]
-**Answer Key**
-
-Question 1: [Letter]  
-Explanation: [Detailed explanation]
-
-Question 2: [Letter]  
-Explanation: [Detailed explanation]
-
-[etc...]
-"""
-
-            print("\n=== PROMPT SENT TO AI ===")
-            print(prompt)
-            print("========================\n")
+            log.info("passage_requested", reading_level=reading_level, genre=genre,
+                     questions=generate_questions, answer_key=include_answer_key)
+            messages = passage_messages(topic, reading_level, genre, generate_questions,
+                                        question_style, include_answer_key)
+            # The rendered prompt is several kilobytes, so it is only logged for sampled debug requests
+            log.debug("passage_prompt", prompt=messages[1]["content"])
 
             # Generate the passage using OpenAI's API
-            response = client.chat.completions.create(
-                model=ENDPOINT_MODELS["generate_passage"],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert in creating Lexile-appropriate reading passages."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
+            response = stream_text(
+                get_client(),
+                "generate_passage",
+                messages,
                 temperature=API_SETTINGS["temperature"],
-                stream=True,
+                regenerate=data.get('regenerate', False),
                 timeout=API_SETTINGS["timeout"]
             )
 
-            for chunk in response:
-                if chunk.choices[0].delta.content is not None:
-                    text = chunk.choices[0].delta.content
-                    yield f"data: {json.dumps({'type': 'content', 'content': text})}\n\n"
+            for text in response:
+                yield {'type': 'content', 'content': text}
 
-            yield f"data: {json.dumps({'type': 'complete'})}\n\n"
+            yield {'type': 'complete'}
 
         except Exception as e:
-            print(f"Error generating passage: {e}")
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+            log.error("generation_failed", component="passage", error=str(e))
+            yield {'type': 'error', 'message': str(e)}
 
-    return Response(
-        stream_with_context(generate()),
-        mimetype='text/event-stream'
-    )
+    return resumable_response('sse', 'text/event-stream', generate)
 
 
 @app.route('/generate-worksheet', methods=['POST'])
@@ -314,104 +165,28 @@ def generate_worksheet():
 
     def generate():
         try:
-            system_prompt = """You are an expert teacher and educational content creator.
-            Create engaging, grade-appropriate worksheets with clear instructions and exercises.
-            Use proper Markdown formatting for structure and layout.
-
-            For multiple choice questions, use this exact format:
-
-            ## Multiple Choice Questions
-
-            1.        Question text goes here?
-
-                     a)  First choice
-
-                     b)  Second choice
-
-                     c)  Third choice
-
-                     d)  Fourth choice
-
-
-            2.        Next question text?
-
-                     a)  First choice
-
-                     b)  Second choice
-
-                     c)  Third choice
-
-                     d)  Fourth choice
-
-            Note: 
-            - Keep number and dot together (no space between them)
-            - Add exactly eight spaces between the dot and the question text
-            - Place each choice on its own line with proper indentation
-            - Add empty line between questions
-            - Add empty line after each choice
-            - Keep consistent spacing throughout
-            - Ensure vertical alignment of choices"""
-
-            main_prompt = f"""Create a {worksheet_type} worksheet about: {prompt}
-
-            Requirements:
-            - Grade Level: {teacher_grade}
-            - Type: {worksheet_type}
-            - Use Markdown for proper formatting
-            - Include clear sections
-            - Format for optimal presentation
-            - Ensure proper spacing between questions and answers
-
-            IMPORTANT: Place the text '[[ANSWER_KEY_START]]' on a new line before starting the answer key section.
-
-            Create the worksheet now, using this exact format:
-
-            # Worksheet Title
-
-            [Worksheet content here...]
-
-            [[ANSWER_KEY_START]]
-
-            # Answer Key
-
-            [Answer key content here...]"""
-
-            response = client.chat.completions.create(
-                model=ENDPOINT_MODELS["generate_worksheet"],
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": main_prompt}
-                ],
+            response = stream_text(
+                get_client(),
+                "generate_worksheet",
+                render_prompt("worksheet", worksheet_type=worksheet_type, prompt=prompt,
+                              teacher_grade=teacher_grade),
                 temperature=API_SETTINGS["temperature"],
-                stream=True
+                regenerate=data.get('regenerate', False)
             )
 
             # Stream the response
-            current_content = ""
-            for chunk in response:
-                if chunk.choices[0].delta.content is not None:
-                    content = chunk.choices[0].delta.content
-                    current_content += content
-                    yield json.dumps({
-                        "content": content,
-                        "done": False
-                    }) + '\n'
-
-            # Send a final message indicating completion
-            yield json.dumps({
-                "content": "",
-                "done": True,
-                "fullContent": current_content
-            }) + '\n'
+            for content in response:
+                yield {"content": content, "done": False}
+
+            # Send a final message indicating completion; resumable streams
+            # make echoing the full content here unnecessary
+            yield {"content": "", "done": True}
 
         except Exception as e:
-            print(f"Error generating worksheet: {str(e)}")
-            yield json.dumps({"error": str(e)}) + '\n'
+            log.error("generation_failed", component="worksheet", error=str(e))
+            yield {"error": str(e)}
 
-    return Response(
-        stream_with_context(generate()),
-        mimetype='application/x-ndjson'
-    )
+    return resumable_response('ndjson', 'application/x-ndjson', generate)
 
 @app.route('/generate-warmup', methods=['POST'])
 def generate_warmup():
@@ -425,49 +200,23 @@ def generate_warmup():
         
     def generate():
         try:
-            prompt = f"""Create a brief 2-3 minute warm-up activity to prepare students for reading about {topic}.
-
-            Story Title: {story_title}
-            Story Content: {story_content}
-
-            Format the response in markdown:
-            ### Warm-Up Activity: {topic}
-
-            **Time:** 2-3 minutes
-
-            **Objective:**
-            [Brief statement of what students will do]
-
-            **Activity Steps:**
-            1. [First step]
-            2. [Second step]
-            3. [Third step]
-
-            **Teacher Notes:**
-            - [Important points to remember]
-            - [What to look for]
-            """
-
-            response = client.chat.completions.create(
-                model=ENDPOINT_MODELS["generate_warmup"],
-                messages=[
-                    {"role": "system", "content": "You are an expert at creating engaging warm-up activities for reading lessons."},
-                    {"role": "user", "content": prompt}
-                ],
+            response = stream_text(
+                get_client(),
+                "generate_warmup",
+                warmup_messages(topic, story_title, story_content),
                 temperature=API_SETTINGS["temperature"],
-                stream=True
+                regenerate=data.get('regenerate', False)
             )
             
             content = ""
-            for chunk in response:
-                if chunk.choices[0].delta.content is not None:
-                    content += chunk.choices[0].delta.content
-                    yield f"data: {json.dumps({'content': chunk.choices[0].delta.content})}\n\n"
+            for text in response:
+                content += text
+                yield f"data: {json.dumps({'content': text})}\n\n"
 
             yield f"data: {json.dumps({'type': 'complete', 'content': content})}\n\n"
             
         except Exception as e:
-            print(f"Error generating warm-up: {str(e)}")
+            log.error("generation_failed", component="warm_up", error=str(e))
             yield f"data: {json.dumps({'type': 'error', 'message': 'Failed to generate warm-up'})}\n\n"
 
     return Response(stream_with_context(generate()), mimetype='text/event-stream')
@@ -484,68 +233,36 @@ def generate_story():
     def generate():
         try:
             # First generate the story
-            story_prompt = f"""Create a short, engaging paragraph-long story that can be used to teach the reading skill of {topic}. 
-            The story should be at {lexile_level} reading level.
-            
-            Requirements:
-            - One paragraph long (approximately 100-150 words)
-            - Age-appropriate vocabulary at {lexile_level} level
-            - Clear beginning, middle, and end
-            - Story should be designed to naturally demonstrate {topic} without explicitly mentioning it
-            - Vocabulary and sentence structure appropriate for {lexile_level}
-            - Include grade-level appropriate vocabulary
-            - The story should be subtle in teaching the skill - don't mention the skill directly
-            """
-
-            story_response = client.chat.completions.create(
-                model=ENDPOINT_MODELS["generate_story"],
-                messages=[
-                    {"role": "system", "content": f"You are an expert at creating engaging stories at {lexile_level} reading level that subtly teach reading skills."},
-                    {"role": "user", "content": story_prompt}
-                ],
-                temperature=API_SETTINGS["temperature"],
-                stream=True
+            story_response = stream_text(
+                get_client(),
+                "generate_story",
+                story_messages(topic, lexile_level),
+                temperature=API_SETTINGS["temperature"]
             )
             
             story_text = ""
-            for chunk in story_response:
-                if chunk.choices[0].delta.content is not None:
-                    story_text += chunk.choices[0].delta.content
-                    yield f"data: {json.dumps({'type': 'story', 'content': chunk.choices[0].delta.content})}\n\n"
+            for text in story_response:
+                story_text += text
+                yield f"data: {json.dumps({'type': 'story', 'content': text})}\n\n"
 
             # Then generate the title
-            title_prompt = f"""Create a short, engaging title for this story. The title should:
-            - Be creative and engaging
-            - Not mention {topic} or any teaching aspects
-            - Relate directly to the story's content
-            - Be appropriate for {lexile_level} level
-            - Be memorable and fun
-            
-            Story: {story_text}
-            
-            Return just the title, no quotes or extra text."""
-            
-            title_response = client.chat.completions.create(
-                model=ENDPOINT_MODELS["generate_story"],
-                messages=[
-                    {"role": "system", "content": "Create engaging, story-specific titles that capture the essence of the story without revealing its teaching purpose."},
-                    {"role": "user", "content": title_prompt}
-                ],
-                temperature=API_SETTINGS["temperature"],
-                stream=True
+            title_response = stream_text(
+                get_client(),
+                "generate_story",
+                story_title_messages(topic, lexile_level, story_text),
+                temperature=API_SETTINGS["temperature"]
             )
             
             title = ""
-            for chunk in title_response:
-                if chunk.choices[0].delta.content is not None:
-                    title += chunk.choices[0].delta.content
-                    yield f"data: {json.dumps({'type': 'title', 'content': chunk.choices[0].delta.content})}\n\n"
+            for text in title_response:
+                title += text
+                yield f"data: {json.dumps({'type': 'title', 'content': text})}\n\n"
 
             # Send final complete data
             yield f"data: {json.dumps({'type': 'complete', 'title': title.strip(), 'content': story_text.strip()})}\n\n"
             
         except Exception as e:
-            print(f"Error generating story: {str(e)}")
+            log.error("generation_failed", component="story", error=str(e))
             yield f"data: {json.dumps({'type': 'error', 'message': 'Failed to generate story'})}\n\n"
 
     return Response(stream_with_context(generate()), mimetype='text/event-stream')
@@ -562,37 +279,23 @@ def generate_guided_reading_intro():
         
     def generate():
         try:
-            prompt = f"""Create a brief 5-minute guided reading introduction lesson for this story. 
-            The lesson should focus on teaching {reading_skill}.
-
-            Story Title: {story_title}
-            Story Content: {story_content}
-
-            Format the response in markdown:
-            ### 5-Minute Introduction Lesson: {reading_skill}
-            [Rest of your prompt...]
-            """
-
-            response = client.chat.completions.create(
-                model=ENDPOINT_MODELS["generate_guided_reading_intro"],
-                messages=[
-                    {"role": "system", "content": "You are an expert reading teacher creating focused, practical guided reading lessons."},
-                    {"role": "user", "content": prompt}
-                ],
+            response = stream_text(
+                get_client(),
+                "generate_guided_reading_intro",
+                guided_reading_intro_messages(story_title, story_content, reading_skill),
                 temperature=API_SETTINGS["temperature"],
-                stream=True
+                regenerate=data.get('regenerate', False)
             )
             
             content = ""
-            for chunk in response:
-                if chunk.choices[0].delta.content:
-                    content += chunk.choices[0].delta.content
-                    yield f"data: {json.dumps({'content': chunk.choices[0].delta.content})}\n\n"
+            for text in response:
+                content += text
+                yield f"data: {json.dumps({'content': text})}\n\n"
 
             yield f"data: {json.dumps({'type': 'complete', 'content': content})}\n\n"
             
         except Exception as e:
-            print(f"Error generating guided reading intro: {str(e)}")
+            log.error("generation_failed", component="guided_reading_intro", error=str(e))
             yield f"data: {json.dumps({'type': 'error', 'message': 'Failed to generate lesson introduction'})}\n\n"
 
     return Response(stream_with_context(generate()), mimetype='text/event-stream')
@@ -608,46 +311,17 @@ def generate_graphic_organizer():
         return jsonify({"error": "Story title, content, and reading skill are required"}), 400
         
     try:
-        prompt = f"""Create a simple graphic organizer to help students analyze the story and practice {reading_skill} skills.
-
-        Story Title: {story_title}
-        Story Content: {story_content}
-
-        Requirements:
-        - Create a clear, printable graphic organizer format
-        - Focus on {reading_skill} skills
-        - Include 3-4 key elements or sections
-        - Add brief instructions for completing each section
-        - Keep it simple and grade-appropriate
-        - Format it in a way that's easy to understand and use
-        
-        Return the response in this format:
-        TITLE: [Title of graphic organizer]
-        INSTRUCTIONS: [Brief instructions for teachers]
-        
-        SECTIONS:
-        1. [Section name]
-   - [What students should write/do here]
-
-        2. [Section name]
-   - [What students should write/do here]
-
-        [etc...]"""
-
-        response = client.chat.completions.create(
-            model=ENDPOINT_MODELS["generate_graphic_organizer"],
-            messages=[
-                {"role": "system", "content": "You are an expert at creating educational graphic organizers for reading comprehension."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=API_SETTINGS["temperature"]
-        )
-        
-        organizer_content = response.choices[0].message.content.strip()
+        organizer_content = complete_text(
+            get_client(),
+            "generate_graphic_organizer",
+            graphic_organizer_messages(story_title, story_content, reading_skill),
+            temperature=API_SETTINGS["temperature"],
+            regenerate=data.get('regenerate', False)
+        ).strip()
         return jsonify({"content": organizer_content})
         
     except Exception as e:
-        print(f"Error generating graphic organizer: {str(e)}")
+        log.error("generation_failed", component="graphic_organizer", error=str(e))
         return jsonify({"error": "Failed to generate graphic organizer"}), 500
 
 @app.route('/generate-exit-ticket', methods=['POST'])
@@ -663,69 +337,25 @@ def generate_exit_ticket():
         
     def generate():
         try:
-            # Extract the practice story title and content from the markdown
-            practice_lines = practice_content.split('\n')
-            practice_title = ''
-            practice_story = ''
-            
-            # Parse the practice content to get title and story
-            in_story = False
-            for line in practice_lines:
-                if line.startswith('### Independent Practice Story:'):
-                    practice_title = line.replace('### Independent Practice Story:', '').strip()
-                elif line.startswith('**Practice Questions'):
-                    in_story = False
-                elif practice_title and not line.startswith('**') and not line.startswith('#'):
-                    if line.strip():
-                        practice_story += line.strip() + ' '
-                        in_story = True
-
-            prompt = f"""Create a quick 2-minute exit ticket activity based on the Independent Practice story that checks students' understanding of {skill}.
-
-            Practice Story Title: {practice_title}
-            Practice Story Content: {practice_story}
-
-            Format the response in markdown:
-            ### 2-Minute Exit Ticket: Checking Understanding
-
-            **Time:** 2 minutes
-
-            **Task:**
-            Based on the story "{practice_title}", complete the following:
-            [Brief task description focusing on {skill}]
-
-            **Instructions for Students:**
-            1. [First step specifically about the practice story]
-            2. [Second step using examples from the practice story]
-
-            **Success Criteria:**
-            - [What students need to demonstrate about {skill} using the practice story]
-            - [How they should use specific examples from the practice story]
-            
-            **Teacher Note:**
-            [What to look for in student responses regarding {skill} and their understanding of the practice story]
-            """
-
-            response = client.chat.completions.create(
-                model=ENDPOINT_MODELS["generate_exit_ticket"],
-                messages=[
-                    {"role": "system", "content": "You are an expert at creating effective exit tickets that check student understanding of specific reading skills using practice stories."},
-                    {"role": "user", "content": prompt}
-                ],
+            practice_title, practice_story = parse_practice_story(practice_content)
+
+            response = stream_text(
+                get_client(),
+                "generate_exit_ticket",
+                exit_ticket_messages(skill, practice_title, practice_story),
                 temperature=API_SETTINGS["temperature"],
-                stream=True
+                regenerate=data.get('regenerate', False)
             )
             
             content = ""
-            for chunk in response:
-                if chunk.choices[0].delta.content:
-                    content += chunk.choices[0].delta.content
-                    yield f"data: {json.dumps({'content': chunk.choices[0].delta.content})}\n\n"
+            for text in response:
+                content += text
+                yield f"data: {json.dumps({'content': text})}\n\n"
 
             yield f"data: {json.dumps({'type': 'complete', 'content': content})}\n\n"
             
         except Exception as e:
-            print(f"Error generating exit ticket: {str(e)}")
+            log.error("generation_failed", component="exit_ticket", error=str(e))
             yield f"data: {json.dumps({'type': 'error', 'message': 'Failed to generate exit ticket'})}\n\n"
 
     return Response(stream_with_context(generate()), mimetype='text/event-stream')
@@ -742,49 +372,107 @@ def generate_practice():
         
     def generate():
         try:
-            prompt = f"""Create a practice activity with a new short story focusing on {skill}.
-
-            Format the response in markdown:
-            ### Independent Practice Story: [Generate an engaging title for the story]
-
-            [Write a short story here that demonstrates {skill} - about 100 words]
-
-            **Practice Questions:**
-            1. [Question specifically about {skill}]
-            2. [Another question about {skill}]
-            3. [Final question about {skill}]
-
-            **Student Instructions:**
-            1. Read the story carefully
-            2. Think about {skill} as you read
-            3. Answer the questions using evidence from the text
-            """
-
-            response = client.chat.completions.create(
-                model=ENDPOINT_MODELS["generate_practice"],
-                messages=[
-                    {"role": "system", "content": "You are an expert at creating educational content and practice activities."},
-                    {"role": "user", "content": prompt}
-                ],
+            response = stream_text(
+                get_client(),
+                "generate_practice",
+                practice_messages(skill),
                 temperature=API_SETTINGS["temperature"],
-                stream=True
+                regenerate=data.get('regenerate', False)
             )
             
             content = ""
-            for chunk in response:
-                if chunk.choices[0].delta.content:
-                    content += chunk.choices[0].delta.content
-                    yield f"data: {json.dumps({'content': chunk.choices[0].delta.content})}\n\n"
+            for text in response:
+                content += text
+                yield f"data: {json.dumps({'content': text})}\n\n"
 
             # Send completion message
             yield f"data: {json.dumps({'type': 'complete', 'content': content})}\n\n"
             
         except Exception as e:
-            print(f"Error generating practice content: {str(e)}")
+            log.error("generation_failed", component="practice_content", error=str(e))
             yield f"data: {json.dumps({'type': 'error', 'message': 'Failed to generate practice content'})}\n\n"
 
     return Response(stream_with_context(generate()), mimetype='text/event-stream')
 
+@app.route('/generate-lesson-bundle', methods=['POST'])
+def generate_lesson_bundle():
+    """
+    Generate the warm-up, introduction, practice and exit ticket for a story in one stream.
+
+    Warm-up, introduction and practice run concurrently; the exit ticket starts as
+    soon as the practice story is complete. Events from all components are
+    multiplexed over a single SSE stream using the component name as event type.
+    """
+    data = request.json
+    skill = data.get('skill') or data.get('topic')
+    topic = data.get('topic') or skill
+    story_title = data.get('storyTitle')
+    story_content = data.get('storyContent')
+
+    if not all([skill, story_title, story_content]):
+        return jsonify({"error": "Skill, story title, and content are required"}), 400
+
+    events = queue.Queue()
+    cancelled = threading.Event()
+
+    def run_component(component, endpoint, messages):
+        try:
+            content = ""
+            for text in stream_text(get_client(), endpoint, messages, temperature=API_SETTINGS["temperature"],
+                                    regenerate=data.get('regenerate', False)):
+                if cancelled.is_set():
+                    return None
+                content += text
+                events.put((component, {'type': 'content', 'content': text}))
+            events.put((component, {'type': 'complete', 'content': content}))
+            return content
+        except Exception as e:
+            log.error("generation_failed", component=f"lesson_bundle.{component}", error=str(e))
+            events.put((component, {'type': 'error', 'message': f'Failed to generate {component}'}))
+            return None
+
+    def run_warmup():
+        run_component('warmup', 'generate_warmup', warmup_messages(topic, story_title, story_content))
+
+    def run_introduction():
+        run_component('introduction', 'generate_guided_reading_intro',
+                      guided_reading_intro_messages(story_title, story_content, skill))
+
+    def run_practice_and_exit_ticket():
+        practice_content = run_component('practice', 'generate_practice', practice_messages(skill))
+        if practice_content is None:
+            if not cancelled.is_set():
+                events.put(('exit_ticket', {'type': 'error', 'message': 'Practice content not available'}))
+            return
+        practice_title, practice_story = parse_practice_story(practice_content)
+        run_component('exit_ticket', 'generate_exit_ticket',
+                      exit_ticket_messages(skill, practice_title, practice_story))
+
+    def generate():
+        executor = ThreadPoolExecutor(max_workers=3)
+        futures = [executor.submit(contextvars.copy_context().run, task)
+                   for task in (run_warmup, run_introduction, run_practice_and_exit_ticket)]
+        results = {}
+        try:
+            while True:
+                try:
+                    component, payload = events.get(timeout=0.1)
+                except queue.Empty:
+                    if all(future.done() for future in futures) and events.empty():
+                        break
+                    continue
+                if payload['type'] == 'complete':
+                    results[component] = payload['content']
+                yield format_bundle_event(component, payload)
+
+            yield f"event: complete\ndata: {json.dumps({'type': 'complete', 'components': results})}\n\n"
+        finally:
+            # Stop the workers early if the client went away
+            cancelled.set()
+            executor.shutdown(wait=False)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
 @app.route('/improve-observation', methods=['POST'])
 def improve_observation():
     data = request.json
@@ -795,41 +483,20 @@ def improve_observation():
         return jsonify({"error": "Observation and topic are required"}), 400
         
     try:
-        prompt = f"""Enhance this observation about {topic} to be more specific and professional. 
-        Keep it concise (2-3 sentences) and natural. Focus on the student's understanding of {topic}.
-        Do not include any phrases like 'revised' or 'improved' or anything that indicates AI modification.
-        Simply provide the enhanced observation as if it was written directly by the teacher.
-
-        Original: {observation}
-
-        Guidelines:
-        1. Keep it brief but specific
-        2. Use professional educational language
-        3. Focus on observable behaviors related to {topic}
-        4. Include one clear next step
-        5. Write in a natural teacher's voice
-        6. Do not use any meta-language about the observation being revised or improved
-        """
-
-        response = client.chat.completions.create(
-            model=ENDPOINT_MODELS["improve_observation"],
-            messages=[
-                {"role": "system", "content": "You are writing as the teacher, providing direct observations about students."},
-                {"role": "user", "content": prompt}
-            ],
+        improved_observation = complete_text(
+            get_client(),
+            "improve_observation",
+            observation_messages(observation, topic),
             temperature=API_SETTINGS["temperature"],
+            regenerate=data.get('regenerate', False),
             max_tokens=API_SETTINGS["max_tokens"]["improve_observation"]
         )
-        
-        improved_observation = response.choices[0].message.content.strip()
-        
-        # Remove any potential prefixes like "Enhanced:" or "Improved:"
-        improved_observation = improved_observation.replace("Enhanced:", "").replace("Improved:", "").strip()
+        improved_observation = clean_observation(improved_observation)
         
         return jsonify({"content": improved_observation})
         
     except Exception as e:
-        print(f"Error improving observation: {str(e)}")
+        log.error("observation_improvement_failed", error=str(e))
         return jsonify({"error": "Failed to improve observation"}), 500
 
 @app.route('/chat', methods=['POST'])
@@ -843,106 +510,114 @@ def chat():
 
     try:
         def generate():
-            system_prompt = """You are an expert teaching coach and educational consultant with decades of experience. 
-            Your role is to help teachers improve their teaching practice, provide guidance on instructional strategies, 
-            classroom management, lesson planning, and student engagement. You have deep knowledge of:
-
-            1. Pedagogical best practices
-            2. Differentiated instruction
-            3. Assessment strategies
-            4. Classroom management techniques
-            5. Social-emotional learning
-            6. Special education accommodations
-            7. Technology integration
-            8. Professional development
-
-            Provide detailed, practical advice and always explain the reasoning behind your suggestions. 
-            Use markdown formatting to structure your responses with headers, bullet points, and emphasis where appropriate.
-            When relevant, provide specific examples and scenarios to illustrate your points."""
-
-            response = client.chat.completions.create(
-                model=ENDPOINT_MODELS["chat"],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": message
-                    }
-                ],
-                stream=True
+            response = cascade_stream(
+                get_client(),
+                "chat",
+                chat_messages(message),
+                check_chat_opening,
+                teacher_id=teacher_id
             )
             
-            for chunk in response:
-                if chunk.choices[0].delta.content is not None:
-                    yield chunk.choices[0].delta.content
+            for text in response:
+                yield text
 
         return Response(stream_with_context(generate()), mimetype='text/plain')
 
     except Exception as e:
-        print(f"Error in chat: {str(e)}")
+        log.error("chat_failed", error=str(e))
         return jsonify({"error": str(e)}), 500
 
+def student_stream_response(events):
+    """
+    Stream parsed students as NDJSON, one line per student as soon as the
+    model has finished writing it.
+    """
+    def generate():
+        try:
+            for event in events:
+                yield json.dumps(event) + '\n'
+        except Exception as e:
+            log.error("student_stream_failed", error=str(e))
+            yield json.dumps({"type": "error", "error": str(e)}) + '\n'
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson'
+    )
+
 @app.route('/parse-students-from-image', methods=['POST'])
 def parse_students_from_image():
     try:
         data = request.json
-        image_data = data.get('image')
         teacher_grade = data.get('teacherGrade')
         teacher_id = data.get('teacherId')  # Get teacherId from request
-        
-        # Use GPT to parse the text content
-        response = client.chat.completions.create(
-            model=ENDPOINT_MODELS["parse_students_from_image"],
-            messages=[
-                {
-                    "role": "system",
-                    "content": """You are a data extraction expert. Extract ALL student information from the provided data. 
-                    The data may be in table format with columns for first name, last name, and reading level.
-                    Process EVERY row and return ALL students in this exact JSON format without any markdown formatting or code blocks:
-                    [
-                        {
-                            "firstName": "string",
-                            "lastName": "string",
-                            "readingLevel": "string",
-                            "gradeLevel": "string"
-                        }
-                    ]
-                    
-                    Important:
-                    - Process EVERY row in the data
-                    - Include ALL students found
-                    - Do not limit the number of students
-                    - Maintain the exact order from the source data
-                    """
-                },
-                {
-                    "role": "user",
-                    "content": f"Extract ALL student information from this data. The data appears to be in a table format with columns for first name, last name, and reading level. Process EVERY row: {image_data}"
-                }
-            ],
-            temperature=0
-        )
-        
-        # Get the response content and clean it
-        content = response.choices[0].message.content.strip()
-        if content.startswith('```'):
-            content = content.replace('```json', '').replace('```', '').strip()
+
+        # PIL and Tesseract are only loaded by this route
+        from image_ocr import image_payloads, ocr_page
+
+        # OCR every page locally so only the extracted text is sent to the model
+        try:
+            images = image_payloads(data)
+            pages = []
+            for page_index, page, error in map_ordered(ocr_page, images, OCR_SETTINGS["max_workers"]):
+                if error is not None:
+                    raise ValueError(f"Image {page_index + 1}: {str(error)}")
+                pages.append(page)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if data.get('mode') == 'batch':
+            items = [dict(page.to_item(), teacherGrade=teacher_grade, teacherId=teacher_id) for page in pages]
+            return queue_batch_job('parse_students_from_image', items, teacher_id)
+
+        def prepare(student, index):
+            return prepare_image_student(student, teacher_grade, teacher_id)
+
+        def local_students(page):
+            # Cleanly tabulated OCR text often needs no model call at all
+            if page.use_vision or not ROSTER_SETTINGS["local_parsing"]:
+                return None
+            # Image rosters need only names, so a missing reading-level column is fine
+            local_result = parse_text_roster(page.text, teacher_grade, teacher_id, require_reading_level=False)
+            return local_result[1] if local_result else None
+
+        def extract(page):
+            students = local_students(page)
+            if students is not None:
+                return students
+            item = page.to_item()
+            content = cascade_complete(
+                get_client(),
+                "parse_students_from_image",
+                image_page_messages(item),
+                image_roster_check(item),
+                temperature=0,
+                teacher_id=teacher_id
+            )
+            return prepare_image_students(json.loads(clean_json_response(content)), teacher_grade, teacher_id)
+
+        if data.get('mode') == 'stream':
+            if len(pages) == 1 and local_students(pages[0]) is None:
+                return student_stream_response(iter_student_events(
+                    stream_text(
+                        get_client(),
+                        "parse_students_from_image",
+                        image_page_messages(pages[0].to_item()),
+                        temperature=0,
+                        teacher_id=teacher_id
+                    ),
+                    prepare
+                ))
+            return student_stream_response(ordered_student_events(
+                map_ordered(extract, pages, OCR_SETTINGS["max_workers"]), prepare))
         
         try:
-            # Try to parse the JSON response
-            students = json.loads(content)
-            if not isinstance(students, list):
-                raise ValueError("Response is not a list")
-                
-            # Ensure each student has the required fields and teacherId
-            for student in students:
-                student['gradeLevel'] = student.get('gradeLevel', teacher_grade)
-                student['teacherId'] = teacher_id  # Add teacherId to each student
-                if not all(key in student for key in ['firstName', 'lastName']):
-                    raise ValueError("Missing required fields in student data")
+            # Extract every page concurrently and merge the students in page order
+            students = []
+            for page_index, page_students, error in map_ordered(extract, pages, OCR_SETTINGS["max_workers"]):
+                if error is not None:
+                    raise error
+                students.extend(page_students)
             
             return jsonify({
                 'students': students,
@@ -950,14 +625,14 @@ def parse_students_from_image():
             })
             
         except json.JSONDecodeError as je:
-            print("JSON Decode Error:", je)
+            log.error("image_students_invalid_json", error=str(je))
             return jsonify({
                 'error': 'Invalid JSON format in response',
                 'details': str(je)
             }), 500
             
     except Exception as e:
-        print(f"Error processing image: {str(e)}")
+        log.error("image_processing_failed", error=str(e))
         return jsonify({
             'error': 'Failed to process image',
             'details': str(e)
@@ -965,106 +640,196 @@ def parse_students_from_image():
 
 @app.route('/parse-students', methods=['POST'])
 def parse_students():
-    data = request.json
+    # Rosters arrive as JSON text or as an uploaded CSV/TSV/XLSX file
+    data = request.get_json(silent=True) or request.form.to_dict()
     text = data.get('text')
     teacher_grade = data.get('teacherGrade', '')
     teacher_id = data.get('teacherId', '')
+    upload = request.files.get('file')
+    local_result = None
+
+    if upload:
+        content = upload.read()
+        if upload.filename.lower().endswith('.xlsx'):
+            try:
+                if ROSTER_SETTINGS["local_parsing"]:
+                    students = parse_xlsx_roster(content, teacher_grade, teacher_id)
+                    local_result = ('xlsx', students) if students else None
+                if local_result is None:
+                    text = xlsx_to_text(content)
+            except (zipfile.BadZipFile, ValueError) as e:
+                return jsonify({"error": f"Could not read spreadsheet: {str(e)}"}), 400
+        else:
+            text = content.decode('utf-8-sig', errors='replace')
+        data = dict(data, text=text)
     
-    print("Received request with:")
-    print(f"Text length: {len(text) if text else 0}")
-    print(f"Teacher grade: {teacher_grade}")
-    print(f"Teacher ID: {teacher_id}")
+    log.info("roster_received", text_chars=len(text) if text else 0, teacher_grade=teacher_grade,
+             teacher_id=teacher_id)
     
-    if not text:
+    if not text and local_result is None:
         return jsonify({"error": "Text is required"}), 400
+
+    # Structured rosters (SIS exports) are parsed locally without calling the model
+    if local_result is None and ROSTER_SETTINGS["local_parsing"]:
+        local_result = parse_text_roster(text, teacher_grade, teacher_id)
+    if local_result is not None:
+        roster_format, students = local_result
+        log.info("roster_parsed_locally", students=len(students), format=roster_format)
+        if data.get('mode') == 'stream':
+            return student_stream_response(student_list_events(students))
+        return jsonify({"students": students, "format": roster_format})
+
+    if data.get('mode') == 'batch':
+        return queue_batch_job('parse_students', [data], teacher_id)
+
+    # Large rosters are split on row boundaries and extracted concurrently
+    chunks = split_roster(text, ROSTER_SETTINGS["chunk_tokens"], ROSTER_SETTINGS["overlap_rows"])
+    merger = RosterMerger(text, teacher_id, ROSTER_SETTINGS["overlap_rows"])
+
+    # Rows that fail validation are re-extracted on their own instead of failing the roster
+    repair = roster_repairer(text, teacher_grade, teacher_id)
+
+    def prepare(student, index):
+        return merger.assign_id(validate_student(student, index))
+
+    if data.get('mode') == 'stream':
+        if len(chunks) > 1:
+            return student_stream_response(repair_student_events(ordered_student_events(
+                extract_roster_chunks(chunks, teacher_grade, teacher_id), validate_student, merger.add_chunk),
+                repair, prepare))
+        return student_stream_response(repair_student_events(iter_student_events(
+            stream_text(
+                get_client(),
+                "parse_students",
+                parse_students_messages(text, teacher_grade, teacher_id),
+                temperature=0.1,
+                teacher_id=teacher_id,
+                **roster_format_params()
+            ),
+            prepare
+        ), repair, prepare))
+
     try:
-        # Create a prompt that explains what we want
-        prompt = f"""Extract student information from the following text and return a JSON array of student objects.
-        Each student object should have: 
-        - firstName (required)
-        - lastName (required)
-        - studentId (required, generate a random ID if not provided)
-        - gradeLevel (use "{teacher_grade}" if not specified)
-        - readingLevel (required)
-        - teacherId (use "{teacher_id}")
-        - periodId (optional)
-        - groupIds (optional, array of strings)
-        - intervention (optional)
-        - interventionResults (optional)
-        The text might be in any format but will contain student information.
-        If certain information is missing, make reasonable assumptions based on context.
-        
-        Text to parse:
-        {text}
-        Return only the JSON array without any markdown formatting or code blocks.
-        Example format:
-        [
-          {{
-            "firstName": "John",
-            "lastName": "Doe",
-            "studentId": "ST" + random 6 digits,
-            "gradeLevel": "{teacher_grade}",
-            "readingLevel": "B",
-            "teacherId": "{teacher_id}",
-            "periodId": null,
-            "groupIds": [],
-            "intervention": "",
-            "interventionResults": ""
-          }}
-        ]
-        """
-        print("Sending request to GPT...")
-        
+        if len(chunks) > 1:
+            log.info("roster_chunks_extracting", chunks=len(chunks))
+            students, failed_rows = collect_students(repair_student_events(ordered_student_events(
+                extract_roster_chunks(chunks, teacher_grade, teacher_id), validate_student, merger.add_chunk),
+                repair, prepare))
+            log.info("roster_parsed", students=len(students), chunks=len(chunks), failed_rows=len(failed_rows))
+            return jsonify({"students": students, "failedRows": failed_rows})
+
         # Call OpenAI API
-        response = client.chat.completions.create(
-            model=ENDPOINT_MODELS["parse_students"],
-            messages=[
-                {
-                    "role": "system", 
-                    "content": "You are a helpful assistant that extracts student information from text and returns it in a structured JSON format. Do not include markdown formatting or code blocks in your response."
-                },
-                {"role": "user", "content": prompt}
-            ],
+        students_json = cascade_complete(
+            get_client(),
+            "parse_students",
+            parse_students_messages(text, teacher_grade, teacher_id),
+            roster_check(text),
             temperature=0.1,
-        )
-        print("Received response from GPT")
-        
-        # Get the response text and clean it
-        students_json = response.choices[0].message.content.strip()
-        print(f"Raw GPT response: {students_json[:200]}...")
-        
-        # Remove markdown code block if present
-        if students_json.startswith('```'):
-            students_json = students_json.replace('```json', '').replace('```', '').strip()
-        print(f"Cleaned JSON: {students_json[:200]}...")
+            teacher_id=teacher_id,
+            **roster_format_params()
+        ).strip()
+        log.debug("roster_model_response", raw_response=students_json)
         
-        students = json.loads(students_json)
-        print(f"Successfully parsed JSON. Found {len(students)} students")
+        # Decode and validate each student on its own; failed rows are repaired
+        students, failed_rows = collect_students(repair_student_events(
+            iter_student_events([students_json], prepare), repair, prepare))
+        log.info("roster_parsed", students=len(students), chunks=1, failed_rows=len(failed_rows))
         
-        # Validate the structure of each student object
-        required_fields = ['firstName', 'lastName', 'studentId', 'gradeLevel', 'readingLevel', 'teacherId']
-        for i, student in enumerate(students):
-            print(f"Validating student {i + 1}: {student.get('firstName', 'N/A')} {student.get('lastName', 'N/A')}")
-            if not all(key in student for key in required_fields):
-                missing = [key for key in required_fields if key not in student]
-                raise ValueError(f"Student {i + 1} missing required fields: {', '.join(missing)}")
-        
-        print("All validations passed. Returning response.")
-        return jsonify({"students": students})
+        return jsonify({"students": students, "failedRows": failed_rows})
         
     except json.JSONDecodeError as e:
-        print(f"JSON Decode Error: {str(e)}")
-        print(f"Problematic JSON: {students_json if 'students_json' in locals() else 'Not available'}")
+        log.error("roster_invalid_json", error=str(e),
+                  raw_response=students_json if 'students_json' in locals() else None)
         return jsonify({"error": "Failed to parse AI response as JSON"}), 500
+    except InputTooLarge as e:
+        log.warning("roster_too_large", error=str(e))
+        return jsonify({"error": f"{str(e)} Use stream or batch mode for large rosters."}), 413
     except ValueError as e:
-        print(f"Validation Error: {str(e)}")
+        log.error("roster_invalid", error=str(e))
         return jsonify({"error": str(e)}), 500
     except Exception as e:
-        print(f"Unexpected Error: {str(e)}")
-        print(f"Error type: {type(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        log.error("roster_failed", exc_info=True, error=str(e))
         return jsonify({"error": str(e)}), 500
 
+def extract_roster_chunks(chunks, teacher_grade, teacher_id):
+    """
+    Extract students from roster chunks concurrently, in source order.
+    """
+    def extract(chunk):
+        content = cascade_complete(
+            get_client(),
+            "parse_students",
+            parse_students_messages(chunk, teacher_grade, teacher_id),
+            roster_check(chunk),
+            temperature=0.1,
+            teacher_id=teacher_id,
+            **roster_format_params()
+        )
+        return decode_student_elements(content)
+
+    return map_ordered(extract, chunks, ROSTER_SETTINGS["max_workers"])
+
+def queue_batch_job(kind, items, teacher_id):
+    try:
+        job = batch_runner.create_job(kind, items, teacher_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(job_summary(job)), 202
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    data = request.json
+    kind = data.get('kind')
+    items = data.get('items')
+
+    if not kind or not isinstance(items, list):
+        return jsonify({"error": "Job kind and a list of items are required"}), 400
+
+    return queue_batch_job(kind, items, data.get('teacherId'))
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = batch_runner.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_summary(job))
+
+@app.route('/scheduler/stats', methods=['GET'])
+def scheduler_stats():
+    return jsonify(scheduler.stats())
+
+@app.route('/prompts/stats', methods=['GET'])
+def prompts_stats():
+    return jsonify(prompt_stats.stats())
+
+@app.route('/preflight/stats', methods=['GET'])
+def preflight_stats_route():
+    return jsonify(preflight_stats.stats())
+
+@app.route('/streams/stats', methods=['GET'])
+def streams_stats():
+    return jsonify(abort_stats.stats())
+
+@app.route('/cascade/stats', methods=['GET'])
+def cascade_stats_route():
+    return jsonify(cascade_stats.stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(upstream_metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/profiles', methods=['GET'])
+def profiles():
+    if not profiler.authorized(request.headers.get(PROFILE_HEADER)):
+        return jsonify({"error": "Not found"}), 404
+    return jsonify(profiler.summaries())
+
+@app.route('/profiles/<profile_id>', methods=['GET'])
+def profile_flamegraph(profile_id):
+    folded = profiler.folded(profile_id) if profiler.authorized(request.headers.get(PROFILE_HEADER)) else None
+    if folded is None:
+        return jsonify({"error": "Not found"}), 404
+    return Response(folded, mimetype='text/plain')
+
 if __name__ == "__main__":
     app.run(debug=True, port=5001)
\ No newline at end of file
@@ -0,0 +1,759 @@
+"""
+ASGI port of the Flask app in app.py.
+
+Serves the same routes with the same request and response contracts, but
+every stream is an async generator over the shared AsyncOpenAI client, so an
+open stream holds a coroutine instead of a worker thread and one process can
+serve hundreds of concurrent streams. Blocking work (OCR, spreadsheet
+parsing, batch job files) runs in the thread pool.
+
+Run with:
+    uvicorn asgi_app:app --port 5001
+"""
+
+import asyncio
+import json
+import zipfile
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from config import API_SETTINGS, ROSTER_SETTINGS, OCR_SETTINGS
+from cascade import acascade_complete, cascade_stats, check_chat_opening, open_cascade_stream
+from completions import acomplete_text, open_text_stream
+from metrics import METRICS_CONTENT_TYPE, upstream_metrics
+from openai_client import close_async_client
+from preflight import InputTooLarge, preflight_stats
+from profiling import PROFILE_HEADER, ProfilingMiddleware, profiler
+from prompts import prompt_stats, render_prompt
+from resumable_streams import aiter_stream, resume_or_start
+from scheduler import scheduler
+from stream_aborts import abort_stats
+from student_parsing import (
+    RosterMerger,
+    aiter_student_events,
+    clean_json_response,
+    decode_student_elements,
+    iter_student_events,
+    image_page_messages,
+    parse_students_messages,
+    prepare_image_student,
+    prepare_image_students,
+    split_roster,
+    student_list_events,
+    validate_student,
+)
+from tracing import TracingMiddleware
+from logs import get_logger
+from roster_ingest import parse_text_roster, parse_xlsx_roster, xlsx_to_text
+from batch_jobs import job_summary
+from route_helpers import (
+    amap_ordered,
+    aordered_student_events,
+    arepair_student_events,
+    aroster_repairer,
+    batch_runner,
+    chat_messages,
+    clean_observation,
+    collect_students,
+    exit_ticket_messages,
+    format_bundle_event,
+    graphic_organizer_messages,
+    guided_reading_intro_messages,
+    image_roster_check,
+    map_ordered,
+    observation_messages,
+    parse_practice_story,
+    passage_messages,
+    practice_messages,
+    roster_check,
+    roster_format_params,
+    story_messages,
+    story_title_messages,
+    warmup_messages,
+)
+
+log = get_logger("asgi_app")
+
+app = FastAPI(title="TeachAssist AI (ASGI)")
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=[
+        "http://localhost:3000",
+        "https://teach-ai-beige.vercel.app",
+        "https://teach-ai-aq9x.vercel.app",
+        "https://teach-ai-db-backend.vercel.app"
+    ],
+    allow_credentials=True,
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["Content-Type", "Authorization", "traceparent"],
+    expose_headers=["X-Trace-Id"],
+    max_age=3600
+)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(TracingMiddleware)
+
+@app.on_event("shutdown")
+async def shutdown_openai_client():
+    # Release the shared OpenAI connection pool
+    await close_async_client()
+
+def error(message, status_code):
+    return JSONResponse({"error": message}, status_code=status_code)
+
+def sse(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+async def completion_deltas(endpoint, messages, **kwargs):
+    """
+    Text deltas of a streamed completion, opened on first iteration so that
+    upstream errors surface inside the response stream as they do in app.py.
+    """
+    response = await open_text_stream(endpoint, messages, **kwargs)
+    async for text in response:
+        yield text
+
+async def content_events(endpoint, messages, label, failure, regenerate=False):
+    """
+    SSE events for one streamed completion: a content event per frame, then
+    a complete event with the full text, or an error event.
+    """
+    try:
+        content = ""
+        async for text in completion_deltas(endpoint, messages, temperature=API_SETTINGS["temperature"],
+                                            regenerate=regenerate):
+            content += text
+            yield sse({'content': text})
+
+        yield sse({'type': 'complete', 'content': content})
+
+    except Exception as e:
+        log.error("generation_failed", component=label, error=str(e))
+        yield sse({'type': 'error', 'message': failure})
+
+def resumable_response(request, fmt, media_type, start):
+    """
+    Serve a generation as a resumable SSE or NDJSON stream (see app.resumable_response).
+    """
+    resumed = resume_or_start(request.headers.get('Last-Event-ID'), start)
+    if resumed is None:
+        return error("Stream has expired; start a new request", 404)
+    stream, last_seq = resumed
+    return StreamingResponse(
+        aiter_stream(fmt, stream, last_seq),
+        media_type=media_type,
+        headers={'X-Stream-Id': stream.id}
+    )
+
+@app.post('/generate-passage')
+async def generate_passage(request: Request):
+    data = await request.json()
+    reading_level = data.get('reading_level')
+    topic = data.get('topic')
+    genre = data.get('genre', 'Informational')
+    generate_questions = data.get('generateQuestions', False)
+    question_style = data.get('questionStyle', 'STAAR')
+    include_answer_key = data.get('includeAnswerKey', False)
+
+    async def generate():
+        try:
+            messages = passage_messages(topic, reading_level, genre, generate_questions,
+                                        question_style, include_answer_key)
+
+            response = completion_deltas(
+                "generate_passage",
+                messages,
+                temperature=API_SETTINGS["temperature"],
+                timeout=API_SETTINGS["timeout"],
+                regenerate=data.get('regenerate', False),
+            )
+
+            async for text in response:
+                yield {'type': 'content', 'content': text}
+
+            yield {'type': 'complete'}
+
+        except Exception as e:
+            log.error("generation_failed", component="passage", error=str(e))
+            yield {'type': 'error', 'message': str(e)}
+
+    return resumable_response(request, 'sse', 'text/event-stream', generate)
+
+@app.post('/generate-worksheet')
+async def generate_worksheet(request: Request):
+    data = await request.json()
+    worksheet_type = data.get('worksheetType')
+    prompt = data.get('prompt')
+    teacher_grade = data.get('teacherGrade')
+
+    if not worksheet_type or not prompt:
+        return error("Worksheet type and prompt are required", 400)
+
+    async def generate():
+        try:
+            response = completion_deltas(
+                "generate_worksheet",
+                render_prompt("worksheet", worksheet_type=worksheet_type, prompt=prompt,
+                              teacher_grade=teacher_grade),
+                temperature=API_SETTINGS["temperature"],
+                regenerate=data.get('regenerate', False)
+            )
+
+            async for content in response:
+                yield {"content": content, "done": False}
+
+            yield {"content": "", "done": True}
+
+        except Exception as e:
+            log.error("generation_failed", component="worksheet", error=str(e))
+            yield {"error": str(e)}
+
+    return resumable_response(request, 'ndjson', 'application/x-ndjson', generate)
+
+@app.post('/generate-warmup')
+async def generate_warmup(request: Request):
+    data = await request.json()
+    topic = data.get('topic')
+    story_title = data.get('storyTitle')
+    story_content = data.get('storyContent')
+
+    if not all([topic, story_title, story_content]):
+        return error("Topic, story title, and content are required", 400)
+
+    return StreamingResponse(
+        content_events("generate_warmup", warmup_messages(topic, story_title, story_content),
+                       "warm-up", "Failed to generate warm-up", data.get('regenerate', False)),
+        media_type='text/event-stream'
+    )
+
+@app.post('/generate-story')
+async def generate_story(request: Request):
+    data = await request.json()
+    topic = data.get('topic')
+    lexile_level = data.get('lexileLevel')
+
+    if not topic or not lexile_level:
+        return error("Topic and Lexile level are required", 400)
+
+    async def generate():
+        try:
+            # First generate the story
+            story_text = ""
+            async for text in completion_deltas("generate_story", story_messages(topic, lexile_level),
+                                                temperature=API_SETTINGS["temperature"]):
+                story_text += text
+                yield sse({'type': 'story', 'content': text})
+
+            # Then generate the title
+            title = ""
+            async for text in completion_deltas("generate_story",
+                                                story_title_messages(topic, lexile_level, story_text),
+                                                temperature=API_SETTINGS["temperature"]):
+                title += text
+                yield sse({'type': 'title', 'content': text})
+
+            yield sse({'type': 'complete', 'title': title.strip(), 'content': story_text.strip()})
+
+        except Exception as e:
+            log.error("generation_failed", component="story", error=str(e))
+            yield sse({'type': 'error', 'message': 'Failed to generate story'})
+
+    return StreamingResponse(generate(), media_type='text/event-stream')
+
+@app.post('/generate-guided-reading-intro')
+async def generate_guided_reading_intro(request: Request):
+    data = await request.json()
+    story_title = data.get('title')
+    story_content = data.get('content')
+    reading_skill = data.get('skill')
+
+    if not all([story_title, story_content, reading_skill]):
+        return error("Story title, content, and reading skill are required", 400)
+
+    return StreamingResponse(
+        content_events("generate_guided_reading_intro",
+                       guided_reading_intro_messages(story_title, story_content, reading_skill),
+                       "guided reading intro", "Failed to generate lesson introduction",
+                       data.get('regenerate', False)),
+        media_type='text/event-stream'
+    )
+
+@app.post('/generate-graphic-organizer')
+async def generate_graphic_organizer(request: Request):
+    data = await request.json()
+    story_title = data.get('title')
+    story_content = data.get('content')
+    reading_skill = data.get('skill')
+
+    if not all([story_title, story_content, reading_skill]):
+        return error("Story title, content, and reading skill are required", 400)
+
+    try:
+        organizer_content = await acomplete_text(
+            "generate_graphic_organizer",
+            graphic_organizer_messages(story_title, story_content, reading_skill),
+            temperature=API_SETTINGS["temperature"],
+            regenerate=data.get('regenerate', False)
+        )
+        return {"content": organizer_content.strip()}
+
+    except Exception as e:
+        log.error("generation_failed", component="graphic_organizer", error=str(e))
+        return error("Failed to generate graphic organizer", 500)
+
+@app.post('/generate-exit-ticket')
+async def generate_exit_ticket(request: Request):
+    data = await request.json()
+    story_title = data.get('storyTitle')
+    story_content = data.get('storyContent')
+    skill = data.get('skill')
+    practice_content = data.get('practiceContent')
+
+    if not all([story_title, story_content, skill, practice_content]):
+        return error("Story title, content, skill, and practice content are required", 400)
+
+    practice_title, practice_story = parse_practice_story(practice_content)
+    return StreamingResponse(
+        content_events("generate_exit_ticket", exit_ticket_messages(skill, practice_title, practice_story),
+                       "exit ticket", "Failed to generate exit ticket", data.get('regenerate', False)),
+        media_type='text/event-stream'
+    )
+
+@app.post('/generate-practice')
+async def generate_practice(request: Request):
+    data = await request.json()
+    skill = data.get('skill')
+    story_title = data.get('storyTitle')
+    story_content = data.get('storyContent')
+
+    if not all([skill, story_title, story_content]):
+        return error("Skill, story title, and content are required", 400)
+
+    return StreamingResponse(
+        content_events("generate_practice", practice_messages(skill),
+                       "practice content", "Failed to generate practice content",
+                       data.get('regenerate', False)),
+        media_type='text/event-stream'
+    )
+
+@app.post('/generate-lesson-bundle')
+async def generate_lesson_bundle(request: Request):
+    """
+    Generate the warm-up, introduction, practice and exit ticket for a story in one stream.
+
+    Components run as tasks on the event loop and feed one queue; see
+    app.generate_lesson_bundle for the event format.
+    """
+    data = await request.json()
+    skill = data.get('skill') or data.get('topic')
+    topic = data.get('topic') or skill
+    story_title = data.get('storyTitle')
+    story_content = data.get('storyContent')
+
+    if not all([skill, story_title, story_content]):
+        return error("Skill, story title, and content are required", 400)
+
+    events = asyncio.Queue()
+
+    async def run_component(component, endpoint, messages):
+        try:
+            content = ""
+            async for text in completion_deltas(endpoint, messages, temperature=API_SETTINGS["temperature"],
+                                                regenerate=data.get('regenerate', False)):
+                content += text
+                events.put_nowait((component, {'type': 'content', 'content': text}))
+            events.put_nowait((component, {'type': 'complete', 'content': content}))
+            return content
+        except Exception as e:
+            log.error("generation_failed", component=f"lesson_bundle.{component}", error=str(e))
+            events.put_nowait((component, {'type': 'error', 'message': f'Failed to generate {component}'}))
+            return None
+
+    async def run_practice_and_exit_ticket():
+        practice_content = await run_component('practice', 'generate_practice', practice_messages(skill))
+        if practice_content is None:
+            events.put_nowait(('exit_ticket', {'type': 'error', 'message': 'Practice content not available'}))
+            return
+        practice_title, practice_story = parse_practice_story(practice_content)
+        await run_component('exit_ticket', 'generate_exit_ticket',
+                            exit_ticket_messages(skill, practice_title, practice_story))
+
+    async def generate():
+        tasks = [
+            asyncio.ensure_future(run_component('warmup', 'generate_warmup',
+                                                warmup_messages(topic, story_title, story_content))),
+            asyncio.ensure_future(run_component('introduction', 'generate_guided_reading_intro',
+                                                guided_reading_intro_messages(story_title, story_content, skill))),
+            asyncio.ensure_future(run_practice_and_exit_ticket()),
+        ]
+        finished = asyncio.gather(*tasks)
+        results = {}
+        try:
+            while not (finished.done() and events.empty()):
+                getter = asyncio.ensure_future(events.get())
+                await asyncio.wait({getter, finished}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    continue
+                component, payload = getter.result()
+                if payload['type'] == 'complete':
+                    results[component] = payload['content']
+                yield format_bundle_event(component, payload)
+
+            yield f"event: complete\ndata: {json.dumps({'type': 'complete', 'components': results})}\n\n"
+        finally:
+            # Stop the components early if the client went away
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(generate(), media_type='text/event-stream')
+
+@app.post('/improve-observation')
+async def improve_observation(request: Request):
+    data = await request.json()
+    observation = data.get('observation')
+    topic = data.get('topic')
+
+    if not observation or not topic:
+        return error("Observation and topic are required", 400)
+
+    try:
+        improved_observation = await acomplete_text(
+            "improve_observation",
+            observation_messages(observation, topic),
+            temperature=API_SETTINGS["temperature"],
+            max_tokens=API_SETTINGS["max_tokens"]["improve_observation"],
+            regenerate=data.get('regenerate', False)
+        )
+        return {"content": clean_observation(improved_observation)}
+
+    except Exception as e:
+        log.error("observation_improvement_failed", error=str(e))
+        return error("Failed to improve observation", 500)
+
+@app.post('/chat')
+async def chat(request: Request):
+    data = await request.json()
+    message = data.get('message')
+    teacher_id = data.get('teacherId')
+
+    if not message:
+        return error("Message is required", 400)
+
+    try:
+        response = await open_cascade_stream("chat", chat_messages(message), check_chat_opening, teacher_id=teacher_id)
+        return StreamingResponse(response, media_type='text/plain')
+
+    except Exception as e:
+        log.error("chat_failed", error=str(e))
+        return error(str(e), 500)
+
+def student_stream_response(events):
+    """
+    Stream parsed students as NDJSON, one line per student as soon as the
+    model has finished writing it.
+    """
+    async def generate():
+        try:
+            async for event in events:
+                yield json.dumps(event) + '\n'
+        except Exception as e:
+            log.error("student_stream_failed", error=str(e))
+            yield json.dumps({"type": "error", "error": str(e)}) + '\n'
+
+    return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+async def listed_events(events):
+    for event in events:
+        yield event
+
+@app.post('/parse-students-from-image')
+async def parse_students_from_image(request: Request):
+    try:
+        data = await request.json()
+        teacher_grade = data.get('teacherGrade')
+        teacher_id = data.get('teacherId')
+
+        # PIL and Tesseract are only loaded by this route
+        from image_ocr import image_payloads, ocr_page
+
+        # OCR every page locally so only the extracted text is sent to the model
+        def ocr_pages(images):
+            pages = []
+            for page_index, page, page_error in map_ordered(ocr_page, images, OCR_SETTINGS["max_workers"]):
+                if page_error is not None:
+                    raise ValueError(f"Image {page_index + 1}: {str(page_error)}")
+                pages.append(page)
+            return pages
+
+        try:
+            pages = await run_in_threadpool(ocr_pages, image_payloads(data))
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+
+        if data.get('mode') == 'batch':
+            items = [dict(page.to_item(), teacherGrade=teacher_grade, teacherId=teacher_id) for page in pages]
+            return await queue_batch_job('parse_students_from_image', items, teacher_id)
+
+        def prepare(student, index):
+            return prepare_image_student(student, teacher_grade, teacher_id)
+
+        def local_students(page):
+            # Cleanly tabulated OCR text often needs no model call at all
+            if page.use_vision or not ROSTER_SETTINGS["local_parsing"]:
+                return None
+            # Image rosters need only names, so a missing reading-level column is fine
+            local_result = parse_text_roster(page.text, teacher_grade, teacher_id, require_reading_level=False)
+            return local_result[1] if local_result else None
+
+        async def extract(page):
+            students = await run_in_threadpool(local_students, page)
+            if students is not None:
+                return students
+            item = page.to_item()
+            content = await acascade_complete(
+                "parse_students_from_image",
+                image_page_messages(item),
+                image_roster_check(item),
+                temperature=0,
+                teacher_id=teacher_id
+            )
+            return prepare_image_students(json.loads(clean_json_response(content)), teacher_grade, teacher_id)
+
+        if data.get('mode') == 'stream':
+            if len(pages) == 1 and await run_in_threadpool(local_students, pages[0]) is None:
+                return student_stream_response(aiter_student_events(
+                    completion_deltas(
+                        "parse_students_from_image",
+                        image_page_messages(pages[0].to_item()),
+                        temperature=0,
+                        teacher_id=teacher_id
+                    ),
+                    prepare
+                ))
+            return student_stream_response(aordered_student_events(
+                amap_ordered(extract, pages, OCR_SETTINGS["max_workers"]), prepare))
+
+        try:
+            # Extract every page concurrently and merge the students in page order
+            students = []
+            async for page_index, page_students, page_error in amap_ordered(extract, pages, OCR_SETTINGS["max_workers"]):
+                if page_error is not None:
+                    raise page_error
+                students.extend(page_students)
+
+            return {
+                'students': students,
+                'message': f'Successfully processed {len(students)} students'
+            }
+
+        except json.JSONDecodeError as je:
+            log.error("image_students_invalid_json", error=str(je))
+            return JSONResponse({
+                'error': 'Invalid JSON format in response',
+                'details': str(je)
+            }, status_code=500)
+
+    except Exception as e:
+        log.error("image_processing_failed", error=str(e))
+        return JSONResponse({
+            'error': 'Failed to process image',
+            'details': str(e)
+        }, status_code=500)
+
+async def roster_request(request):
+    """
+    The fields and uploaded file of a /parse-students request (JSON or form data).
+    """
+    if request.headers.get('content-type', '').startswith(('multipart/form-data', 'application/x-www-form-urlencoded')):
+        form = await request.form()
+        upload = form.get('file')
+        data = {key: value for key, value in form.items() if isinstance(value, str)}
+        return data, (upload if upload is not None and not isinstance(upload, str) else None)
+    try:
+        return (await request.json()) or {}, None
+    except ValueError:
+        return {}, None
+
+@app.post('/parse-students')
+async def parse_students(request: Request):
+    # Rosters arrive as JSON text or as an uploaded CSV/TSV/XLSX file
+    data, upload = await roster_request(request)
+    text = data.get('text')
+    teacher_grade = data.get('teacherGrade', '')
+    teacher_id = data.get('teacherId', '')
+    local_result = None
+
+    if upload:
+        content = await upload.read()
+        if upload.filename.lower().endswith('.xlsx'):
+            try:
+                if ROSTER_SETTINGS["local_parsing"]:
+                    students = await run_in_threadpool(parse_xlsx_roster, content, teacher_grade, teacher_id)
+                    local_result = ('xlsx', students) if students else None
+                if local_result is None:
+                    text = await run_in_threadpool(xlsx_to_text, content)
+            except (zipfile.BadZipFile, ValueError) as e:
+                return error(f"Could not read spreadsheet: {str(e)}", 400)
+        else:
+            text = content.decode('utf-8-sig', errors='replace')
+        data = dict(data, text=text)
+
+    if not text and local_result is None:
+        return error("Text is required", 400)
+
+    # Structured rosters (SIS exports) are parsed locally without calling the model
+    if local_result is None and ROSTER_SETTINGS["local_parsing"]:
+        local_result = await run_in_threadpool(parse_text_roster, text, teacher_grade, teacher_id)
+    if local_result is not None:
+        roster_format, students = local_result
+        log.info("roster_parsed_locally", students=len(students), format=roster_format)
+        if data.get('mode') == 'stream':
+            return student_stream_response(listed_events(student_list_events(students)))
+        return {"students": students, "format": roster_format}
+
+    if data.get('mode') == 'batch':
+        return await queue_batch_job('parse_students', [data], teacher_id)
+
+    # Large rosters are split on row boundaries and extracted concurrently
+    chunks = split_roster(text, ROSTER_SETTINGS["chunk_tokens"], ROSTER_SETTINGS["overlap_rows"])
+    merger = RosterMerger(text, teacher_id, ROSTER_SETTINGS["overlap_rows"])
+
+    # Rows that fail validation are re-extracted on their own instead of failing the roster
+    repair = aroster_repairer(text, teacher_grade, teacher_id)
+
+    def prepare(student, index):
+        return merger.assign_id(validate_student(student, index))
+
+    if data.get('mode') == 'stream':
+        if len(chunks) > 1:
+            return student_stream_response(arepair_student_events(aordered_student_events(
+                extract_roster_chunks(chunks, teacher_grade, teacher_id), validate_student, merger.add_chunk),
+                repair, prepare))
+        return student_stream_response(arepair_student_events(aiter_student_events(
+            completion_deltas(
+                "parse_students",
+                parse_students_messages(text, teacher_grade, teacher_id),
+                temperature=0.1,
+                teacher_id=teacher_id,
+                **roster_format_params()
+            ),
+            prepare
+        ), repair, prepare))
+
+    try:
+        if len(chunks) > 1:
+            events = arepair_student_events(aordered_student_events(
+                extract_roster_chunks(chunks, teacher_grade, teacher_id), validate_student, merger.add_chunk),
+                repair, prepare)
+            students, failed_rows = collect_students([event async for event in events])
+            log.info("roster_parsed", students=len(students), chunks=len(chunks), failed_rows=len(failed_rows))
+            return {"students": students, "failedRows": failed_rows}
+
+        students_json = await acascade_complete(
+            "parse_students",
+            parse_students_messages(text, teacher_grade, teacher_id),
+            roster_check(text),
+            temperature=0.1,
+            teacher_id=teacher_id,
+            **roster_format_params()
+        )
+        # Decode and validate each student on its own; failed rows are repaired
+        events = arepair_student_events(
+            listed_events(iter_student_events([students_json.strip()], prepare)), repair, prepare)
+        students, failed_rows = collect_students([event async for event in events])
+        log.info("roster_parsed", students=len(students), chunks=1, failed_rows=len(failed_rows))
+        return {"students": students, "failedRows": failed_rows}
+
+    except json.JSONDecodeError as e:
+        log.error("roster_invalid_json", error=str(e))
+        return error("Failed to parse AI response as JSON", 500)
+    except InputTooLarge as e:
+        log.warning("roster_too_large", error=str(e))
+        return error(f"{str(e)} Use stream or batch mode for large rosters.", 413)
+    except ValueError as e:
+        log.error("roster_invalid", error=str(e))
+        return error(str(e), 500)
+    except Exception as e:
+        log.error("roster_failed", exc_info=True, error=str(e))
+        return error(str(e), 500)
+
+def extract_roster_chunks(chunks, teacher_grade, teacher_id):
+    """
+    Extract students from roster chunks concurrently, in source order.
+    """
+    async def extract(chunk):
+        content = await acascade_complete(
+            "parse_students",
+            parse_students_messages(chunk, teacher_grade, teacher_id),
+            roster_check(chunk),
+            temperature=0.1,
+            teacher_id=teacher_id,
+            **roster_format_params()
+        )
+        return decode_student_elements(content)
+
+    return amap_ordered(extract, chunks, ROSTER_SETTINGS["max_workers"])
+
+async def queue_batch_job(kind, items, teacher_id):
+    try:
+        job = await run_in_threadpool(batch_runner.create_job, kind, items, teacher_id)
+    except ValueError as e:
+        return error(str(e), 400)
+    return JSONResponse(job_summary(job), status_code=202)
+
+@app.post('/jobs')
+async def create_job(request: Request):
+    data = await request.json()
+    kind = data.get('kind')
+    items = data.get('items')
+
+    if not kind or not isinstance(items, list):
+        return error("Job kind and a list of items are required", 400)
+
+    return await queue_batch_job(kind, items, data.get('teacherId'))
+
+@app.get('/jobs/{job_id}')
+async def get_job(job_id: str):
+    # Fetching a job may poll the Batch API with the blocking client
+    job = await run_in_threadpool(batch_runner.get_job, job_id)
+    if job is None:
+        return error("Job not found", 404)
+    return job_summary(job)
+
+@app.get('/scheduler/stats')
+async def scheduler_stats():
+    return scheduler.stats()
+
+@app.get('/prompts/stats')
+async def prompts_stats():
+    return prompt_stats.stats()
+
+@app.get('/preflight/stats')
+async def preflight_stats_route():
+    return preflight_stats.stats()
+
+@app.get('/streams/stats')
+async def streams_stats():
+    return abort_stats.stats()
+
+@app.get('/cascade/stats')
+async def cascade_stats_route():
+    return cascade_stats.stats()
+
+@app.get('/metrics')
+async def metrics():
+    return Response(upstream_metrics.render(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+@app.get('/profiles')
+async def profiles(request: Request):
+    if not profiler.authorized(request.headers.get(PROFILE_HEADER)):
+        return error("Not found", 404)
+    return profiler.summaries()
+
+@app.get('/profiles/{profile_id}')
+async def profile_flamegraph(profile_id: str, request: Request):
+    folded = profiler.folded(profile_id) if profiler.authorized(request.headers.get(PROFILE_HEADER)) else None
+    if folded is None:
+        return error("Not found", 404)
+    return Response(folded, media_type='text/plain')
@@ -0,0 +1,306 @@
+"""
+Asynchronous job mode backed by the OpenAI Batch API.
+
+Bulk work that does not need interactive latency (large roster imports,
+pre-generating passages for a grade level) is queued as a job instead of
+holding a web worker. Requests from all queued jobs are collected into one
+JSONL file and submitted as a batch; a background thread polls the batch,
+runs each job kind's validation over the results and stores them for
+GET /jobs/<id>.
+
+Job kinds are registered by the app with `register_job_kind`, which keeps
+prompt construction and validation next to the interactive routes.
+"""
+
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from config import BATCH_SETTINGS
+from logs import get_logger
+from openai_client import get_client
+from preflight import preflight
+
+log = get_logger("batch_jobs")
+
+TERMINAL_BATCH_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class JobKind:
+    """
+    How to turn one job item into a chat request and how to validate its result.
+
+    `params` are extra request body parameters, such as the response_format
+    the interactive route sends.
+    """
+
+    def __init__(self, endpoint: str, model: str, build_messages: Callable[[dict], List[dict]],
+                 process_result: Callable[[dict, str], object], temperature: Optional[float] = None,
+                 params: Optional[dict] = None):
+        self.endpoint = endpoint
+        self.model = model
+        self.build_messages = build_messages
+        self.process_result = process_result
+        self.temperature = temperature
+        self.params = params or {}
+
+
+JOB_KINDS: Dict[str, JobKind] = {}
+
+
+def register_job_kind(kind: str, endpoint: str, model: str,
+                      build_messages: Callable[[dict], List[dict]],
+                      process_result: Callable[[dict, str], object],
+                      temperature: Optional[float] = None, params: Optional[dict] = None) -> None:
+    JOB_KINDS[kind] = JobKind(endpoint, model, build_messages, process_result, temperature, params)
+
+
+class JobStore:
+    """
+    One JSON file per job so status survives worker restarts.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def save(self, job: dict) -> None:
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            job["updatedAt"] = time.time()
+            tmp_path = f"{self._path(job['id'])}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(job, f)
+            os.replace(tmp_path, self._path(job["id"]))
+
+    def load(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            try:
+                with open(self._path(job_id), "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                return None
+
+    def with_status(self, *statuses: str) -> List[dict]:
+        if not os.path.isdir(self.directory):
+            return []
+        jobs = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                job = self.load(name[:-len(".json")])
+                if job and job["status"] in statuses:
+                    jobs.append(job)
+        return jobs
+
+
+class BatchRunner:
+    """
+    Collects queued jobs into Batch API submissions and polls them to completion.
+    """
+
+    def __init__(self, client_factory: Callable, store: JobStore, settings: dict):
+        self.client_factory = client_factory
+        self.store = store
+        self.settings = settings
+        self._lock = threading.Lock()
+        self._worker = None
+        self._last_poll: Dict[str, float] = {}
+
+    @property
+    def client(self):
+        return self.client_factory()
+
+    def create_job(self, kind: str, items: List[dict], teacher_id: str = None) -> dict:
+        """
+        Queue a job; its requests are submitted with the next batch flush.
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        if not items:
+            raise ValueError("A job needs at least one item")
+        if len(items) > self.settings["max_items_per_job"]:
+            raise ValueError(f"A job may contain at most {self.settings['max_items_per_job']} items")
+        job_kind = JOB_KINDS[kind]
+        for item in items:
+            # Surface bad or over-budget input now rather than when the batch is assembled
+            preflight(job_kind.endpoint, job_kind.build_messages(item), job_kind.model, record=False)
+
+        job = {
+            "id": f"job_{uuid.uuid4().hex}",
+            "kind": kind,
+            "status": "queued",
+            "teacherId": teacher_id,
+            "createdAt": time.time(),
+            "batchId": None,
+            "items": [{"index": i, "input": item, "status": "pending"} for i, item in enumerate(items)],
+        }
+        self.store.save(job)
+        self._ensure_worker()
+        return job
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """
+        Return a job, polling its batch first when it is due.
+        """
+        job = self.store.load(job_id)
+        if job and job["status"] == "queued":
+            self._ensure_worker()
+        elif job and job["status"] == "submitted":
+            self._poll_batch(job["batchId"])
+            job = self.store.load(job_id)
+        return job
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.flush()
+                batch_ids = {job["batchId"] for job in self.store.with_status("submitted")}
+                for batch_id in batch_ids:
+                    self._poll_batch(batch_id)
+                if not batch_ids and not self.store.with_status("queued"):
+                    return
+            except Exception as e:
+                log.error("batch_worker_failed", exc_info=True, error=str(e))
+            time.sleep(self.settings["poll_interval"])
+
+    def flush(self, force: bool = False) -> Optional[str]:
+        """
+        Submit all queued jobs as one batch once the collection window has passed.
+        """
+        with self._lock:
+            queued = self.store.with_status("queued")
+            if not queued:
+                return None
+            pending = sum(len(job["items"]) for job in queued)
+            oldest = min(job["createdAt"] for job in queued)
+            due = (pending >= self.settings["max_batch_requests"]
+                   or time.time() - oldest >= self.settings["collect_window"])
+            if not (force or due):
+                return None
+
+            lines = []
+            for job in queued:
+                kind = JOB_KINDS[job["kind"]]
+                for item in job["items"]:
+                    messages = preflight(kind.endpoint, kind.build_messages(item["input"]), kind.model)
+                    body = {"model": kind.model, "messages": messages, **kind.params}
+                    if kind.temperature is not None:
+                        body["temperature"] = kind.temperature
+                    lines.append(json.dumps({
+                        "custom_id": f"{job['id']}-{item['index']}",
+                        "method": "POST",
+                        "url": "/v1/chat/completions",
+                        "body": body,
+                    }))
+
+            input_file = self.client.files.create(
+                file=("batch.jsonl", io.BytesIO(("\n".join(lines) + "\n").encode("utf-8"))),
+                purpose="batch",
+            )
+            batch = self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window=self.settings["completion_window"],
+            )
+            for job in queued:
+                job["status"] = "submitted"
+                job["batchId"] = batch.id
+                self.store.save(job)
+            log.info("batch_submitted", batch_id=batch.id, requests=len(lines), jobs=len(queued))
+            return batch.id
+
+    def _poll_batch(self, batch_id: str) -> None:
+        with self._lock:
+            now = time.time()
+            if now - self._last_poll.get(batch_id, 0) < self.settings["poll_interval"]:
+                return
+            self._last_poll[batch_id] = now
+            self._collect_batch(batch_id)
+
+    def _collect_batch(self, batch_id: str) -> None:
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status not in TERMINAL_BATCH_STATUSES:
+            return
+
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                for line in self.client.files.content(file_id).text.splitlines():
+                    if line.strip():
+                        record = json.loads(line)
+                        results[record["custom_id"]] = record
+
+        for job in self.store.with_status("submitted"):
+            if job["batchId"] == batch_id:
+                self._finish_job(job, batch.status, results)
+        self._last_poll.pop(batch_id, None)
+
+    def _finish_job(self, job: dict, batch_status: str, results: dict) -> None:
+        kind = JOB_KINDS[job["kind"]]
+        for item in job["items"]:
+            record = results.get(f"{job['id']}-{item['index']}")
+            try:
+                if record is None:
+                    raise ValueError(f"No result returned (batch {batch_status})")
+                response = record.get("response") or {}
+                if record.get("error") or response.get("status_code") != 200:
+                    raise ValueError(json.dumps(record.get("error") or response.get("body")))
+                content = response["body"]["choices"][0]["message"]["content"] or ""
+                item["result"] = kind.process_result(item["input"], content)
+                item["status"] = "completed"
+            except Exception as e:
+                item["status"] = "failed"
+                item["error"] = str(e)
+
+        failed = sum(1 for item in job["items"] if item["status"] == "failed")
+        job["status"] = "failed" if failed == len(job["items"]) else "completed"
+        job["failedItems"] = failed
+        self.store.save(job)
+
+
+_batch_client = None
+
+
+def get_batch_client():
+    """
+    The shared client, or a dedicated one when OPENAI_BATCH_BASE_URL points at a stand-in server.
+    """
+    global _batch_client
+    if not BATCH_SETTINGS["base_url"]:
+        return get_client()
+    if _batch_client is None:
+        from openai import OpenAI
+
+        _batch_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY", "batch"), base_url=BATCH_SETTINGS["base_url"])
+    return _batch_client
+
+
+def job_summary(job: dict) -> dict:
+    """
+    Public view of a job for the /jobs endpoints.
+    """
+    return {
+        "jobId": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "createdAt": job["createdAt"],
+        "updatedAt": job.get("updatedAt"),
+        "failedItems": job.get("failedItems", 0),
+        "items": [
+            {key: item[key] for key in ("index", "status", "result", "error") if key in item}
+            for item in job["items"]
+        ],
+    }
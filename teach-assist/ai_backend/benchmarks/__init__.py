@@ -0,0 +1,3 @@
+"""
+Benchmarks for the AI backend. Run from ai_backend/ with `python -m benchmarks.<name>`.
+"""
@@ -0,0 +1,92 @@
+"""
+Measure how many /generate-warmup streams main.py serves concurrently on one worker.
+
+The shared AsyncOpenAI client is pointed at an in-process fake upstream that
+streams chat-completion chunks with a fixed delay, so no tokens are spent.
+If the event loop is never blocked, N concurrent streams finish in roughly the
+time of one stream; a blocking client would take N times as long.
+
+Usage (from ai_backend/):
+    python -m benchmarks.concurrent_streams --streams 50 --tokens 20 --delay 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+from openai import AsyncOpenAI
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import main  # noqa: E402
+from openai_client import set_async_client  # noqa: E402
+
+
+def stream_chunk(i: int) -> bytes:
+    """
+    The i-th SSE event of a fake chat completion stream.
+    """
+    chunk = {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "bench",
+        "choices": [{"index": 0, "delta": {"content": f"tok{i} "}, "finish_reason": None}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n".encode()
+
+
+def fake_upstream(tokens: int, delay: float) -> httpx.MockTransport:
+    """
+    Build a transport that answers every chat completion with a slow SSE stream.
+    """
+    async def body():
+        for i in range(tokens):
+            await asyncio.sleep(delay)
+            yield stream_chunk(i)
+        yield b"data: [DONE]\n\n"
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=body())
+
+    return httpx.MockTransport(handler)
+
+
+async def run(streams: int, tokens: int, delay: float) -> None:
+    set_async_client(AsyncOpenAI(
+        api_key="benchmark",
+        base_url="http://upstream.local/v1",
+        http_client=httpx.AsyncClient(transport=fake_upstream(tokens, delay)),
+    ))
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        async def one_stream():
+            response = await http.post("/generate-warmup", json={"topic": "main idea"})
+            return response.status_code, response.text.count("data: ")
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one_stream() for _ in range(streams)))
+        elapsed = time.perf_counter() - start
+
+    failures = sum(1 for status, _ in results if status != 200)
+    single_stream = tokens * delay
+    print(f"Streams:               {streams}")
+    print(f"Failures:              {failures}")
+    print(f"Events per stream:     {results[0][1]}")
+    print(f"Single stream (ideal): {single_stream:.2f}s")
+    print(f"Serialized (blocking): {single_stream * streams:.2f}s")
+    print(f"Measured wall time:    {elapsed:.2f}s")
+    print(f"Effective concurrency: {single_stream * streams / elapsed:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--streams", type=int, default=50, help="Number of concurrent requests")
+    parser.add_argument("--tokens", type=int, default=20, help="Chunks per upstream stream")
+    parser.add_argument("--delay", type=float, default=0.05, help="Seconds between upstream chunks")
+    args = parser.parse_args()
+    asyncio.run(run(args.streams, args.tokens, args.delay))
@@ -0,0 +1,303 @@
+"""
+Local OpenAI-compatible stand-in server for offline testing.
+
+Implements chat completions, streamed or not, and the Files and Batch
+endpoints used by batch_jobs.py. Every completion is canned: roster prompts
+get a JSON array of students built from the roster lines, and everything
+else gets a titled passage of `--tokens` filler words.
+
+Streamed completions wait `--ttft` seconds before the first chunk and
+`--token-delay` seconds between chunks, one word per chunk. Non-streamed
+completions wait for the whole generation. For error injection:
+  - `--error-rate` of requests fail up front with `--error-status` (the
+    OpenAI client retries 429 and 5xx responses itself);
+  - `--stream-error-rate` of streams drop the connection partway through.
+Random choices use `--seed`, so runs are reproducible. Batches complete
+after `--batch-delay` seconds.
+
+Usage (from ai_backend/):
+    python -m benchmarks.fake_openai --port 8089 --ttft 0.4 --token-delay 0.02 --tokens 300
+    OPENAI_BASE_URL=http://localhost:8089/v1 OPENAI_BATCH_BASE_URL=http://localhost:8089/v1 python app.py
+
+benchmarks/load_generator.py starts this server itself.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+app = FastAPI(title="Fake OpenAI")
+
+FILES = {}
+BATCHES = {}
+SETTINGS = {
+    "batch_delay": 2.0,
+    "ttft": 0.3,  # Seconds before the first streamed chunk
+    "token_delay": 0.02,  # Seconds between streamed chunks
+    "tokens": 200,  # Words in a generated passage
+    "error_rate": 0.0,  # Share of requests failed up front
+    "error_status": 500,
+    "stream_error_rate": 0.0,  # Share of streams cut off partway through
+}
+RANDOM = random.Random(0)
+
+FILLER = ("The students read the passage closely and found the main idea in each paragraph "
+          "before they compared the details with a partner and wrote a short summary.").split()
+
+
+def fake_students(prompt: str) -> list:
+    """
+    Turn each roster line of a /parse-students prompt into a student object.
+    """
+    match = re.search(r"Text to parse:\n(.*?)\n\s*Return only the JSON array", prompt, re.S)
+    roster = match.group(1) if match else prompt
+    students = []
+    for line in roster.splitlines():
+        fields = [f for f in re.split(r"[,\t]|\s{2,}", line.strip()) if f]
+        if len(fields) < 2 or fields[0].lower() in ("first name", "firstname", "first"):
+            continue
+        students.append({
+            "firstName": fields[0],
+            "lastName": fields[1],
+            "studentId": f"ST{100000 + len(students)}",
+            "gradeLevel": "",
+            "readingLevel": fields[2] if len(fields) > 2 else "",
+            "teacherId": "",
+        })
+    return students
+
+
+def message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        # Vision requests send a list of text and image parts
+        return "\n".join(part.get("text", "") for part in content if part.get("type") == "text")
+    return content
+
+
+def fake_completion_text(body: dict) -> str:
+    messages = body.get("messages", [])
+    system = next((message_text(m) for m in messages if m["role"] == "system"), "")
+    user = next((message_text(m) for m in reversed(messages) if m["role"] == "user"), "")
+    if "student information" in system:
+        return json.dumps(fake_students(user))
+    words = " ".join(FILLER[i % len(FILLER)] for i in range(SETTINGS["tokens"]))
+    return f"# **Sample Passage**\n\n{words}\n"
+
+
+def text_pieces(text: str) -> list:
+    """
+    The streamed deltas of `text`: a word (with its trailing space) each, JSON in 8-character pieces.
+    """
+    if text.startswith("["):
+        return [text[i:i + 8] for i in range(0, len(text), 8)]
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+def usage(body: dict, pieces: list) -> dict:
+    prompt_tokens = sum(len(message_text(m)) for m in body.get("messages", [])) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(pieces),
+        "total_tokens": prompt_tokens + len(pieces),
+    }
+
+
+def completion_body(body: dict) -> dict:
+    text = fake_completion_text(body)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": text},
+            "finish_reason": "stop",
+        }],
+        "usage": usage(body, text_pieces(text)),
+    }
+
+
+def chunk_event(completion_id: str, model: str, delta: dict, finish_reason=None, usage=None) -> bytes:
+    chunk = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if usage is None else [],
+    }
+    if usage is not None:
+        chunk["usage"] = usage
+    return f"data: {json.dumps(chunk)}\n\n".encode()
+
+
+async def stream_completion(body: dict, pieces: list, cut_at):
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    model = body.get("model", "fake")
+    await asyncio.sleep(SETTINGS["ttft"])
+    yield chunk_event(completion_id, model, {"role": "assistant", "content": ""})
+    for index, piece in enumerate(pieces):
+        if index:
+            await asyncio.sleep(SETTINGS["token_delay"])
+        if index == cut_at:
+            # Raising here makes the server drop the connection mid-response
+            raise ConnectionAbortedError("Injected stream failure")
+        yield chunk_event(completion_id, model, {"content": piece})
+    yield chunk_event(completion_id, model, {}, finish_reason="stop")
+    if (body.get("stream_options") or {}).get("include_usage"):
+        yield chunk_event(completion_id, model, {}, usage=usage(body, pieces))
+    yield b"data: [DONE]\n\n"
+
+
+def file_object(file_id: str) -> dict:
+    record = FILES[file_id]
+    return {
+        "id": file_id,
+        "object": "file",
+        "bytes": len(record["content"]),
+        "created_at": record["created_at"],
+        "filename": record["filename"],
+        "purpose": record["purpose"],
+        "status": "processed",
+    }
+
+
+@app.post("/v1/files")
+async def create_file(file: UploadFile = File(...), purpose: str = Form(...)):
+    file_id = f"file-{uuid.uuid4().hex[:24]}"
+    FILES[file_id] = {
+        "content": await file.read(),
+        "filename": file.filename,
+        "purpose": purpose,
+        "created_at": int(time.time()),
+    }
+    return file_object(file_id)
+
+
+@app.get("/v1/files/{file_id}")
+async def retrieve_file(file_id: str):
+    if file_id not in FILES:
+        raise HTTPException(status_code=404, detail="File not found")
+    return file_object(file_id)
+
+
+@app.get("/v1/files/{file_id}/content")
+async def file_content(file_id: str):
+    if file_id not in FILES:
+        raise HTTPException(status_code=404, detail="File not found")
+    return Response(FILES[file_id]["content"], media_type="application/octet-stream")
+
+
+async def run_batch(batch_id: str) -> None:
+    batch = BATCHES[batch_id]
+    batch["status"] = "in_progress"
+    batch["in_progress_at"] = int(time.time())
+    await asyncio.sleep(SETTINGS["batch_delay"])
+
+    output_lines = []
+    for line in FILES[batch["input_file_id"]]["content"].decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        output_lines.append(json.dumps({
+            "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+            "custom_id": request["custom_id"],
+            "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": completion_body(request["body"])},
+            "error": None,
+        }))
+
+    output_id = f"file-{uuid.uuid4().hex[:24]}"
+    FILES[output_id] = {
+        "content": ("\n".join(output_lines) + "\n").encode("utf-8"),
+        "filename": f"{batch_id}_output.jsonl",
+        "purpose": "batch_output",
+        "created_at": int(time.time()),
+    }
+    batch.update({
+        "status": "completed",
+        "output_file_id": output_id,
+        "completed_at": int(time.time()),
+        "request_counts": {"total": len(output_lines), "completed": len(output_lines), "failed": 0},
+    })
+
+
+@app.post("/v1/batches")
+async def create_batch(body: dict):
+    if body.get("input_file_id") not in FILES:
+        raise HTTPException(status_code=400, detail="Unknown input_file_id")
+    batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+    BATCHES[batch_id] = {
+        "id": batch_id,
+        "object": "batch",
+        "endpoint": body.get("endpoint"),
+        "input_file_id": body["input_file_id"],
+        "completion_window": body.get("completion_window", "24h"),
+        "status": "validating",
+        "created_at": int(time.time()),
+        "output_file_id": None,
+        "error_file_id": None,
+        "errors": None,
+        "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        "metadata": body.get("metadata"),
+    }
+    asyncio.create_task(run_batch(batch_id))
+    return BATCHES[batch_id]
+
+
+@app.get("/v1/batches/{batch_id}")
+async def retrieve_batch(batch_id: str):
+    if batch_id not in BATCHES:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return BATCHES[batch_id]
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(body: dict):
+    if RANDOM.random() < SETTINGS["error_rate"]:
+        return JSONResponse({"error": {"message": "Injected failure", "type": "server_error"}},
+                            status_code=SETTINGS["error_status"])
+    if body.get("stream"):
+        pieces = text_pieces(fake_completion_text(body))
+        cut_at = RANDOM.randrange(len(pieces)) if RANDOM.random() < SETTINGS["stream_error_rate"] else None
+        return StreamingResponse(stream_completion(body, pieces, cut_at), media_type="text/event-stream")
+    completion = completion_body(body)
+    await asyncio.sleep(SETTINGS["ttft"] + SETTINGS["token_delay"] * completion["usage"]["completion_tokens"])
+    return completion
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--batch-delay", type=float, default=SETTINGS["batch_delay"],
+                        help="Seconds before a batch completes")
+    parser.add_argument("--ttft", type=float, default=SETTINGS["ttft"], help="Seconds before the first chunk")
+    parser.add_argument("--token-delay", type=float, default=SETTINGS["token_delay"],
+                        help="Seconds between streamed chunks")
+    parser.add_argument("--tokens", type=int, default=SETTINGS["tokens"], help="Words in a generated passage")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failed up front")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected failures")
+    parser.add_argument("--stream-error-rate", type=float, default=0.0,
+                        help="Share of streams cut off partway through")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for error injection")
+    args = parser.parse_args()
+    SETTINGS.update(
+        batch_delay=args.batch_delay,
+        ttft=args.ttft,
+        token_delay=args.token_delay,
+        tokens=args.tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        stream_error_rate=args.stream_error_rate,
+    )
+    RANDOM.seed(args.seed)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,179 @@
+"""
+Compare the Flask app (app.py) with its ASGI port (asgi_app.py) on concurrent streams.
+
+Each app serves the same /generate-warmup streams from a fake upstream that
+sends chat-completion chunks with a fixed delay, in its own interpreter:
+  - flask: requests run on a pool of `--threads` worker threads, like one
+    gunicorn gthread worker; each open stream holds a thread;
+  - flask-unbounded: one thread per stream, to price a thread per stream;
+  - asgi: every stream is a coroutine on one event loop.
+
+Reported per run: wall time, effective concurrency (how many single-stream
+durations fit into the wall time) and memory per stream, both as resident
+set growth and as the Python heap peak (tracemalloc, in a second pass so
+it does not slow down the timed one). The upstream
+scheduler, generation cache and single-flight coalescing are disabled so
+each request really streams from upstream.
+
+Usage (from ai_backend/):
+    python -m benchmarks.flask_vs_asgi --streams 200 --threads 8 --tokens 40 --delay 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from benchmarks.concurrent_streams import fake_upstream, stream_chunk  # noqa: E402
+from config import CACHE_SETTINGS, COALESCE_SETTINGS, SCHEDULER_SETTINGS  # noqa: E402
+
+AI_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WARMUP_REQUEST = {"topic": "main idea", "storyTitle": "The Lost Kite", "storyContent": "Mia lost her kite."}
+
+
+def fake_upstream_sync(tokens: int, delay: float) -> httpx.MockTransport:
+    """
+    fake_upstream for the blocking OpenAI client used by app.py.
+    """
+    def body():
+        for i in range(tokens):
+            time.sleep(delay)
+            yield stream_chunk(i)
+        yield b"data: [DONE]\n\n"
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=body())
+
+    return httpx.MockTransport(handler)
+
+
+def max_rss_kb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_flask(streams: int, threads: int, tokens: int, delay: float):
+    from openai import OpenAI
+    import app
+    from openai_client import set_client
+
+    set_client(OpenAI(
+        api_key="benchmark",
+        base_url="http://upstream.local/v1",
+        http_client=httpx.Client(transport=fake_upstream_sync(tokens, delay)),
+    ))
+
+    def one_stream(_):
+        response = app.app.test_client().post("/generate-warmup", json=WARMUP_REQUEST, buffered=False)
+        return response.status_code, response.get_data().count(b"data: ")
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(one_stream, range(streams)))
+
+
+def run_asgi(streams: int, tokens: int, delay: float):
+    from openai import AsyncOpenAI
+    import asgi_app
+    from openai_client import set_async_client
+
+    async def run():
+        set_async_client(AsyncOpenAI(
+            api_key="benchmark",
+            base_url="http://upstream.local/v1",
+            http_client=httpx.AsyncClient(transport=fake_upstream(tokens, delay)),
+        ))
+        transport = httpx.ASGITransport(app=asgi_app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+            async def one_stream():
+                response = await http.post("/generate-warmup", json=WARMUP_REQUEST)
+                return response.status_code, response.content.count(b"data: ")
+
+            return await asyncio.gather(*(one_stream() for _ in range(streams)))
+
+    return asyncio.run(run())
+
+
+def measure(target: str, streams: int, threads: int, tokens: int, delay: float) -> dict:
+    """
+    Run one target in this interpreter and return its measurements.
+    """
+    SCHEDULER_SETTINGS["enabled"] = False
+    CACHE_SETTINGS["enabled"] = False
+    COALESCE_SETTINGS["enabled"] = False
+
+    # Import the app before the baseline so only per-stream memory is measured
+    if target == "asgi":
+        import asgi_app  # noqa: F401
+    else:
+        import app  # noqa: F401
+    def run():
+        if target == "asgi":
+            return run_asgi(streams, tokens, delay)
+        return run_flask(streams, streams if target == "flask-unbounded" else threads, tokens, delay)
+
+    baseline_rss = max_rss_kb()
+    start = time.perf_counter()
+    results = run()
+    wall = time.perf_counter() - start
+    rss_growth = max_rss_kb() - baseline_rss
+
+    # tracemalloc slows everything down, so the heap is measured in a second pass
+    tracemalloc.start()
+    run()
+    _, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    single_stream = tokens * delay
+    return {
+        "target": target,
+        "failures": sum(1 for status, events in results if status != 200 or not events),
+        "wall": wall,
+        "concurrency": single_stream * streams / wall,
+        "rss_kb_per_stream": rss_growth / streams,
+        "heap_kb_per_stream": heap_peak / 1024 / streams,
+    }
+
+
+def compare(streams: int, threads: int, tokens: int, delay: float) -> None:
+    print(f"{streams} streams of {tokens} chunks every {delay * 1000:.0f} ms "
+          f"(single stream {tokens * delay:.2f}s); Flask pool of {threads} threads\n")
+    print(f"{'target':<16} {'failures':>8} {'wall':>8} {'concurrency':>12} {'RSS/stream':>12} {'heap/stream':>12}")
+    for target in ("flask", "flask-unbounded", "asgi"):
+        # A fresh interpreter per target keeps peak RSS comparable
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.flask_vs_asgi", "--target", target,
+             "--streams", str(streams), "--threads", str(threads),
+             "--tokens", str(tokens), "--delay", str(delay)],
+            cwd=AI_BACKEND_DIR, capture_output=True, text=True, check=False,
+        )
+        if completed.returncode != 0:
+            print(f"{target:<16} failed:\n{completed.stderr[-2000:]}")
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        print(f"{target:<16} {result['failures']:>8} {result['wall']:>7.2f}s {result['concurrency']:>11.1f}x "
+              f"{result['rss_kb_per_stream']:>9.1f} KB {result['heap_kb_per_stream']:>9.1f} KB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--streams", type=int, default=200, help="Number of concurrent requests")
+    parser.add_argument("--threads", type=int, default=8, help="Worker threads for the Flask app")
+    parser.add_argument("--tokens", type=int, default=40, help="Chunks per upstream stream")
+    parser.add_argument("--delay", type=float, default=0.05, help="Seconds between upstream chunks")
+    parser.add_argument("--target", choices=["flask", "flask-unbounded", "asgi"],
+                        help="Measure one target and print JSON (used internally by the comparison)")
+    args = parser.parse_args()
+    if args.target:
+        print(json.dumps(measure(args.target, args.streams, args.threads, args.tokens, args.delay)))
+    else:
+        compare(args.streams, args.threads, args.tokens, args.delay)
@@ -0,0 +1,447 @@
+"""
+Load-test every route of app.py, asgi_app.py or main.py against the fake OpenAI server.
+
+Starts benchmarks.fake_openai with the given upstream timing and error
+injection, then the target in its own server process, pointed at the fake
+through OPENAI_BASE_URL:
+  - app: app.py on Werkzeug's threaded server, as `python app.py` runs it;
+  - asgi: asgi_app.py on uvicorn;
+  - main: main.py on uvicorn, with a signed JWT for the routes that need one.
+Each route then gets `--requests` requests with `--concurrency` in flight.
+Request bodies differ per request, so the generation cache and single-flight
+coalescing do not hide upstream work; use --repeat-bodies to measure them.
+
+Reported per route:
+  - p50/p95/p99 latency, and p50/p95 time to the first response byte;
+  - requests and response kilobytes per second;
+  - errors: HTTP errors, dropped connections, and error events sent inside
+    a 200 stream;
+  - memory per in-flight request: the target's peak RSS growth during the
+    route, divided by the concurrency (read from /proc, so Linux only).
+
+Runs are reproducible for a given set of flags. `--env KEY=VALUE` passes
+configuration to the target, and `--json` saves the results. `--compare`
+prints two saved runs side by side.
+
+Usage (from ai_backend/):
+    python -m benchmarks.load_generator asgi --concurrency 20 --requests 100 --ttft 0.3 --token-delay 0.02
+    python -m benchmarks.load_generator app --routes generate --json flask.json
+    python -m benchmarks.load_generator main --stream-error-rate 0.05 --env LOG_LEVEL=DEBUG
+    python -m benchmarks.load_generator --compare flask.json asgi.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+AI_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILE_TOKEN = "loadtest"
+JWT_SECRET = "loadtest-secret-for-local-benchmarks"
+TEACHER_ID = "loadtest"
+
+# A 1x1 PNG, enough to exercise the image route without a real roster photo
+TINY_PNG = ("data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk"
+            "YPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==")
+
+STORY = "Mia lost her red kite in the park. She asked her friends to help and they found it in a tree."
+
+# Substrings that mark an error event inside a 200 SSE or NDJSON stream
+STREAM_ERROR_MARKERS = (b'"type": "error"', b'"type":"error"', b'"chunk_error"')
+
+
+class Route:
+    def __init__(self, method: str, path: str, body: Optional[Callable[[int], dict]] = None,
+                 name: Optional[str] = None, headers: Optional[dict] = None, ok=(200, 202)):
+        self.method = method
+        self.path = path
+        self.body = body
+        self.name = name or f"{method} {path}"
+        self.headers = headers or {}
+        self.ok = ok
+
+
+def roster(n: int) -> str:
+    # Without a header row the roster is not parsed locally, so the model is called
+    return "\n".join(f"Student{n}x{i},Family{i},{400 + 10 * i}L" for i in range(12))
+
+
+def app_routes() -> List[Route]:
+    """
+    The routes of app.py, which asgi_app.py serves as well.
+    """
+    profile = {"X-Profile": PROFILE_TOKEN}
+    return [
+        Route("POST", "/generate-passage", lambda n: {
+            "topic": f"How bees make honey {n}", "reading_level": "600-700", "genre": "Informational",
+            "generateQuestions": True, "questionStyle": "STAAR", "includeAnswerKey": True}),
+        Route("POST", "/generate-worksheet", lambda n: {
+            "worksheetType": "Reading comprehension", "prompt": f"Finding the main idea {n}",
+            "teacherGrade": "4"}),
+        Route("POST", "/generate-warmup", lambda n: {
+            "topic": f"main idea {n}", "storyTitle": "The Lost Kite", "storyContent": STORY}),
+        Route("POST", "/generate-story", lambda n: {"topic": f"a lost kite {n}", "lexileLevel": "600-700"}),
+        Route("POST", "/generate-guided-reading-intro", lambda n: {
+            "skill": f"main idea {n}", "title": "The Lost Kite", "content": STORY}),
+        Route("POST", "/generate-graphic-organizer", lambda n: {
+            "skill": f"main idea {n}", "title": "The Lost Kite", "content": STORY}),
+        Route("POST", "/generate-exit-ticket", lambda n: {
+            "skill": f"main idea {n}", "storyTitle": "The Lost Kite", "storyContent": STORY,
+            "practiceContent": STORY}),
+        Route("POST", "/generate-practice", lambda n: {
+            "skill": f"main idea {n}", "storyTitle": "The Lost Kite", "storyContent": STORY}),
+        Route("POST", "/generate-lesson-bundle", lambda n: {
+            "topic": f"main idea {n}", "skill": "main idea", "storyTitle": "The Lost Kite", "storyContent": STORY}),
+        Route("POST", "/improve-observation", lambda n: {
+            "observation": f"Student {n} read slowly but retold the story well.", "topic": "fluency"}),
+        Route("POST", "/chat", lambda n: {"message": f"Give me a warm-up for fractions ({n})",
+                                          "teacherId": TEACHER_ID}),
+        Route("POST", "/parse-students", lambda n: {
+            "text": roster(n), "teacherGrade": "4", "teacherId": TEACHER_ID}),
+        Route("POST", "/parse-students", lambda n: {
+            "text": roster(n), "teacherGrade": "4", "teacherId": TEACHER_ID, "mode": "stream"},
+            name="POST /parse-students (stream)"),
+        Route("POST", "/parse-students-from-image", lambda n: {
+            "image": TINY_PNG, "teacherGrade": "4", "teacherId": TEACHER_ID}),
+        Route("POST", "/jobs", lambda n: {
+            "kind": "generate_passage", "teacherId": TEACHER_ID,
+            "items": [{"topic": f"volcanoes {n}", "reading_level": "600-700"}]}),
+        Route("GET", "/jobs/{job_id}"),
+        Route("GET", "/scheduler/stats"),
+        Route("GET", "/prompts/stats"),
+        Route("GET", "/preflight/stats"),
+        Route("GET", "/streams/stats"),
+        Route("GET", "/cascade/stats"),
+        Route("GET", "/metrics"),
+        Route("GET", "/profiles", headers=profile),
+        Route("GET", "/profiles/{profile_id}", headers=profile),
+    ]
+
+
+def main_routes() -> List[Route]:
+    profile = {"X-Profile": PROFILE_TOKEN}
+    return [
+        Route("GET", "/"),
+        Route("GET", "/health"),
+        Route("POST", "/improve-intervention", lambda n: {
+            "text": f"Student {n} needs help decoding multisyllabic words."}),
+        Route("POST", "/generate-story", lambda n: {"prompt": f"A story about a lost kite {n}"}),
+        Route("POST", "/generate-lesson-plan", lambda n: {"topic": f"fractions {n}", "grade_level": "4"}),
+        Route("POST", "/generate-warmup", lambda n: {"topic": f"main idea {n}", "grade_level": "4"}),
+        Route("POST", "/generate-assessment", lambda n: {
+            "topic": f"fractions {n}", "grade_level": "4", "num_questions": 5}),
+        Route("POST", "/chat", lambda n: {"message": f"Give me a warm-up for fractions ({n})"}),
+        Route("POST", "/generate-practice", lambda n: {"skill": f"main idea {n}"}),
+        Route("POST", "/generate-guided-reading-intro", lambda n: {
+            "skill": f"main idea {n}", "title": "The Lost Kite", "content": STORY}),
+        Route("POST", "/generate-exit-ticket", lambda n: {"skill": f"main idea {n}"}),
+        Route("GET", "/scheduler/stats"),
+        Route("GET", "/prompts/stats"),
+        Route("GET", "/preflight/stats"),
+        Route("GET", "/streams/stats"),
+        Route("GET", "/cascade/stats"),
+        Route("GET", "/metrics"),
+        Route("GET", "/profiles", headers=profile),
+        Route("GET", "/profiles/{profile_id}", headers=profile),
+    ]
+
+
+TARGETS = {
+    "app": {"routes": app_routes, "ready": "/scheduler/stats"},
+    "asgi": {"routes": app_routes, "ready": "/scheduler/stats"},
+    "main": {"routes": main_routes, "ready": "/health"},
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_command(target: str, port: int, workers: int) -> List[str]:
+    if target == "app":
+        return [sys.executable, "-c",
+                "from werkzeug.serving import run_simple; import app; "
+                f"run_simple('127.0.0.1', {port}, app.app, threaded=True)"]
+    module = "asgi_app" if target == "asgi" else "main"
+    return [sys.executable, "-m", "uvicorn", f"{module}:app", "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning"]
+
+
+def process_rss_kb(pid: int) -> int:
+    """
+    Resident memory of a process and its children (uvicorn workers), from /proc.
+    """
+    total = 0
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1])
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                total += sum(process_rss_kb(int(child)) for child in f.read().split())
+    except (OSError, ValueError):
+        pass
+    return total
+
+
+async def wait_ready(base_url: str, path: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as http:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{base_url} exited with status {process.returncode}")
+            try:
+                if (await http.get(path)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{base_url} did not start within {timeout:.0f}s")
+
+
+def percentile(values: List[float], share: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+async def send(http: httpx.AsyncClient, route: Route, n: int, context: dict, headers: dict) -> dict:
+    start = time.perf_counter()
+    first_byte = None
+    body = []
+    try:
+        async with http.stream(route.method, route.path.format(**context),
+                               json=route.body(n) if route.body else None,
+                               headers=dict(headers, **route.headers)) as response:
+            async for chunk in response.aiter_raw():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - start
+                body.append(chunk)
+        content = b"".join(body)
+        if response.status_code not in route.ok:
+            error = f"HTTP {response.status_code}"
+        elif any(marker in content for marker in STREAM_ERROR_MARKERS):
+            error = "error event"
+        else:
+            error = None
+    except httpx.HTTPError as e:
+        content = b"".join(body)
+        error = type(e).__name__
+    return {
+        "latency": time.perf_counter() - start,
+        "ttft": first_byte,
+        "bytes": len(content),
+        "error": error,
+        "content": content,
+    }
+
+
+async def run_route(http: httpx.AsyncClient, route: Route, requests: int, concurrency: int, context: dict,
+                    headers: dict, pid: int, repeat_bodies: bool) -> dict:
+    limit = asyncio.Semaphore(concurrency)
+    baseline = process_rss_kb(pid)
+    peak = baseline
+    sampling = True
+
+    async def sample_memory():
+        nonlocal peak
+        while sampling:
+            peak = max(peak, process_rss_kb(pid))
+            await asyncio.sleep(0.05)
+
+    async def limited(n):
+        async with limit:
+            return await send(http, route, 0 if repeat_bodies else n, context, headers)
+
+    sampler = asyncio.create_task(sample_memory())
+    start = time.perf_counter()
+    results = await asyncio.gather(*(limited(n) for n in range(requests)))
+    wall = time.perf_counter() - start
+    sampling = False
+    await sampler
+
+    errors: Dict[str, int] = {}
+    for result in results:
+        if result["error"]:
+            errors[result["error"]] = errors.get(result["error"], 0) + 1
+    latencies = [result["latency"] for result in results]
+    ttfts = [result["ttft"] for result in results if result["ttft"] is not None]
+    return {
+        "route": route.name,
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "ttft_p50_ms": percentile(ttfts, 0.50) * 1000 if ttfts else None,
+        "ttft_p95_ms": percentile(ttfts, 0.95) * 1000 if ttfts else None,
+        "requests_per_s": requests / wall,
+        "kb_per_s": sum(result["bytes"] for result in results) / 1024 / wall,
+        "kb_per_request_in_flight": max(0, peak - baseline) / min(concurrency, requests),
+        "last_response": results[-1]["content"],
+    }
+
+
+async def prepare_context(http: httpx.AsyncClient, target: str, headers: dict) -> dict:
+    """
+    Ids for the routes that read a resource: a queued job and a recorded profile.
+    """
+    context = {"job_id": "none", "profile_id": "none"}
+    if target != "main":
+        response = await http.post("/jobs", json={"kind": "generate_passage", "teacherId": TEACHER_ID,
+                                                  "items": [{"topic": "setup", "reading_level": "600-700"}]})
+        if response.status_code < 400:
+            context["job_id"] = response.json().get("jobId", "none")
+    profiled_path = "/generate-story"
+    body = {"topic": "setup", "lexileLevel": "600-700"} if target != "main" else {"prompt": "setup"}
+    response = await http.post(profiled_path, json=body, headers=dict(headers, **{"X-Profile": PROFILE_TOKEN}))
+    context["profile_id"] = response.headers.get("x-profile-id", "none")
+    return context
+
+
+async def run(args) -> dict:
+    fake_port, target_port = free_port(), free_port()
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_openai", "--port", str(fake_port),
+         "--ttft", str(args.ttft), "--token-delay", str(args.token_delay), "--tokens", str(args.tokens),
+         "--error-rate", str(args.error_rate), "--error-status", str(args.error_status),
+         "--stream-error-rate", str(args.stream_error_rate), "--seed", str(args.seed), "--batch-delay", "1"],
+        cwd=AI_BACKEND_DIR, stderr=subprocess.DEVNULL,
+    )
+    env = dict(os.environ,
+               OPENAI_API_KEY="loadtest",
+               OPENAI_BASE_URL=f"http://127.0.0.1:{fake_port}/v1",
+               OPENAI_BATCH_BASE_URL=f"http://127.0.0.1:{fake_port}/v1",
+               JWT_SECRET=JWT_SECRET,
+               PROFILE_TOKEN=PROFILE_TOKEN)
+    env.update(dict(item.split("=", 1) for item in args.env))
+    output = None if args.server_output else subprocess.DEVNULL
+    server = subprocess.Popen(server_command(args.target, target_port, args.workers), cwd=AI_BACKEND_DIR, env=env,
+                              stdout=output, stderr=output)
+    try:
+        await wait_ready(f"http://127.0.0.1:{fake_port}", "/docs", fake)
+        base_url = f"http://127.0.0.1:{target_port}"
+        await wait_ready(base_url, TARGETS[args.target]["ready"], server)
+
+        headers = {}
+        if args.target == "main":
+            import jwt
+            headers["Authorization"] = f"Bearer {jwt.encode({'teacherId': TEACHER_ID}, JWT_SECRET, algorithm='HS256')}"
+
+        routes = [route for route in TARGETS[args.target]["routes"]()
+                  if not args.routes or any(part in route.name for part in args.routes)]
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as http:
+            context = await prepare_context(http, args.target, headers)
+            results = []
+            for route in routes:
+                result = await run_route(http, route, args.requests, args.concurrency, context, headers,
+                                         server.pid, args.repeat_bodies)
+                if args.verbose:
+                    print(f"{route.name}: {result['last_response'][:300]!r}")
+                del result["last_response"]
+                results.append(result)
+                print_row(result)
+    finally:
+        for process in (server, fake):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    return {
+        "target": args.target,
+        "settings": {key: value for key, value in vars(args).items() if key not in ("json", "compare", "verbose")},
+        "routes": results,
+    }
+
+
+HEADER = (f"{'route':<40} {'req':>5} {'err':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'ttft50':>8} {'ttft95':>8} "
+          f"{'req/s':>7} {'KB/s':>8} {'KB/req':>7}")
+
+
+def _ms(value: Optional[float]) -> str:
+    return f"{value:.0f}ms" if value is not None else "-"
+
+
+def print_row(result: dict) -> None:
+    errors = sum(result["errors"].values())
+    print(f"{result['route']:<40} {result['requests']:>5} {errors:>5} {_ms(result['p50_ms']):>8} "
+          f"{_ms(result['p95_ms']):>8} {_ms(result['p99_ms']):>8} {_ms(result['ttft_p50_ms']):>8} "
+          f"{_ms(result['ttft_p95_ms']):>8} {result['requests_per_s']:>7.1f} {result['kb_per_s']:>8.1f} "
+          f"{result['kb_per_request_in_flight']:>7.0f}")
+    if result["errors"]:
+        print(f"{'':<40} errors: {result['errors']}")
+
+
+def compare(first_path: str, second_path: str) -> None:
+    with open(first_path) as f:
+        first = json.load(f)
+    with open(second_path) as f:
+        second = json.load(f)
+    second_routes = {result["route"]: result for result in second["routes"]}
+    print(f"{first_path} ({first['target']}) vs {second_path} ({second['target']})\n")
+    print(f"{'route':<40} {'p95':>17} {'ttft p95':>17} {'req/s':>15} {'errors':>11}")
+    for result in first["routes"]:
+        other = second_routes.get(result["route"])
+        if other is None:
+            continue
+        print(f"{result['route']:<40} {_ms(result['p95_ms']):>8}{_ms(other['p95_ms']):>9} "
+              f"{_ms(result['ttft_p95_ms']):>8}{_ms(other['ttft_p95_ms']):>9} "
+              f"{result['requests_per_s']:>7.1f}{other['requests_per_s']:>8.1f} "
+              f"{sum(result['errors'].values()):>5}{sum(other['errors'].values()):>6}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("target", nargs="?", choices=sorted(TARGETS), help="Entry point to load-test")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per route")
+    parser.add_argument("--concurrency", type=int, default=10, help="Requests in flight at once")
+    parser.add_argument("--routes", nargs="*", default=[], help="Only routes whose name contains one of these")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes (asgi and main)")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds before a request is abandoned")
+    parser.add_argument("--repeat-bodies", action="store_true",
+                        help="Send identical bodies, so the generation cache and coalescing apply")
+    parser.add_argument("--ttft", type=float, default=0.3, help="Fake upstream seconds to the first chunk")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Fake upstream seconds between chunks")
+    parser.add_argument("--tokens", type=int, default=200, help="Words per fake passage")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of upstream requests failed up front")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected upstream failures")
+    parser.add_argument("--stream-error-rate", type=float, default=0.0,
+                        help="Share of upstream streams cut off partway through")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for upstream error injection")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Environment variable for the target, e.g. LOG_LEVEL=DEBUG")
+    parser.add_argument("--server-output", action="store_true", help="Show the target's output and request log")
+    parser.add_argument("--verbose", action="store_true", help="Print the start of each route's last response")
+    parser.add_argument("--json", help="Save the results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("FIRST", "SECOND"), help="Compare two saved runs")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    elif not args.target:
+        parser.error("a target (app, asgi or main) or --compare is required")
+    else:
+        print(f"{args.target}: {args.requests} requests per route, {args.concurrency} in flight; upstream "
+              f"TTFT {args.ttft}s, {args.token_delay * 1000:.0f} ms/token, {args.tokens} tokens, "
+              f"{args.error_rate:.0%} errors, {args.stream_error_rate:.0%} cut streams\n")
+        print(HEADER)
+        report = asyncio.run(run(args))
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"\nSaved to {args.json}")
@@ -0,0 +1,451 @@
+"""
+Evaluate candidate models for each endpoint on latency, cost and format compliance.
+
+Replays a fixed corpus of representative requests per endpoint against each
+candidate model. Each request's messages and parameters are built by the
+same helpers the routes use, and they are sent straight to the OpenAI client,
+so the generation cache, single-flight coalescing and the scheduler do not
+affect the timings. Every request is streamed, so TTFT is recorded for the
+endpoints the routes call without streaming too.
+
+Recorded per request:
+  - time to the first content token and total latency;
+  - prompt and completion tokens, from the streamed usage;
+  - cost, from CASCADE_SETTINGS["prices"];
+  - format compliance, checked against what the prompt asks for:
+      * [[ANSWER_KEY_START]] is present when an answer key is requested,
+        and absent otherwise;
+      * the number of questions (4-5 for passages, 3 for practice);
+      * every student has the required fields, and every roster row
+        comes back;
+      * each prompt's section headers, e.g. the worksheet title and answer
+        key and the warm-up's Time, Objective and Activity Steps.
+
+The report has one table per endpoint. Each row is a model, with its pass
+rate, p50 TTFT, p50/p95 latency, mean tokens and cost per request. The
+recommended model is the best one by --rank-by (p50 latency, p50 TTFT or
+cost) whose pass rate is at least --min-pass-rate. The current
+ENDPOINT_MODELS choice is marked with *; endpoints with a model cascade list
+its models as well, since CASCADE_SETTINGS tries those first.
+
+Usage (from ai_backend/):
+    python -m benchmarks.model_eval --models gpt-4o gpt-4o-mini --repeats 3 --json eval.json
+    python -m benchmarks.model_eval --endpoints generate_passage parse_students --rank-by ttft
+    python -m benchmarks.model_eval --fake --repeats 2
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import httpx
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from benchmarks.load_generator import AI_BACKEND_DIR, free_port, percentile  # noqa: E402
+from cascade import LowConfidence, check_chat_opening, estimate_cost  # noqa: E402
+from config import API_SETTINGS, CASCADE_SETTINGS, ENDPOINT_MODELS, OPENAI_MODELS  # noqa: E402
+from prompts import render_prompt  # noqa: E402
+from route_helpers import (  # noqa: E402
+    chat_messages, exit_ticket_messages, graphic_organizer_messages, guided_reading_intro_messages,
+    observation_messages, passage_messages, practice_messages, roster_format_params, story_messages,
+    warmup_messages,
+)
+from student_parsing import (  # noqa: E402
+    BLANK_STUDENT_FIELDS, REQUIRED_STUDENT_FIELDS, clean_json_response, image_page_messages,
+    parse_students_messages, roster_rows, student_array,
+)
+
+ANSWER_KEY_MARKER = "[[ANSWER_KEY_START]]"
+
+STORY_TITLE = "The Lost Kite"
+STORY = ("Mia lost her red kite in the park on a windy afternoon. She asked her friends to help, and they "
+         "searched under the benches and behind the slide. At last Leo pointed up, and there it was, tangled "
+         "in the branches of the tallest oak tree. Together they shook the branch until the kite floated down.")
+PRACTICE_STORY = ("Sam wanted to win the science fair. He tested three kinds of soil and wrote down how tall "
+                  "each bean plant grew. The plant in the sandy soil barely grew at all.")
+ROSTER = "\n".join([
+    "Ava,Lopez,520L",
+    "Noah,Kim,610L",
+    "Liam,Okafor,480L",
+    "Emma,Nguyen,700L",
+    "Olivia,Schmidt,455L",
+    "Mason,Patel,590L",
+])
+ROSTER_TABLE = "\n".join([
+    "Jordan   Reyes   N",
+    "Priya    Shah    P",
+    "Ethan    Brooks  M",
+    "Chloe    Martin  O",
+])
+
+Check = Callable[[str], Optional[str]]
+
+
+def answer_key(expected: bool) -> Check:
+    """
+    The answer key marker is present when an answer key was requested, and absent otherwise.
+    """
+    def check(text: str) -> Optional[str]:
+        if expected and ANSWER_KEY_MARKER not in text:
+            return "answer key marker missing"
+        if not expected and ANSWER_KEY_MARKER in text:
+            return "answer key marker not requested"
+        return None
+    return check
+
+
+def numbered_items(text: str) -> int:
+    return len(re.findall(r"^\s*\**\s*(?:Question\s+)?\d+[.)]", text, re.MULTILINE | re.IGNORECASE))
+
+
+def question_count(low: int, high: int, heading: str) -> Check:
+    """
+    Between `low` and `high` numbered questions after `heading`, before any answer key.
+    """
+    def check(text: str) -> Optional[str]:
+        start = text.lower().find(heading.lower())
+        if start < 0:
+            return f"'{heading}' missing" if high else None
+        section = text[start + len(heading):].split(ANSWER_KEY_MARKER)[0]
+        # Stop at the next heading or bold section label
+        section = re.split(r"^\s*(?:#|\*\*[^*\d]+:?\*\*\s*$)", section, maxsplit=1, flags=re.MULTILINE)[0]
+        count = numbered_items(section)
+        if not low <= count <= high:
+            return f"{count} questions, expected {low}-{high}" if high else f"{count} questions, expected none"
+        return None
+    return check
+
+
+def sections(*headers: str) -> Check:
+    """
+    Every header appears in the text; case and spacing are ignored.
+    """
+    def check(text: str) -> Optional[str]:
+        normalized = re.sub(r"\s+", " ", text.lower())
+        missing = [header for header in headers if re.sub(r"\s+", " ", header.lower()) not in normalized]
+        return f"missing sections: {', '.join(missing)}" if missing else None
+    return check
+
+
+def title_line(prefix: str = "# ") -> Check:
+    """
+    The first non-empty line starts with `prefix`.
+    """
+    def check(text: str) -> Optional[str]:
+        first = next((line.strip() for line in text.splitlines() if line.strip()), "")
+        return None if first.startswith(prefix) else f"first line is not a '{prefix.strip()}' title"
+    return check
+
+
+def word_count(low: int, high: int) -> Check:
+    def check(text: str) -> Optional[str]:
+        words = len(text.split())
+        return None if low <= words <= high else f"{words} words, expected {low}-{high}"
+    return check
+
+
+def no_phrases(*phrases: str) -> Check:
+    def check(text: str) -> Optional[str]:
+        found = [phrase for phrase in phrases if phrase in text.lower()]
+        return f"contains {', '.join(found)}" if found else None
+    return check
+
+
+def chat_opening(text: str) -> Optional[str]:
+    try:
+        check_chat_opening(text)
+    except LowConfidence as e:
+        return str(e)
+    return None
+
+
+def students(roster: str, fields: List[str]) -> Check:
+    """
+    The response is a student array in which every student has `fields` and every roster row appears.
+
+    A blank or null field counts as missing (structured output always returns
+    every key), except for BLANK_STUDENT_FIELDS.
+    """
+    def filled(student: dict, field: str) -> bool:
+        if field not in student:
+            return False
+        value = student[field]
+        return field in BLANK_STUDENT_FIELDS or not (value is None or (isinstance(value, str) and not value.strip()))
+
+    def check(text: str) -> Optional[str]:
+        try:
+            records = student_array(json.loads(clean_json_response(text)))
+        except json.JSONDecodeError as e:
+            return f"invalid JSON: {e}"
+        if not isinstance(records, list):
+            return "response is not a student array"
+        incomplete = [i + 1 for i, student in enumerate(records)
+                      if not isinstance(student, dict) or not all(filled(student, field) for field in fields)]
+        if incomplete:
+            return f"students {incomplete} missing required fields"
+        names = {(str(s.get("firstName", "")).lower(), str(s.get("lastName", "")).lower()) for s in records}
+        rows = [re.split(r"[,\t]|\s{2,}", row.strip()) for row in roster_rows(roster)[1]]
+        missing = [" ".join(row[:2]) for row in rows if (row[0].lower(), row[1].lower()) not in names]
+        if missing:
+            return f"{len(missing)} of {len(rows)} roster rows missing"
+        return None
+    return check
+
+
+class Case:
+    def __init__(self, endpoint: str, name: str, messages: List[dict], checks: List[Check], **params):
+        self.endpoint = endpoint
+        self.name = name
+        self.messages = messages
+        self.checks = checks
+        self.params = params
+
+
+def corpus() -> List[Case]:
+    """
+    The representative requests, with the parameters their routes send.
+    """
+    temperature = API_SETTINGS["temperature"]
+    worksheet_key = [title_line(), answer_key(True), sections("# Answer Key")]
+    return [
+        Case("generate_passage", "staar questions with answer key",
+             passage_messages("How bees make honey", "600-700", "Informational", True, "STAAR", True),
+             [title_line(), question_count(4, 5, "## Questions"), answer_key(True)], temperature=temperature),
+        Case("generate_passage", "questions without answer key",
+             passage_messages("A storm at the lighthouse", "900-1000", "Fiction", True, "STAAR", False),
+             [title_line(), question_count(4, 5, "## Questions"), answer_key(False)], temperature=temperature),
+        Case("generate_passage", "passage only",
+             passage_messages("The first moon landing", "400-500", "Historical Fiction", False, "STAAR", False),
+             [title_line(), question_count(0, 0, "## Questions"), answer_key(False)], temperature=temperature),
+        Case("generate_worksheet", "multiple choice",
+             render_prompt("worksheet", worksheet_type="Multiple Choice", prompt="Equivalent fractions",
+                           teacher_grade="4"),
+             worksheet_key + [sections("## Multiple Choice Questions")], temperature=temperature),
+        Case("generate_worksheet", "vocabulary",
+             render_prompt("worksheet", worksheet_type="Vocabulary", prompt="Words from the water cycle",
+                           teacher_grade="3"),
+             worksheet_key, temperature=temperature),
+        Case("generate_warmup", "story warm-up",
+             warmup_messages("Making predictions", STORY_TITLE, STORY),
+             [sections("### Warm-Up Activity", "**Time:**", "**Objective:**", "**Activity Steps:**",
+                       "**Teacher Notes:**")], temperature=temperature),
+        Case("generate_story", "skill story",
+             story_messages("Cause and effect", "500-600"),
+             [word_count(60, 220)], temperature=temperature),
+        Case("generate_guided_reading_intro", "introduction lesson",
+             guided_reading_intro_messages(STORY_TITLE, STORY, "Sequencing"),
+             [sections("### 5-Minute Introduction Lesson", "**Objective:**", "**Introduction", "**Modeling",
+                       "**Guided Practice", "**Teacher Notes:**")], temperature=temperature),
+        Case("generate_graphic_organizer", "story organizer",
+             graphic_organizer_messages(STORY_TITLE, STORY, "Story elements"),
+             [sections("TITLE:", "INSTRUCTIONS:", "SECTIONS:")], temperature=temperature),
+        Case("generate_exit_ticket", "practice story exit ticket",
+             exit_ticket_messages("Drawing conclusions", "The Science Fair", PRACTICE_STORY),
+             [sections("### 2-Minute Exit Ticket", "**Time:**", "**Task:**", "**Instructions for Students:**",
+                       "**Success Criteria:**", "**Teacher Note")], temperature=temperature),
+        Case("generate_practice", "practice story",
+             practice_messages("Main idea"),
+             [sections("### Independent Practice Story:", "**Student Instructions:**"),
+              question_count(3, 3, "**Practice Questions:**")], temperature=temperature),
+        Case("improve_observation", "observation rewrite",
+             observation_messages("kid got confused on fractions, kept adding the bottoms", "Adding fractions"),
+             [word_count(15, 120), no_phrases("enhanced:", "improved:", "revised")],
+             temperature=temperature, max_tokens=API_SETTINGS["max_tokens"]["improve_observation"]),
+        Case("chat", "coaching question",
+             chat_messages("How can I keep a class of 28 fourth graders engaged during a 20-minute read-aloud?"),
+             [chat_opening]),
+        Case("parse_students", "pasted roster",
+             parse_students_messages(ROSTER, "4", "teacher-1"),
+             [students(ROSTER, REQUIRED_STUDENT_FIELDS)], temperature=0.1, **roster_format_params()),
+        Case("parse_students_from_image", "ocr page",
+             image_page_messages({"text": ROSTER_TABLE}),
+             [students(ROSTER_TABLE, ["firstName", "lastName", "readingLevel", "gradeLevel"])], temperature=0),
+    ]
+
+
+def default_models() -> List[str]:
+    models = list(OPENAI_MODELS.values()) + list(CASCADE_SETTINGS["prices"])
+    return list(dict.fromkeys(models))
+
+
+def run_case(client, case: Case, model: str, timeout: float) -> dict:
+    start = time.perf_counter()
+    ttft = None
+    pieces = []
+    usage = None
+    result = {"endpoint": case.endpoint, "case": case.name, "model": model}
+    try:
+        stream = client.chat.completions.create(model=model, messages=case.messages, stream=True,
+                                                stream_options={"include_usage": True}, timeout=timeout,
+                                                **case.params)
+        for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                pieces.append(chunk.choices[0].delta.content)
+    except Exception as e:
+        result.update(latency=time.perf_counter() - start, ttft=ttft, passed=False, failures=[f"error: {e}"],
+                      prompt_tokens=0, completion_tokens=0, cost=0.0)
+        return result
+
+    text = "".join(pieces)
+    failures = [failure for failure in (check(text) for check in case.checks) if failure]
+    if not text.strip():
+        failures.insert(0, "empty response")
+    prompt_tokens = usage.prompt_tokens if usage else 0
+    completion_tokens = usage.completion_tokens if usage else 0
+    result.update(latency=time.perf_counter() - start, ttft=ttft, passed=not failures, failures=failures,
+                  prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                  cost=estimate_cost(model, prompt_tokens, completion_tokens))
+    return result
+
+
+def summarize(endpoint: str, model: str, runs: List[dict]) -> dict:
+    latencies = [run["latency"] for run in runs]
+    ttfts = [run["ttft"] for run in runs if run["ttft"] is not None]
+    failures = {}
+    for run in runs:
+        for failure in run["failures"]:
+            key = f"{run['case']}: {failure}"
+            failures[key] = failures.get(key, 0) + 1
+    priced = model in CASCADE_SETTINGS["prices"]
+    return {
+        "endpoint": endpoint,
+        "model": model,
+        "current": ENDPOINT_MODELS.get(endpoint) == model,
+        "requests": len(runs),
+        "pass_rate": sum(run["passed"] for run in runs) / len(runs),
+        "ttft_p50_ms": percentile(ttfts, 0.50) * 1000 if ttfts else None,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "prompt_tokens": sum(run["prompt_tokens"] for run in runs) / len(runs),
+        "completion_tokens": sum(run["completion_tokens"] for run in runs) / len(runs),
+        "cost_per_request": sum(run["cost"] for run in runs) / len(runs) if priced else None,
+        "failures": failures,
+    }
+
+
+RANK_KEYS = {"latency": "p50_ms", "ttft": "ttft_p50_ms", "cost": "cost_per_request"}
+
+
+def recommend(rows: List[dict], rank_by: str, min_pass_rate: float) -> Optional[dict]:
+    """
+    The best model by `rank_by` among those passing at least `min_pass_rate` of requests.
+    """
+    key = RANK_KEYS[rank_by]
+    passing = [row for row in rows if row["pass_rate"] >= min_pass_rate and row[key] is not None]
+    return min(passing, key=lambda row: row[key], default=None)
+
+
+def _ms(value: Optional[float]) -> str:
+    return f"{value:.0f}ms" if value is not None else "-"
+
+
+def print_endpoint(endpoint: str, rows: List[dict], choice: Optional[dict], rank_by: str,
+                   min_pass_rate: float) -> None:
+    cascade = CASCADE_SETTINGS["endpoints"].get(endpoint)
+    print(f"\n{endpoint} (current: {ENDPOINT_MODELS.get(endpoint, '-')}"
+          + (f"; cascade: {' -> '.join(cascade)})" if cascade else ")"))
+    print(f"  {'model':<24} {'req':>4} {'pass':>6} {'ttft50':>8} {'p50':>8} {'p95':>8} "
+          f"{'in tok':>7} {'out tok':>8} {'$/req':>9}")
+    for row in rows:
+        cost = f"{row['cost_per_request']:.5f}" if row["cost_per_request"] is not None else "-"
+        name = row["model"] + (" *" if row["current"] else "")
+        print(f"  {name:<24} {row['requests']:>4} {row['pass_rate']:>6.0%} {_ms(row['ttft_p50_ms']):>8} "
+              f"{_ms(row['p50_ms']):>8} {_ms(row['p95_ms']):>8} {row['prompt_tokens']:>7.0f} "
+              f"{row['completion_tokens']:>8.0f} {cost:>9}")
+        for failure, count in sorted(row["failures"].items(), key=lambda item: -item[1])[:3]:
+            print(f"  {'':<24} {count}x {failure[:100]}")
+    if choice is None:
+        print(f"  recommended: none pass {min_pass_rate:.0%} of requests")
+    elif choice["current"]:
+        print(f"  recommended: {choice['model']} (best by {rank_by} that passes; unchanged)")
+    else:
+        print(f"  recommended: {choice['model']} (best by {rank_by} that passes; "
+              f"set ENDPOINT_MODELS[\"{endpoint}\"])")
+
+
+def start_fake_server() -> tuple:
+    port = free_port()
+    fake = subprocess.Popen([sys.executable, "-m", "benchmarks.fake_openai", "--port", str(port),
+                             "--ttft", "0.05", "--token-delay", "0.002"],
+                            cwd=AI_BACKEND_DIR, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/docs")
+            return fake, f"http://127.0.0.1:{port}/v1"
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    fake.kill()
+    raise RuntimeError("benchmarks.fake_openai did not start")
+
+
+def evaluate(args) -> dict:
+    from openai import OpenAI
+
+    cases = [case for case in corpus() if not args.endpoints or case.endpoint in args.endpoints]
+    fake = None
+    base_url = args.base_url
+    if args.fake:
+        fake, base_url = start_fake_server()
+    client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY", "model-eval"), base_url=base_url, max_retries=0)
+    try:
+        jobs = [(case, model) for case in cases for model in args.models for _ in range(args.repeats)]
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            runs = list(executor.map(lambda job: run_case(client, job[0], job[1], args.timeout), jobs))
+    finally:
+        if fake is not None:
+            fake.terminate()
+            fake.wait()
+
+    endpoints = []
+    for endpoint in dict.fromkeys(case.endpoint for case in cases):
+        rows = [summarize(endpoint, model, [run for run in runs if run["endpoint"] == endpoint
+                                            and run["model"] == model])
+                for model in args.models]
+        choice = recommend(rows, args.rank_by, args.min_pass_rate)
+        print_endpoint(endpoint, rows, choice, args.rank_by, args.min_pass_rate)
+        endpoints.append({"endpoint": endpoint, "models": rows,
+                          "recommended": choice["model"] if choice else None})
+    return {
+        "settings": {key: value for key, value in vars(args).items() if key != "json"},
+        "endpoints": endpoints,
+        "runs": runs,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--models", nargs="+", default=default_models(), help="Candidate models")
+    parser.add_argument("--endpoints", nargs="*", default=[], choices=sorted(ENDPOINT_MODELS),
+                        help="Only these endpoints")
+    parser.add_argument("--repeats", type=int, default=3, help="Times each request is sent to each model")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once")
+    parser.add_argument("--timeout", type=float, default=API_SETTINGS["timeout"], help="Seconds per request")
+    parser.add_argument("--rank-by", choices=sorted(RANK_KEYS), default="latency",
+                        help="What the recommended model is best by")
+    parser.add_argument("--min-pass-rate", type=float, default=1.0,
+                        help="Share of requests a model must pass to be recommended")
+    parser.add_argument("--base-url", help="OpenAI-compatible API base URL (default: OPENAI_BASE_URL or OpenAI)")
+    parser.add_argument("--fake", action="store_true",
+                        help="Run against benchmarks.fake_openai, to try the harness offline")
+    parser.add_argument("--json", help="Save the summaries and every request's result to this file")
+    args = parser.parse_args()
+
+    print(f"{len(args.models)} models x {args.repeats} repeats; {args.concurrency} requests in flight; "
+          f"ranked by {args.rank_by}, passing at least {args.min_pass_rate:.0%}")
+    report = evaluate(args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved to {args.json}")
@@ -0,0 +1,158 @@
+"""
+Cold-start profile and budget check for the AI backend entry points.
+
+Each target is measured in fresh interpreters, the way a serverless cold
+start sees it:
+  - `python -X importtime` breaks import time down by top-level package;
+  - a second run times import plus the first request to a route that does not
+    call OpenAI, and lists heavy modules that were loaded by then.
+
+The check fails (exit status 1) when time-to-first-request exceeds the
+target's budget or when a module that should be imported lazily was loaded
+at startup.
+
+Usage (from ai_backend/):
+    python -m benchmarks.startup_profile                 # main, app and asgi_app
+    python -m benchmarks.startup_profile main --top 15 --budget-ms 800
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+AI_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Milliseconds from interpreter start to the first response, per entry point
+STARTUP_BUDGETS = {
+    "main": 1500,
+    "app": 1500,
+    "asgi_app": 1500,
+}
+
+# Modules only some endpoints need; none of them may be loaded at startup
+LAZY_MODULES = ["openai", "PIL", "pytesseract", "tiktoken"]
+
+FIRST_REQUEST = {
+    "main": """
+import time
+start = time.perf_counter()
+import main
+from starlette.testclient import TestClient
+imported = time.perf_counter()
+status = TestClient(main.app).get("/health").status_code
+""",
+    "app": """
+import time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+status = app.app.test_client().get("/scheduler/stats").status_code
+""",
+    "asgi_app": """
+import time
+start = time.perf_counter()
+import asgi_app
+from starlette.testclient import TestClient
+imported = time.perf_counter()
+status = TestClient(asgi_app.app).get("/scheduler/stats").status_code
+""",
+}
+
+REPORT = """
+finished = time.perf_counter()
+import json, sys
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": (finished - start) * 1000,
+    "status": status,
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+"""
+
+
+def run_python(args):
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "startup-profile")
+    return subprocess.run(
+        [sys.executable] + args,
+        cwd=AI_BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+
+def import_breakdown(target):
+    """
+    Return {top-level package: self import time in ms} for importing `target`.
+    """
+    result = run_python(["-X", "importtime", "-c", f"import {target}"])
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {target} failed:\n{result.stderr[-2000:]}")
+
+    totals = defaultdict(float)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|", 2)
+        totals[name.strip().split(".")[0]] += int(self_us) / 1000
+    return totals
+
+
+def first_request(target):
+    result = run_python(["-c", FIRST_REQUEST[target] + REPORT % (LAZY_MODULES,)])
+    if result.returncode != 0:
+        raise RuntimeError(f"First request to {target} failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def profile(target, top, budget_ms, runs):
+    totals = import_breakdown(target)
+    total_ms = sum(totals.values())
+    print(f"\n{target}: import time by package (self time, {total_ms:.0f} ms total)")
+    for name, ms in sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {name:<28} {ms:8.1f} ms  {ms / total_ms:6.1%}")
+
+    # Keep the fastest run; slower ones are noise from the machine, not the code
+    timings = min((first_request(target) for _ in range(runs)), key=lambda r: r["first_request_ms"])
+    print(f"  import {timings['import_ms']:.0f} ms, first request {timings['first_request_ms']:.0f} ms "
+          f"(HTTP {timings['status']}, budget {budget_ms} ms)")
+
+    failures = []
+    if timings["first_request_ms"] > budget_ms:
+        failures.append(f"{target}: first request took {timings['first_request_ms']:.0f} ms, budget is {budget_ms} ms")
+    if timings["loaded"]:
+        failures.append(f"{target}: loaded at startup but should be lazy: {', '.join(timings['loaded'])}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile AI backend cold starts")
+    parser.add_argument("targets", nargs="*", default=list(STARTUP_BUDGETS),
+                        help=f"Entry points to check ({', '.join(STARTUP_BUDGETS)})")
+    parser.add_argument("--top", type=int, default=10, help="Packages to list per target")
+    parser.add_argument("--budget-ms", type=float, help="Override the time-to-first-request budget")
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts per target; the fastest counts")
+    args = parser.parse_args()
+    unknown = [target for target in args.targets if target not in STARTUP_BUDGETS]
+    if unknown:
+        parser.error(f"unknown target: {', '.join(unknown)}")
+
+    failures = []
+    for target in args.targets:
+        failures += profile(target, args.top, args.budget_ms or STARTUP_BUDGETS[target], args.runs)
+
+    if failures:
+        print("\nCold-start budget exceeded:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nCold-start budget met.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Measure what frame coalescing saves on main.py's streaming routes.
+
+Concurrent /generate-warmup streams are served from the in-process fake
+upstream used by benchmarks.concurrent_streams, once with coalescing disabled
+(one SSE event per delta) and once with the configured flush interval. For
+each run the CPU time of the process and the SSE events and bytes on the
+wire per stream are reported. The upstream scheduler is disabled so the
+fake upstream is not paced by real rate limits.
+
+Usage (from ai_backend/):
+    python -m benchmarks.stream_frames --streams 50 --tokens 200 --delay 0.005
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from openai import AsyncOpenAI
+
+from benchmarks.concurrent_streams import fake_upstream
+from config import SCHEDULER_SETTINGS, STREAM_SETTINGS
+import main
+from openai_client import set_async_client
+
+ENDPOINT = "generate_warmup"
+
+
+async def run(streams: int, tokens: int, delay: float, interval: float) -> dict:
+    SCHEDULER_SETTINGS["enabled"] = False
+    STREAM_SETTINGS["flush_intervals"][ENDPOINT] = interval
+    set_async_client(AsyncOpenAI(
+        api_key="benchmark",
+        base_url="http://upstream.local/v1",
+        http_client=httpx.AsyncClient(transport=fake_upstream(tokens, delay)),
+    ))
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        async def one_stream():
+            response = await http.post("/generate-warmup", json={"topic": "main idea"})
+            return response.content.count(b"data: "), len(response.content)
+
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        results = await asyncio.gather(*(one_stream() for _ in range(streams)))
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+
+    return {
+        "cpu": cpu,
+        "wall": wall,
+        "events": sum(events for events, _ in results) / streams,
+        "bytes": sum(size for _, size in results) / streams,
+    }
+
+
+def report(label: str, result: dict) -> None:
+    print(f"{label:<22} cpu {result['cpu']:6.2f}s  wall {result['wall']:6.2f}s  "
+          f"events/stream {result['events']:7.1f}  bytes/stream {result['bytes']:9.0f}")
+
+
+async def compare(streams: int, tokens: int, delay: float, interval: float) -> None:
+    baseline = await run(streams, tokens, delay, 0)
+    framed = await run(streams, tokens, delay, interval)
+    report("per-delta events", baseline)
+    report(f"{interval * 1000:.0f} ms frames", framed)
+    print(f"CPU saved:   {1 - framed['cpu'] / baseline['cpu']:.1%}")
+    print(f"Bytes saved: {1 - framed['bytes'] / baseline['bytes']:.1%}")
+    print(f"Events per stream: {baseline['events']:.0f} -> {framed['events']:.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--streams", type=int, default=50, help="Number of concurrent requests")
+    parser.add_argument("--tokens", type=int, default=200, help="Chunks per upstream stream")
+    parser.add_argument("--delay", type=float, default=0.005, help="Seconds between upstream chunks")
+    parser.add_argument("--interval", type=float, default=STREAM_SETTINGS["flush_interval"],
+                        help="Flush interval in seconds for the coalesced run")
+    args = parser.parse_args()
+    asyncio.run(compare(args.streams, args.tokens, args.delay, args.interval))
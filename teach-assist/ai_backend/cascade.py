@@ -0,0 +1,314 @@
+"""
+Model cascade for endpoints that would otherwise always use the default model.
+
+A request first goes to the first (cheapest) model in the endpoint's
+CASCADE_SETTINGS list and its answer is passed to a check. If the check
+raises ValueError (the answer is invalid) or LowConfidence (it is valid but
+looks incomplete), the request is retried on the next model. The last
+model's answer is returned unchecked, so routes keep their own parsing and
+error handling. Streamed answers are checked on their first
+CASCADE_SETTINGS["stream_window_chars"] characters, which are held back until
+the check passes.
+
+GET /cascade/stats reports per endpoint:
+  - the escalation rate, by reason;
+  - the latency of accepted and escalated answers, compared with the
+    default model's own latency (time to first text for streams);
+  - the estimated cost, compared with sending every request to the
+    endpoint's default model.
+Token counts are estimated with the model's tokenizer, because the
+completion helpers return text only.
+"""
+
+import threading
+import time
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from config import CASCADE_SETTINGS, ENDPOINT_MODELS
+from completions import acomplete_text, complete_text, open_text_stream, stream_text
+from logs import get_logger
+from preflight import count_message_tokens, count_tokens
+
+log = get_logger("cascade")
+
+
+class LowConfidence(ValueError):
+    """
+    Raised by a cascade check when an answer is well-formed but looks incomplete.
+    """
+
+
+def cascade_models(endpoint: str) -> List[str]:
+    """
+    Models tried in order for `endpoint`; just its ENDPOINT_MODELS entry when it has no cascade.
+    """
+    if not CASCADE_SETTINGS["enabled"]:
+        return [ENDPOINT_MODELS[endpoint]]
+    return CASCADE_SETTINGS["endpoints"].get(endpoint) or [ENDPOINT_MODELS[endpoint]]
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    price = CASCADE_SETTINGS["prices"].get(model)
+    if price is None:
+        return 0.0
+    return (prompt_tokens * price["input"] + completion_tokens * price["output"]) / 1_000_000
+
+
+def check_chat_opening(text: str) -> None:
+    """
+    Escalate chat answers that are empty or open with a refusal or a hedge.
+    """
+    opening = text.strip().lower()
+    if not opening:
+        raise ValueError("Empty answer")
+    for phrase in CASCADE_SETTINGS["chat_escalation_phrases"]:
+        if opening.startswith(phrase):
+            raise LowConfidence(f"Answer opens with '{phrase}'")
+
+
+class CascadeCall:
+    """
+    The models one request went through, with their latency and output.
+    """
+
+    def __init__(self, endpoint: str, messages: List[dict]):
+        self.endpoint = endpoint
+        self.messages = messages
+        self.started = time.perf_counter()
+        self.attempts = []  # (model, seconds, text)
+        self.reasons = []
+
+    def attempt(self, model: str, started: float, text: str, ended: Optional[float] = None) -> None:
+        self.attempts.append((model, (ended or time.perf_counter()) - started, text))
+
+    def escalate(self, model: str, error: ValueError) -> None:
+        log.info("cascade_escalated", endpoint=self.endpoint, model=model, reason=str(error))
+        self.reasons.append("low_confidence" if isinstance(error, LowConfidence) else "invalid")
+
+    def finish(self, latency: Optional[float] = None) -> None:
+        cascade_stats.record(self, latency if latency is not None else time.perf_counter() - self.started)
+
+    def release(self, model: str, started: float, opening: str, deltas: Iterator[str]) -> Iterator[str]:
+        """
+        Stream the accepted answer: the held-back opening, then the rest.
+        """
+        released = None
+        text = [opening]
+        try:
+            if opening:
+                released = time.perf_counter()
+                yield opening
+            for delta in deltas:
+                if released is None:
+                    released = time.perf_counter()
+                text.append(delta)
+                yield delta
+        finally:
+            deltas.close()
+            self.attempt(model, started, "".join(text), released)
+            self.finish((released or time.perf_counter()) - self.started)
+
+    async def arelease(self, model: str, started: float, opening: str,
+                       deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+        released = None
+        text = [opening]
+        try:
+            if opening:
+                released = time.perf_counter()
+                yield opening
+            async for delta in deltas:
+                if released is None:
+                    released = time.perf_counter()
+                text.append(delta)
+                yield delta
+        finally:
+            await deltas.aclose()
+            self.attempt(model, started, "".join(text), released)
+            self.finish((released or time.perf_counter()) - self.started)
+
+
+class CascadeStats:
+    """
+    Escalation rates, latency and estimated cost of the cascade per endpoint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, dict] = {}
+
+    def record(self, call: CascadeCall, latency: float) -> None:
+        cost = 0.0
+        for model, _, text in call.attempts:
+            cost += estimate_cost(model, count_message_tokens(call.messages, model), count_tokens(text, model))
+        default_model = ENDPOINT_MODELS[call.endpoint]
+        answer = call.attempts[-1][2] if call.attempts else ""
+        default_cost = estimate_cost(default_model, count_message_tokens(call.messages, default_model),
+                                     count_tokens(answer, default_model))
+
+        with self._lock:
+            entry = self._endpoints.setdefault(call.endpoint, {
+                "requests": 0,
+                "escalated": 0,
+                "reasons": {},
+                "latency": 0.0,
+                "accepted_latency": 0.0,
+                "escalated_latency": 0.0,
+                "default_model_requests": 0,
+                "default_model_latency": 0.0,
+                "cost": 0.0,
+                "default_cost": 0.0,
+            })
+            entry["requests"] += 1
+            entry["latency"] += latency
+            entry["cost"] += cost
+            entry["default_cost"] += default_cost
+            if call.reasons:
+                entry["escalated"] += 1
+                entry["escalated_latency"] += latency
+                for reason in call.reasons:
+                    entry["reasons"][reason] = entry["reasons"].get(reason, 0) + 1
+            else:
+                entry["accepted_latency"] += latency
+            for model, seconds, _ in call.attempts:
+                if model == default_model:
+                    entry["default_model_requests"] += 1
+                    entry["default_model_latency"] += seconds
+
+    def stats(self) -> dict:
+        def average_ms(total, count):
+            return round(total / count * 1000, 1) if count else None
+
+        with self._lock:
+            result = {}
+            for endpoint, entry in self._endpoints.items():
+                accepted = entry["requests"] - entry["escalated"]
+                average = average_ms(entry["latency"], entry["requests"])
+                default_average = average_ms(entry["default_model_latency"], entry["default_model_requests"])
+                result[endpoint] = {
+                    "requests": entry["requests"],
+                    "escalated": entry["escalated"],
+                    "escalation_rate": round(entry["escalated"] / entry["requests"], 3),
+                    "reasons": dict(entry["reasons"]),
+                    "average_latency_ms": average,
+                    "average_accepted_ms": average_ms(entry["accepted_latency"], accepted),
+                    "average_escalated_ms": average_ms(entry["escalated_latency"], entry["escalated"]),
+                    "average_default_model_ms": default_average,
+                    # Negative when the cascade answers faster than the default model alone
+                    "latency_delta_ms": round(average - default_average, 1) if default_average is not None else None,
+                    "cost_usd": round(entry["cost"], 6),
+                    "default_only_cost_usd": round(entry["default_cost"], 6),
+                    "cost_saved_ratio": round(1 - entry["cost"] / entry["default_cost"], 3)
+                    if entry["default_cost"] else 0.0,
+                }
+            return result
+
+
+cascade_stats = CascadeStats()
+
+
+def cascade_complete(client, endpoint: str, messages: List[dict], check: Callable[[str], object],
+                     **kwargs) -> str:
+    """
+    complete_text() along the endpoint's cascade: the first answer that passes `check`.
+    """
+    models = cascade_models(endpoint)
+    call = CascadeCall(endpoint, messages)
+    for model in models[:-1]:
+        started = time.perf_counter()
+        content = complete_text(client, endpoint, messages, model=model, **kwargs)
+        call.attempt(model, started, content)
+        try:
+            check(content)
+        except ValueError as e:
+            call.escalate(model, e)
+        else:
+            call.finish()
+            return content
+
+    started = time.perf_counter()
+    content = complete_text(client, endpoint, messages, model=models[-1], **kwargs)
+    call.attempt(models[-1], started, content)
+    call.finish()
+    return content
+
+
+async def acascade_complete(endpoint: str, messages: List[dict], check: Callable[[str], object],
+                            **kwargs) -> str:
+    """
+    acomplete_text() along the endpoint's cascade: the first answer that passes `check`.
+    """
+    models = cascade_models(endpoint)
+    call = CascadeCall(endpoint, messages)
+    for model in models[:-1]:
+        started = time.perf_counter()
+        content = await acomplete_text(endpoint, messages, model=model, **kwargs)
+        call.attempt(model, started, content)
+        try:
+            check(content)
+        except ValueError as e:
+            call.escalate(model, e)
+        else:
+            call.finish()
+            return content
+
+    started = time.perf_counter()
+    content = await acomplete_text(endpoint, messages, model=models[-1], **kwargs)
+    call.attempt(models[-1], started, content)
+    call.finish()
+    return content
+
+
+def cascade_stream(client, endpoint: str, messages: List[dict], check: Callable[[str], object],
+                   **kwargs) -> Iterator[str]:
+    """
+    stream_text() along the endpoint's cascade: the first answer whose opening passes `check`.
+    """
+    models = cascade_models(endpoint)
+    call = CascadeCall(endpoint, messages)
+    for index, model in enumerate(models):
+        started = time.perf_counter()
+        deltas = stream_text(client, endpoint, messages, model=model, **kwargs)
+        opening = ""
+        if index < len(models) - 1:
+            for text in deltas:
+                opening += text
+                if len(opening) >= CASCADE_SETTINGS["stream_window_chars"]:
+                    break
+            try:
+                check(opening)
+            except ValueError as e:
+                deltas.close()
+                call.attempt(model, started, opening)
+                call.escalate(model, e)
+                continue
+        yield from call.release(model, started, opening, deltas)
+        return
+
+
+async def open_cascade_stream(endpoint: str, messages: List[dict], check: Callable[[str], object],
+                              **kwargs) -> AsyncIterator[str]:
+    """
+    open_text_stream() along the endpoint's cascade: the first answer whose opening passes `check`.
+
+    Returns once an answer has been accepted, so upstream errors and every
+    escalation happen before the route starts its response.
+    """
+    models = cascade_models(endpoint)
+    call = CascadeCall(endpoint, messages)
+    for index, model in enumerate(models):
+        started = time.perf_counter()
+        deltas = await open_text_stream(endpoint, messages, model=model, **kwargs)
+        opening = ""
+        if index < len(models) - 1:
+            async for text in deltas:
+                opening += text
+                if len(opening) >= CASCADE_SETTINGS["stream_window_chars"]:
+                    break
+            try:
+                check(opening)
+            except ValueError as e:
+                await deltas.aclose()
+                call.attempt(model, started, opening)
+                call.escalate(model, e)
+                continue
+        return call.arelease(model, started, opening, deltas)
@@ -0,0 +1,398 @@
+"""
+Helpers for calling OpenAI chat completions from the AI routes.
+
+Routes in app.py go through these functions instead of calling
+`client.chat.completions.create` directly, so that the generation cache,
+single-flight coalescing and the upstream scheduler apply uniformly to every
+endpoint. asgi_app.py and main.py use the async helpers at the bottom of this
+module, which apply the same cache, coalescing and scheduling on the event
+loop with the shared AsyncOpenAI client. Every request
+passes the preflight stage (minification and input token budgets) first,
+streamed deltas are coalesced into frames, and prompts rendered from the
+prompt registry have their cached-token usage recorded per template. When a
+client disconnects mid-stream the upstream response is closed right away and
+the abort is counted in stream_aborts. Every upstream request is recorded in
+the Prometheus-style metrics once it ends, and traced as a client span under
+the route's span.
+"""
+
+import asyncio
+import time
+from typing import AsyncIterator, Iterator, List, Optional
+
+from config import ENDPOINT_MODELS
+from generation_cache import generation_cache, is_cache_enabled, make_cache_key
+from metrics import upstream_metrics
+from openai_client import get_async_client
+from preflight import preflight
+from prompts import prompt_stats
+from scheduler import expected_completion_tokens, scheduler
+from single_flight import is_coalescing_enabled, single_flight
+from stream_aborts import abort_stats
+from stream_frames import acoalesce, coalesce
+from tracing import current_span, tracer
+
+
+def _request_params(temperature: Optional[float], max_tokens: Optional[int], extra: dict) -> dict:
+    params = dict(extra)
+    if temperature is not None:
+        params["temperature"] = temperature
+    if max_tokens is not None:
+        params["max_tokens"] = max_tokens
+    return params
+
+
+def _start_span(endpoint: str, model: str, stream: bool, parent=None):
+    return tracer.start_span("openai.chat.completions", "client", parent=parent, attributes={
+        "openai.endpoint": endpoint,
+        "openai.model": model,
+        "openai.stream": stream,
+    })
+
+
+def _end_span(span, usage, error: Optional[BaseException] = None) -> None:
+    if usage is not None:
+        span.set_attribute("openai.prompt_tokens", getattr(usage, "prompt_tokens", None))
+        span.set_attribute("openai.completion_tokens", getattr(usage, "completion_tokens", None))
+    if error is not None:
+        span.record_error(error)
+    span.end()
+
+
+def _acquire(span, endpoint: str, model: str, messages: List[dict], max_tokens: Optional[int],
+             teacher_id: Optional[str]):
+    """
+    Schedule an upstream request; if that fails (e.g. SchedulerTimeout) its
+    span is ended with the error, so the failure still shows in the trace.
+    """
+    try:
+        ticket = scheduler.acquire(endpoint, model, messages, max_tokens, teacher_id)
+    except BaseException as e:
+        _end_span(span, None, e)
+        raise
+    span.add_event("scheduled")
+    return ticket
+
+
+async def _acquire_async(span, endpoint: str, model: str, messages: List[dict], max_tokens: Optional[int],
+                         teacher_id: Optional[str]):
+    """
+    _acquire for the async helpers; a cancelled wait also ends the span.
+    """
+    try:
+        ticket = await scheduler.acquire_async(endpoint, model, messages, max_tokens, teacher_id)
+    except BaseException as e:
+        _end_span(span, None, e)
+        raise
+    span.add_event("scheduled")
+    return ticket
+
+
+def stream_text(client, endpoint: str, messages: List[dict], model: str = None,
+                temperature: float = None, max_tokens: int = None,
+                teacher_id: str = None, regenerate: bool = False, **kwargs) -> Iterator[str]:
+    """
+    Stream the text deltas of a chat completion.
+
+    Cached generations are replayed, and identical concurrent requests share a
+    single upstream stream. With `regenerate` a fresh generation is made
+    instead, and it replaces the cached one. Deltas are coalesced into frames
+    per the endpoint's STREAM_SETTINGS.
+    """
+    yield from coalesce(_stream_deltas(client, endpoint, messages, model, temperature,
+                                       max_tokens, teacher_id, regenerate, kwargs), endpoint)
+
+
+def _stream_deltas(client, endpoint: str, messages: List[dict], model: Optional[str],
+                   temperature: Optional[float], max_tokens: Optional[int],
+                   teacher_id: Optional[str], regenerate: bool, kwargs: dict) -> Iterator[str]:
+    model = model or ENDPOINT_MODELS[endpoint]
+    messages = preflight(endpoint, messages, model)
+    key = make_cache_key(endpoint, model, messages, temperature, max_tokens)
+    if is_cache_enabled(endpoint) and not regenerate:
+        cached = generation_cache.get(key)
+        if cached is not None:
+            yield from cached
+            return
+    # Coalesced requests are produced on another thread, outside the route's context
+    parent = current_span()
+
+    def produce():
+        span = _start_span(endpoint, model, True, parent)
+        ticket = _acquire(span, endpoint, model, messages, max_tokens, teacher_id)
+        usage = None
+        error = None
+        started = time.perf_counter()
+        first_token = None
+        chunks = []
+        finished = False
+        upstream_metrics.stream_opened(endpoint, model)
+        try:
+            response = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                **_request_params(temperature, max_tokens, kwargs)
+            )
+
+            try:
+                for chunk in response:
+                    if chunk.usage:
+                        usage = chunk.usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        text = chunk.choices[0].delta.content
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                            span.add_event("first_token")
+                        chunks.append(text)
+                        yield text
+                finished = True
+            except GeneratorExit:
+                # The client disconnected (or every coalesced subscriber left)
+                abort_stats.record(endpoint, model, "".join(chunks),
+                                   expected_completion_tokens(endpoint, max_tokens))
+                raise
+            finally:
+                # Closing the response drops the upstream connection so OpenAI
+                # stops generating instead of being read to the end
+                response.close()
+        except Exception as e:
+            upstream_metrics.record_error(endpoint, model, e)
+            error = e
+            raise
+        finally:
+            scheduler.complete(ticket, usage)
+            prompt_stats.record(messages, usage, first_token)
+            upstream_metrics.stream_closed(endpoint, model)
+            upstream_metrics.record(endpoint, model, ticket, started, usage, first_token, len(chunks), finished)
+            _end_span(span, usage, error)
+
+        if is_cache_enabled(endpoint):
+            generation_cache.set(key, chunks)
+
+    # A regenerated request must not join an identical one already in flight
+    if is_coalescing_enabled(endpoint) and not regenerate:
+        yield from single_flight.stream(key, produce)
+    else:
+        yield from produce()
+
+
+def complete_text(client, endpoint: str, messages: List[dict], model: str = None,
+                  temperature: float = None, max_tokens: int = None,
+                  teacher_id: str = None, regenerate: bool = False, **kwargs) -> str:
+    """
+    Return the full text of a non-streamed chat completion, using the cache and
+    coalescing identical concurrent requests when enabled; `regenerate` skips
+    both, as in stream_text.
+    """
+    model = model or ENDPOINT_MODELS[endpoint]
+    messages = preflight(endpoint, messages, model)
+    key = make_cache_key(endpoint, model, messages, temperature, max_tokens)
+    if is_cache_enabled(endpoint) and not regenerate:
+        cached = generation_cache.get(key)
+        if cached is not None:
+            return "".join(cached)
+    parent = current_span()
+
+    def produce():
+        span = _start_span(endpoint, model, False, parent)
+        ticket = _acquire(span, endpoint, model, messages, max_tokens, teacher_id)
+        response = None
+        started = time.perf_counter()
+        try:
+            response = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                **_request_params(temperature, max_tokens, kwargs)
+            )
+        except Exception as e:
+            upstream_metrics.record_error(endpoint, model, e)
+            _end_span(span, None, e)
+            raise
+        finally:
+            scheduler.complete(ticket, response.usage if response else None)
+        _end_span(span, response.usage)
+        upstream_metrics.record(endpoint, model, ticket, started, response.usage)
+        prompt_stats.record(messages, response.usage, time.perf_counter() - started)
+        content = response.choices[0].message.content or ""
+
+        if is_cache_enabled(endpoint):
+            generation_cache.set(key, [content])
+        yield content
+
+    if is_coalescing_enabled(endpoint) and not regenerate:
+        return "".join(single_flight.stream(key, produce))
+    return "".join(produce())
+
+
+async def _iterate_stream(response, ticket, span, endpoint: str, model: str, messages: List[dict],
+                          max_tokens: Optional[int], started: float) -> AsyncIterator[str]:
+    usage = None
+    error = None
+    first_token = None
+    chunks = []
+    finished = False
+    upstream_metrics.stream_opened(endpoint, model)
+    try:
+        async for chunk in response:
+            if chunk.usage:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                text = chunk.choices[0].delta.content
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                    span.add_event("first_token")
+                chunks.append(text)
+                yield text
+        finished = True
+    except (GeneratorExit, asyncio.CancelledError):
+        # The route's response was cancelled or closed because the client disconnected
+        abort_stats.record(endpoint, model, "".join(chunks), expected_completion_tokens(endpoint, max_tokens))
+        raise
+    except Exception as e:
+        upstream_metrics.record_error(endpoint, model, e)
+        error = e
+        raise
+    finally:
+        await response.close()
+        scheduler.complete(ticket, usage)
+        prompt_stats.record(messages, usage, first_token)
+        upstream_metrics.stream_closed(endpoint, model)
+        upstream_metrics.record(endpoint, model, ticket, started, usage, first_token, len(chunks), finished)
+        _end_span(span, usage, error)
+
+
+async def _replay(chunks: List[str]) -> AsyncIterator[str]:
+    for text in chunks:
+        yield text
+
+
+async def _resume(first: str, deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+    try:
+        yield first
+        async for text in deltas:
+            yield text
+    finally:
+        await deltas.aclose()
+
+
+async def _started(deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Wait for the first delta, so that errors raised before it (scheduling,
+    the upstream request) reach the route instead of the response stream.
+    """
+    try:
+        first = await deltas.__anext__()
+    except StopAsyncIteration:
+        return _replay([])
+    except BaseException:
+        await deltas.aclose()
+        raise
+    return _resume(first, deltas)
+
+
+async def open_text_stream(endpoint: str, messages: List[dict], model: str = None,
+                           temperature: float = None, max_tokens: int = None,
+                           teacher_id: str = None, regenerate: bool = False,
+                           **kwargs) -> AsyncIterator[str]:
+    """
+    Start a streamed completion on the shared async client and return its text deltas.
+
+    Like stream_text, cached generations are replayed and identical concurrent
+    requests share one upstream stream, unless `regenerate` is set. The stream
+    has started before this returns, so upstream errors surface to the route
+    rather than in the middle of the response stream.
+    """
+    model = model or ENDPOINT_MODELS[endpoint]
+    messages = preflight(endpoint, messages, model)
+    key = make_cache_key(endpoint, model, messages, temperature, max_tokens)
+    if is_cache_enabled(endpoint) and not regenerate:
+        cached = await asyncio.to_thread(generation_cache.get, key)
+        if cached is not None:
+            return acoalesce(_replay(cached), endpoint)
+    parent = current_span()
+
+    async def produce():
+        span = _start_span(endpoint, model, True, parent)
+        ticket = await _acquire_async(span, endpoint, model, messages, max_tokens, teacher_id)
+        started = time.perf_counter()
+        try:
+            response = await get_async_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                **_request_params(temperature, max_tokens, kwargs)
+            )
+        except Exception as e:
+            upstream_metrics.record_error(endpoint, model, e)
+            scheduler.complete(ticket)
+            _end_span(span, None, e)
+            raise
+
+        chunks = []
+        deltas = _iterate_stream(response, ticket, span, endpoint, model, messages, max_tokens, started)
+        try:
+            async for text in deltas:
+                chunks.append(text)
+                yield text
+        finally:
+            await deltas.aclose()
+
+        if is_cache_enabled(endpoint):
+            await asyncio.to_thread(generation_cache.set, key, chunks)
+
+    # A regenerated request must not join an identical one already in flight
+    if is_coalescing_enabled(endpoint) and not regenerate:
+        deltas = single_flight.astream(key, produce)
+    else:
+        deltas = produce()
+    return acoalesce(await _started(deltas), endpoint)
+
+
+async def acomplete_text(endpoint: str, messages: List[dict], model: str = None,
+                         temperature: float = None, max_tokens: int = None,
+                         teacher_id: str = None, regenerate: bool = False, **kwargs) -> str:
+    """
+    Return the full text of a non-streamed completion from the shared async
+    client, with the cache and coalescing of complete_text.
+    """
+    model = model or ENDPOINT_MODELS[endpoint]
+    messages = preflight(endpoint, messages, model)
+    key = make_cache_key(endpoint, model, messages, temperature, max_tokens)
+    if is_cache_enabled(endpoint) and not regenerate:
+        cached = await asyncio.to_thread(generation_cache.get, key)
+        if cached is not None:
+            return "".join(cached)
+    parent = current_span()
+
+    async def produce():
+        span = _start_span(endpoint, model, False, parent)
+        ticket = await _acquire_async(span, endpoint, model, messages, max_tokens, teacher_id)
+        response = None
+        started = time.perf_counter()
+        try:
+            response = await get_async_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                **_request_params(temperature, max_tokens, kwargs)
+            )
+        except Exception as e:
+            upstream_metrics.record_error(endpoint, model, e)
+            _end_span(span, None, e)
+            raise
+        finally:
+            scheduler.complete(ticket, response.usage if response else None)
+        _end_span(span, response.usage)
+        upstream_metrics.record(endpoint, model, ticket, started, response.usage)
+        prompt_stats.record(messages, response.usage, time.perf_counter() - started)
+        content = response.choices[0].message.content or ""
+
+        if is_cache_enabled(endpoint):
+            await asyncio.to_thread(generation_cache.set, key, [content])
+        yield content
+
+    if is_coalescing_enabled(endpoint) and not regenerate:
+        return "".join([text async for text in single_flight.astream(key, produce)])
+    return "".join([text async for text in produce()])
@@ -2,6 +2,14 @@
 Configuration settings for the AI backend.
 """
 
+import os
+import tempfile
+
+from dotenv import load_dotenv
+
+# Load environment variables from a .env file once, before any setting reads them
+load_dotenv()
+
 # OpenAI Model Settings
 OPENAI_MODELS = {
     "default": "gpt-4o",  # Default model for complex tasks
@@ -31,5 +39,244 @@ API_SETTINGS = {
     "max_tokens": {
         "default": None,  # No limit by default
         "improve_observation": 150,  # Specific limit for observations
-    }
-} 
\ No newline at end of file
+    },
+    "max_connections": 100,  # Shared connection pool size for the async client
+    "max_keepalive_connections": 20,  # Idle connections kept open to OpenAI
+}
+ 
+# Generation cache settings
+CACHE_SETTINGS = {
+    "enabled": True,
+    "memory_entries": 512,  # Entries kept in the in-memory LRU
+    "disk_dir": os.environ.get(
+        "GENERATION_CACHE_DIR",
+        os.path.join(tempfile.gettempdir(), "teachassist-generation-cache"),
+    ),
+    "ttl": 7 * 24 * 60 * 60,  # Seconds before a cached generation expires
+    "max_disk_bytes": 100 * 1024 * 1024,  # Oldest entries are evicted past this size
+    "sweep_interval": 10 * 60,  # Seconds between full scans of the cache directory for expired entries
+    # Endpoints opt in individually; personalized or conversational output stays uncached
+    "endpoints": {
+        "generate_passage": True,
+        "generate_worksheet": True,
+        "generate_warmup": True,
+        "generate_story": False,
+        "generate_guided_reading_intro": True,
+        "generate_graphic_organizer": True,
+        "generate_exit_ticket": True,
+        "generate_practice": True,
+        "improve_observation": True,
+        "chat": False,
+        "parse_students_from_image": False,
+        "parse_students": False,
+    },
+}
+
+# Single-flight coalescing of identical in-flight requests
+COALESCE_SETTINGS = {
+    "enabled": True,
+    "endpoints": {
+        "generate_passage": True,
+        "generate_worksheet": True,
+        "generate_warmup": True,
+        "generate_story": True,
+        "generate_guided_reading_intro": True,
+        "generate_graphic_organizer": True,
+        "generate_exit_ticket": True,
+        "generate_practice": True,
+        "improve_observation": True,
+        "chat": False,
+        "parse_students_from_image": True,
+        "parse_students": True,
+    },
+}
+
+# Upstream request scheduler settings
+SCHEDULER_SETTINGS = {
+    "enabled": True,
+    # Per-model OpenAI rate limits (requests and tokens per minute)
+    "rate_limits": {
+        "gpt-4o": {"rpm": 500, "tpm": 30000},
+        "gpt-4o-mini": {"rpm": 500, "tpm": 200000},
+        "gpt-4": {"rpm": 500, "tpm": 10000},
+    },
+    "default_rate_limit": {"rpm": 500, "tpm": 30000},
+    # Lanes in priority order; earlier lanes are always served first
+    "lanes": ["interactive", "streaming", "bulk"],
+    "default_lane": "streaming",
+    "endpoint_lanes": {
+        "chat": "interactive",
+        "improve_observation": "interactive",
+        "improve_intervention": "interactive",
+        "parse_students": "bulk",
+        "parse_students_from_image": "bulk",
+    },
+    # Expected completion size used when a request sets no max_tokens
+    "default_completion_tokens": 800,
+    "completion_estimates": {
+        "generate_passage": 1500,
+        "generate_worksheet": 1500,
+        "generate_lesson_plan": 1500,
+        "parse_students": 4000,
+        "parse_students_from_image": 4000,
+    },
+    "teacher_weights": {},  # Optional per-teacherId weights for fair queueing
+    "max_queue_wait": 120,  # Seconds a request may wait before failing
+}
+
+# Batch API job mode settings
+BATCH_SETTINGS = {
+    "jobs_dir": os.environ.get(
+        "BATCH_JOBS_DIR",
+        os.path.join(tempfile.gettempdir(), "teachassist-batch-jobs"),
+    ),
+    # Point the batch client at a local stand-in server for testing
+    "base_url": os.environ.get("OPENAI_BATCH_BASE_URL"),
+    "completion_window": "24h",
+    "collect_window": 30,  # Seconds to collect queued jobs into one batch
+    "max_batch_requests": 500,  # Submit early once this many requests are queued
+    "max_items_per_job": 200,
+    "poll_interval": 30,  # Seconds between batch status checks
+}
+
+# Chunked roster extraction for /parse-students
+ROSTER_SETTINGS = {
+    "local_parsing": True,  # Parse CSV/TSV/XLSX/fixed-width rosters without the LLM
+    "chunk_tokens": 1500,  # Estimated input tokens per extraction request
+    "overlap_rows": 1,  # Rows repeated at each chunk seam so split records are seen whole
+    "max_workers": 6,  # Chunks extracted concurrently
+    "structured_output": True,  # Constrain extraction to the student JSON schema (response_format)
+    "repair_rows": True,  # Re-extract rows that still fail validation after local JSON repair
+    "repair_batch_rows": 10,  # Failed rows per targeted follow-up call
+}
+
+# Image preprocessing and OCR for /parse-students-from-image
+OCR_SETTINGS = {
+    "max_dimension": 2000,  # Longest side in pixels before OCR
+    "tesseract_config": "--oem 1 --psm 6",  # LSTM engine, uniform block of text (table rows)
+    "column_gap": 1.5,  # Word gaps wider than this many line heights become column breaks
+    "min_confidence": 60,  # Below this mean word confidence the page goes to the vision model
+    "vision_max_dimension": 1024,  # Longest side of the compact image sent to the vision model
+    "vision_jpeg_quality": 70,
+    "max_pages": 10,
+    "max_workers": 4,  # Pages processed concurrently
+}
+
+# Prompt registry versions (prompts.py)
+PROMPT_SETTINGS = {
+    # Template versions to render instead of the latest, e.g. PROMPT_VERSIONS="passage=1,worksheet=1"
+    "pinned": {
+        name: int(version)
+        for name, _, version in (item.partition("=") for item in os.environ.get("PROMPT_VERSIONS", "").split(",") if item)
+    },
+}
+
+# Preflight minification and input token budgets for every completion request
+PREFLIGHT_SETTINGS = {
+    "minify": True,  # Strip prompt indentation, trailing spaces and repeated blank lines
+    "default_encoding": "o200k_base",  # Tokenizer for models tiktoken does not know
+    "image_tokens": 765,  # Input tokens counted per image part (high detail, 1024px)
+    "default_max_input_tokens": 6000,
+    "max_input_tokens": {
+        "generate_story": 2000,  # gpt-4 has an 8k context window
+        "generate_warmup": 4000,
+        "generate_guided_reading_intro": 4000,
+        "generate_exit_ticket": 4000,
+        "improve_intervention": 2000,
+        "improve_observation": 2000,
+        "chat": 8000,
+        "parse_students": 16000,  # Larger rosters should use stream (chunked) or batch mode
+        "parse_students_from_image": 8000,
+    },
+    # Truncating these inputs would silently drop students, so over-budget requests are rejected
+    "reject_over_budget": ["parse_students", "parse_students_from_image"],
+}
+
+# Coalescing of streamed deltas into SSE/NDJSON frames
+STREAM_SETTINGS = {
+    "flush_interval": 0.04,  # Seconds a frame collects deltas before it is sent; 0 sends every delta
+    "max_frame_chars": 1024,  # Send a frame early once it holds this much text
+    "flush_intervals": {
+        "chat": 0.03,  # Conversational replies should feel live
+        "improve_observation": 0.03,
+    },
+}
+
+# Resumable generation streams (Last-Event-ID replay)
+RESUME_SETTINGS = {
+    "ttl": 5 * 60,  # Seconds a finished stream stays available for replay
+    "max_events": 2000,  # Events buffered per stream; older ones can no longer be replayed
+    "max_streams": 500,  # Streams kept at once; the oldest are forgotten first
+    "abandon_after": 15,  # Seconds a running stream may go without a reader before its generation is stopped
+}
+
+# Model cascade: try the cheaper model first and escalate when its answer fails validation
+CASCADE_SETTINGS = {
+    "enabled": True,
+    "endpoints": {  # Models tried in order; the last one's answer is always used
+        "parse_students": [OPENAI_MODELS["mini"], OPENAI_MODELS["default"]],
+        "parse_students_from_image": [OPENAI_MODELS["mini"], OPENAI_MODELS["default"]],
+        "chat": [OPENAI_MODELS["mini"], OPENAI_MODELS["default"]],
+    },
+    "min_row_coverage": 0.8,  # Escalate a roster when fewer students than this share of its rows come back
+    "stream_window_chars": 200,  # Streamed answers are checked on this many characters before any is sent
+    # Chat answers opening with one of these (lowercase) are retried on the next model
+    "chat_escalation_phrases": ["i'm sorry", "i am sorry", "i can't", "i cannot", "as an ai", "i'm not sure", "i am not sure"],
+    "prices": {  # USD per million tokens, for the cost figures in GET /cascade/stats
+        "gpt-4o": {"input": 2.50, "output": 10.00},
+        "gpt-4o-mini": {"input": 0.15, "output": 0.60},
+    },
+}
+
+# Prometheus-style metrics served by GET /metrics (histogram bucket upper bounds)
+METRICS_SETTINGS = {
+    "latency_buckets": [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120],  # Seconds per upstream request
+    "queue_buckets": [0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30],  # Seconds waiting for the scheduler
+    "ttft_buckets": [0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10],  # Seconds to the first streamed token
+    "gap_buckets": [0.005, 0.01, 0.02, 0.03, 0.05, 0.1, 0.25, 0.5, 1],  # Mean seconds between streamed deltas
+    "rate_buckets": [5, 10, 20, 40, 60, 80, 100, 150, 200, 300],  # Completion tokens per second while streaming
+    "token_buckets": [50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000],  # Tokens per request
+}
+
+# Opt-in per-request sampling profiler (folded-stack flamegraphs)
+PROFILE_SETTINGS = {
+    "token": os.environ.get("PROFILE_TOKEN"),  # Requests whose X-Profile header carries this token are profiled
+    "sample_rate": float(os.environ.get("PROFILE_SAMPLE_RATE", "0")),  # Share of other requests profiled at random
+    "paths": ["/generate-", "/parse-students", "/improve-", "/chat"],  # Route prefixes that may be profiled
+    "interval": 0.005,  # Seconds between stack samples
+    "dir": os.environ.get(
+        "PROFILE_DIR",
+        os.path.join(tempfile.gettempdir(), "teachassist-profiles"),
+    ),
+    "keep": 50,  # Most recent profiles kept; older flamegraph files are deleted
+}
+
+# Distributed tracing: W3C traceparent propagation and spans per route and upstream call
+TRACE_SETTINGS = {
+    "service": os.environ.get("TRACE_SERVICE_NAME", "teachassist-ai"),
+    "exporter": os.environ.get("TRACE_EXPORTER", "none"),  # none, file, console or otlp
+    "file": os.environ.get(
+        "TRACE_FILE",
+        os.path.join(tempfile.gettempdir(), "teachassist-traces.jsonl"),
+    ),
+    # OTLP/HTTP JSON endpoint of a collector, or of the stand-in: python tracing.py --collect 4318 traces.jsonl
+    "otlp_endpoint": os.environ.get("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"),
+    "batch_size": 100,  # Spans sent per export request
+    "flush_interval": 2,  # Seconds between exports
+}
+
+# Structured logging: JSON lines written from a background thread
+LOG_SETTINGS = {
+    "level": os.environ.get("LOG_LEVEL", "INFO"),
+    "format": os.environ.get("LOG_FORMAT", "json"),  # json, or text for local development
+    "debug_sample_rate": float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", "0.01")),  # Share of debug events kept
+    "queue_size": 10000,  # Records waiting to be written; further records are dropped, never waited on
+    "max_field_chars": 1000,  # Longer string fields are truncated
+    # Fields whose values are never written; matched case-insensitively, ignoring _ and -
+    "secret_fields": ["authorization", "token", "apikey", "secret", "password", "jwtsecret", "payload"],
+    # Fields holding student PII or roster content, written as their size only
+    "pii_fields": [
+        "firstname", "lastname", "name", "studentname", "email", "students", "student",
+        "text", "roster", "rawresponse", "response", "content", "observation",
+    ],
+}
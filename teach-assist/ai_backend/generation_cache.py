@@ -0,0 +1,209 @@
+"""
+Content-addressed cache for OpenAI generations.
+
+Entries are keyed by a hash of the endpoint, model, normalized messages,
+temperature and max_tokens. A bounded in-memory LRU sits in front of an
+on-disk tier that expires entries after a TTL and evicts the oldest files
+once the directory grows past its size limit. The directory's size is tracked
+as entries are written, and it is only listed when that estimate passes the
+limit or every CACHE_SETTINGS["sweep_interval"] seconds, since other
+processes may write to it as well.
+
+Routes pass a request's `regenerate` flag to the completion helpers, which
+then skip the lookup and cache the fresh generation in place of the old one.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from config import CACHE_SETTINGS
+from logs import get_logger
+
+log = get_logger("generation_cache")
+
+
+def normalize_messages(messages: List[dict]) -> List[dict]:
+    """
+    Collapse insignificant whitespace so that re-indented prompts share a key.
+    """
+    normalized = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            content = "\n".join(" ".join(line.split()) for line in content.strip().splitlines())
+        normalized.append({"role": message.get("role"), "content": content})
+    return normalized
+
+
+def make_cache_key(endpoint: str, model: str, messages: List[dict],
+                   temperature: Optional[float] = None, max_tokens: Optional[int] = None) -> str:
+    """
+    Return the content address for a generation request.
+    """
+    payload = json.dumps({
+        "endpoint": endpoint,
+        "model": model,
+        "messages": normalize_messages(messages),
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_cache_enabled(endpoint: str) -> bool:
+    """
+    Check whether an endpoint has opted in to caching in config.CACHE_SETTINGS.
+    """
+    return CACHE_SETTINGS["enabled"] and CACHE_SETTINGS["endpoints"].get(endpoint, False)
+
+
+class GenerationCache:
+    """
+    Two-tier cache mapping a content address to the list of streamed text deltas.
+    """
+
+    def __init__(self, directory: str, memory_entries: int, ttl: int, max_disk_bytes: int,
+                 sweep_interval: float):
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self.sweep_interval = sweep_interval
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None  # Unknown until the first sweep
+        self._last_sweep = 0.0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """
+        Return the cached deltas for a key, or None on a miss.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, chunks = entry
+                if time.time() - created < self.ttl:
+                    self._memory.move_to_end(key)
+                    return chunks
+                del self._memory[key]
+
+        entry = self._read_disk(key)
+        if entry is None:
+            return None
+        created, chunks = entry
+        self._remember(key, created, chunks)
+        return chunks
+
+    def set(self, key: str, chunks: List[str]) -> None:
+        """
+        Store a completed generation in both tiers.
+        """
+        self._remember(key, time.time(), chunks)
+        self._write_disk(key, chunks)
+
+    def clear(self) -> None:
+        """
+        Drop every entry from memory and disk.
+        """
+        with self._lock:
+            self._memory.clear()
+            self._disk_bytes = None
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    self._remove(os.path.join(self.directory, name))
+
+    def _remember(self, key: str, created: float, chunks: List[str]) -> None:
+        with self._lock:
+            self._memory[key] = (created, chunks)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _read_disk(self, key: str) -> Optional[tuple]:
+        path = self._path(key)
+        try:
+            created = os.path.getmtime(path)
+            if time.time() - created >= self.ttl:
+                self._remove(path)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return created, json.load(f)["chunks"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_disk(self, key: str, chunks: List[str]) -> None:
+        path = self._path(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            # Write to a temporary file first so readers never see a partial entry
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"chunks": chunks}, f, ensure_ascii=False)
+            written = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+            with self._lock:
+                sweep = self._disk_bytes is None or time.time() - self._last_sweep >= self.sweep_interval
+                if not sweep:
+                    self._disk_bytes += written - replaced
+                    sweep = self._disk_bytes > self.max_disk_bytes
+            if sweep:
+                self._evict_disk()
+        except OSError as e:
+            log.error("generation_cache_write_failed", key=key[:12], error=str(e))
+
+    def _evict_disk(self) -> None:
+        now = time.time()
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if now - stat.st_mtime >= self.ttl:
+                self._remove(path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            self._remove(path)
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+            self._last_sweep = now
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+generation_cache = GenerationCache(
+    directory=CACHE_SETTINGS["disk_dir"],
+    memory_entries=CACHE_SETTINGS["memory_entries"],
+    ttl=CACHE_SETTINGS["ttl"],
+    max_disk_bytes=CACHE_SETTINGS["max_disk_bytes"],
+    sweep_interval=CACHE_SETTINGS["sweep_interval"],
+)
@@ -0,0 +1,187 @@
+"""
+Local OCR pipeline for roster images.
+
+Images are decoded, EXIF-rotated, downscaled, converted to grayscale and
+binarized with PIL, then read with Tesseract. Words are regrouped into table
+rows (wide horizontal gaps become tabs) so the extracted text keeps the
+roster's columns. Only that text is sent to the model; when OCR confidence
+is too low a compact grayscale JPEG is sent as a vision input instead of the
+original upload.
+"""
+
+import base64
+import binascii
+import io
+from typing import List, Optional, Tuple
+
+import pytesseract
+from PIL import Image, ImageOps
+
+from config import OCR_SETTINGS
+from logs import get_logger
+
+log = get_logger("image_ocr")
+
+
+class OcrPage:
+    """
+    Result of preprocessing one image: OCR text, or a compact image for the vision model.
+    """
+
+    def __init__(self, text: str = "", confidence: float = 0.0, image_url: Optional[str] = None):
+        self.text = text
+        self.confidence = confidence
+        self.image_url = image_url
+
+    @property
+    def use_vision(self) -> bool:
+        return self.image_url is not None
+
+    def to_item(self) -> dict:
+        if self.use_vision:
+            return {"imageUrl": self.image_url}
+        return {"text": self.text}
+
+
+def decode_image(data: str) -> Image.Image:
+    """
+    Decode a data URL or bare base64 string into a PIL image.
+
+    Raises ValueError if the payload is not a readable image.
+    """
+    if not isinstance(data, str) or not data:
+        raise ValueError("Image data is required")
+    if data.startswith("data:"):
+        data = data.split(",", 1)[-1]
+    try:
+        raw = base64.b64decode(data, validate=False)
+        image = Image.open(io.BytesIO(raw))
+        image.load()
+    except (binascii.Error, OSError) as e:
+        raise ValueError(f"Could not decode image: {str(e)}")
+    return image
+
+
+def downscale(image: Image.Image, max_dimension: int) -> Image.Image:
+    if max(image.size) <= max_dimension:
+        return image
+    image = image.copy()
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    return image
+
+
+def otsu_threshold(image: Image.Image) -> int:
+    """
+    Threshold that best separates dark text from a light background.
+    """
+    histogram = image.histogram()[:256]
+    total = sum(histogram)
+    weighted_total = sum(level * count for level, count in enumerate(histogram))
+    background = 0
+    weighted_background = 0.0
+    best_threshold = 127
+    best_variance = 0.0
+    for level, count in enumerate(histogram):
+        background += count
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        weighted_background += level * count
+        mean_background = weighted_background / background
+        mean_foreground = (weighted_total - weighted_background) / foreground
+        variance = background * foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_variance = variance
+            best_threshold = level
+    return best_threshold
+
+
+def preprocess(image: Image.Image) -> Image.Image:
+    """
+    Rotate per EXIF, downscale, grayscale and binarize an image for OCR.
+    """
+    image = ImageOps.exif_transpose(image)
+    image = downscale(image, OCR_SETTINGS["max_dimension"])
+    image = ImageOps.autocontrast(image.convert("L"))
+    threshold = otsu_threshold(image)
+    return image.point(lambda value: 255 if value > threshold else 0)
+
+
+def table_text(data: dict) -> Tuple[str, float]:
+    """
+    Rebuild table rows from Tesseract word boxes and return (text, mean confidence).
+
+    Words on the same line separated by more than OCR_SETTINGS["column_gap"]
+    line heights are treated as separate columns and joined with a tab.
+    """
+    lines = {}
+    tops = {}
+    confidences = []
+    for i, word in enumerate(data["text"]):
+        word = word.strip()
+        confidence = float(data["conf"][i])
+        if not word or confidence < 0:
+            continue
+        confidences.append(confidence)
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append((data["left"][i], data["width"][i], data["height"][i], word))
+        tops[key] = min(tops.get(key, data["top"][i]), data["top"][i])
+
+    rows = []
+    for key in sorted(lines, key=lambda k: (tops[k], k)):
+        words = sorted(lines[key])
+        row = words[0][3]
+        for (left, width, height, _), (next_left, _, _, word) in zip(words, words[1:]):
+            gap = next_left - (left + width)
+            row += ("\t" if gap > OCR_SETTINGS["column_gap"] * height else " ") + word
+        rows.append(row)
+
+    confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return "\n".join(rows), confidence
+
+
+def vision_image_url(image: Image.Image) -> str:
+    """
+    Small grayscale JPEG data URL for the vision model.
+    """
+    image = downscale(ImageOps.exif_transpose(image), OCR_SETTINGS["vision_max_dimension"]).convert("L")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=OCR_SETTINGS["vision_jpeg_quality"], optimize=True)
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def ocr_page(data: str) -> OcrPage:
+    """
+    Run the OCR pipeline on one image, falling back to a vision input when
+    Tesseract is unavailable or not confident.
+    """
+    image = decode_image(data)
+    try:
+        result = pytesseract.image_to_data(
+            preprocess(image),
+            config=OCR_SETTINGS["tesseract_config"],
+            output_type=pytesseract.Output.DICT,
+        )
+    except (pytesseract.TesseractNotFoundError, pytesseract.TesseractError) as e:
+        log.warning("ocr_unavailable", error=str(e))
+        return OcrPage(image_url=vision_image_url(image))
+
+    text, confidence = table_text(result)
+    log.info("ocr_read", lines=len(text.splitlines()), confidence=round(confidence))
+    if confidence < OCR_SETTINGS["min_confidence"] or not text.strip():
+        return OcrPage(text, confidence, image_url=vision_image_url(image))
+    return OcrPage(text, confidence)
+
+
+def image_payloads(data: dict) -> List[str]:
+    """
+    Images sent to /parse-students-from-image, as `images` (pages in order) or a single `image`.
+    """
+    images = data.get("images") or ([data["image"]] if data.get("image") else [])
+    if not images:
+        raise ValueError("At least one image is required")
+    if len(images) > OCR_SETTINGS["max_pages"]:
+        raise ValueError(f"At most {OCR_SETTINGS['max_pages']} images can be processed at once")
+    return images
@@ -1,15 +1,9 @@
 # intervention_improver.py
 
-import openai
-import os
-from dotenv import load_dotenv
+from logs import get_logger
+from openai_client import get_client
 
-# Load environment variables from a .env file
-load_dotenv()
-
-client = openai.OpenAI(
-    api_key=os.environ.get("OPENAI_API_KEY"),
-)
+log = get_logger("intervention_note_improver")
 
 # System message to guide the assistant's behavior
 system_message = """
@@ -18,7 +12,7 @@ You are an expert educator helping to improve intervention notes for clarity and
 
 def improve_intervention_text(text, model="gpt-4o-mini", max_tokens=150):
     try:
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model=model,
             messages=[
                 {"role": "system", "content": system_message},
@@ -29,6 +23,6 @@ def improve_intervention_text(text, model="gpt-4o-mini", max_tokens=150):
         )
         return response.choices[0].message.content.strip()
     except Exception as e:
-        print(f"Error communicating with OpenAI: {e}")
+        log.error("upstream_failed", component="intervention_note", error=str(e))
         return None
 # We worked on cause and effect
\ No newline at end of file
@@ -1,32 +1,30 @@
 # lesson_plan_generator.py
 
-import os
-from openai import OpenAI
-from dotenv import load_dotenv
+from logs import get_logger
+from openai_client import get_client
 
-load_dotenv()
+log = get_logger("lesson_plan_generator")
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+SYSTEM_PROMPT = """You are an expert teacher and curriculum developer.
+                    Create detailed, practical, and engaging educational content.
+                    Format your responses in a clear, structured way using markdown:
+                    - Use headers (###) for main sections
+                    - Use bullet points for lists
+                    - Use bold (**) for emphasis
+                    - Break up text into readable paragraphs
+                    - Include numbered steps where appropriate"""
 
 def send_request_to_openai(prompt: str) -> str:
     """
     Send a request to OpenAI's API and return the response.
     """
     try:
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model="gpt-4o",
             messages=[
                 {
                     "role": "system",
-                    "content": """You are an expert teacher and curriculum developer.
-                    Create detailed, practical, and engaging educational content.
-                    Format your responses in a clear, structured way using markdown:
-                    - Use headers (###) for main sections
-                    - Use bullet points for lists
-                    - Use bold (**) for emphasis
-                    - Break up text into readable paragraphs
-                    - Include numbered steps where appropriate"""
+                    "content": SYSTEM_PROMPT
                 },
                 {
                     "role": "user",
@@ -38,7 +36,7 @@ def send_request_to_openai(prompt: str) -> str:
         
         return response.choices[0].message.content.strip()
     except Exception as e:
-        print(f"Error in OpenAI request: {str(e)}")
+        log.error("upstream_failed", component="lesson_plan", error=str(e))
         return None
 
 def generate_lesson_plan(topic: str, grade_level: str, standards: str = None) -> str:
@@ -86,5 +84,5 @@ def generate_lesson_plan(topic: str, grade_level: str, standards: str = None) ->
         
         return send_request_to_openai(prompt)
     except Exception as e:
-        print(f"Error generating lesson plan: {str(e)}")
+        log.error("generation_failed", component="lesson_plan", error=str(e))
         return None
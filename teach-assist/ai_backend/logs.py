@@ -0,0 +1,209 @@
+"""
+Structured, leveled logging for the AI routes.
+
+Routes log named events with fields instead of printing:
+
+    log = get_logger("app")
+    log.info("roster_parsed", students=len(students), failed_rows=len(failed_rows))
+
+Each event becomes one JSON line with its time, level, logger, event name,
+the request's trace id (see tracing.py) and its fields. LOG_FORMAT=text gives
+readable lines for local development instead.
+
+Logging never blocks a request. A record is put on a bounded queue, and a
+background thread redacts, formats and writes it. If the queue is full, the
+record is dropped and counted. Debug events, such as rendered prompts and raw
+model output, are sampled at LOG_SETTINGS["debug_sample_rate"] before any
+record is built, so unsampled calls cost a random() call.
+
+Redaction happens in the background thread:
+  - secret fields (tokens, keys, JWT payloads) are written as "[redacted]";
+  - PII fields (student names, roster text and model output) are written
+    as their size only, unless they hold a number;
+  - any other string has API keys, bearer tokens, JWTs and email addresses
+    masked, and is truncated to LOG_SETTINGS["max_field_chars"].
+
+benchmarks/logging_overhead.py measures the per-request cost of these
+events against the prints they replaced.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import time
+
+from config import LOG_SETTINGS
+from tracing import current_span
+
+SECRET_PATTERNS = [
+    re.compile(r"\bsk-[A-Za-z0-9_-]{8,}"),  # OpenAI API keys
+    re.compile(r"\beyJ[\w-]+\.[\w-]+\.[\w-]+"),  # JWTs
+    re.compile(r"(?i)\bbearer\s+[\w.~+/-]+=*"),
+]
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+
+
+def _field_key(name: str) -> str:
+    return name.lower().replace("_", "").replace("-", "")
+
+
+SECRET_FIELDS = {_field_key(name) for name in LOG_SETTINGS["secret_fields"]}
+PII_FIELDS = {_field_key(name) for name in LOG_SETTINGS["pii_fields"]}
+
+
+def redact_text(text: str) -> str:
+    for pattern in SECRET_PATTERNS:
+        text = pattern.sub("[redacted]", text)
+    text = EMAIL_PATTERN.sub("[email]", text)
+    limit = LOG_SETTINGS["max_field_chars"]
+    if len(text) > limit:
+        text = f"{text[:limit]}... [{len(text) - limit} more chars]"
+    return text
+
+
+def redact(name: str, value):
+    """
+    The value of field `name` as it may be written to the logs.
+    """
+    key = _field_key(name)
+    if key in SECRET_FIELDS:
+        return "[redacted]"
+    if key in PII_FIELDS and not isinstance(value, (bool, int, float)):
+        if isinstance(value, str):
+            return f"[{len(value)} chars]"
+        if isinstance(value, (list, tuple, dict)):
+            return f"[{len(value)} items]"
+        return "[redacted]"
+    if isinstance(value, dict):
+        return {k: redact(str(k), v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(name, item) for item in value]
+    if isinstance(value, str):
+        return redact_text(value)
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return redact_text(str(value))
+
+
+class EventFormatter(logging.Formatter):
+    """
+    Formats event records as JSON lines, or as text lines for local development.
+    """
+
+    def __init__(self, fmt: str = "json"):
+        super().__init__()
+        self.fmt = fmt
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {name: redact(name, value) for name, value in getattr(record, "fields", {}).items()}
+        if record.exc_info:
+            fields["exception"] = redact_text(self.formatException(record.exc_info))
+        trace_id = getattr(record, "trace_id", None)
+        if self.fmt == "text":
+            pairs = " ".join(f"{name}={value}" for name, value in fields.items())
+            return f"{record.levelname:<7} {record.name} {record.getMessage()} {pairs}".rstrip()
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        if trace_id:
+            entry["trace_id"] = trace_id
+        entry.update(fields)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that drops records when the queue is full instead of blocking.
+    """
+
+    def __init__(self, record_queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting and redaction happen on the listener thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class EventLogger:
+    """
+    Logs named events with keyword fields, tagged with the current trace id.
+    """
+
+    def __init__(self, logger: logging.Logger):
+        self._logger = logger
+
+    def _log(self, level: int, event: str, fields: dict, exc_info=None) -> None:
+        # Built directly rather than through Logger.log, which walks the stack to find the caller
+        record = self._logger.makeRecord(self._logger.name, level, "", 0, event, None, exc_info, extra={
+            "fields": fields,
+            "trace_id": getattr(current_span(), "trace_id", None),
+        })
+        self._logger.handle(record)
+
+    def debug(self, event: str, **fields) -> None:
+        """
+        Log a verbose event, kept for a sample of calls only.
+        """
+        rate = LOG_SETTINGS["debug_sample_rate"]
+        if self._logger.isEnabledFor(logging.DEBUG) and random.random() < rate:
+            fields["sample_rate"] = rate
+            self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields) -> None:
+        if self._logger.isEnabledFor(logging.INFO):
+            self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields) -> None:
+        if self._logger.isEnabledFor(logging.WARNING):
+            self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, exc_info: bool = False, **fields) -> None:
+        """
+        Log a failure; exc_info=True adds the traceback of the exception being handled.
+        """
+        if self._logger.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, event, fields, exc_info=sys.exc_info() if exc_info else None)
+
+
+def _configure() -> DroppingQueueHandler:
+    root = logging.getLogger("teachassist")
+    root.setLevel(LOG_SETTINGS["level"].upper())
+    root.propagate = False
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(EventFormatter(LOG_SETTINGS["format"]))
+    handler = DroppingQueueHandler(queue.Queue(LOG_SETTINGS["queue_size"]))
+    root.addHandler(handler)
+
+    listener = logging.handlers.QueueListener(handler.queue, output)
+    listener.start()
+
+    def stop():
+        # Writes out what is still queued
+        listener.stop()
+        if handler.dropped:
+            print(f"Dropped {handler.dropped} log records on a full queue", file=sys.stderr)
+    atexit.register(stop)
+    return handler
+
+
+queue_handler = _configure()
+
+
+def get_logger(name: str) -> EventLogger:
+    return EventLogger(logging.getLogger(f"teachassist.{name}"))
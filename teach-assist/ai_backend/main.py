@@ -1,57 +1,58 @@
 # # main.py
 
 from fastapi import FastAPI, HTTPException, Header, Depends
-from starlette.responses import StreamingResponse
+from starlette.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-from lesson_plan_generator import send_request_to_openai
-import openai
 import os
-from dotenv import load_dotenv
 from typing import List, Optional
 import jwt
-from openai import OpenAI
 import json
-
-# Load environment variables from a .env file
-load_dotenv()
+from openai_client import close_async_client
+from cascade import cascade_stats, check_chat_opening, open_cascade_stream
+from completions import open_text_stream, acomplete_text
+from metrics import METRICS_CONTENT_TYPE, upstream_metrics
+from profiling import ProfilingMiddleware, profiler
+from preflight import preflight_stats
+from prompts import prompt_stats, render_prompt
+from scheduler import scheduler
+from stream_aborts import abort_stats
+from tracing import TracingMiddleware
+from logs import get_logger
+
+log = get_logger("main")
 
 # Set OpenAI API key
 openai_api_key = os.environ.get("OPENAI_API_KEY")
-print(f"OpenAI API key status: {'Configured' if openai_api_key else 'Not configured'}")
-print(f"OpenAI API key length: {len(openai_api_key) if openai_api_key else 0}")
-print(f"OpenAI API key prefix: {openai_api_key[:7] + '...' if openai_api_key else 'None'}")
+log.info("openai_key_checked", configured=bool(openai_api_key))
 
 if not openai_api_key:
-    print("WARNING: OPENAI_API_KEY is not set in environment variables.")
+    log.error("openai_key_missing")
     raise ValueError("OPENAI_API_KEY is not set in environment variables.")
 
 # JWT configuration
 JWT_SECRET = os.environ.get("JWT_SECRET", "hPp0DlBqrAylk1TB1g/a7hM2jFeVkxfEQgFnJ4NXb2Ul5QWJ1gpV2F/PFdspKd2IudfDnyI9gfGHFGhH9A==")
-print(f"JWT_SECRET status: {'Configured' if JWT_SECRET != 'your-secret-key' else 'Using default'}")
+log.info("jwt_secret_checked", configured="JWT_SECRET" in os.environ)
 
 async def verify_token(authorization: Optional[str] = Header(None)):
     if not authorization:
-        print("No authorization header found")
+        log.info("auth_rejected", reason="missing_header")
         raise HTTPException(status_code=401, detail="Authorization header missing")
     
     try:
-        print("Verifying token...")
         scheme, token = authorization.split()
         if scheme.lower() != 'bearer':
-            print(f"Invalid scheme: {scheme}")
+            log.info("auth_rejected", reason="invalid_scheme")
             raise HTTPException(status_code=401, detail="Invalid authentication scheme")
         
-        print(f"Token length: {len(token)}")
-        print(f"JWT_SECRET length: {len(JWT_SECRET)}")
         payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        print(f"Token decoded successfully. Payload: {payload}")
+        log.debug("auth_accepted", teacher_id=payload.get('teacherId'))
         return payload
     except jwt.InvalidTokenError as e:
-        print(f"Invalid token error: {str(e)}")
+        log.info("auth_rejected", reason="invalid_token", error=str(e))
         raise HTTPException(status_code=401, detail="Invalid token")
     except Exception as e:
-        print(f"Auth error: {str(e)}")
+        log.warning("auth_failed", error=str(e))
         raise HTTPException(status_code=401, detail="Authentication failed")
 
 # Initialize FastAPI application
@@ -61,6 +62,11 @@ app = FastAPI(
     version="1.0.0"
 )
 
+@app.on_event("shutdown")
+async def shutdown_openai_client():
+    # Release the shared OpenAI connection pool
+    await close_async_client()
+
 # Get environment-specific origins
 def get_allowed_origins() -> List[str]:
     env = os.environ.get("ENVIRONMENT", "development")
@@ -78,9 +84,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
     max_age=3600  # Cache preflight requests for 1 hour
 )
 
+# Opt-in per-request sampling profiles (X-Profile header or PROFILE_SAMPLE_RATE)
+app.add_middleware(ProfilingMiddleware)
+
+# Trace spans per request, joining the caller's traceparent (TRACE_EXPORTER)
+app.add_middleware(TracingMiddleware)
+
 # Pydantic models
 class ImproveInterventionRequest(BaseModel):
     text: str
@@ -106,6 +119,7 @@ class GenerateLessonPlanResponse(BaseModel):
 class GenerateWarmupRequest(BaseModel):
     topic: str
     grade_level: str = None
+    regenerate: bool = False
 
 class GenerateWarmupResponse(BaseModel):
     warmup: str
@@ -143,7 +157,14 @@ async def root():
             "generate_lesson_plan": "POST /generate-lesson-plan",
             "generate_warmup": "POST /generate-warmup",
             "generate_assessment": "POST /generate-assessment",
-            "chat": "POST /chat"
+            "chat": "POST /chat",
+            "scheduler_stats": "GET /scheduler/stats",
+            "prompt_stats": "GET /prompts/stats",
+            "preflight_stats": "GET /preflight/stats",
+            "stream_stats": "GET /streams/stats",
+            "cascade_stats": "GET /cascade/stats",
+            "metrics": "GET /metrics",
+            "profiles": "GET /profiles"
         }
     }
 
@@ -154,28 +175,19 @@ async def improve_intervention(request: ImproveInterventionRequest):
     Improve the intervention text using OpenAI's GPT model.
     """
     try:
-        client = OpenAI(api_key=openai_api_key)
-        response = client.chat.completions.create(
+        improved_text = await acomplete_text(
+            "improve_intervention",
             model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert educator helping to improve intervention notes for clarity and effectiveness.",
-                },
-                {
-                    "role": "user",
-                    "content": f"Please improve the following intervention note for clarity and effectiveness:\n\n\"{request.text}\"",
-                },
-            ],
+            messages=render_prompt("improve_intervention", text=request.text),
             temperature=0.7,
             max_tokens=150,
         )
 
-        improved_text = response.choices[0].message.content.strip()
+        improved_text = improved_text.strip()
         return ImproveInterventionResponse(improved_text=improved_text)
 
     except Exception as e:
-        print(f"OpenAI API error: {e}")
+        log.error("upstream_failed", route="improve_intervention", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to improve intervention text.")
 
 # Route to generate stories
@@ -185,53 +197,20 @@ async def generate_story(request: GenerateStoryRequest):
     Generate a story using OpenAI's GPT model.
     """
     try:
-        prompt = f"""Generate a very short, engaging story based on the following prompt:
-        Topic: {request.prompt}
-        
-        Requirements:
-        1. Create a single paragraph story (about 100-150 words)
-        2. Make it engaging and age-appropriate
-        3. Include a clear beginning, middle, and end
-        4. Focus on {request.prompt} without explicitly mentioning it
-        5. Use vocabulary appropriate for the target audience
-        6. Keep it concise but meaningful
-        
-        Format:
-        [Title]
-        
-        [Single paragraph story]"""
-        
         try:
-            client = OpenAI(api_key=openai_api_key)
-            response = client.chat.completions.create(
+            response = await open_text_stream(
+                "generate_story",
                 model="gpt-4",
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": """You are an expert at creating engaging educational stories.
-                        Follow these rules exactly:
-                        1. Generate a short, creative title
-                        2. Add TWO blank lines after the title
-                        3. Write a single engaging paragraph
-                        4. Keep the story concise (100-150 words)
-                        5. Use descriptive language suitable for the target audience
-                        6. Do not use any markdown headers or formatting
-                        7. Make sure the story has a clear beginning, middle, and end"""
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                stream=True
+                messages=render_prompt("story", topic=request.prompt),
+                temperature=0.7
             )
 
             async def generate():
                 story_text = ""
-                for chunk in response:
-                    if chunk.choices[0].delta.content is not None:
-                        content = chunk.choices[0].delta.content
-                        story_text += content
-                        # Format the content as a proper SSE data message
-                        yield f"data: {json.dumps({'content': content})}\n\n"
+                async for content in response:
+                    story_text += content
+                    # Format the content as a proper SSE data message
+                    yield f"data: {json.dumps({'content': content})}\n\n"
                 
                 # Split the story text into title and content
                 parts = story_text.strip().split('\n\n', 1)
@@ -244,11 +223,11 @@ async def generate_story(request: GenerateStoryRequest):
             return StreamingResponse(generate(), media_type='text/event-stream')
 
         except Exception as api_error:
-            print(f"OpenAI API error: {str(api_error)}")
+            log.error("upstream_failed", route="generate_story", error=str(api_error))
             raise
 
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        log.error("route_failed", route="generate_story", exc_info=True, error=str(e))
         raise HTTPException(status_code=500, detail="An unexpected error occurred.")
 
 # Route to generate lesson plans
@@ -258,73 +237,33 @@ async def generate_lesson_plan(request: GenerateLessonPlanRequest):
     Generate a lesson plan using OpenAI's GPT model.
     """
     try:
-        prompt = f"""Generate a {request.lesson_type} lesson plan for grade {request.grade_level} on the topic: {request.topic}
-        {f'Align with these standards: {request.standards}' if request.standards else ''}
-        
-        Include the following sections:
-        ### Lesson Overview
-        - Grade Level
-        - Subject Area
-        - Duration
-        - Topic
-        
-        ### Learning Objectives
-        - What students will know
-        - What students will be able to do
-        
-        ### Materials Needed
-        - List all required materials
-        
-        ### Lesson Structure
-        1. Opening/Hook (5-10 minutes)
-        2. Main Activity (20-30 minutes)
-        3. Practice/Application (15-20 minutes)
-        4. Closure (5-10 minutes)
-        
-        ### Assessment Strategies
-        - How you will check for understanding
-        - Any specific assessment tasks
-        
-        ### Differentiation Strategies
-        - For struggling students
-        - For advanced students
-        - For ELL students
-        
-        ### Extensions and Homework
-        - Additional practice
-        - Related assignments
-        
-        Format the response in clear markdown with appropriate headers and sections."""
-        
+        standards = f"Align with these standards: {request.standards}" if request.standards else ""
+        messages = render_prompt("lesson_plan", lesson_type=request.lesson_type, grade_level=request.grade_level,
+                                 topic=request.topic, standards=standards)
+
         try:
-            client = OpenAI(api_key=openai_api_key)
-            response = client.chat.completions.create(
+            response = await open_text_stream(
+                "generate_lesson_plan",
                 model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are an expert teacher and curriculum developer."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                stream=True
+                messages=messages,
+                temperature=0.7
             )
             
             async def generate():
                 lesson_text = ""
-                for chunk in response:
-                    if chunk.choices[0].delta.content is not None:
-                        content = chunk.choices[0].delta.content
-                        lesson_text += content
-                        yield f"data: {json.dumps({'content': content})}\n\n"
+                async for content in response:
+                    lesson_text += content
+                    yield f"data: {json.dumps({'content': content})}\n\n"
                 yield f"data: {json.dumps({'type': 'complete', 'content': lesson_text})}\n\n"
 
             return StreamingResponse(generate(), media_type='text/event-stream')
 
         except Exception as api_error:
-            print(f"OpenAI API error: {str(api_error)}")
+            log.error("upstream_failed", route="generate_lesson_plan", error=str(api_error))
             raise
 
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        log.error("route_failed", route="generate_lesson_plan", exc_info=True, error=str(e))
         raise HTTPException(status_code=500, detail="An unexpected error occurred.")
 
 # Route to generate warmup activities
@@ -334,55 +273,33 @@ async def generate_warmup(request: GenerateWarmupRequest):
     Generate a warmup activity using OpenAI's GPT model.
     """
     try:
-        grade_level_text = f" for grade {request.grade_level}" if request.grade_level else ""
-        prompt = f"""Create a short 2-3 minute warmup activity{grade_level_text} on the topic: {request.topic}
-        
-        Format the response in clear markdown with these exact sections:
-        ### Warm-Up Activity: {request.topic}
+        grade_level_text = f"\nGrade Level: {request.grade_level}" if request.grade_level else ""
+        messages = render_prompt("warmup", topic=request.topic, details=grade_level_text)
 
-        **Time:** 2-3 minutes
-
-        **Objective:**
-        [Brief statement of what students will do]
-
-        **Activity Steps:**
-        1. [First step]
-        2. [Second step]
-        3. [Third step]
-
-        **Teacher Notes:**
-        - [Important points to remember]
-        - [What to look for]"""
-        
         try:
-            client = OpenAI(api_key=openai_api_key)
-            response = client.chat.completions.create(
+            response = await open_text_stream(
+                "generate_warmup",
                 model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are an expert at creating engaging warm-up activities for reading lessons."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=messages,
                 temperature=0.7,
-                stream=True
+                regenerate=request.regenerate
             )
             
             async def generate():
                 warmup_text = ""
-                for chunk in response:
-                    if chunk.choices[0].delta.content is not None:
-                        content = chunk.choices[0].delta.content
-                        warmup_text += content
-                        yield f"data: {json.dumps({'content': content})}\n\n"
+                async for content in response:
+                    warmup_text += content
+                    yield f"data: {json.dumps({'content': content})}\n\n"
                 yield f"data: {json.dumps({'type': 'complete', 'content': warmup_text})}\n\n"
 
             return StreamingResponse(generate(), media_type='text/event-stream')
 
         except Exception as api_error:
-            print(f"OpenAI API error: {str(api_error)}")
+            log.error("upstream_failed", route="generate_warmup", error=str(api_error))
             raise
 
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        log.error("route_failed", route="generate_warmup", exc_info=True, error=str(e))
         raise HTTPException(status_code=500, detail="An unexpected error occurred.")
 
 # Route to generate assessments
@@ -392,15 +309,19 @@ async def generate_assessment(request: GenerateAssessmentRequest):
     Generate an assessment using OpenAI's GPT model.
     """
     try:
-        prompt = f"""Create a {request.num_questions}-question assessment for grade {request.grade_level} on the topic: {request.topic}
-        Include a mix of question types (multiple choice, short answer, etc.) and provide an answer key."""
-        
-        assessment = send_request_to_openai(prompt)
-        if assessment is None:
+        assessment = await acomplete_text(
+            "generate_assessment",
+            model="gpt-4o",
+            messages=render_prompt("assessment", num_questions=request.num_questions,
+                                   grade_level=request.grade_level, topic=request.topic),
+            temperature=0.7
+        )
+        assessment = assessment.strip()
+        if not assessment:
             raise HTTPException(status_code=500, detail="Failed to generate assessment")
         return GenerateAssessmentResponse(assessment=assessment)
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        log.error("route_failed", route="generate_assessment", exc_info=True, error=str(e))
         raise HTTPException(status_code=500, detail="An unexpected error occurred.")
 
 # Route for chat interactions
@@ -410,58 +331,36 @@ async def chat(request: ChatRequest, token_payload: dict = Depends(verify_token)
     Have a conversation with the AI teaching assistant.
     """
     try:
-        print("Chat endpoint called")
-        print(f"OpenAI API key status: {'Configured' if openai_api_key else 'Not configured'}")
-        print(f"OpenAI API key length: {len(openai_api_key) if openai_api_key else 0}")
-        print(f"OpenAI API key prefix: {openai_api_key[:7] + '...' if openai_api_key else 'None'}")
-        print(f"Environment: {os.environ.get('ENVIRONMENT', 'not set')}")
-        print(f"User ID from token: {token_payload.get('teacherId', 'not found')}")
+        log.info("chat_requested", teacher_id=token_payload.get('teacherId'), message_chars=len(request.message))
 
         if not openai_api_key:
-            print("ERROR: OpenAI API key is not set")
+            log.error("openai_key_missing")
             raise HTTPException(status_code=500, detail="OpenAI API key is not configured")
 
-        system_prompt = """You are a helpful teaching assistant with expertise in education. 
-        You provide clear, concise, and practical advice to teachers. 
-        Focus on being specific and actionable in your responses.
-        Format your responses in a clear, structured way using markdown:
-        - Use headers (###) for main sections
-        - Use bullet points for lists
-        - Use bold (**) for emphasis
-        - Break up text into readable paragraphs
-        - Include numbered steps where appropriate"""
-        
         context = f"\nContext: {request.context}" if request.context else ""
-        
-        print(f"Sending request to OpenAI API with message: {request.message[:100]}...")
-        
+
         try:
-            client = OpenAI(api_key=openai_api_key)
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"{request.message}{context}"}
-                ],
+            # Answered by the cheaper model unless its opening looks like a refusal
+            response = await open_cascade_stream(
+                "chat",
+                messages=render_prompt("chat", message=request.message, context=context),
+                check=check_chat_opening,
                 temperature=0.7,
-                stream=True
+                teacher_id=token_payload.get('teacherId')
             )
             
             async def generate():
-                for chunk in response:
-                    if chunk.choices[0].delta.content is not None:
-                        yield chunk.choices[0].delta.content
+                async for content in response:
+                    yield content
 
             return StreamingResponse(generate(), media_type='text/plain')
 
         except Exception as api_error:
-            print(f"Detailed OpenAI API error: {str(api_error)}")
-            print(f"Error type: {type(api_error).__name__}")
+            log.error("upstream_failed", route="chat", error_type=type(api_error).__name__, error=str(api_error))
             raise
 
     except Exception as e:
-        print(f"Unexpected error in chat endpoint: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
+        log.error("route_failed", route="chat", error_type=type(e).__name__, error=str(e))
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
 # Health check endpoint
@@ -469,58 +368,80 @@ async def chat(request: ChatRequest, token_payload: dict = Depends(verify_token)
 async def health_check():
     return {"status": "healthy", "service": "TeachAssist AI API"}
 
+# Upstream scheduler queue depth and wait times
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    return scheduler.stats()
+
+# Prompt-prefix cache hits per prompt template version
+@app.get("/prompts/stats")
+async def prompts_stats():
+    return prompt_stats.stats()
+
+# Input tokens saved by prompt minification and budget enforcement per endpoint
+@app.get("/preflight/stats")
+async def preflight_stats_route():
+    return preflight_stats.stats()
+
+# Streams closed early because the client disconnected, and the tokens saved
+@app.get("/streams/stats")
+async def streams_stats():
+    return abort_stats.stats()
+
+# Model cascade escalation rates, latency and estimated cost against the default model
+@app.get("/cascade/stats")
+async def cascade_stats_route():
+    return cascade_stats.stats()
+
+# Upstream latency, time to first token, throughput and token usage in Prometheus text format
+@app.get("/metrics")
+async def metrics():
+    return Response(upstream_metrics.render(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+# Recent request profiles and their folded-stack flamegraphs; require the profiling token
+@app.get("/profiles")
+async def profiles(x_profile: Optional[str] = Header(None)):
+    if not profiler.authorized(x_profile):
+        raise HTTPException(status_code=404, detail="Not found")
+    return profiler.summaries()
+
+@app.get("/profiles/{profile_id}")
+async def profile_flamegraph(profile_id: str, x_profile: Optional[str] = Header(None)):
+    folded = profiler.folded(profile_id) if profiler.authorized(x_profile) else None
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return Response(folded, media_type="text/plain")
+
 @app.post("/generate-practice")
 async def generate_practice(request: dict):
     """
     Generate a practice activity with a new story.
     """
     try:
-        prompt = f"""Create a practice activity with a new short story focusing on {request.get('skill')}.
-
-        Format the response in markdown:
-        ### Independent Practice Story: [Generate an engaging title]
-
-        [Write a short story here that demonstrates {request.get('skill')} - about 100 words]
-
-        **Practice Questions:**
-        1. [Question specifically about {request.get('skill')}]
-        2. [Another question about {request.get('skill')}]
-        3. [Final question about {request.get('skill')}]
-
-        **Student Instructions:**
-        1. Read the story carefully
-        2. Think about {request.get('skill')} as you read
-        3. Answer the questions using evidence from the text"""
-
         try:
-            client = OpenAI(api_key=openai_api_key)
-            response = client.chat.completions.create(
+            response = await open_text_stream(
+                "generate_practice",
                 model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are an expert at creating educational content and practice activities."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=render_prompt("practice", skill=request.get('skill')),
                 temperature=0.7,
-                stream=True
+                regenerate=request.get('regenerate', False)
             )
             
             async def generate():
                 practice_text = ""
-                for chunk in response:
-                    if chunk.choices[0].delta.content is not None:
-                        content = chunk.choices[0].delta.content
-                        practice_text += content
-                        yield f"data: {json.dumps({'content': content})}\n\n"
+                async for content in response:
+                    practice_text += content
+                    yield f"data: {json.dumps({'content': content})}\n\n"
                 yield f"data: {json.dumps({'type': 'complete', 'content': practice_text})}\n\n"
 
             return StreamingResponse(generate(), media_type='text/event-stream')
 
         except Exception as api_error:
-            print(f"OpenAI API error: {str(api_error)}")
+            log.error("upstream_failed", route="generate_practice", error=str(api_error))
             raise
 
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        log.error("route_failed", route="generate_practice", exc_info=True, error=str(e))
         raise HTTPException(status_code=500, detail="An unexpected error occurred.")
 
 @app.post("/generate-guided-reading-intro")
@@ -529,65 +450,31 @@ async def generate_guided_reading_intro(request: dict):
     Generate a guided reading introduction lesson.
     """
     try:
-        prompt = f"""Create a brief 5-minute guided reading introduction lesson for this story. 
-        The lesson should focus on teaching {request.get('skill')}.
-
-        Story Title: {request.get('title')}
-        Story Content: {request.get('content')}
-
-        Format the response in markdown:
-        ### 5-Minute Introduction Lesson: {request.get('skill')}
-
-        **Objective:**
-        [What students will learn about {request.get('skill')}]
-
-        **Introduction (1-2 minutes):**
-        - [How to introduce the concept]
-        - [Key points to emphasize]
-
-        **Modeling (2-3 minutes):**
-        1. [Step-by-step demonstration]
-        2. [Examples from the text]
-        3. [Think-aloud points]
-
-        **Guided Practice (1-2 minutes):**
-        - [How students will practice]
-        - [What to look for]
-
-        **Teacher Notes:**
-        - [Important reminders]
-        - [Common misconceptions]
-        - [Support strategies]"""
-
         try:
-            client = OpenAI(api_key=openai_api_key)
-            response = client.chat.completions.create(
+            response = await open_text_stream(
+                "generate_guided_reading_intro",
                 model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are an expert reading teacher creating focused, practical guided reading lessons."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=render_prompt("guided_reading_intro", skill=request.get('skill'),
+                                       title=request.get('title'), content=request.get('content')),
                 temperature=0.7,
-                stream=True
+                regenerate=request.get('regenerate', False)
             )
             
             async def generate():
                 intro_text = ""
-                for chunk in response:
-                    if chunk.choices[0].delta.content is not None:
-                        content = chunk.choices[0].delta.content
-                        intro_text += content
-                        yield f"data: {json.dumps({'content': content})}\n\n"
+                async for content in response:
+                    intro_text += content
+                    yield f"data: {json.dumps({'content': content})}\n\n"
                 yield f"data: {json.dumps({'type': 'complete', 'content': intro_text})}\n\n"
 
             return StreamingResponse(generate(), media_type='text/event-stream')
 
         except Exception as api_error:
-            print(f"OpenAI API error: {str(api_error)}")
+            log.error("upstream_failed", route="generate_guided_reading_intro", error=str(api_error))
             raise
 
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        log.error("route_failed", route="generate_guided_reading_intro", exc_info=True, error=str(e))
         raise HTTPException(status_code=500, detail="An unexpected error occurred.")
 
 @app.post("/generate-exit-ticket")
@@ -596,55 +483,28 @@ async def generate_exit_ticket(request: dict):
     Generate an exit ticket for lesson assessment.
     """
     try:
-        prompt = f"""Create a brief exit ticket assessment for {request.get('skill')}.
-
-        Format the response in markdown:
-        ### Exit Ticket: {request.get('skill')}
-
-        **Learning Target Check:**
-        [Brief statement of what students should have learned]
-
-        **Questions:**
-        1. [First question about {request.get('skill')}]
-        2. [Second question about {request.get('skill')}]
-        3. [Quick application task]
-
-        **Success Criteria:**
-        - [What a complete answer looks like]
-        - [Key points students should include]
-
-        **Teacher Notes:**
-        - [What to look for in responses]
-        - [Common misconceptions to address]
-        - [Next steps based on responses]"""
-
         try:
-            client = OpenAI(api_key=openai_api_key)
-            response = client.chat.completions.create(
+            response = await open_text_stream(
+                "generate_exit_ticket",
                 model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are an expert at creating focused assessment tools for checking student understanding."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=render_prompt("exit_ticket", skill=request.get('skill')),
                 temperature=0.7,
-                stream=True
+                regenerate=request.get('regenerate', False)
             )
             
             async def generate():
                 ticket_text = ""
-                for chunk in response:
-                    if chunk.choices[0].delta.content is not None:
-                        content = chunk.choices[0].delta.content
-                        ticket_text += content
-                        yield f"data: {json.dumps({'content': content})}\n\n"
+                async for content in response:
+                    ticket_text += content
+                    yield f"data: {json.dumps({'content': content})}\n\n"
                 yield f"data: {json.dumps({'type': 'complete', 'content': ticket_text})}\n\n"
 
             return StreamingResponse(generate(), media_type='text/event-stream')
 
         except Exception as api_error:
-            print(f"OpenAI API error: {str(api_error)}")
+            log.error("upstream_failed", route="generate_exit_ticket", error=str(api_error))
             raise
 
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        log.error("route_failed", route="generate_exit_ticket", exc_info=True, error=str(e))
         raise HTTPException(status_code=500, detail="An unexpected error occurred.")
@@ -0,0 +1,176 @@
+"""
+Prometheus-style metrics for the upstream OpenAI requests.
+
+GET /metrics on app.py, asgi_app.py and main.py serves these in the
+Prometheus text exposition format, labelled by endpoint and model:
+  - request latency, scheduler queue time and time to first token;
+  - the mean gap between streamed deltas and completion tokens per second;
+  - prompt, completion and cached prompt tokens per request;
+  - upstream errors by exception type, and the streams open right now.
+
+The completion helpers record each request once, when it finishes, from
+timings and usage they already track. Nothing is added per streamed chunk.
+Requests served from the generation cache never reach upstream and are not
+counted.
+"""
+
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import METRICS_SETTINGS
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: List[float]):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = sorted(buckets)
+        self.series: Dict[Labels, list] = {}  # labels -> [bucket counts, sum, count]
+
+    def observe(self, labels: Labels, value: float) -> None:
+        series = self.series.setdefault(labels, [[0] * len(self.buckets), 0.0, 0])
+        position = bisect.bisect_left(self.buckets, value)
+        if position < len(self.buckets):
+            series[0][position] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, kind: str = "counter"):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.series: Dict[Labels, float] = {}
+
+    def add(self, labels: Labels, amount: float = 1) -> None:
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(self.series.items()):
+            lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class UpstreamMetrics:
+    """
+    Histograms, counters and gauges for upstream requests, per endpoint and model.
+    """
+
+    def __init__(self, settings: dict):
+        self._lock = threading.Lock()
+        self.latency = Histogram("teachai_upstream_request_seconds",
+                                 "Upstream request duration, to the last token for streams.",
+                                 settings["latency_buckets"])
+        self.queue = Histogram("teachai_upstream_queue_seconds",
+                               "Time waiting for the upstream scheduler before the request was sent.",
+                               settings["queue_buckets"])
+        self.ttft = Histogram("teachai_time_to_first_token_seconds",
+                              "Time from sending a streamed request to its first token.",
+                              settings["ttft_buckets"])
+        self.gap = Histogram("teachai_inter_token_gap_seconds",
+                             "Mean time between streamed deltas, one observation per stream.",
+                             settings["gap_buckets"])
+        self.rate = Histogram("teachai_completion_tokens_per_second",
+                              "Completion tokens per second after the first token of a stream.",
+                              settings["rate_buckets"])
+        self.prompt_tokens = Histogram("teachai_prompt_tokens", "Prompt tokens per request.",
+                                       settings["token_buckets"])
+        self.completion_tokens = Histogram("teachai_completion_tokens", "Completion tokens per request.",
+                                           settings["token_buckets"])
+        self.cached_tokens = Histogram("teachai_cached_prompt_tokens", "Prompt tokens served from the prompt cache.",
+                                       settings["token_buckets"])
+        self.errors = Counter("teachai_upstream_errors_total", "Failed upstream requests by exception type.")
+        self.active = Counter("teachai_active_streams", "Upstream streams currently open.", kind="gauge")
+
+    @staticmethod
+    def _labels(endpoint: str, model: str) -> Labels:
+        return (("endpoint", endpoint), ("model", model))
+
+    def stream_opened(self, endpoint: str, model: str) -> None:
+        with self._lock:
+            self.active.add(self._labels(endpoint, model), 1)
+
+    def stream_closed(self, endpoint: str, model: str) -> None:
+        with self._lock:
+            self.active.add(self._labels(endpoint, model), -1)
+
+    def record_error(self, endpoint: str, model: str, error: BaseException) -> None:
+        labels = self._labels(endpoint, model) + (("error", type(error).__name__),)
+        with self._lock:
+            self.errors.add(labels)
+
+    def record(self, endpoint: str, model: str, ticket, started: float, usage=None,
+               first_token: Optional[float] = None, deltas: int = 0, finished: bool = True) -> None:
+        """
+        Record one upstream request when it ends.
+
+        `started` is the perf_counter() time the request was sent and
+        `first_token` the seconds from then to the first streamed token.
+        Latency and throughput are left out for streams that did not finish
+        (client disconnects and errors), whose durations would be cut short.
+        """
+        elapsed = time.perf_counter() - started
+        labels = self._labels(endpoint, model)
+        with self._lock:
+            if ticket is not None and ticket.granted_at is not None:
+                self.queue.observe(labels, ticket.granted_at - ticket.enqueued_at)
+            if first_token is not None:
+                self.ttft.observe(labels, first_token)
+            if usage is not None:
+                details = getattr(usage, "prompt_tokens_details", None)
+                self.prompt_tokens.observe(labels, getattr(usage, "prompt_tokens", 0) or 0)
+                self.completion_tokens.observe(labels, getattr(usage, "completion_tokens", 0) or 0)
+                self.cached_tokens.observe(labels, (getattr(details, "cached_tokens", None) or 0) if details else 0)
+            if not finished:
+                return
+            self.latency.observe(labels, elapsed)
+            if first_token is None:
+                return
+            generating = elapsed - first_token
+            if deltas > 1:
+                self.gap.observe(labels, generating / (deltas - 1))
+            completion = getattr(usage, "completion_tokens", None) if usage is not None else None
+            if completion and generating > 0:
+                self.rate.observe(labels, completion / generating)
+
+    def render(self) -> str:
+        metrics = [self.latency, self.queue, self.ttft, self.gap, self.rate,
+                   self.prompt_tokens, self.completion_tokens, self.cached_tokens, self.errors, self.active]
+        with self._lock:
+            lines = [line for metric in metrics for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+
+upstream_metrics = UpstreamMetrics(METRICS_SETTINGS)
+
+# Content type of the Prometheus text exposition format
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
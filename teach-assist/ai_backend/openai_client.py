@@ -0,0 +1,94 @@
+"""
+Shared OpenAI clients for the AI backend.
+
+Every module gets its client from here: one process-wide OpenAI client for
+the Flask app and helper modules, and one AsyncOpenAI client for main.py, so
+concurrent requests share a connection pool instead of opening one per call.
+Both are built on first use and the openai package itself is only imported
+then, which keeps it out of serverless cold starts that never call OpenAI.
+"""
+
+import os
+import threading
+from typing import TYPE_CHECKING
+
+from config import API_SETTINGS
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+_client = None
+_async_client = None
+_lock = threading.Lock()
+
+
+def get_client() -> "OpenAI":
+    """
+    Return the shared synchronous OpenAI client, creating it on first use.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import httpx
+                from openai import DefaultHttpxClient, OpenAI
+
+                _client = OpenAI(
+                    api_key=os.environ.get("OPENAI_API_KEY"),
+                    timeout=API_SETTINGS["timeout"],
+                    http_client=DefaultHttpxClient(
+                        limits=httpx.Limits(
+                            max_connections=API_SETTINGS["max_connections"],
+                            max_keepalive_connections=API_SETTINGS["max_keepalive_connections"],
+                        )
+                    ),
+                )
+    return _client
+
+
+def set_client(client: "OpenAI") -> None:
+    """
+    Replace the shared synchronous client, e.g. to point tests at a stand-in.
+    """
+    global _client
+    _client = client
+
+
+def get_async_client() -> "AsyncOpenAI":
+    """
+    Return the shared AsyncOpenAI client, creating it on first use.
+    """
+    global _async_client
+    if _async_client is None:
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        _async_client = AsyncOpenAI(
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            timeout=API_SETTINGS["timeout"],
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=API_SETTINGS["max_connections"],
+                    max_keepalive_connections=API_SETTINGS["max_keepalive_connections"],
+                )
+            ),
+        )
+    return _async_client
+
+
+def set_async_client(client: "AsyncOpenAI") -> None:
+    """
+    Replace the shared client, e.g. to point benchmarks at a local stand-in.
+    """
+    global _async_client
+    _async_client = client
+
+
+async def close_async_client() -> None:
+    """
+    Close the shared client and its connection pool.
+    """
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
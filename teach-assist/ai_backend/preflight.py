@@ -0,0 +1,271 @@
+"""
+Preflight stage for chat completion requests.
+
+Before a request is scheduled its messages are minified (indentation from
+triple-quoted prompts, trailing spaces and runs of blank lines are
+removed; code fences and relative indentation are kept so markdown examples
+survive), counted with the model's tokenizer and checked against the
+endpoint's input budget from PREFLIGHT_SETTINGS.
+
+Over-budget prompts rendered from the prompt registry are truncated field by
+field, longest value first, at a paragraph, line or sentence boundary. Other
+prompts, and endpoints where dropping input would silently lose data (roster
+parsing), are rejected with InputTooLarge. Token savings per endpoint are
+reported by GET /preflight/stats.
+
+tiktoken is imported on first use; without it (or without its encoding
+files) token counts fall back to a four-characters-per-token estimate.
+"""
+
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from config import PREFLIGHT_SETTINGS
+from logs import get_logger
+from prompts import PromptMessages
+
+if TYPE_CHECKING:
+    import tiktoken
+
+log = get_logger("preflight")
+
+TRUNCATION_MARKER = "\n[...truncated]"
+
+_encodings: Dict[str, Optional["tiktoken.Encoding"]] = {}
+_encodings_lock = threading.Lock()
+
+
+class InputTooLarge(ValueError):
+    """
+    Raised when a request's input cannot be fit into its endpoint's token budget.
+    """
+
+    def __init__(self, endpoint: str, tokens: int, budget: int):
+        super().__init__(f"Input is too large for {endpoint}: about {tokens} tokens, "
+                         f"the limit is {budget}. Shorten the input or split it into smaller requests.")
+        self.endpoint = endpoint
+        self.tokens = tokens
+        self.budget = budget
+
+
+def get_encoding(model: str) -> Optional["tiktoken.Encoding"]:
+    """
+    Tokenizer for `model`, or None when tiktoken is unavailable.
+    """
+    if model in _encodings:
+        return _encodings[model]
+    with _encodings_lock:
+        if model not in _encodings:
+            try:
+                import tiktoken
+                try:
+                    encoding = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    encoding = tiktoken.get_encoding(PREFLIGHT_SETTINGS["default_encoding"])
+            except Exception as e:
+                log.warning("tokenizer_unavailable", model=model, error=str(e))
+                encoding = None
+            _encodings[model] = encoding
+    return _encodings[model]
+
+
+def count_tokens(text: str, model: str) -> int:
+    encoding = get_encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: List[dict], model: str) -> int:
+    """
+    Input tokens for a chat request, including per-message framing and images.
+    """
+    total = 3  # Every reply is primed with the assistant role
+    for message in messages:
+        total += 4
+        content = message.get("content") or ""
+        if isinstance(content, str):
+            total += count_tokens(content, model)
+            continue
+        for part in content:
+            if part.get("type") == "text":
+                total += count_tokens(part.get("text", ""), model)
+            else:
+                total += PREFLIGHT_SETTINGS["image_tokens"]
+    return total
+
+
+def minify_text(text: str) -> str:
+    """
+    Normalize prompt whitespace without changing the markdown it describes.
+
+    The common indentation of all lines after the first is removed (the first
+    line usually follows the opening quotes), trailing spaces are stripped
+    and runs of blank lines collapse to one. Lines inside code fences keep
+    their relative indentation and blank lines, and tabs are never touched
+    (not even trailing ones, which mark empty last cells) so tab-separated
+    data survives.
+    """
+    lines = text.replace("\r\n", "\n").split("\n")
+    indents = [len(line) - len(line.lstrip(" ")) for line in lines[1:] if line.strip()]
+    indent = min(indents) if indents else 0
+
+    result = []
+    in_fence = False
+    for i, line in enumerate(lines):
+        line = line.lstrip(" ") if i == 0 else line[indent:]
+        if in_fence:
+            result.append(line)
+        else:
+            line = line.rstrip(" ")
+            if line or (result and result[-1]):
+                result.append(line)
+        if line.strip().startswith("```"):
+            in_fence = not in_fence
+    return "\n".join(result).strip("\n")
+
+
+def minify_messages(messages: List[dict]) -> List[dict]:
+    minified = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            message = dict(message, content=minify_text(content))
+        elif isinstance(content, list):
+            message = dict(message, content=[
+                dict(part, text=minify_text(part["text"])) if part.get("type") == "text" else part
+                for part in content
+            ])
+        minified.append(message)
+    if isinstance(messages, PromptMessages):
+        return PromptMessages(minified, messages.template, messages.values)
+    return minified
+
+
+def truncate_text(text: str, max_tokens: int, model: str) -> str:
+    """
+    Cut `text` to about `max_tokens`, ending at a paragraph, line or sentence break when one is near.
+    """
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    max_tokens = max(0, max_tokens - count_tokens(TRUNCATION_MARKER, model))
+    encoding = get_encoding(model)
+    if encoding is None:
+        cut = text[:max_tokens * 4]
+    else:
+        cut = encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+    for separator in ("\n\n", "\n", ". "):
+        position = cut.rfind(separator)
+        # Only back off to a boundary if it keeps most of the allowed text
+        if position >= len(cut) * 0.8:
+            cut = cut[:position + 1]
+            break
+    return cut.rstrip() + TRUNCATION_MARKER
+
+
+def max_input_tokens(endpoint: str) -> int:
+    return PREFLIGHT_SETTINGS["max_input_tokens"].get(endpoint, PREFLIGHT_SETTINGS["default_max_input_tokens"])
+
+
+def fit_to_budget(endpoint: str, messages: List[dict], model: str, tokens: int, budget: int):
+    """
+    Truncate the longest per-request values of a registry prompt until it fits.
+
+    Returns (messages, tokens); raises InputTooLarge if it cannot be made to fit.
+    """
+    if endpoint in PREFLIGHT_SETTINGS["reject_over_budget"] or not isinstance(messages, PromptMessages):
+        raise InputTooLarge(endpoint, tokens, budget)
+
+    template = messages.template
+    values = dict(messages.values)
+    fields = [field for field, value in values.items()
+              if isinstance(value, str) and field not in template.variants]
+    while tokens > budget and fields:
+        field = max(fields, key=lambda name: len(values[name]))
+        fields.remove(field)
+        field_tokens = count_tokens(values[field], model)
+        values[field] = truncate_text(values[field], field_tokens - (tokens - budget), model)
+        messages = minify_messages(template.render(**values))
+        tokens = count_message_tokens(messages, model)
+    if tokens > budget:
+        raise InputTooLarge(endpoint, tokens, budget)
+    return messages, tokens
+
+
+class PreflightStats:
+    """
+    Token savings and budget outcomes per endpoint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, dict] = {}
+
+    def record(self, endpoint: str, raw_tokens: int, sent_tokens: int, elapsed: float,
+               truncated: bool = False, rejected: bool = False) -> None:
+        with self._lock:
+            entry = self._endpoints.setdefault(endpoint, {
+                "requests": 0,
+                "raw_tokens": 0,
+                "sent_tokens": 0,
+                "truncated": 0,
+                "rejected": 0,
+                "preflight_seconds": 0.0,
+            })
+            entry["requests"] += 1
+            entry["raw_tokens"] += raw_tokens
+            entry["sent_tokens"] += sent_tokens
+            entry["truncated"] += 1 if truncated else 0
+            entry["rejected"] += 1 if rejected else 0
+            entry["preflight_seconds"] += elapsed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                endpoint: {
+                    "requests": entry["requests"],
+                    "raw_tokens": entry["raw_tokens"],
+                    "sent_tokens": entry["sent_tokens"],
+                    "saved_tokens": entry["raw_tokens"] - entry["sent_tokens"],
+                    "saved_ratio": round(1 - entry["sent_tokens"] / entry["raw_tokens"], 3)
+                    if entry["raw_tokens"] else 0.0,
+                    "truncated": entry["truncated"],
+                    "rejected": entry["rejected"],
+                    "average_preflight_ms": round(entry["preflight_seconds"] / entry["requests"] * 1000, 2),
+                }
+                for endpoint, entry in self._endpoints.items()
+            }
+
+
+preflight_stats = PreflightStats()
+
+
+def preflight(endpoint: str, messages: List[dict], model: str, record: bool = True) -> List[dict]:
+    """
+    Minify `messages` and enforce the endpoint's input budget.
+
+    Raises InputTooLarge when the request cannot be fit into the budget. Pass
+    `record=False` for validation-only checks so they are not counted twice.
+    """
+    started = time.perf_counter()
+    raw_tokens = count_message_tokens(messages, model)
+    if PREFLIGHT_SETTINGS["minify"]:
+        messages = minify_messages(messages)
+    tokens = count_message_tokens(messages, model)
+
+    budget = max_input_tokens(endpoint)
+    truncated = tokens > budget
+    if truncated:
+        try:
+            messages, tokens = fit_to_budget(endpoint, messages, model, tokens, budget)
+        except InputTooLarge:
+            if record:
+                preflight_stats.record(endpoint, 0, 0, time.perf_counter() - started, rejected=True)
+            raise
+        log.info("input_truncated", endpoint=endpoint, tokens=tokens, budget=budget)
+
+    if record:
+        preflight_stats.record(endpoint, raw_tokens, tokens, time.perf_counter() - started, truncated=truncated)
+    return messages
@@ -0,0 +1,306 @@
+"""
+Opt-in sampling profiler for single AI requests.
+
+A request is profiled if its X-Profile header carries
+PROFILE_SETTINGS["token"], or at random at PROFILE_SETTINGS["sample_rate"].
+Only routes under PROFILE_SETTINGS["paths"] are eligible. While the request
+runs, including its streaming generator, a background thread samples the
+stacks of the threads doing its work every PROFILE_SETTINGS["interval"]
+seconds: the thread that serves it, plus the worker threads it starts.
+The active profile is carried in a context variable, and the resumable
+stream and single-flight workers register their threads on it (see
+profiled_thread), so generation and the upstream read are sampled where
+they actually run.
+
+When the request ends, the stacks are written as a folded-stack file, one
+"frame;frame;frame count" line per distinct stack. flamegraph.pl, inferno
+and speedscope all read this format. A summary splits the wall time into
+the CPU time of the request's threads and its off-CPU time. Off-CPU time is
+mostly time spent waiting on the upstream stream, with the share of samples
+parked in socket, SSL or selector reads reported alongside.
+
+The response carries an X-Profile-Id header. GET /profiles and
+GET /profiles/<id> return the summaries and folded stacks to callers that
+send the token.
+
+In Flask each profile covers its request alone. A coalesced upstream stream
+is sampled in the profile of the request that started it. In the ASGI apps
+the event loop thread is sampled, so on a busy worker a profile also
+includes the requests running alongside it. Vercel serves one request per
+instance, so there it does not.
+"""
+
+import collections
+import contextlib
+import contextvars
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+from config import PROFILE_SETTINGS
+from logs import get_logger
+
+log = get_logger("profiling")
+
+# Innermost frames in these files mean the thread is blocked, not computing
+WAITING_FILES = {"selectors.py", "socket.py", "ssl.py", "threading.py", "queue.py"}
+
+PROFILE_HEADER = "X-Profile"
+
+# The profile of the request being served, inherited by the work it starts
+_current_profile = contextvars.ContextVar("request_profile", default=None)
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def thread_cpu_clock(thread_id: int) -> Optional[int]:
+    try:
+        return time.pthread_getcpuclockid(thread_id)
+    except (AttributeError, OSError):
+        return None
+
+
+class RequestProfile:
+    """
+    Stack samples and timings of one profiled request.
+    """
+
+    def __init__(self, route: str, thread_id: int):
+        self.id = uuid.uuid4().hex[:12]
+        self.route = route
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.waiting_samples = 0
+        self.ticks = 0
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.summary = None
+        self._lock = threading.Lock()
+        # Thread id -> (CPU clock, its reading when the thread joined)
+        self._threads: Dict[int, tuple] = {}
+        self._thread_count = 0
+        self._cpu = 0.0
+        self._cpu_known = True
+        self.add_thread(thread_id)
+
+    def add_thread(self, thread_id: int) -> None:
+        """
+        Sample `thread_id` as part of this request from now on.
+        """
+        clock = thread_cpu_clock(thread_id)
+        started = time.clock_gettime(clock) if clock is not None else None
+        with self._lock:
+            if self.summary is None and thread_id not in self._threads:
+                self._threads[thread_id] = (clock, started)
+                self._thread_count += 1
+
+    def remove_thread(self, thread_id: int) -> None:
+        """
+        Stop sampling `thread_id`, adding the CPU time it spent meanwhile.
+        """
+        with self._lock:
+            entry = self._threads.pop(thread_id, None)
+            if entry is not None:
+                self._add_cpu(entry)
+
+    def _add_cpu(self, entry: tuple) -> None:
+        # Called with the lock held, on or before the thread exits
+        clock, started = entry
+        try:
+            self._cpu += time.clock_gettime(clock) - started
+        except (TypeError, OSError):
+            self._cpu_known = False
+
+    def sample(self, frames: dict) -> None:
+        with self._lock:
+            thread_ids = list(self._threads)
+        self.ticks += 1
+        for thread_id in thread_ids:
+            frame = frames.get(thread_id)
+            if frame is not None:
+                self.add(frame)
+
+    def add(self, frame) -> None:
+        names = []
+        innermost = frame
+        while frame is not None and len(names) < 200:
+            names.append(frame_name(frame))
+            frame = frame.f_back
+        self.stacks[";".join(reversed(names))] += 1
+        self.samples += 1
+        if os.path.basename(innermost.f_code.co_filename) in WAITING_FILES \
+                or "_backends" in innermost.f_code.co_filename:
+            self.waiting_samples += 1
+
+    def finish(self) -> dict:
+        wall = time.perf_counter() - self.started
+        with self._lock:
+            for entry in self._threads.values():
+                self._add_cpu(entry)
+            self._threads.clear()
+            cpu = self._cpu if self._cpu_known else None
+        if cpu is None:
+            # Without per-thread CPU clocks, estimate from the samples
+            running = self.samples - self.waiting_samples
+            cpu = wall * running / self.ticks if self.ticks else 0.0
+        cpu = min(cpu, wall)
+        self.summary = {
+            "id": self.id,
+            "route": self.route,
+            "started_at": round(self.started_at, 3),
+            "wall_ms": round(wall * 1000, 1),
+            "cpu_ms": round(cpu * 1000, 1),
+            "off_cpu_ms": round((wall - cpu) * 1000, 1),
+            "samples": self.samples,
+            "waiting_samples": self.waiting_samples,
+            "threads": self._thread_count,
+            "flamegraph": os.path.join(PROFILE_SETTINGS["dir"], f"{self.id}.folded"),
+        }
+        return self.summary
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Profiler:
+    """
+    Starts and stops request profiles and runs the shared sampling thread.
+    """
+
+    def __init__(self, settings: dict):
+        self.settings = settings
+        self._lock = threading.Lock()
+        self._active: Dict[str, RequestProfile] = {}
+        self._finished = collections.OrderedDict()
+        self._sampler = None
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return bool(self.settings["token"]) and token == self.settings["token"]
+
+    def should_profile(self, path: str, token: Optional[str]) -> bool:
+        if not any(path.startswith(prefix) for prefix in self.settings["paths"]):
+            return False
+        return self.authorized(token) or random.random() < self.settings["sample_rate"]
+
+    def start(self, route: str) -> RequestProfile:
+        """
+        Profile the calling thread, and the worker threads that join the
+        profile from its context, until stop() is called.
+        """
+        profile = RequestProfile(route, threading.get_ident())
+        _current_profile.set(profile)
+        with self._lock:
+            self._active[profile.id] = profile
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._sample, name="request-profiler", daemon=True)
+                self._sampler.start()
+        return profile
+
+    def stop(self, profile: RequestProfile) -> None:
+        if _current_profile.get() is profile:
+            _current_profile.set(None)
+        with self._lock:
+            if self._active.pop(profile.id, None) is None:
+                return
+        summary = profile.finish()
+        try:
+            os.makedirs(self.settings["dir"], exist_ok=True)
+            with open(summary["flamegraph"], "w") as f:
+                f.write(profile.folded())
+        except OSError as e:
+            log.error("profile_write_failed", profile_id=profile.id, error=str(e))
+        log.debug("request_profiled", profile_id=profile.id, route=profile.route, wall_ms=summary["wall_ms"],
+                  cpu_ms=summary["cpu_ms"], off_cpu_ms=summary["off_cpu_ms"], samples=summary["samples"],
+                  flamegraph=summary["flamegraph"])
+        with self._lock:
+            self._finished[profile.id] = profile
+            while len(self._finished) > self.settings["keep"]:
+                _, dropped = self._finished.popitem(last=False)
+                try:
+                    os.remove(dropped.summary["flamegraph"])
+                except OSError:
+                    pass
+
+    def _sample(self) -> None:
+        while True:
+            with self._lock:
+                active = list(self._active.values())
+                if not active:
+                    self._sampler = None
+                    return
+            frames = sys._current_frames()
+            for profile in active:
+                profile.sample(frames)
+            del frames
+            time.sleep(self.settings["interval"])
+
+    def summaries(self) -> list:
+        with self._lock:
+            return [profile.summary for profile in reversed(self._finished.values())]
+
+    def folded(self, profile_id: str) -> Optional[str]:
+        with self._lock:
+            profile = self._finished.get(profile_id)
+        return profile.folded() if profile else None
+
+
+profiler = Profiler(PROFILE_SETTINGS)
+
+
+@contextlib.contextmanager
+def profiled_thread():
+    """
+    Sample the calling thread in the current request's profile, if there is
+    one, while the block runs. Worker threads started with the request's
+    context run their work inside this.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    thread_id = threading.get_ident()
+    profile.add_thread(thread_id)
+    try:
+        yield
+    finally:
+        profile.remove_thread(thread_id)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles selected requests until their response body is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        token = headers.get(PROFILE_HEADER.lower().encode(), b"").decode() or None
+        if not profiler.should_profile(scope["path"], token):
+            await self.app(scope, receive, send)
+            return
+
+        profile = profiler.start(scope["path"])
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers") or []) + [
+                    (b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.stop(profile)
@@ -0,0 +1,973 @@
+"""
+Versioned prompt registry.
+
+OpenAI caches long prompt prefixes automatically, but only when the start of
+the prompt is byte-identical across requests. Templates here are therefore
+laid out static-first: the system message and the instruction block never
+contain per-request values, variant blocks are chosen from a small fixed set
+(for example by reading-level category), and the per-request values (topic,
+story content, reading level) are formatted into a final request block.
+
+Each template keeps its earlier versions. Version 1 is the wording the
+routes used before the registry, rendered from the same values as the latest
+version, so a route's prompt can be pinned back to it through
+PROMPT_SETTINGS["pinned"] (the PROMPT_VERSIONS environment variable) or
+rendered with `render_prompt(name, version=...)`. Templates whose wording
+never changed have only a version 1.
+
+Every rendered prompt carries its template ID (`name@version`), and the
+completion helpers record the `cached_tokens` reported in response usage
+against it, so prefix-hit rates and their latency effect can be read from
+GET /prompts/stats, and two versions can be compared by running each in turn
+(for example with benchmarks/model_eval.py).
+"""
+
+import string
+import threading
+from typing import Callable, Dict, List, Optional
+
+from config import PROMPT_SETTINGS
+
+_formatter = string.Formatter()
+
+
+def template_fields(text: str) -> List[str]:
+    return [field for _, field, _, _ in _formatter.parse(text) if field is not None]
+
+
+class PromptMessages(list):
+    """
+    Chat messages rendered from a template, tagged with the template and the
+    values they were rendered with.
+    """
+
+    def __init__(self, messages: List[dict], template: "PromptTemplate", values: dict):
+        super().__init__(messages)
+        self.template = template
+        self.values = values
+
+    @property
+    def template_id(self) -> str:
+        return self.template.id
+
+
+class PromptTemplate:
+    """
+    A versioned prompt whose static text always precedes per-request values.
+
+    `system` and `instructions` must be static. `variants` maps a value name
+    to the static blocks it selects between (an empty block is left out), and
+    `request` is the only part formatted with per-request values. `derive`
+    computes further request values from the given ones, for wording that
+    needs values the callers do not pass.
+    """
+
+    def __init__(self, name: str, version: int, system: str, request: str,
+                 instructions: str = "", variants: Optional[Dict[str, Dict[object, str]]] = None,
+                 derive: Optional[Callable[[dict], dict]] = None):
+        self.name = name
+        self.version = version
+        self.system = system
+        self.instructions = instructions
+        self.variants = variants or {}
+        self.request = request
+        self.derive = derive
+
+        static_blocks = [system, instructions] + [text for options in self.variants.values() for text in options.values()]
+        for block in static_blocks:
+            if template_fields(block):
+                raise ValueError(f"Prompt '{self.id}' has per-request fields in a static block")
+        self.fields = set(template_fields(request)) | set(self.variants)
+
+    @property
+    def id(self) -> str:
+        return f"{self.name}@{self.version}"
+
+    def render(self, **values) -> PromptMessages:
+        given = values
+        if self.derive is not None:
+            try:
+                values = dict(values, **self.derive(values))
+            except KeyError as e:
+                raise ValueError(f"Prompt '{self.id}' is missing values: {e.args[0]}")
+        missing = self.fields - set(values)
+        if missing:
+            raise ValueError(f"Prompt '{self.id}' is missing values: {', '.join(sorted(missing))}")
+
+        blocks = [self.instructions] if self.instructions else []
+        for field, options in self.variants.items():
+            if values[field] not in options:
+                raise ValueError(f"Prompt '{self.id}' has no {field} variant '{values[field]}'")
+            blocks.append(options[values[field]])
+        blocks.append(self.request.format(**values))
+
+        return PromptMessages([
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": "\n\n".join(block for block in blocks if block)},
+        ], self, given)
+
+
+# Every registered version of each template, and the version each name renders
+PROMPT_VERSIONS: Dict[str, Dict[int, PromptTemplate]] = {}
+PROMPTS: Dict[str, PromptTemplate] = {}
+
+
+def register_prompt(template: PromptTemplate) -> PromptTemplate:
+    """
+    Add a template version. A name renders its PROMPT_SETTINGS["pinned"]
+    version when one is set, and its highest registered version otherwise.
+    """
+    versions = PROMPT_VERSIONS.setdefault(template.name, {})
+    versions[template.version] = template
+    pinned = PROMPT_SETTINGS["pinned"].get(template.name)
+    PROMPTS[template.name] = versions.get(pinned) or versions[max(versions)]
+    return template
+
+
+def render_prompt(name: str, version: Optional[int] = None, **values) -> PromptMessages:
+    """
+    Render the active version of a template, or the given `version` of it.
+    """
+    if version is None:
+        return PROMPTS[name].render(**values)
+    if version not in PROMPT_VERSIONS[name]:
+        raise ValueError(f"Prompt '{name}' has no version {version}")
+    return PROMPT_VERSIONS[name][version].render(**values)
+
+
+class PromptStats:
+    """
+    Prompt-prefix cache hits and latency per template version.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._templates: Dict[str, dict] = {}
+
+    def record(self, messages, usage, latency: Optional[float] = None) -> None:
+        """
+        Record one upstream response for the template `messages` were rendered from.
+
+        `latency` is the time to the first token (streams) or to the response.
+        """
+        template_id = getattr(messages, "template_id", None)
+        if template_id is None or usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", None) or 0) if details else 0
+        with self._lock:
+            entry = self._templates.setdefault(template_id, {
+                "requests": 0,
+                "prompt_tokens": 0,
+                "cached_tokens": 0,
+                "prefix_hits": 0,
+                "hit_latency": [0.0, 0],
+                "miss_latency": [0.0, 0],
+            })
+            entry["requests"] += 1
+            entry["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+            entry["cached_tokens"] += cached
+            entry["prefix_hits"] += 1 if cached else 0
+            if latency is not None:
+                bucket = entry["hit_latency" if cached else "miss_latency"]
+                bucket[0] += latency
+                bucket[1] += 1
+
+    def stats(self) -> dict:
+        def average(bucket):
+            return round(bucket[0] / bucket[1], 3) if bucket[1] else None
+
+        with self._lock:
+            return {
+                template_id: {
+                    "requests": entry["requests"],
+                    "prompt_tokens": entry["prompt_tokens"],
+                    "cached_tokens": entry["cached_tokens"],
+                    "cached_token_ratio": round(entry["cached_tokens"] / entry["prompt_tokens"], 3)
+                    if entry["prompt_tokens"] else 0.0,
+                    "prefix_hit_rate": round(entry["prefix_hits"] / entry["requests"], 3),
+                    "average_latency_hit": average(entry["hit_latency"]),
+                    "average_latency_miss": average(entry["miss_latency"]),
+                }
+                for template_id, entry in self._templates.items()
+            }
+
+
+prompt_stats = PromptStats()
+
+
+# STAAR question and answer key guidance, included only when STAAR questions are requested
+STAAR_QUESTION_GUIDANCE = """After the passage, include 4-5 STAAR-style questions that:
+- Follow the exact STAAR format with specific question stems.
+- Align to Lexile-level readiness and supporting standards.
+- Include a balanced mix of:
+    * Key Ideas and Details (main idea, inference, character analysis)
+    * Author's Purpose and Craft (understanding text structure, point of view, and author's choices)
+    * Integration of Knowledge and Ideas (using evidence, making connections, analyzing information)
+- Use academic and precise vocabulary such as "central idea," "text structure," "according to the passage," and "which sentence."
+- Provide four answer choices (A-D) with plausible distractors representing common misconceptions.
+- Maintain Lexile-level appropriate complexity and align with the reading level specified."""
+
+STAAR_ANSWER_KEY_GUIDANCE = """After the questions, include an answer key section marked with [[ANSWER_KEY_START]] on its own line, followed by:
+- The correct answer for each question (1-5)
+- A detailed explanation for why each answer is correct
+- References to specific text evidence supporting each answer
+- Common misconceptions addressed by the incorrect options
+
+Format as:
+[[ANSWER_KEY_START]]
+Question 1: [Correct Answer Letter]
+Explanation: [Detailed explanation with text evidence]
+
+Question 2: [Correct Answer Letter]
+Explanation: [Detailed explanation with text evidence]
+
+[etc.]"""
+
+GENRE_GUIDANCE = {
+    'Fiction': 'Create a narrative with strong character development, a coherent plot, and vivid sensory details.',
+    'Historical Fiction': 'Blend accurate historical facts with an engaging narrative that brings the past to life.',
+    'Science Fiction': 'Incorporate scientific or technological concepts suitable for the Lexile level, focusing on imagination and curiosity.',
+    'Informational': 'Present factual, well-structured information that clearly explains the topic and provides key details.',
+    'Expository': 'Offer a clear, logical explanation of the topic, supported by relevant facts and examples.',
+    'Persuasive': 'Present a reasoned argument with evidence, guiding readers towards a particular stance or conclusion.'
+}
+
+PASSAGE_V1_TECHNICAL_REQUIREMENTS = {
+    "elementary": """- Maintain an approximate Lexile level of {reading_level}.
+- Use simple and clear language appropriate for this reading level.
+- {paragraph_instructions}
+- Ensure precise organization and a polished tone.
+- Follow standard test passage formatting conventions (e.g., a clear, bold title; well-structured paragraphs).""",
+    "middle": """- Maintain an approximate Lexile level of {reading_level}.
+- Use clear, coherent, and engaging language appropriate for this reading level.
+- {paragraph_instructions}
+- Include descriptive details and logical transitions between ideas.
+- Ensure precise organization, logical progression of ideas, and a polished tone.
+- Follow standard test passage formatting conventions (e.g., a clear, bold title; well-structured paragraphs).""",
+    "high": """- Maintain an approximate Lexile level of {reading_level}.
+- Use sophisticated language that is clear, coherent, and engaging.
+- {paragraph_instructions}
+- Include vivid descriptive details, strong transitions between ideas, and a well-structured narrative or informational flow.
+- Incorporate subtle figurative language, relevant examples, and carefully chosen vocabulary.
+- Ensure precise organization, logical progression of ideas, and a polished tone.
+- Follow standard test passage formatting conventions (e.g., a clear, bold title; well-structured paragraphs).""",
+}
+
+
+def _passage_v1_values(values: dict) -> dict:
+    paragraph_instructions = (f"Include exactly {values['num_paragraphs']} cohesive paragraphs, "
+                              f"each containing approximately {values['word_count']}.")
+    return {
+        "genre_guidance": GENRE_GUIDANCE.get(
+            values["genre"], "Create an engaging passage that effectively addresses the given topic."),
+        "technical_requirements": PASSAGE_V1_TECHNICAL_REQUIREMENTS[values["category"]].format(
+            reading_level=values["reading_level"], paragraph_instructions=paragraph_instructions),
+        "question_guidance": STAAR_QUESTION_GUIDANCE if values["staar_questions"] else "",
+        "answer_key_guidance": STAAR_ANSWER_KEY_GUIDANCE if values["staar_answer_key"] else "",
+    }
+
+
+# Reading passages (app.py /generate-passage)
+register_prompt(PromptTemplate(
+    name="passage",
+    version=1,
+    system="You are an expert in creating Lexile-appropriate reading passages.",
+    derive=_passage_v1_values,
+    request="""Generate a {genre} passage about "{topic}" at a {reading_level} Lexile level.
+The passage should be presented in a standardized {question_style} test format and maintain appropriate complexity for {reading_level} Lexile level readers.
+
+Genre-specific requirements:
+{genre_guidance}
+
+Technical requirements:
+{technical_requirements}
+
+{question_guidance}
+{answer_key_guidance}
+
+Return the content in this exact markdown format:
+
+# **[Title]**
+
+[Passage content with proper paragraphs]
+
+## Questions
+
+1. [Question text]
+   A. [Answer choice]
+   B. [Answer choice]
+   C. [Answer choice]
+   D. [Answer choice]
+
+2. [Question text]
+   A. [Answer choice]
+   B. [Answer choice]
+   C. [Answer choice]
+   D. [Answer choice]
+
+[etc...]
+
+If includeAnswerKey is true, add this section with a special marker:
+[[ANSWER_KEY_START]]
+**Answer Key**
+
+Question 1: [Letter]
+Explanation: [Detailed explanation]
+
+Question 2: [Letter]
+Explanation: [Detailed explanation]
+
+[etc...]""",
+))
+
+register_prompt(PromptTemplate(
+    name="passage",
+    version=2,
+    system="You are an expert in creating Lexile-appropriate reading passages.",
+    instructions="""Write a reading passage presented in a standardized test format. The genre, topic, Lexile level, paragraph count, question style and answer key settings are given at the end of this message.
+
+Genre-specific requirements:
+- Fiction: Create a narrative with strong character development, a coherent plot, and vivid sensory details.
+- Historical Fiction: Blend accurate historical facts with an engaging narrative that brings the past to life.
+- Science Fiction: Incorporate scientific or technological concepts suitable for the Lexile level, focusing on imagination and curiosity.
+- Informational: Present factual, well-structured information that clearly explains the topic and provides key details.
+- Expository: Offer a clear, logical explanation of the topic, supported by relevant facts and examples.
+- Persuasive: Present a reasoned argument with evidence, guiding readers towards a particular stance or conclusion.
+- Any other genre: Create an engaging passage that effectively addresses the given topic.
+
+Return the content in this exact markdown format:
+
+# **[Title]**
+
+[Passage content with proper paragraphs]
+
+## Questions
+
+1. [Question text]
+   A. [Answer choice]
+   B. [Answer choice]
+   C. [Answer choice]
+   D. [Answer choice]
+
+2. [Question text]
+   A. [Answer choice]
+   B. [Answer choice]
+   C. [Answer choice]
+   D. [Answer choice]
+
+[etc...]
+
+Include the Questions section only when questions are requested. If an answer key is requested, add this section with a special marker:
+[[ANSWER_KEY_START]]
+**Answer Key**
+
+Question 1: [Letter]
+Explanation: [Detailed explanation]
+
+Question 2: [Letter]
+Explanation: [Detailed explanation]
+
+[etc...]""",
+    variants={
+        "category": {
+            "elementary": """Technical requirements:
+- Maintain the approximate Lexile level given below.
+- Use simple and clear language appropriate for this reading level.
+- Include exactly the number of cohesive paragraphs given below, each of the given length.
+- Ensure precise organization and a polished tone.
+- Follow standard test passage formatting conventions (e.g., a clear, bold title; well-structured paragraphs).""",
+            "middle": """Technical requirements:
+- Maintain the approximate Lexile level given below.
+- Use clear, coherent, and engaging language appropriate for this reading level.
+- Include exactly the number of cohesive paragraphs given below, each of the given length.
+- Include descriptive details and logical transitions between ideas.
+- Ensure precise organization, logical progression of ideas, and a polished tone.
+- Follow standard test passage formatting conventions (e.g., a clear, bold title; well-structured paragraphs).""",
+            "high": """Technical requirements:
+- Maintain the approximate Lexile level given below.
+- Use sophisticated language that is clear, coherent, and engaging.
+- Include exactly the number of cohesive paragraphs given below, each of the given length.
+- Include vivid descriptive details, strong transitions between ideas, and a well-structured narrative or informational flow.
+- Incorporate subtle figurative language, relevant examples, and carefully chosen vocabulary.
+- Ensure precise organization, logical progression of ideas, and a polished tone.
+- Follow standard test passage formatting conventions (e.g., a clear, bold title; well-structured paragraphs).""",
+        },
+        "staar_questions": {True: STAAR_QUESTION_GUIDANCE, False: ""},
+        "staar_answer_key": {True: STAAR_ANSWER_KEY_GUIDANCE, False: ""},
+    },
+    request="""Generate a {genre} passage about "{topic}" at a {reading_level} Lexile level.
+The passage should be presented in a standardized {question_style} test format and maintain appropriate complexity for {reading_level} Lexile level readers.
+Paragraphs: exactly {num_paragraphs} cohesive paragraphs, each containing approximately {word_count}.
+Questions: {questions}
+Answer key: {answer_key}""",
+))
+
+# Worksheets (app.py /generate-worksheet)
+WORKSHEET_SYSTEM_PROMPT = """You are an expert teacher and educational content creator.
+            Create engaging, grade-appropriate worksheets with clear instructions and exercises.
+            Use proper Markdown formatting for structure and layout.
+
+            For multiple choice questions, use this exact format:
+
+            ## Multiple Choice Questions
+
+            1.        Question text goes here?
+
+                     a)  First choice
+
+                     b)  Second choice
+
+                     c)  Third choice
+
+                     d)  Fourth choice
+
+
+            2.        Next question text?
+
+                     a)  First choice
+
+                     b)  Second choice
+
+                     c)  Third choice
+
+                     d)  Fourth choice
+
+            Note:
+            - Keep number and dot together (no space between them)
+            - Add exactly eight spaces between the dot and the question text
+            - Place each choice on its own line with proper indentation
+            - Add empty line between questions
+            - Add empty line after each choice
+            - Keep consistent spacing throughout
+            - Ensure vertical alignment of choices"""
+
+register_prompt(PromptTemplate(
+    name="worksheet",
+    version=1,
+    system=WORKSHEET_SYSTEM_PROMPT,
+    request="""Create a {worksheet_type} worksheet about: {prompt}
+
+Requirements:
+- Grade Level: {teacher_grade}
+- Type: {worksheet_type}
+- Use Markdown for proper formatting
+- Include clear sections
+- Format for optimal presentation
+- Ensure proper spacing between questions and answers
+
+IMPORTANT: Place the text '[[ANSWER_KEY_START]]' on a new line before starting the answer key section.
+
+Create the worksheet now, using this exact format:
+
+# Worksheet Title
+
+[Worksheet content here...]
+
+[[ANSWER_KEY_START]]
+
+# Answer Key
+
+[Answer key content here...]""",
+))
+
+register_prompt(PromptTemplate(
+    name="worksheet",
+    version=2,
+    system=WORKSHEET_SYSTEM_PROMPT,
+    instructions="""Create a worksheet of the type, topic and grade level given at the end of this message.
+
+Requirements:
+- Use Markdown for proper formatting
+- Include clear sections
+- Format for optimal presentation
+- Ensure proper spacing between questions and answers
+
+IMPORTANT: Place the text '[[ANSWER_KEY_START]]' on a new line before starting the answer key section.
+
+Create the worksheet using this exact format:
+
+# Worksheet Title
+
+[Worksheet content here...]
+
+[[ANSWER_KEY_START]]
+
+# Answer Key
+
+[Answer key content here...]""",
+    request="""Create a {worksheet_type} worksheet about: {prompt}
+
+- Grade Level: {teacher_grade}
+- Type: {worksheet_type}""",
+))
+
+# Exit ticket on the independent practice story (app.py /generate-exit-ticket)
+register_prompt(PromptTemplate(
+    name="practice_exit_ticket",
+    version=1,
+    system="You are an expert at creating effective exit tickets that check student understanding of specific reading skills using practice stories.",
+    request="""Create a quick 2-minute exit ticket activity based on the Independent Practice story that checks students' understanding of {skill}.
+
+Practice Story Title: {practice_title}
+Practice Story Content: {practice_story}
+
+Format the response in markdown:
+### 2-Minute Exit Ticket: Checking Understanding
+
+**Time:** 2 minutes
+
+**Task:**
+Based on the story "{practice_title}", complete the following:
+[Brief task description focusing on {skill}]
+
+**Instructions for Students:**
+1. [First step specifically about the practice story]
+2. [Second step using examples from the practice story]
+
+**Success Criteria:**
+- [What students need to demonstrate about {skill} using the practice story]
+- [How they should use specific examples from the practice story]
+
+**Teacher Note:**
+[What to look for in student responses regarding {skill} and their understanding of the practice story]""",
+))
+
+register_prompt(PromptTemplate(
+    name="practice_exit_ticket",
+    version=2,
+    system="You are an expert at creating effective exit tickets that check student understanding of specific reading skills using practice stories.",
+    instructions="""Create a quick 2-minute exit ticket activity based on the Independent Practice story given at the end of this message that checks students' understanding of the given skill.
+
+Format the response in markdown:
+### 2-Minute Exit Ticket: Checking Understanding
+
+**Time:** 2 minutes
+
+**Task:**
+Based on the story "[Practice Story Title]", complete the following:
+[Brief task description focusing on the skill]
+
+**Instructions for Students:**
+1. [First step specifically about the practice story]
+2. [Second step using examples from the practice story]
+
+**Success Criteria:**
+- [What students need to demonstrate about the skill using the practice story]
+- [How they should use specific examples from the practice story]
+
+**Teacher Note:**
+[What to look for in student responses regarding the skill and their understanding of the practice story]""",
+    request="""Skill: {skill}
+
+Practice Story Title: {practice_title}
+Practice Story Content: {practice_story}""",
+))
+
+# Lesson content (main.py; warm-up, practice and guided reading are shared with app.py)
+register_prompt(PromptTemplate(
+    name="improve_intervention",
+    version=1,
+    system="You are an expert educator helping to improve intervention notes for clarity and effectiveness.",
+    request="""Please improve the following intervention note for clarity and effectiveness:
+
+"{text}\"""",
+))
+
+STORY_SYSTEM_PROMPT = """You are an expert at creating engaging educational stories.
+Follow these rules exactly:
+1. Generate a short, creative title
+2. Add TWO blank lines after the title
+3. Write a single engaging paragraph
+4. Keep the story concise (100-150 words)
+5. Use descriptive language suitable for the target audience
+6. Do not use any markdown headers or formatting
+7. Make sure the story has a clear beginning, middle, and end"""
+
+register_prompt(PromptTemplate(
+    name="story",
+    version=1,
+    system=STORY_SYSTEM_PROMPT,
+    request="""Generate a very short, engaging story based on the following prompt:
+Topic: {topic}
+
+Requirements:
+1. Create a single paragraph story (about 100-150 words)
+2. Make it engaging and age-appropriate
+3. Include a clear beginning, middle, and end
+4. Focus on {topic} without explicitly mentioning it
+5. Use vocabulary appropriate for the target audience
+6. Keep it concise but meaningful
+
+Format:
+[Title]
+
+[Single paragraph story]""",
+))
+
+register_prompt(PromptTemplate(
+    name="story",
+    version=2,
+    system=STORY_SYSTEM_PROMPT,
+    instructions="""Generate a very short, engaging story based on the topic given at the end of this message.
+
+Requirements:
+1. Create a single paragraph story (about 100-150 words)
+2. Make it engaging and age-appropriate
+3. Include a clear beginning, middle, and end
+4. Focus on the topic without explicitly mentioning it
+5. Use vocabulary appropriate for the target audience
+6. Keep it concise but meaningful
+
+Format:
+[Title]
+
+[Single paragraph story]""",
+    request="Topic: {topic}",
+))
+
+register_prompt(PromptTemplate(
+    name="lesson_plan",
+    version=1,
+    system="You are an expert teacher and curriculum developer.",
+    request="""Generate a {lesson_type} lesson plan for grade {grade_level} on the topic: {topic}
+{standards}
+
+Include the following sections:
+### Lesson Overview
+- Grade Level
+- Subject Area
+- Duration
+- Topic
+
+### Learning Objectives
+- What students will know
+- What students will be able to do
+
+### Materials Needed
+- List all required materials
+
+### Lesson Structure
+1. Opening/Hook (5-10 minutes)
+2. Main Activity (20-30 minutes)
+3. Practice/Application (15-20 minutes)
+4. Closure (5-10 minutes)
+
+### Assessment Strategies
+- How you will check for understanding
+- Any specific assessment tasks
+
+### Differentiation Strategies
+- For struggling students
+- For advanced students
+- For ELL students
+
+### Extensions and Homework
+- Additional practice
+- Related assignments
+
+Format the response in clear markdown with appropriate headers and sections.""",
+))
+
+register_prompt(PromptTemplate(
+    name="lesson_plan",
+    version=2,
+    system="You are an expert teacher and curriculum developer.",
+    instructions="""Generate a lesson plan of the type, grade and topic given at the end of this message.
+
+Include the following sections:
+### Lesson Overview
+- Grade Level
+- Subject Area
+- Duration
+- Topic
+
+### Learning Objectives
+- What students will know
+- What students will be able to do
+
+### Materials Needed
+- List all required materials
+
+### Lesson Structure
+1. Opening/Hook (5-10 minutes)
+2. Main Activity (20-30 minutes)
+3. Practice/Application (15-20 minutes)
+4. Closure (5-10 minutes)
+
+### Assessment Strategies
+- How you will check for understanding
+- Any specific assessment tasks
+
+### Differentiation Strategies
+- For struggling students
+- For advanced students
+- For ELL students
+
+### Extensions and Homework
+- Additional practice
+- Related assignments
+
+Format the response in clear markdown with appropriate headers and sections.""",
+    request="""Generate a {lesson_type} lesson plan for grade {grade_level} on the topic: {topic}
+{standards}""",
+))
+
+register_prompt(PromptTemplate(
+    name="warmup",
+    version=1,
+    system="You are an expert at creating engaging warm-up activities for reading lessons.",
+    request="""Create a short 2-3 minute warmup activity on the topic: {topic}{details}
+
+Format the response in clear markdown with these exact sections:
+### Warm-Up Activity: {topic}
+
+**Time:** 2-3 minutes
+
+**Objective:**
+[Brief statement of what students will do]
+
+**Activity Steps:**
+1. [First step]
+2. [Second step]
+3. [Third step]
+
+**Teacher Notes:**
+- [Important points to remember]
+- [What to look for]""",
+))
+
+register_prompt(PromptTemplate(
+    name="warmup",
+    version=2,
+    system="You are an expert at creating engaging warm-up activities for reading lessons.",
+    instructions="""Create a short 2-3 minute warm-up activity on the topic given at the end of this message. If a story is given, the activity should prepare students for reading it.
+
+Format the response in clear markdown with these exact sections:
+### Warm-Up Activity: [Topic]
+
+**Time:** 2-3 minutes
+
+**Objective:**
+[Brief statement of what students will do]
+
+**Activity Steps:**
+1. [First step]
+2. [Second step]
+3. [Third step]
+
+**Teacher Notes:**
+- [Important points to remember]
+- [What to look for]""",
+    request="Topic: {topic}{details}",
+))
+
+ASSESSMENT_SYSTEM_PROMPT = """You are an expert teacher and curriculum developer.
+                    Create detailed, practical, and engaging educational content.
+                    Format your responses in a clear, structured way using markdown:
+                    - Use headers (###) for main sections
+                    - Use bullet points for lists
+                    - Use bold (**) for emphasis
+                    - Break up text into readable paragraphs
+                    - Include numbered steps where appropriate"""
+
+register_prompt(PromptTemplate(
+    name="assessment",
+    version=1,
+    system=ASSESSMENT_SYSTEM_PROMPT,
+    request="""Create a {num_questions}-question assessment for grade {grade_level} on the topic: {topic}
+Include a mix of question types (multiple choice, short answer, etc.) and provide an answer key.""",
+))
+
+register_prompt(PromptTemplate(
+    name="assessment",
+    version=2,
+    system=ASSESSMENT_SYSTEM_PROMPT,
+    instructions="Include a mix of question types (multiple choice, short answer, etc.) and provide an answer key.",
+    request="Create a {num_questions}-question assessment for grade {grade_level} on the topic: {topic}",
+))
+
+register_prompt(PromptTemplate(
+    name="practice",
+    version=1,
+    system="You are an expert at creating educational content and practice activities.",
+    request="""Create a practice activity with a new short story focusing on {skill}.
+
+Format the response in markdown:
+### Independent Practice Story: [Generate an engaging title]
+
+[Write a short story here that demonstrates {skill} - about 100 words]
+
+**Practice Questions:**
+1. [Question specifically about {skill}]
+2. [Another question about {skill}]
+3. [Final question about {skill}]
+
+**Student Instructions:**
+1. Read the story carefully
+2. Think about {skill} as you read
+3. Answer the questions using evidence from the text""",
+))
+
+register_prompt(PromptTemplate(
+    name="practice",
+    version=2,
+    system="You are an expert at creating educational content and practice activities.",
+    instructions="""Create a practice activity with a new short story focusing on the skill given at the end of this message.
+
+Format the response in markdown:
+### Independent Practice Story: [Generate an engaging title]
+
+[Write a short story here that demonstrates the skill - about 100 words]
+
+**Practice Questions:**
+1. [Question specifically about the skill]
+2. [Another question about the skill]
+3. [Final question about the skill]
+
+**Student Instructions:**
+1. Read the story carefully
+2. Think about the skill as you read
+3. Answer the questions using evidence from the text""",
+    request="Skill: {skill}",
+))
+
+register_prompt(PromptTemplate(
+    name="guided_reading_intro",
+    version=1,
+    system="You are an expert reading teacher creating focused, practical guided reading lessons.",
+    request="""Create a brief 5-minute guided reading introduction lesson for this story.
+The lesson should focus on teaching {skill}.
+
+Story Title: {title}
+Story Content: {content}
+
+Format the response in markdown:
+### 5-Minute Introduction Lesson: {skill}
+
+**Objective:**
+[What students will learn about {skill}]
+
+**Introduction (1-2 minutes):**
+- [How to introduce the concept]
+- [Key points to emphasize]
+
+**Modeling (2-3 minutes):**
+1. [Step-by-step demonstration]
+2. [Examples from the text]
+3. [Think-aloud points]
+
+**Guided Practice (1-2 minutes):**
+- [How students will practice]
+- [What to look for]
+
+**Teacher Notes:**
+- [Important reminders]
+- [Common misconceptions]
+- [Support strategies]""",
+))
+
+register_prompt(PromptTemplate(
+    name="guided_reading_intro",
+    version=2,
+    system="You are an expert reading teacher creating focused, practical guided reading lessons.",
+    instructions="""Create a brief 5-minute guided reading introduction lesson for the story given at the end of this message. The lesson should focus on teaching the given skill.
+
+Format the response in markdown:
+### 5-Minute Introduction Lesson: [Skill]
+
+**Objective:**
+[What students will learn about the skill]
+
+**Introduction (1-2 minutes):**
+- [How to introduce the concept]
+- [Key points to emphasize]
+
+**Modeling (2-3 minutes):**
+1. [Step-by-step demonstration]
+2. [Examples from the text]
+3. [Think-aloud points]
+
+**Guided Practice (1-2 minutes):**
+- [How students will practice]
+- [What to look for]
+
+**Teacher Notes:**
+- [Important reminders]
+- [Common misconceptions]
+- [Support strategies]""",
+    request="""Skill: {skill}
+
+Story Title: {title}
+Story Content: {content}""",
+))
+
+register_prompt(PromptTemplate(
+    name="exit_ticket",
+    version=1,
+    system="You are an expert at creating focused assessment tools for checking student understanding.",
+    request="""Create a brief exit ticket assessment for {skill}.
+
+Format the response in markdown:
+### Exit Ticket: {skill}
+
+**Learning Target Check:**
+[Brief statement of what students should have learned]
+
+**Questions:**
+1. [First question about {skill}]
+2. [Second question about {skill}]
+3. [Quick application task]
+
+**Success Criteria:**
+- [What a complete answer looks like]
+- [Key points students should include]
+
+**Teacher Notes:**
+- [What to look for in responses]
+- [Common misconceptions to address]
+- [Next steps based on responses]""",
+))
+
+register_prompt(PromptTemplate(
+    name="exit_ticket",
+    version=2,
+    system="You are an expert at creating focused assessment tools for checking student understanding.",
+    instructions="""Create a brief exit ticket assessment for the skill given at the end of this message.
+
+Format the response in markdown:
+### Exit Ticket: [Skill]
+
+**Learning Target Check:**
+[Brief statement of what students should have learned]
+
+**Questions:**
+1. [First question about the skill]
+2. [Second question about the skill]
+3. [Quick application task]
+
+**Success Criteria:**
+- [What a complete answer looks like]
+- [Key points students should include]
+
+**Teacher Notes:**
+- [What to look for in responses]
+- [Common misconceptions to address]
+- [Next steps based on responses]""",
+    request="Skill: {skill}",
+))
+
+register_prompt(PromptTemplate(
+    name="chat",
+    version=1,
+    system="""You are a helpful teaching assistant with expertise in education.
+        You provide clear, concise, and practical advice to teachers.
+        Focus on being specific and actionable in your responses.
+        Format your responses in a clear, structured way using markdown:
+        - Use headers (###) for main sections
+        - Use bullet points for lists
+        - Use bold (**) for emphasis
+        - Break up text into readable paragraphs
+        - Include numbered steps where appropriate""",
+    request="{message}{context}",
+))
@@ -0,0 +1,294 @@
+"""
+Resumable generation streams.
+
+A resumable route runs its generator in a background thread and appends each
+event, numbered in order, to a bounded ring buffer. Readers follow the buffer
+and send every event with an ID of the form "<stream id>:<seq>": an SSE `id:`
+line, or `streamId`/`seq` fields on NDJSON lines. A client that loses its
+connection sends the last ID it received in a `Last-Event-ID` header and
+gets the missed events replayed, then continues live if the generation is
+still running. Finished streams are kept for RESUME_SETTINGS["ttl"] seconds.
+
+Because the generation outlives the request that started it, a client
+disconnect alone does not stop it. Instead a running stream that has had no
+reader for RESUME_SETTINGS["abandon_after"] seconds is closed, which closes
+the upstream OpenAI response and counts the abort in stream_aborts.
+
+Sync generators (the Flask app) run in a background thread; async ones (the
+ASGI app) run as a task on the event loop, and their readers use afollow()
+and aiter_stream() so waiting for events never blocks the loop.
+"""
+
+import asyncio
+import contextvars
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Callable, Iterable, Iterator, Optional, Tuple, Union
+
+from config import RESUME_SETTINGS
+from logs import get_logger
+from profiling import profiled_thread
+
+log = get_logger("resumable_streams")
+
+
+class ResumeUnavailable(Exception):
+    """
+    Raised when the events after a client's Last-Event-ID are no longer buffered.
+    """
+
+
+class ResumableStream:
+    """
+    Sequence-numbered events of one generation, kept in a ring buffer.
+    """
+
+    def __init__(self, stream_id: str, max_events: int):
+        self.id = stream_id
+        self.events = deque(maxlen=max_events)
+        self.next_seq = 0
+        self.done = False
+        self.updated = time.monotonic()
+        self.readers = 0
+        self.unread_since = self.updated
+        self.task = None
+        self._condition = threading.Condition()
+        self._waiters = []
+
+    def append(self, payload: dict) -> None:
+        with self._condition:
+            self.events.append((self.next_seq, payload))
+            self.next_seq += 1
+            self.updated = time.monotonic()
+            self._notify()
+
+    def finish(self) -> None:
+        with self._condition:
+            self.done = True
+            self.updated = time.monotonic()
+            self._notify()
+
+    def _notify(self) -> None:
+        self._condition.notify_all()
+        for loop, arrived in self._waiters:
+            loop.call_soon_threadsafe(arrived.set)
+        self._waiters.clear()
+
+    def abandoned(self, grace: float) -> bool:
+        """
+        True if nobody has been reading the stream for more than `grace` seconds.
+        """
+        with self._condition:
+            return self.readers == 0 and time.monotonic() - self.unread_since > grace
+
+    def follow(self, last_seq: int = -1) -> Iterator[Tuple[int, dict]]:
+        """
+        Yield (seq, payload) for every event after `last_seq` until the stream ends.
+
+        Raises ResumeUnavailable if some of those events were already evicted.
+        """
+        next_seq = last_seq + 1
+        self._attach()
+        try:
+            while True:
+                with self._condition:
+                    while next_seq >= self.next_seq and not self.done:
+                        self._condition.wait()
+                    pending, finished = self._pending(next_seq, last_seq)
+                for seq, payload in pending:
+                    yield seq, payload
+                    next_seq = seq + 1
+                if finished and next_seq >= self.next_seq:
+                    return
+        finally:
+            self._detach()
+
+    async def afollow(self, last_seq: int = -1) -> AsyncIterator[Tuple[int, dict]]:
+        """
+        follow() for the event loop: waits for new events without blocking it.
+        """
+        next_seq = last_seq + 1
+        loop = asyncio.get_running_loop()
+        self._attach()
+        try:
+            while True:
+                arrived = None
+                with self._condition:
+                    if next_seq >= self.next_seq and not self.done:
+                        arrived = asyncio.Event()
+                        self._waiters.append((loop, arrived))
+                    else:
+                        pending, finished = self._pending(next_seq, last_seq)
+                if arrived is not None:
+                    await arrived.wait()
+                    continue
+                for seq, payload in pending:
+                    yield seq, payload
+                    next_seq = seq + 1
+                if finished and next_seq >= self.next_seq:
+                    return
+        finally:
+            self._detach()
+
+    def _pending(self, next_seq: int, last_seq: int):
+        # Called with the condition held
+        if self.events and next_seq < self.events[0][0]:
+            raise ResumeUnavailable(f"Events after {self.id}:{last_seq} are no longer available")
+        return [event for event in self.events if event[0] >= next_seq], self.done
+
+    def _attach(self) -> None:
+        with self._condition:
+            self.readers += 1
+
+    def _detach(self) -> None:
+        with self._condition:
+            self.readers -= 1
+            if not self.readers:
+                self.unread_since = time.monotonic()
+
+
+class StreamStore:
+    """
+    Registry of recent resumable streams, expired after a TTL.
+    """
+
+    def __init__(self, settings: dict):
+        self.settings = settings
+        self._streams: "OrderedDict[str, ResumableStream]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, events: Union[Iterable[dict], AsyncIterator[dict]]) -> ResumableStream:
+        """
+        Run `events` in a background thread, or as a task on the running event
+        loop if it is an async iterator, buffering everything it yields.
+        """
+        stream = ResumableStream(uuid.uuid4().hex, self.settings["max_events"])
+        with self._lock:
+            self._expire()
+            self._streams[stream.id] = stream
+        if hasattr(events, "__aiter__"):
+            stream.task = asyncio.ensure_future(self._arun(stream, events))
+        else:
+            # The copied context keeps the generation's upstream spans in the request's
+            # trace, and its thread in the request's profile
+            thread = threading.Thread(target=contextvars.copy_context().run, args=(self._run, stream, events),
+                                      daemon=True)
+            thread.start()
+        return stream
+
+    def get(self, stream_id: str) -> Optional[ResumableStream]:
+        with self._lock:
+            self._expire()
+            return self._streams.get(stream_id)
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for stream_id, stream in list(self._streams.items()):
+            if stream.done and now - stream.updated > self.settings["ttl"]:
+                del self._streams[stream_id]
+        # Past the cap, forget the oldest streams first (finished or not)
+        while len(self._streams) >= self.settings["max_streams"]:
+            self._streams.popitem(last=False)
+
+    def _run(self, stream: ResumableStream, events: Iterable[dict]) -> None:
+        events = iter(events)
+        with profiled_thread():
+            try:
+                for payload in events:
+                    stream.append(payload)
+                    if stream.abandoned(self.settings["abandon_after"]):
+                        log.info("stream_abandoned", stream_id=stream.id,
+                                 idle_seconds=self.settings['abandon_after'])
+                        break
+            finally:
+                # Closing the generator closes the upstream completion it is reading
+                if hasattr(events, "close"):
+                    events.close()
+                stream.finish()
+
+    async def _arun(self, stream: ResumableStream, events: AsyncIterator[dict]) -> None:
+        try:
+            async for payload in events:
+                stream.append(payload)
+                if stream.abandoned(self.settings["abandon_after"]):
+                    log.info("stream_abandoned", stream_id=stream.id, idle_seconds=self.settings['abandon_after'])
+                    break
+        finally:
+            if hasattr(events, "aclose"):
+                await events.aclose()
+            stream.finish()
+
+
+stream_store = StreamStore(RESUME_SETTINGS)
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """
+    Split a "<stream id>:<seq>" Last-Event-ID; None if absent or malformed.
+    """
+    if not value or ":" not in value:
+        return None
+    stream_id, _, seq = value.rpartition(":")
+    try:
+        return stream_id, int(seq)
+    except ValueError:
+        return None
+
+
+def encode_event(fmt: str, stream_id: str, seq: int, payload: dict) -> str:
+    """
+    Encode one event as an SSE message or an NDJSON line carrying its ID.
+    """
+    if fmt == "sse":
+        return f"id: {stream_id}:{seq}\ndata: {json.dumps(payload)}\n\n"
+    return json.dumps(dict(payload, streamId=stream_id, seq=seq)) + "\n"
+
+
+def error_event(fmt: str, message: str) -> str:
+    if fmt == "sse":
+        return f"data: {json.dumps({'type': 'error', 'message': message})}\n\n"
+    return json.dumps({"error": message}) + "\n"
+
+
+def iter_stream(fmt: str, stream: ResumableStream, last_seq: int = -1) -> Iterator[str]:
+    """
+    Encoded events of `stream` after `last_seq`.
+    """
+    try:
+        for seq, payload in stream.follow(last_seq):
+            yield encode_event(fmt, stream.id, seq, payload)
+    except ResumeUnavailable as e:
+        yield error_event(fmt, f"{str(e)}; start a new request")
+
+
+async def aiter_stream(fmt: str, stream: ResumableStream, last_seq: int = -1) -> AsyncIterator[str]:
+    """
+    iter_stream() for the event loop.
+    """
+    try:
+        async for seq, payload in stream.afollow(last_seq):
+            yield encode_event(fmt, stream.id, seq, payload)
+    except ResumeUnavailable as e:
+        yield error_event(fmt, f"{str(e)}; start a new request")
+
+
+def resume_or_start(last_event_id: Optional[str],
+                    start: Callable[[], Union[Iterable[dict], AsyncIterator[dict]]]
+                    ) -> Optional[Tuple[ResumableStream, int]]:
+    """
+    The stream named by `last_event_id` and the last seq the client saw, or a
+    new stream running `start()` when no ID was sent. Async routes pass a
+    `start` returning an async iterator and must be on the event loop.
+
+    Returns None when the client asked to resume a stream that has expired.
+    """
+    resume = parse_last_event_id(last_event_id)
+    if resume is None:
+        return stream_store.start(start()), -1
+    stream = stream_store.get(resume[0])
+    if stream is None:
+        return None
+    return stream, resume[1]
@@ -0,0 +1,263 @@
+"""
+Deterministic parsing of structured rosters without calling the model.
+
+Most rosters pasted into /parse-students are CSV or tab-separated SIS
+exports, spreadsheets or fixed-width reports with a header row. When the
+header can be mapped onto the student schema the rows are read locally with
+a streaming reader; anything that does not look structured returns None and
+the caller falls back to LLM extraction.
+
+Every /parse-students student needs a reading level, so a roster without a
+reading-level column is not parsed locally either: it goes to the model,
+which can find the level under a heading the aliases do not know, and rows
+still without one fail validation and reach the repair pass. A blank cell in
+a reading-level column is kept as "" (the teacher left it blank).
+"""
+
+import csv
+import io
+import re
+import zipfile
+from typing import Dict, Iterable, Iterator, List, Optional
+from xml.etree.ElementTree import iterparse
+
+from student_parsing import RosterMerger
+
+FIELD_ALIASES = {
+    "firstName": ["first name", "firstname", "first", "fname", "given name", "student first name",
+                  "first nm", "preferred first name"],
+    "lastName": ["last name", "lastname", "last", "lname", "surname", "family name", "student last name",
+                 "last nm"],
+    "name": ["name", "student name", "student", "full name", "student full name"],
+    "readingLevel": ["reading level", "readinglevel", "reading lvl", "reading", "rdg level", "rdg lvl",
+                     "guided reading level", "gr level", "grl", "f&p level", "fp level", "f&p", "level",
+                     "lexile", "lexile level"],
+    "gradeLevel": ["grade", "grade level", "gradelevel", "grade lvl", "grd", "gr"],
+    "studentId": ["student id", "studentid", "id", "student number", "student #", "student no",
+                  "sis id", "local id", "state id"],
+}
+
+HEADER_ALIASES = {
+    re.sub(r"[^a-z0-9&#]", "", alias): field
+    for field, aliases in FIELD_ALIASES.items()
+    for alias in aliases
+}
+
+DELIMITERS = ["\t", ",", ";", "|"]
+
+# Give up on local parsing if more than this share of rows cannot be read
+MAX_BAD_ROW_RATIO = 0.1
+
+SPREADSHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+
+def normalize_header(cell: str) -> str:
+    return re.sub(r"[^a-z0-9&#]", "", str(cell or "").lower())
+
+
+def map_header(cells: List[str], require_reading_level: bool = True) -> Optional[Dict[str, int]]:
+    """
+    Map header cells onto schema fields; None unless a name (and, when
+    `require_reading_level` is set, a reading level) can be recovered.
+    """
+    columns = {}
+    for index, cell in enumerate(cells):
+        field = HEADER_ALIASES.get(normalize_header(cell))
+        if field and field not in columns:
+            columns[field] = index
+    has_name = ("firstName" in columns and "lastName" in columns) or "name" in columns
+    if not has_name or (require_reading_level and "readingLevel" not in columns):
+        return None
+    return columns
+
+
+def split_full_name(name: str):
+    """
+    Split "Last, First" or "First Last" into (first, last).
+    """
+    name = name.strip()
+    if "," in name:
+        last, first = name.split(",", 1)
+        return first.strip(), last.strip()
+    parts = name.split()
+    if len(parts) < 2:
+        return name, ""
+    return " ".join(parts[:-1]), parts[-1]
+
+
+def students_from_rows(rows: Iterable[Optional[List[str]]], columns: Dict[str, int],
+                       teacher_grade: str, teacher_id: str) -> Optional[List[dict]]:
+    """
+    Convert data rows into student objects, or None if too many rows are unreadable.
+
+    IDs read from the roster are kept; students without one get a stable synthetic ID.
+    """
+    merger = RosterMerger(None, teacher_id)
+    students = []
+    bad_rows = 0
+
+    def cell(row, field):
+        index = columns.get(field)
+        if index is None or index >= len(row):
+            return ""
+        return str(row[index] if row[index] is not None else "").strip()
+
+    for row in rows:
+        if row is None:
+            bad_rows += 1
+            continue
+        if not any(str(value or "").strip() for value in row):
+            continue
+        if "firstName" in columns:
+            first, last = cell(row, "firstName"), cell(row, "lastName")
+        else:
+            first, last = split_full_name(cell(row, "name"))
+        if not first or not last:
+            bad_rows += 1
+            continue
+        students.append(merger.assign_id({
+            "firstName": first,
+            "lastName": last,
+            "studentId": cell(row, "studentId"),
+            "gradeLevel": cell(row, "gradeLevel") or teacher_grade,
+            "readingLevel": cell(row, "readingLevel"),
+            "teacherId": teacher_id,
+            "periodId": None,
+            "groupIds": [],
+            "intervention": "",
+            "interventionResults": "",
+        }))
+
+    if not students or bad_rows > MAX_BAD_ROW_RATIO * (len(students) + bad_rows):
+        return None
+    return students
+
+
+def fixed_width_columns(header: str) -> Optional[List[int]]:
+    """
+    Start offsets of header columns separated by two or more spaces.
+    """
+    starts = [match.start() for match in re.finditer(r"\S+(?: \S+)*", header)]
+    return starts if len(starts) >= 2 else None
+
+
+def iter_fixed_width(lines: Iterable[str], starts: List[int]) -> Iterator[Optional[List[str]]]:
+    bounds = list(zip(starts, starts[1:] + [None]))
+    for line in lines:
+        # A value running across a column boundary means the layout is not fixed-width
+        if any(0 < start <= len(line) and not line[start - 1].isspace() for start in starts[1:]):
+            yield None
+            continue
+        yield [line[start:end] for start, end in bounds]
+
+
+def parse_text_roster(text: str, teacher_grade: str, teacher_id: str, require_reading_level: bool = True):
+    """
+    Parse delimited or fixed-width roster text.
+
+    Returns (format, students), or None if the text is not structured or,
+    when `require_reading_level` is set, has no reading-level column.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    if len(lines) < 2:
+        return None
+    header = lines[0]
+
+    for delimiter in DELIMITERS:
+        if delimiter not in header:
+            continue
+        columns = map_header(next(csv.reader([header], delimiter=delimiter)), require_reading_level)
+        if columns:
+            reader = csv.reader(io.StringIO(text.strip()), delimiter=delimiter)
+            next(reader)
+            students = students_from_rows(reader, columns, teacher_grade, teacher_id)
+            if students:
+                return "tsv" if delimiter == "\t" else "csv", students
+
+    starts = fixed_width_columns(header)
+    if starts:
+        columns = map_header([header[start:end].strip() for start, end in zip(starts, starts[1:] + [None])],
+                             require_reading_level)
+        if columns:
+            students = students_from_rows(iter_fixed_width(lines[1:], starts), columns,
+                                          teacher_grade, teacher_id)
+            if students:
+                return "fixed-width", students
+    return None
+
+
+def column_index(reference: str) -> int:
+    """
+    Zero-based column index of a cell reference such as "AB12".
+    """
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord("A") + 1
+    return index - 1
+
+
+def iter_xlsx_rows(data: bytes) -> Iterator[List[str]]:
+    """
+    Stream the rows of the first worksheet of an XLSX file using only the standard library.
+    """
+    with zipfile.ZipFile(io.BytesIO(data)) as workbook:
+        names = workbook.namelist()
+        shared = []
+        if "xl/sharedStrings.xml" in names:
+            with workbook.open("xl/sharedStrings.xml") as f:
+                for _, element in iterparse(f):
+                    if element.tag == SPREADSHEET_NS + "si":
+                        shared.append("".join(t.text or "" for t in element.iter(SPREADSHEET_NS + "t")))
+                        element.clear()
+
+        sheets = sorted(name for name in names if re.match(r"xl/worksheets/sheet\d+\.xml$", name))
+        if not sheets:
+            raise ValueError("Spreadsheet has no worksheets")
+        sheet = "xl/worksheets/sheet1.xml" if "xl/worksheets/sheet1.xml" in sheets else sheets[0]
+
+        with workbook.open(sheet) as f:
+            for _, element in iterparse(f):
+                if element.tag != SPREADSHEET_NS + "row":
+                    continue
+                row = []
+                for cell in element.iter(SPREADSHEET_NS + "c"):
+                    index = column_index(cell.get("r", "")) if cell.get("r") else len(row)
+                    cell_type = cell.get("t")
+                    if cell_type == "inlineStr":
+                        value = "".join(t.text or "" for t in cell.iter(SPREADSHEET_NS + "t"))
+                    else:
+                        value = cell.findtext(SPREADSHEET_NS + "v") or ""
+                        if cell_type == "s" and value:
+                            value = shared[int(value)]
+                        elif value.endswith(".0"):
+                            value = value[:-2]
+                    row.extend([""] * (index - len(row)))
+                    row.append(value)
+                element.clear()
+                yield row
+
+
+def parse_xlsx_roster(data: bytes, teacher_grade: str, teacher_id: str) -> Optional[List[dict]]:
+    """
+    Parse an uploaded XLSX roster; None if the sheet has no recognizable
+    header or no reading-level column.
+    """
+    rows = iter_xlsx_rows(data)
+    for header in rows:
+        if any(str(cell).strip() for cell in header):
+            break
+    else:
+        return None
+    columns = map_header(header)
+    if not columns:
+        return None
+    return students_from_rows(rows, columns, teacher_grade, teacher_id)
+
+
+def xlsx_to_text(data: bytes) -> str:
+    """
+    Tab-separated text of the first worksheet, for rosters that need LLM extraction.
+    """
+    return "\n".join("\t".join(row) for row in iter_xlsx_rows(data) if any(cell.strip() for cell in row))
@@ -0,0 +1,673 @@
+"""
+Request handling shared by the Flask app (app.py) and its ASGI port (asgi_app.py).
+
+Both apps build the same prompts, parse the same generated content and emit
+the same events, so the two stay interchangeable behind the same client.
+Batch job kinds are registered here, and both apps queue jobs on the one
+batch runner.
+"""
+
+import asyncio
+import contextvars
+import json
+from concurrent.futures import ThreadPoolExecutor
+from config import ENDPOINT_MODELS, API_SETTINGS, BATCH_SETTINGS, CASCADE_SETTINGS, ROSTER_SETTINGS
+from completions import acomplete_text, complete_text
+from logs import get_logger
+from openai_client import get_client
+from prompts import render_prompt
+from student_parsing import (
+    STUDENT_REPAIR_FORMAT,
+    STUDENT_ROSTER_FORMAT,
+    StudentArrayParser,
+    check_image_roster_response,
+    check_roster_response,
+    clean_json_response,
+    image_page_messages,
+    load_element,
+    parse_students_messages,
+    parse_students_response,
+    prepare_image_students,
+    repair_students_messages,
+)
+from batch_jobs import BatchRunner, JobStore, get_batch_client, register_job_kind
+
+log = get_logger("route_helpers")
+
+LEXILE_SPECIFICATIONS = {
+    "BR": {
+        "category": "elementary",
+        "paragraphs": 2,
+        "word_count": "25 to 50 words",
+        "range": "0L to 200L"
+    },
+    "0-200": {
+        "category": "elementary",
+        "paragraphs": 2,
+        "word_count": "25 to 50 words",
+        "range": "0L to 200L"
+    },
+    "200-300": {
+        "category": "elementary",
+        "paragraphs": 2,
+        "word_count": "40 to 70 words",
+        "range": "200L to 300L"
+    },
+    "300-400": {
+        "category": "elementary",
+        "paragraphs": 3,
+        "word_count": "50 to 100 words",
+        "range": "300L to 400L"
+    },
+    "400-500": {
+        "category": "elementary",
+        "paragraphs": 3,
+        "word_count": "60 to 110 words",
+        "range": "400L to 500L"
+    },
+    "500-600": {
+        "category": "elementary",
+        "paragraphs": 4,
+        "word_count": "70 to 120 words",
+        "range": "500L to 600L"
+    },
+    "600-700": {
+        "category": "elementary",
+        "paragraphs": 4,
+        "word_count": "80 to 130 words",
+        "range": "600L to 700L"
+    },
+    "700-800": {
+        "category": "middle",
+        "paragraphs": 5,
+        "word_count": "100 to 200 words",
+        "range": "700L to 800L"
+    },
+    "800-900": {
+        "category": "middle",
+        "paragraphs": 5,
+        "word_count": "100 to 200 words",
+        "range": "800L to 900L"
+    },
+    "900-1000": {
+        "category": "middle",
+        "paragraphs": 5,
+        "word_count": "100 to 200 words",
+        "range": "900L to 1000L"
+    },
+    "1000-1100": {
+        "category": "high",
+        "paragraphs": 6,
+        "word_count": "150 to 250 words",
+        "range": "1000L to 1100L"
+    },
+    "1100-1200": {
+        "category": "high",
+        "paragraphs": 6,
+        "word_count": "150 to 250 words",
+        "range": "1100L to 1200L"
+    }
+}
+
+def passage_messages(topic, reading_level, genre, generate_questions, question_style, include_answer_key):
+    """
+    Build the chat messages for a Lexile-leveled reading passage.
+
+    Raises ValueError for an unsupported reading level.
+    """
+    # Get specifications based on reading level
+    spec = LEXILE_SPECIFICATIONS.get(reading_level)
+    if not spec:
+        raise ValueError(f"Reading level '{reading_level}' is not supported.")
+
+    questions = "None"
+    answer_key = "None"
+    staar_questions = bool(generate_questions) and question_style.upper() == "STAAR"
+    if generate_questions:
+        questions = f"Include 4-5 {question_style.upper()}-style questions after the passage."
+        if include_answer_key:
+            answer_key = "Include the answer key after the questions."
+
+    return render_prompt(
+        "passage",
+        category=spec["category"],
+        genre=genre,
+        topic=topic,
+        reading_level=reading_level,
+        question_style=question_style,
+        num_paragraphs=spec["paragraphs"],
+        word_count=spec["word_count"],
+        questions=questions,
+        answer_key=answer_key,
+        staar_questions=staar_questions,
+        staar_answer_key=staar_questions and bool(include_answer_key),
+    )
+
+def warmup_messages(topic, story_title, story_content):
+    """
+    Build the chat messages for a reading warm-up activity.
+    """
+    return render_prompt("warmup", topic=topic,
+                         details=f"\n\nStory Title: {story_title}\nStory Content: {story_content}")
+
+def story_messages(topic, lexile_level):
+    """
+    Build the chat messages for a short story that subtly teaches a reading skill.
+    """
+    story_prompt = f"""Create a short, engaging paragraph-long story that can be used to teach the reading skill of {topic}. 
+            The story should be at {lexile_level} reading level.
+            
+            Requirements:
+            - One paragraph long (approximately 100-150 words)
+            - Age-appropriate vocabulary at {lexile_level} level
+            - Clear beginning, middle, and end
+            - Story should be designed to naturally demonstrate {topic} without explicitly mentioning it
+            - Vocabulary and sentence structure appropriate for {lexile_level}
+            - Include grade-level appropriate vocabulary
+            - The story should be subtle in teaching the skill - don't mention the skill directly
+            """
+    return [
+        {"role": "system", "content": f"You are an expert at creating engaging stories at {lexile_level} reading level that subtly teach reading skills."},
+        {"role": "user", "content": story_prompt}
+    ]
+
+def story_title_messages(topic, lexile_level, story_text):
+    """
+    Build the chat messages for a title for a generated story.
+    """
+    title_prompt = f"""Create a short, engaging title for this story. The title should:
+            - Be creative and engaging
+            - Not mention {topic} or any teaching aspects
+            - Relate directly to the story's content
+            - Be appropriate for {lexile_level} level
+            - Be memorable and fun
+            
+            Story: {story_text}
+            
+            Return just the title, no quotes or extra text."""
+    return [
+        {"role": "system", "content": "Create engaging, story-specific titles that capture the essence of the story without revealing its teaching purpose."},
+        {"role": "user", "content": title_prompt}
+    ]
+
+def guided_reading_intro_messages(story_title, story_content, reading_skill):
+    """
+    Build the chat messages for a guided reading introduction lesson.
+    """
+    return render_prompt("guided_reading_intro", skill=reading_skill, title=story_title, content=story_content)
+
+def graphic_organizer_messages(story_title, story_content, reading_skill):
+    """
+    Build the chat messages for a printable graphic organizer for a story.
+    """
+    prompt = f"""Create a simple graphic organizer to help students analyze the story and practice {reading_skill} skills.
+
+        Story Title: {story_title}
+        Story Content: {story_content}
+
+        Requirements:
+        - Create a clear, printable graphic organizer format
+        - Focus on {reading_skill} skills
+        - Include 3-4 key elements or sections
+        - Add brief instructions for completing each section
+        - Keep it simple and grade-appropriate
+        - Format it in a way that's easy to understand and use
+        
+        Return the response in this format:
+        TITLE: [Title of graphic organizer]
+        INSTRUCTIONS: [Brief instructions for teachers]
+        
+        SECTIONS:
+        1. [Section name]
+   - [What students should write/do here]
+
+        2. [Section name]
+   - [What students should write/do here]
+
+        [etc...]"""
+
+    return [
+        {"role": "system", "content": "You are an expert at creating educational graphic organizers for reading comprehension."},
+        {"role": "user", "content": prompt}
+    ]
+
+def parse_practice_story(practice_content):
+    """
+    Extract the practice story title and content from the practice markdown.
+    """
+    practice_lines = practice_content.split('\n')
+    practice_title = ''
+    practice_story = ''
+    
+    # Parse the practice content to get title and story
+    in_story = False
+    for line in practice_lines:
+        if line.startswith('### Independent Practice Story:'):
+            practice_title = line.replace('### Independent Practice Story:', '').strip()
+        elif line.startswith('**Practice Questions'):
+            in_story = False
+        elif practice_title and not line.startswith('**') and not line.startswith('#'):
+            if line.strip():
+                practice_story += line.strip() + ' '
+                in_story = True
+
+    return practice_title, practice_story
+
+def exit_ticket_messages(skill, practice_title, practice_story):
+    """
+    Build the chat messages for an exit ticket based on the practice story.
+    """
+    return render_prompt("practice_exit_ticket", skill=skill, practice_title=practice_title,
+                         practice_story=practice_story)
+
+def practice_messages(skill):
+    """
+    Build the chat messages for an independent practice story and questions.
+    """
+    return render_prompt("practice", skill=skill)
+
+def format_bundle_event(component, payload):
+    """
+    Format one lesson bundle SSE event tagged with its component.
+    """
+    return f"event: {component}\ndata: {json.dumps({'component': component, **payload})}\n\n"
+
+def observation_messages(observation, topic):
+    """
+    Build the chat messages that rewrite a teacher's observation professionally.
+    """
+    prompt = f"""Enhance this observation about {topic} to be more specific and professional. 
+        Keep it concise (2-3 sentences) and natural. Focus on the student's understanding of {topic}.
+        Do not include any phrases like 'revised' or 'improved' or anything that indicates AI modification.
+        Simply provide the enhanced observation as if it was written directly by the teacher.
+
+        Original: {observation}
+
+        Guidelines:
+        1. Keep it brief but specific
+        2. Use professional educational language
+        3. Focus on observable behaviors related to {topic}
+        4. Include one clear next step
+        5. Write in a natural teacher's voice
+        6. Do not use any meta-language about the observation being revised or improved
+        """
+
+    return [
+        {"role": "system", "content": "You are writing as the teacher, providing direct observations about students."},
+        {"role": "user", "content": prompt}
+    ]
+
+def clean_observation(improved_observation):
+    """
+    Remove any potential prefixes like "Enhanced:" or "Improved:".
+    """
+    return improved_observation.replace("Enhanced:", "").replace("Improved:", "").strip()
+
+CHAT_SYSTEM_PROMPT = """You are an expert teaching coach and educational consultant with decades of experience. 
+            Your role is to help teachers improve their teaching practice, provide guidance on instructional strategies, 
+            classroom management, lesson planning, and student engagement. You have deep knowledge of:
+
+            1. Pedagogical best practices
+            2. Differentiated instruction
+            3. Assessment strategies
+            4. Classroom management techniques
+            5. Social-emotional learning
+            6. Special education accommodations
+            7. Technology integration
+            8. Professional development
+
+            Provide detailed, practical advice and always explain the reasoning behind your suggestions. 
+            Use markdown formatting to structure your responses with headers, bullet points, and emphasis where appropriate.
+            When relevant, provide specific examples and scenarios to illustrate your points."""
+
+def chat_messages(message):
+    """
+    Build the chat messages for the teaching coach.
+    """
+    return [
+        {
+            "role": "system",
+            "content": CHAT_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": message
+        }
+    ]
+
+def roster_check(roster_text):
+    """
+    Model cascade check for students extracted from `roster_text`.
+    """
+    return lambda content: check_roster_response(content, roster_text, CASCADE_SETTINGS["min_row_coverage"])
+
+def image_roster_check(page):
+    """
+    Model cascade check for students extracted from one image page item.
+    """
+    return lambda content: check_image_roster_response(content, page.get("text"), CASCADE_SETTINGS["min_row_coverage"])
+
+def raw_student(student):
+    # Elements that could not be decoded are kept as their raw text
+    return student if isinstance(student, str) else json.dumps(student)
+
+def map_ordered(func, items, max_workers):
+    """
+    Run `func` over `items` concurrently.
+
+    Yields (index, result, error) in input order; each result is yielded as
+    soon as it and every result before it have finished. Each call runs in
+    a copy of the caller's context, so its upstream requests stay under the
+    route's trace span.
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = [executor.submit(contextvars.copy_context().run, func, item) for item in items]
+    try:
+        for index, future in enumerate(futures):
+            try:
+                yield index, future.result(), None
+            except Exception as e:
+                yield index, None, e
+    finally:
+        # Drop work that has not started if the caller stopped early
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def ordered_student_events(results, prepare_student, merge=None):
+    """
+    NDJSON events for students extracted in parts (roster chunks or image
+    pages), in source order. A part that failed is reported as a chunk_error.
+    """
+    index = 0
+    failed = 0
+    failed_chunks = 0
+    for chunk_index, chunk_students, error in results:
+        if error is not None:
+            failed_chunks += 1
+            yield {"type": "chunk_error", "chunk": chunk_index, "error": str(error)}
+            continue
+        for student in (merge(chunk_students) if merge else chunk_students):
+            try:
+                yield {"type": "student", "index": index, "student": prepare_student(student, index)}
+            except ValueError as e:
+                failed += 1
+                yield {"type": "student_error", "index": index, "error": str(e), "raw": raw_student(student)}
+            index += 1
+    yield {"type": "complete", "count": index - failed, "failed": failed, "failedChunks": failed_chunks}
+
+async def amap_ordered(func, items, max_workers):
+    """
+    map_ordered for a coroutine function, running at most `max_workers` calls at once.
+    """
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def run(item):
+        async with semaphore:
+            return await func(item)
+
+    tasks = [asyncio.ensure_future(run(item)) for item in items]
+    try:
+        for index, task in enumerate(tasks):
+            try:
+                yield index, await task, None
+            except Exception as e:
+                yield index, None, e
+    finally:
+        # Drop work that has not finished if the caller stopped early
+        for task in tasks:
+            task.cancel()
+
+async def aordered_student_events(results, prepare_student, merge=None):
+    """
+    ordered_student_events for results from amap_ordered.
+    """
+    index = 0
+    failed = 0
+    failed_chunks = 0
+    async for chunk_index, chunk_students, error in results:
+        if error is not None:
+            failed_chunks += 1
+            yield {"type": "chunk_error", "chunk": chunk_index, "error": str(error)}
+            continue
+        for student in (merge(chunk_students) if merge else chunk_students):
+            try:
+                yield {"type": "student", "index": index, "student": prepare_student(student, index)}
+            except ValueError as e:
+                failed += 1
+                yield {"type": "student_error", "index": index, "error": str(e), "raw": raw_student(student)}
+            index += 1
+    yield {"type": "complete", "count": index - failed, "failed": failed, "failedChunks": failed_chunks}
+
+def roster_format_params(response_format=STUDENT_ROSTER_FORMAT):
+    """
+    Extra completion parameters for roster extraction requests.
+    """
+    if ROSTER_SETTINGS["structured_output"]:
+        return {"response_format": response_format}
+    return {}
+
+def roster_repairer(roster_text, teacher_grade, teacher_id):
+    """
+    Follow-up request that re-extracts failed records, given as (index, raw
+    JSON text) pairs, from `roster_text`.
+    """
+    def repair(records):
+        return complete_text(
+            get_client(),
+            "parse_students",
+            repair_students_messages(records, roster_text, teacher_grade, teacher_id),
+            temperature=0,
+            teacher_id=teacher_id,
+            **roster_format_params(STUDENT_REPAIR_FORMAT)
+        )
+    return repair
+
+def aroster_repairer(roster_text, teacher_grade, teacher_id):
+    """
+    roster_repairer for the async completion helpers.
+    """
+    async def repair(records):
+        return await acomplete_text(
+            "parse_students",
+            repair_students_messages(records, roster_text, teacher_grade, teacher_id),
+            temperature=0,
+            teacher_id=teacher_id,
+            **roster_format_params(STUDENT_REPAIR_FORMAT)
+        )
+    return repair
+
+def record_index(value):
+    """
+    The roster index a repaired student echoes back, or None if it is not one.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+def repaired_events(failed, content, prepare_student):
+    """
+    Events for the failed rows of one repair request: the repaired student
+    where the follow-up answer has a valid one for that row's index, else the
+    original error.
+
+    Repaired students are matched to rows by the recordIndex they echo, not by
+    their position, so a dropped, merged or reordered answer cannot attach a
+    student to the wrong row; rows with no matching answer stay failed.
+    """
+    repaired = {}
+    if content is not None:
+        parser = StudentArrayParser()
+        try:
+            raws = parser.feed(content) + parser.close()
+        except ValueError:
+            raws = []
+        for raw in raws:
+            try:
+                student = load_element(raw)
+            except ValueError:
+                continue
+            if not isinstance(student, dict):
+                continue
+            index = record_index(student.pop("recordIndex", None))
+            if index is not None:
+                repaired.setdefault(index, student)
+
+    events = []
+    for failed_event in failed:
+        event = failed_event
+        index = failed_event["index"]
+        if index in repaired:
+            try:
+                event = {"type": "student", "index": index,
+                         "student": prepare_student(repaired[index], index), "repaired": True}
+            except ValueError:
+                pass
+        events.append(event)
+    return events
+
+def repair_batches(failed):
+    """
+    Split failed-row events into batches of ROSTER_SETTINGS["repair_batch_rows"].
+    """
+    size = ROSTER_SETTINGS["repair_batch_rows"]
+    return [failed[i:i + size] for i in range(0, len(failed), size)]
+
+def repaired_complete(complete, results):
+    repaired = sum(1 for event in results if event.get("repaired"))
+    return dict(complete, count=complete["count"] + repaired, failed=complete["failed"] - repaired,
+                repaired=repaired)
+
+def repair_student_events(events, repair, prepare_student):
+    """
+    Send student events as they arrive and re-extract the rows that failed.
+
+    Failed rows are held back until the extraction is complete, then sent to
+    `repair(records)` in small batches concurrently; each batch's rows are
+    sent as it completes, repaired ones marked "repaired" and the rest with
+    their original error.
+    """
+    if not ROSTER_SETTINGS["repair_rows"]:
+        yield from events
+        return
+
+    held = []
+    complete = None
+    for event in events:
+        if event["type"] == "student_error":
+            held.append(event)
+        elif event["type"] == "complete":
+            complete = event
+        else:
+            yield event
+
+    def repair_batch(batch):
+        log.info("roster_rows_repairing", rows=len(batch))
+        try:
+            content = repair([(failed_event["index"], failed_event["raw"]) for failed_event in batch])
+        except Exception as e:
+            log.error("roster_repair_failed", rows=len(batch), error=str(e))
+            content = None
+        return repaired_events(batch, content, prepare_student)
+
+    results = []
+    for _, batch_events, _ in map_ordered(repair_batch, repair_batches(held), ROSTER_SETTINGS["max_workers"]):
+        results.extend(batch_events)
+        yield from batch_events
+    if complete is not None:
+        yield repaired_complete(complete, results)
+
+async def arepair_student_events(events, repair, prepare_student):
+    """
+    repair_student_events for async student events and an async `repair`.
+    """
+    if not ROSTER_SETTINGS["repair_rows"]:
+        async for event in events:
+            yield event
+        return
+
+    held = []
+    complete = None
+    async for event in events:
+        if event["type"] == "student_error":
+            held.append(event)
+        elif event["type"] == "complete":
+            complete = event
+        else:
+            yield event
+
+    async def repair_batch(batch):
+        log.info("roster_rows_repairing", rows=len(batch))
+        try:
+            content = await repair([(failed_event["index"], failed_event["raw"]) for failed_event in batch])
+        except Exception as e:
+            log.error("roster_repair_failed", rows=len(batch), error=str(e))
+            content = None
+        return repaired_events(batch, content, prepare_student)
+
+    results = []
+    async for _, batch_events, _ in amap_ordered(repair_batch, repair_batches(held), ROSTER_SETTINGS["max_workers"]):
+        results.extend(batch_events)
+        for event in batch_events:
+            yield event
+    if complete is not None:
+        yield repaired_complete(complete, results)
+
+def collect_students(events):
+    """
+    Students and still-failed rows from student events, in roster order.
+
+    Raises ValueError if a roster chunk failed outright.
+    """
+    students = {}
+    failed_rows = []
+    for event in events:
+        if event["type"] == "chunk_error":
+            raise ValueError(f"Roster chunk {event['chunk'] + 1} failed: {event['error']}")
+        if event["type"] == "student":
+            students[event["index"]] = event["student"]
+        elif event["type"] == "student_error":
+            failed_rows.append({key: event[key] for key in ("index", "error", "raw")})
+    return [students[index] for index in sorted(students)], failed_rows
+
+def _passage_job_messages(item):
+    return passage_messages(
+        item.get('topic'),
+        item.get('reading_level'),
+        item.get('genre', 'Informational'),
+        item.get('generateQuestions', False),
+        item.get('questionStyle', 'STAAR'),
+        item.get('includeAnswerKey', False),
+    )
+
+register_job_kind(
+    'parse_students',
+    endpoint='parse_students',
+    model=ENDPOINT_MODELS['parse_students'],
+    build_messages=lambda item: parse_students_messages(
+        item.get('text'), item.get('teacherGrade', ''), item.get('teacherId', '')),
+    process_result=lambda item, content: parse_students_response(content),
+    temperature=0.1,
+    params=roster_format_params(),
+)
+register_job_kind(
+    'parse_students_from_image',
+    endpoint='parse_students_from_image',
+    model=ENDPOINT_MODELS['parse_students_from_image'],
+    build_messages=image_page_messages,
+    process_result=lambda item, content: prepare_image_students(
+        json.loads(clean_json_response(content)), item.get('teacherGrade'), item.get('teacherId')),
+    temperature=0,
+)
+register_job_kind(
+    'generate_passage',
+    endpoint='generate_passage',
+    model=ENDPOINT_MODELS['generate_passage'],
+    build_messages=_passage_job_messages,
+    process_result=lambda item, content: {'content': content},
+    temperature=API_SETTINGS["temperature"],
+)
+
+batch_runner = BatchRunner(get_batch_client, JobStore(BATCH_SETTINGS["jobs_dir"]), BATCH_SETTINGS)
@@ -0,0 +1,304 @@
+"""
+Upstream-aware request scheduler for OpenAI calls.
+
+Every completion acquires a slot before it is sent upstream. Slots are granted
+from per-model token buckets (requests per minute and tokens per minute) using
+an up-front token estimate, and the estimate is corrected with the usage the
+response reports. Waiting requests are ordered by priority lane first
+(interactive chat, then streaming generation, then bulk parsing) and by
+weighted fair queueing across teacher IDs within a lane, so one teacher's
+roster import cannot starve everybody else.
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from config import SCHEDULER_SETTINGS
+
+
+class SchedulerTimeout(Exception):
+    """
+    Raised when a request waits longer than SCHEDULER_SETTINGS["max_queue_wait"].
+    """
+
+
+def estimate_prompt_tokens(messages: List[dict]) -> int:
+    """
+    Cheap prompt size estimate (about four characters per token).
+    """
+    chars = sum(len(m.get("content") or "") if isinstance(m.get("content"), str) else 1000
+                for m in messages)
+    return chars // 4 + 4 * len(messages)
+
+
+def expected_completion_tokens(endpoint: str, max_tokens: Optional[int] = None) -> int:
+    """
+    Up-front completion size for `endpoint`: max_tokens if set, else the configured estimate.
+    """
+    return max_tokens or SCHEDULER_SETTINGS["completion_estimates"].get(
+        endpoint, SCHEDULER_SETTINGS["default_completion_tokens"])
+
+
+def lane_for_endpoint(endpoint: str) -> str:
+    return SCHEDULER_SETTINGS["endpoint_lanes"].get(endpoint, SCHEDULER_SETTINGS["default_lane"])
+
+
+class TokenBucket:
+    """
+    Requests-per-minute and tokens-per-minute budget for one model.
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = float(rpm)
+        self.tokens = float(tpm)
+        self.updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+        self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+
+    def can_admit(self, tokens: int) -> bool:
+        # A request larger than the whole budget is admitted once the bucket is full
+        return self.requests >= 1 and self.tokens >= min(tokens, self.tpm)
+
+    def take(self, tokens: int) -> None:
+        self.requests -= 1
+        self.tokens -= tokens
+
+    def adjust(self, delta: int) -> None:
+        self.tokens = min(self.tpm, self.tokens + delta)
+
+    def seconds_until(self, tokens: int) -> float:
+        missing_requests = max(0.0, 1 - self.requests)
+        missing_tokens = max(0.0, min(tokens, self.tpm) - self.tokens)
+        return max(missing_requests * 60 / self.rpm, missing_tokens * 60 / self.tpm)
+
+
+class Ticket:
+    """
+    One request waiting for, or holding, an upstream slot.
+    """
+
+    def __init__(self, sequence: int, lane: str, teacher_id: str, model: str,
+                 estimated_tokens: int, start_tag: float, finish_tag: float):
+        self.sequence = sequence
+        self.lane = lane
+        self.teacher_id = teacher_id
+        self.model = model
+        self.estimated_tokens = estimated_tokens
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.enqueued_at = time.monotonic()
+        self.granted_at = None
+        self.waker = None
+
+    @property
+    def granted(self) -> bool:
+        return self.granted_at is not None
+
+
+class LaneStats:
+    def __init__(self):
+        self.granted = 0
+        self.abandoned = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float) -> None:
+        self.granted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+
+class Scheduler:
+    """
+    Central admission control shared by the Flask app and main.py.
+    """
+
+    def __init__(self, settings: dict):
+        self.settings = settings
+        self.lanes = settings["lanes"]
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._queues = {lane: deque() for lane in self.lanes}
+        self._virtual_time = {lane: 0.0 for lane in self.lanes}
+        self._teacher_finish: Dict[tuple, float] = {}
+        self._stats = {lane: LaneStats() for lane in self.lanes}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def _bucket(self, model: str) -> TokenBucket:
+        bucket = self._buckets.get(model)
+        if bucket is None:
+            limits = self.settings["rate_limits"].get(model, self.settings["default_rate_limit"])
+            bucket = TokenBucket(limits["rpm"], limits["tpm"])
+            self._buckets[model] = bucket
+        return bucket
+
+    def _enqueue(self, endpoint: str, model: str, messages: List[dict],
+                 max_tokens: Optional[int], teacher_id: Optional[str]) -> Ticket:
+        lane = lane_for_endpoint(endpoint)
+        teacher_id = teacher_id or "anonymous"
+        estimated = estimate_prompt_tokens(messages) + expected_completion_tokens(endpoint, max_tokens)
+        weight = self.settings["teacher_weights"].get(teacher_id, 1.0)
+
+        # Weighted fair queueing: each teacher's requests are tagged with a
+        # virtual finish time proportional to their cost divided by weight
+        start = max(self._virtual_time[lane], self._teacher_finish.get((lane, teacher_id), 0.0))
+        finish_tag = start + estimated / weight
+        self._teacher_finish[(lane, teacher_id)] = finish_tag
+
+        ticket = Ticket(next(self._sequence), lane, teacher_id, model, estimated, start, finish_tag)
+        self._queues[lane].append(ticket)
+        return ticket
+
+    def _dispatch(self) -> None:
+        """
+        Grant every ticket that fits, in lane priority and fair-queue order.
+        """
+        blocked_models = set()
+        for lane in self.lanes:
+            queue = self._queues[lane]
+            if not queue:
+                continue
+            for ticket in sorted(queue, key=lambda t: (t.finish_tag, t.sequence)):
+                if ticket.model in blocked_models:
+                    continue
+                bucket = self._bucket(ticket.model)
+                bucket.refill()
+                if not bucket.can_admit(ticket.estimated_tokens):
+                    # Lower-priority work for this model must not overtake this ticket
+                    blocked_models.add(ticket.model)
+                    continue
+                bucket.take(ticket.estimated_tokens)
+                queue.remove(ticket)
+                ticket.granted_at = time.monotonic()
+                self._virtual_time[lane] = max(self._virtual_time[lane], ticket.start_tag)
+                self._stats[lane].record(ticket.granted_at - ticket.enqueued_at)
+                if ticket.waker:
+                    ticket.waker()
+            if not queue:
+                self._virtual_time[lane] = 0.0
+                for key in [k for k in self._teacher_finish if k[0] == lane]:
+                    del self._teacher_finish[key]
+        self._condition.notify_all()
+
+    def _unscheduled(self, endpoint: str, model: str) -> Ticket:
+        ticket = Ticket(next(self._sequence), lane_for_endpoint(endpoint), "anonymous", model, 0, 0.0, 0.0)
+        ticket.granted_at = ticket.enqueued_at
+        return ticket
+
+    def _retry_delay(self, ticket: Ticket) -> float:
+        return min(1.0, max(0.01, self._bucket(ticket.model).seconds_until(ticket.estimated_tokens)))
+
+    def _abandon(self, ticket: Ticket) -> None:
+        if not ticket.granted and ticket in self._queues[ticket.lane]:
+            self._queues[ticket.lane].remove(ticket)
+            self._stats[ticket.lane].abandoned += 1
+            self._dispatch()
+
+    def acquire(self, endpoint: str, model: str, messages: List[dict],
+                max_tokens: Optional[int] = None, teacher_id: Optional[str] = None) -> Ticket:
+        """
+        Block until the request may be sent upstream.
+        """
+        if not self.settings["enabled"]:
+            return self._unscheduled(endpoint, model)
+        with self._condition:
+            ticket = self._enqueue(endpoint, model, messages, max_tokens, teacher_id)
+            deadline = ticket.enqueued_at + self.settings["max_queue_wait"]
+            try:
+                while True:
+                    self._dispatch()
+                    if ticket.granted:
+                        return ticket
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise SchedulerTimeout(f"Request waited more than {self.settings['max_queue_wait']}s for {model}")
+                    self._condition.wait(min(remaining, self._retry_delay(ticket)))
+            finally:
+                self._abandon(ticket)
+
+    async def acquire_async(self, endpoint: str, model: str, messages: List[dict],
+                            max_tokens: Optional[int] = None, teacher_id: Optional[str] = None) -> Ticket:
+        """
+        Wait without blocking the event loop until the request may be sent upstream.
+        """
+        if not self.settings["enabled"]:
+            return self._unscheduled(endpoint, model)
+        loop = asyncio.get_running_loop()
+        granted = asyncio.Event()
+        with self._condition:
+            ticket = self._enqueue(endpoint, model, messages, max_tokens, teacher_id)
+            ticket.waker = lambda: loop.call_soon_threadsafe(granted.set)
+        deadline = ticket.enqueued_at + self.settings["max_queue_wait"]
+        try:
+            while True:
+                with self._condition:
+                    self._dispatch()
+                    if ticket.granted:
+                        return ticket
+                    delay = self._retry_delay(ticket)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise SchedulerTimeout(f"Request waited more than {self.settings['max_queue_wait']}s for {model}")
+                try:
+                    await asyncio.wait_for(granted.wait(), timeout=min(remaining, delay))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._condition:
+                self._abandon(ticket)
+
+    def complete(self, ticket: Ticket, usage=None) -> None:
+        """
+        Reconcile the token estimate with the usage reported by the response.
+        """
+        if usage is None or not self.settings["enabled"]:
+            return
+        actual = getattr(usage, "total_tokens", None)
+        if actual is None:
+            return
+        with self._condition:
+            self._bucket(ticket.model).adjust(ticket.estimated_tokens - actual)
+            self._dispatch()
+
+    def stats(self) -> dict:
+        """
+        Queue depth and wait times per lane, plus remaining budget per model.
+        """
+        with self._condition:
+            now = time.monotonic()
+            lanes = {}
+            for lane in self.lanes:
+                queue = self._queues[lane]
+                stats = self._stats[lane]
+                lanes[lane] = {
+                    "queue_depth": len(queue),
+                    "oldest_wait": round(max((now - t.enqueued_at for t in queue), default=0.0), 3),
+                    "granted": stats.granted,
+                    "abandoned": stats.abandoned,
+                    "average_wait": round(stats.total_wait / stats.granted, 3) if stats.granted else 0.0,
+                    "max_wait": round(stats.max_wait, 3),
+                }
+            models = {}
+            for model, bucket in self._buckets.items():
+                bucket.refill()
+                models[model] = {
+                    "requests_available": round(bucket.requests, 1),
+                    "tokens_available": int(bucket.tokens),
+                    "rpm": bucket.rpm,
+                    "tpm": bucket.tpm,
+                }
+            return {"enabled": self.settings["enabled"], "lanes": lanes, "models": models}
+
+
+scheduler = Scheduler(SCHEDULER_SETTINGS)
@@ -0,0 +1,240 @@
+"""
+Single-flight coalescing of identical in-flight generation requests.
+
+The first request for a key starts one upstream stream in a background thread.
+Every request for that key, including the first, subscribes to the flight and
+reads from its shared buffer from the beginning, so requests that join late
+still receive the tokens emitted before they arrived. When the last subscriber
+disconnects the upstream stream is abandoned.
+
+The async helpers used by the ASGI apps share flights the same way through
+astream(): the producer is an async iterator run as a task on the event
+loop, and subscribers wait for new chunks without blocking the loop. When
+the last one disconnects the task is cancelled, which closes the upstream
+response right away.
+"""
+
+import asyncio
+import contextvars
+import threading
+from typing import AsyncIterator, Callable, Dict, Iterator
+
+from config import COALESCE_SETTINGS
+from logs import get_logger
+from profiling import profiled_thread
+
+log = get_logger("single_flight")
+
+
+def is_coalescing_enabled(endpoint: str) -> bool:
+    """
+    Check whether an endpoint shares identical in-flight requests per config.COALESCE_SETTINGS.
+    """
+    return COALESCE_SETTINGS["enabled"] and COALESCE_SETTINGS["endpoints"].get(endpoint, False)
+
+
+class FlightCancelled(Exception):
+    """
+    Raised inside a producer when every subscriber has gone away.
+    """
+
+
+class Flight:
+    """
+    Shared buffer for one upstream generation.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.cancelled = False
+        self.task = None
+        self._condition = threading.Condition()
+        self._waiters = []
+
+    def publish(self, text: str) -> None:
+        with self._condition:
+            if self.cancelled:
+                raise FlightCancelled()
+            self.chunks.append(text)
+            self._notify()
+
+    def finish(self, error: Exception = None) -> None:
+        with self._condition:
+            self.done = True
+            self.error = error
+            self._notify()
+
+    def _notify(self) -> None:
+        # Called with the condition held
+        self._condition.notify_all()
+        for loop, arrived in self._waiters:
+            loop.call_soon_threadsafe(arrived.set)
+        self._waiters.clear()
+
+    def subscribe(self) -> bool:
+        """
+        Add a subscriber unless the flight has already been abandoned.
+        """
+        with self._condition:
+            if self.cancelled:
+                return False
+            self.subscribers += 1
+            return True
+
+    def unsubscribe(self) -> bool:
+        """
+        Drop a subscriber and return True if the flight is now abandoned.
+        """
+        with self._condition:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                self.cancelled = True
+            return self.cancelled
+
+    def follow(self) -> Iterator[str]:
+        """
+        Yield every chunk from the start of the buffer until the flight ends.
+        """
+        index = 0
+        while True:
+            with self._condition:
+                while index >= len(self.chunks) and not self.done:
+                    self._condition.wait()
+                pending = self.chunks[index:]
+                finished = self.done
+                error = self.error
+            for text in pending:
+                yield text
+            index += len(pending)
+            if finished and index >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+    async def afollow(self) -> AsyncIterator[str]:
+        """
+        follow() for the event loop: waits for new chunks without blocking it.
+        """
+        loop = asyncio.get_running_loop()
+        index = 0
+        while True:
+            arrived = None
+            with self._condition:
+                if index >= len(self.chunks) and not self.done:
+                    arrived = asyncio.Event()
+                    self._waiters.append((loop, arrived))
+                else:
+                    pending = self.chunks[index:]
+                    finished = self.done
+                    error = self.error
+            if arrived is not None:
+                await arrived.wait()
+                continue
+            for text in pending:
+                yield text
+            index += len(pending)
+            if finished and index >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    """
+    Registry of in-flight generations keyed by normalized request.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def _join(self, key: str):
+        """
+        Subscribe to the flight for `key`, starting a new one if there is none
+        running. Returns (flight, leader).
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None or not flight.subscribe()
+            if leader:
+                flight = Flight()
+                flight.subscribe()
+                self._flights[key] = flight
+        return flight, leader
+
+    def _forget(self, key: str, flight: Flight) -> None:
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def stream(self, key: str, produce: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """
+        Stream the output of `produce`, sharing it with identical concurrent requests.
+        """
+        flight, leader = self._join(key)
+        if leader:
+            # The leader's context puts the producer thread in its request's profile
+            thread = threading.Thread(target=contextvars.copy_context().run,
+                                      args=(self._run, key, flight, produce), daemon=True)
+            thread.start()
+
+        try:
+            yield from flight.follow()
+        finally:
+            flight.unsubscribe()
+
+    def _run(self, key: str, flight: Flight, produce: Callable[[], Iterator[str]]) -> None:
+        error = None
+        upstream = produce()
+        with profiled_thread():
+            try:
+                for text in upstream:
+                    flight.publish(text)
+            except FlightCancelled:
+                log.info("flight_abandoned", key=key[:12])
+            except Exception as e:
+                error = e
+            finally:
+                upstream.close()
+                self._forget(key, flight)
+                flight.finish(error)
+
+    async def astream(self, key: str, produce: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        stream() for the event loop, with `produce` returning an async iterator.
+        """
+        flight, leader = self._join(key)
+        if leader:
+            flight.task = asyncio.ensure_future(self._arun(key, flight, produce))
+
+        try:
+            async for text in flight.afollow():
+                yield text
+        finally:
+            if flight.unsubscribe() and flight.task is not None:
+                flight.task.cancel()
+
+    async def _arun(self, key: str, flight: Flight, produce: Callable[[], AsyncIterator[str]]) -> None:
+        error = None
+        upstream = produce()
+        try:
+            async for text in upstream:
+                flight.publish(text)
+        except (FlightCancelled, asyncio.CancelledError):
+            log.info("flight_abandoned", key=key[:12])
+        except Exception as e:
+            error = e
+        finally:
+            await upstream.aclose()
+            self._forget(key, flight)
+            flight.finish(error)
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,57 @@
+"""
+Counters for streams abandoned by their client.
+
+When a teacher closes a generation dialog or navigates away, the route's
+generator is closed (Flask) or cancelled (FastAPI). The completion helpers
+then close the upstream OpenAI response instead of reading it to the end and
+record the abort here. Aborted streams report no usage, so tokens are
+estimated: the tokens streamed before the abort are counted with the model's
+tokenizer, and the tokens saved are the expected completion size (max_tokens
+or the scheduler's per-endpoint estimate) minus the tokens already streamed.
+Streams the model cascade rejects after their opening are closed the same way
+and counted here too. Reported by GET /streams/stats.
+"""
+
+import threading
+from typing import Dict
+
+from logs import get_logger
+from preflight import count_tokens
+
+log = get_logger("stream_aborts")
+
+
+class AbortStats:
+    """
+    Aborted streams and the completion tokens they did not generate, per endpoint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, dict] = {}
+
+    def record(self, endpoint: str, model: str, streamed_text: str, expected_tokens: int) -> None:
+        streamed = count_tokens(streamed_text, model) if streamed_text else 0
+        saved = max(0, expected_tokens - streamed)
+        log.info("stream_aborted", endpoint=endpoint, model=model, streamed_tokens=streamed, saved_tokens=saved)
+        with self._lock:
+            entry = self._endpoints.setdefault(endpoint, {
+                "aborted": 0,
+                "streamed_tokens": 0,
+                "saved_tokens": 0,
+            })
+            entry["aborted"] += 1
+            entry["streamed_tokens"] += streamed
+            entry["saved_tokens"] += saved
+
+    def stats(self) -> dict:
+        with self._lock:
+            endpoints = {endpoint: dict(entry) for endpoint, entry in self._endpoints.items()}
+        return {
+            "aborted": sum(entry["aborted"] for entry in endpoints.values()),
+            "saved_tokens": sum(entry["saved_tokens"] for entry in endpoints.values()),
+            "endpoints": endpoints,
+        }
+
+
+abort_stats = AbortStats()
@@ -0,0 +1,699 @@
+"""
+Prompt construction and validation for roster (student list) extraction.
+
+Shared by the interactive /parse-students routes and the batch job mode so
+both apply exactly the same prompts and checks. Extraction can be
+constrained to the StudentRoster schema with structured output; malformed
+rows are repaired locally where possible, and the rows that still fail are
+re-extracted by a targeted follow-up request (see route_helpers).
+"""
+
+import hashlib
+import json
+import re
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+from cascade import LowConfidence
+
+# Fields every student returned by /parse-students must carry
+REQUIRED_STUDENT_FIELDS = ['firstName', 'lastName', 'studentId', 'gradeLevel', 'readingLevel', 'teacherId']
+# Required fields that may be an empty string (the roster has no student IDs)
+BLANK_STUDENT_FIELDS = ['studentId']
+
+
+class StudentRecord(BaseModel):
+    """
+    One student as extracted by /parse-students.
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    firstName: str
+    lastName: str
+    studentId: str
+    gradeLevel: str
+    readingLevel: str
+    teacherId: str
+    periodId: Optional[str]
+    groupIds: List[str]
+    intervention: Optional[str]
+    interventionResults: Optional[str]
+
+
+class StudentRoster(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    students: List[StudentRecord]
+
+
+class RepairedStudentRecord(StudentRecord):
+    """
+    A re-extracted student, with the roster index of the record it corrects.
+    """
+    recordIndex: int
+
+
+class RepairedStudentRoster(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    students: List[RepairedStudentRecord]
+
+
+# Structured output: every optional field is nullable but present, as strict mode requires
+STUDENT_ROSTER_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "student_roster",
+        "strict": True,
+        "schema": StudentRoster.model_json_schema(),
+    },
+}
+
+STUDENT_REPAIR_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "repaired_student_roster",
+        "strict": True,
+        "schema": RepairedStudentRoster.model_json_schema(),
+    },
+}
+
+PARSE_STUDENTS_SYSTEM_PROMPT = "You are a helpful assistant that extracts student information from text and returns it in a structured JSON format. Do not include markdown formatting or code blocks in your response."
+
+PARSE_STUDENTS_FROM_IMAGE_SYSTEM_PROMPT = """You are a data extraction expert. Extract ALL student information from the provided data. 
+                    The data may be in table format with columns for first name, last name, and reading level.
+                    Process EVERY row and return ALL students in this exact JSON format without any markdown formatting or code blocks:
+                    [
+                        {
+                            "firstName": "string",
+                            "lastName": "string",
+                            "readingLevel": "string",
+                            "gradeLevel": "string"
+                        }
+                    ]
+                    
+                    Important:
+                    - Process EVERY row in the data
+                    - Include ALL students found
+                    - Do not limit the number of students
+                    - Maintain the exact order from the source data
+                    """
+
+
+def parse_students_messages(text, teacher_grade, teacher_id):
+    """
+    Build the chat messages that extract students from pasted roster text.
+    """
+    prompt = f"""Extract student information from the following text and return a JSON array of student objects.
+        Each student object should have: 
+        - firstName (required)
+        - lastName (required)
+        - studentId (required, generate a random ID if not provided)
+        - gradeLevel (use "{teacher_grade}" if not specified)
+        - readingLevel (required)
+        - teacherId (use "{teacher_id}")
+        - periodId (optional)
+        - groupIds (optional, array of strings)
+        - intervention (optional)
+        - interventionResults (optional)
+        The text might be in any format but will contain student information.
+        If certain information is missing, make reasonable assumptions based on context.
+        
+        Text to parse:
+        {text}
+        Return only the JSON array without any markdown formatting or code blocks.
+        Example format:
+        [
+          {{
+            "firstName": "John",
+            "lastName": "Doe",
+            "studentId": "ST" + random 6 digits,
+            "gradeLevel": "{teacher_grade}",
+            "readingLevel": "B",
+            "teacherId": "{teacher_id}",
+            "periodId": null,
+            "groupIds": [],
+            "intervention": "",
+            "interventionResults": ""
+          }}
+        ]
+        """
+    return [
+        {
+            "role": "system", 
+            "content": PARSE_STUDENTS_SYSTEM_PROMPT
+        },
+        {"role": "user", "content": prompt}
+    ]
+
+
+def parse_students_from_image_messages(image_data):
+    """
+    Build the chat messages that extract students from image data.
+    """
+    return [
+        {
+            "role": "system",
+            "content": PARSE_STUDENTS_FROM_IMAGE_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": f"Extract ALL student information from this data. The data appears to be in a table format with columns for first name, last name, and reading level. Process EVERY row: {image_data}"
+        }
+    ]
+
+
+def parse_students_from_vision_messages(image_url):
+    """
+    Build the chat messages that extract students from a roster image the
+    OCR pipeline could not read confidently.
+    """
+    return [
+        {
+            "role": "system",
+            "content": PARSE_STUDENTS_FROM_IMAGE_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": "Extract ALL student information from this roster image. The data appears to be in a table format with columns for first name, last name, and reading level. Process EVERY row."
+                },
+                {"type": "image_url", "image_url": {"url": image_url, "detail": "high"}}
+            ]
+        }
+    ]
+
+
+def image_page_messages(page):
+    """
+    Messages for one preprocessed image page: its OCR text, or the compact image.
+    """
+    if page.get("imageUrl"):
+        return parse_students_from_vision_messages(page["imageUrl"])
+    return parse_students_from_image_messages(page.get("text") or page.get("image"))
+
+
+def repair_students_messages(records, roster_text, teacher_grade, teacher_id):
+    """
+    Build the chat messages that re-extract only the records whose first
+    extraction was malformed or incomplete, each with its source roster rows.
+
+    `records` are (index, raw) pairs; the model echoes each record's index
+    as recordIndex so corrected students can be matched to their records.
+    """
+    sections = []
+    for index, raw in records:
+        rows = source_rows(raw, roster_text)
+        sections.append(f"Record {index}: {raw}\nRoster rows: " + ("\n".join(rows) if rows else "(not found)"))
+    prompt = f"""These student records were extracted from a class roster but are malformed or missing fields.
+        Return a JSON array with one corrected student object per record.
+        Each student object must have recordIndex set to the number of the record it corrects (the N in "Record N"),
+        and should have firstName, lastName, studentId (keep the given one, or "" if none),
+        gradeLevel (use "{teacher_grade}" if not specified), readingLevel and teacherId (use "{teacher_id}").
+        Take missing values from the record's roster rows. Return only the JSON array without any markdown formatting or code blocks.
+
+        {chr(10).join(sections)}
+        """
+    return [
+        {
+            "role": "system",
+            "content": PARSE_STUDENTS_SYSTEM_PROMPT
+        },
+        {"role": "user", "content": prompt}
+    ]
+
+
+def source_rows(raw, roster_text):
+    """
+    Roster rows that mention the names in a raw extracted record.
+    """
+    names = [name.lower() for name in re.findall(r'"(?:firstName|lastName)"\s*:\s*"([^"]+)"', raw)]
+    if not names or not roster_text:
+        return []
+    return [row for row in roster_rows(roster_text)[1] if all(name in row.lower() for name in names)]
+
+
+def clean_json_response(content):
+    """
+    Strip surrounding whitespace and markdown code fences from a model response.
+    """
+    content = content.strip()
+    if content.startswith('```'):
+        content = content.replace('```json', '').replace('```', '').strip()
+    return content
+
+
+def student_array(data):
+    """
+    The student list from a decoded response: a bare array, or the
+    {"students": [...]} object returned with structured output.
+    """
+    if isinstance(data, dict) and isinstance(data.get("students"), list):
+        return data["students"]
+    return data
+
+
+def repair_json_element(raw):
+    """
+    Best-effort local fix of one malformed JSON element.
+
+    Drops trailing commas, and closes a truncated element after removing
+    its unfinished string and any key left without a value, so a cut-off
+    field is reported missing rather than kept half-written.
+    """
+    text = raw.strip().rstrip(',')
+    closers = []
+    in_string = False
+    escaped = False
+    string_start = None
+    for position, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+            string_start = position
+        elif char in '{[':
+            closers.append('}' if char == '{' else ']')
+        elif char in '}]' and closers:
+            closers.pop()
+    if in_string:
+        text = text[:string_start]
+    text = re.sub(r'(?<=[{,])\s*"[^"]*"\s*:?\s*$', '', text)
+    text = re.sub(r',\s*$', '', text)
+    text = re.sub(r',(\s*[}\]])', r'\1', text)
+    return text + "".join(reversed(closers))
+
+
+def load_element(raw):
+    """
+    Decode one raw array element, repairing it locally if it is malformed.
+    """
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError as e:
+        try:
+            return json.loads(repair_json_element(raw))
+        except json.JSONDecodeError:
+            raise e
+
+
+def missing_student_fields(student):
+    """
+    Required fields `student` lacks. Structured output always returns every
+    key, so a field the model could not fill comes back blank; a blank or
+    null value counts as missing except for BLANK_STUDENT_FIELDS.
+    """
+    missing = []
+    for key in REQUIRED_STUDENT_FIELDS:
+        value = student.get(key)
+        if key not in student or (key not in BLANK_STUDENT_FIELDS
+                                  and (value is None or (isinstance(value, str) and not value.strip()))):
+            missing.append(key)
+    return missing
+
+
+def validate_student(student, index):
+    """
+    Check that one parsed student has the required fields.
+
+    Raises ValueError naming the student (1-based) and its missing fields.
+    """
+    if not isinstance(student, dict):
+        raise ValueError(f"Student {index + 1} is not an object")
+    missing = missing_student_fields(student)
+    if missing:
+        raise ValueError(f"Student {index + 1} missing required fields: {', '.join(missing)}")
+    return student
+
+
+def validate_students(students):
+    """
+    Check that every parsed student has the required fields.
+
+    Raises ValueError naming the first student with missing fields.
+    """
+    if not isinstance(students, list):
+        raise ValueError("Response is not a list")
+    for i, student in enumerate(students):
+        validate_student(student, i)
+    return students
+
+
+def prepare_image_student(student, teacher_grade, teacher_id):
+    """
+    Fill in grade level and teacher for one student read from an image and validate it.
+    """
+    if not isinstance(student, dict):
+        raise ValueError("Missing required fields in student data")
+    student['gradeLevel'] = student.get('gradeLevel', teacher_grade)
+    student['teacherId'] = teacher_id
+    if not all(key in student for key in ['firstName', 'lastName']):
+        raise ValueError("Missing required fields in student data")
+    return student
+
+
+def prepare_image_students(students, teacher_grade, teacher_id):
+    """
+    Fill in grade level and teacher for students read from an image and validate them.
+    """
+    if not isinstance(students, list):
+        raise ValueError("Response is not a list")
+    for student in students:
+        prepare_image_student(student, teacher_grade, teacher_id)
+    return students
+
+
+def parse_students_response(content):
+    """
+    Decode and validate the JSON array returned for /parse-students.
+    """
+    return validate_students(student_array(json.loads(clean_json_response(content))))
+
+
+def check_roster_coverage(students, source_text, min_coverage):
+    """
+    Raise LowConfidence when far fewer students came back than the roster has rows.
+    """
+    rows = roster_rows(source_text)[1] if source_text else []
+    if len(rows) > 1 and len(students) < min_coverage * len(rows):
+        raise LowConfidence(f"Extracted {len(students)} students from {len(rows)} roster rows")
+
+
+def check_roster_response(content, source_text, min_coverage):
+    """
+    Model cascade check for a /parse-students answer extracted from `source_text`.
+    """
+    check_roster_coverage(parse_students_response(content), source_text, min_coverage)
+
+
+def check_image_roster_response(content, source_text, min_coverage):
+    """
+    Model cascade check for a /parse-students-from-image answer; `source_text`
+    is the page's OCR text, or None when the model read the image itself.
+    """
+    students = json.loads(clean_json_response(content))
+    if not isinstance(students, list):
+        raise ValueError("Response is not a list")
+    for i, student in enumerate(students):
+        if not isinstance(student, dict) or not all(key in student for key in ['firstName', 'lastName']):
+            raise ValueError(f"Student {i + 1} missing required fields")
+    check_roster_coverage(students, source_text, min_coverage)
+
+
+class StudentArrayParser:
+    """
+    Incremental parser that splits a streamed JSON array into its elements.
+
+    Text deltas are fed in as they arrive; each top-level element is returned
+    as raw JSON text as soon as its closing bracket (or separating comma) is
+    seen, so students can be validated and sent before the model finishes.
+    Anything before the opening bracket, such as a markdown code fence, is
+    ignored, as is anything after the closing bracket.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.finished = False
+        self._buffer = ""
+        self._pos = 0
+        self._element_start = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text):
+        """
+        Consume a text delta and return the raw elements it completed.
+        """
+        elements = []
+        if self.finished:
+            return elements
+        self._buffer += text
+        while self._pos < len(self._buffer) and not self.finished:
+            char = self._buffer[self._pos]
+            if not self.started:
+                if char == '[':
+                    self.started = True
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+                if self._element_start is None:
+                    self._element_start = self._pos
+            elif char in '{[':
+                if self._element_start is None:
+                    self._element_start = self._pos
+                self._depth += 1
+            elif char in '}]' and self._depth > 0:
+                self._depth -= 1
+            elif char in ',]' and self._depth == 0:
+                if self._element_start is not None:
+                    elements.append(self._buffer[self._element_start:self._pos].strip())
+                    self._element_start = None
+                self.finished = char == ']'
+            elif not char.isspace() and self._element_start is None:
+                self._element_start = self._pos
+            self._pos += 1
+
+        # Drop consumed text so long rosters do not accumulate in memory
+        keep = self._pos if self._element_start is None else self._element_start
+        self._buffer = self._buffer[keep:]
+        self._pos -= keep
+        if self._element_start is not None:
+            self._element_start = 0
+        return elements
+
+    def close(self):
+        """
+        Return the trailing partial element of a truncated response, if any.
+
+        Raises ValueError if the response never contained a JSON array.
+        """
+        if not self.started:
+            raise ValueError("Response does not contain a JSON array")
+        if self.finished or self._element_start is None:
+            return []
+        return [self._buffer[self._element_start:].strip()]
+
+
+def decode_student_elements(content):
+    """
+    Decode each element of a roster response on its own, repairing malformed
+    ones locally; elements that still cannot be decoded are kept as raw text
+    so they can be re-extracted.
+
+    Raises ValueError if the response does not contain a JSON array.
+    """
+    parser = StudentArrayParser()
+    students = []
+    for raw in parser.feed(content) + parser.close():
+        try:
+            students.append(load_element(raw))
+        except json.JSONDecodeError:
+            students.append(raw)
+    return students
+
+
+def student_event(raw, index, prepare_student):
+    """
+    Result event for one raw array element: the prepared student, or an error.
+    """
+    try:
+        return {"type": "student", "index": index, "student": prepare_student(load_element(raw), index)}
+    except ValueError as e:
+        return {"type": "student_error", "index": index, "error": str(e), "raw": raw}
+
+
+def iter_student_events(chunks, prepare_student):
+    """
+    Turn a streamed roster completion into per-student result events.
+
+    Each element is decoded and passed to `prepare_student(student, index)`;
+    a malformed or invalid element produces an error event for that element
+    only. Ends with a summary event.
+    """
+    parser = StudentArrayParser()
+
+    def raw_elements():
+        for text in chunks:
+            yield from parser.feed(text)
+        yield from parser.close()
+
+    count = 0
+    failed = 0
+    for index, raw in enumerate(raw_elements()):
+        event = student_event(raw, index, prepare_student)
+        if event["type"] == "student":
+            count += 1
+        else:
+            failed += 1
+        yield event
+
+    yield {"type": "complete", "count": count, "failed": failed}
+
+
+async def aiter_student_events(chunks, prepare_student):
+    """
+    iter_student_events for an async stream of completion text.
+    """
+    parser = StudentArrayParser()
+    index = 0
+    failed = 0
+    async for text in chunks:
+        for raw in parser.feed(text):
+            event = student_event(raw, index, prepare_student)
+            failed += event["type"] != "student"
+            index += 1
+            yield event
+    for raw in parser.close():
+        event = student_event(raw, index, prepare_student)
+        failed += event["type"] != "student"
+        index += 1
+        yield event
+
+    yield {"type": "complete", "count": index - failed, "failed": failed}
+
+
+HEADER_PATTERN = re.compile(r"\b(first|last|name|student|reading|grade|level|id)\b", re.IGNORECASE)
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def roster_rows(text):
+    """
+    Split roster text into its header row (None if it has none) and its data rows.
+    """
+    rows = [row for row in text.splitlines() if row.strip()]
+    header = None
+    if rows and HEADER_PATTERN.search(rows[0]) and not any(char.isdigit() for char in rows[0]):
+        header = rows.pop(0)
+    return header, rows
+
+
+def split_roster(text, chunk_tokens, overlap_rows=0):
+    """
+    Split roster text on row boundaries into chunks of about `chunk_tokens`.
+
+    A header row is repeated at the top of every chunk, and the last
+    `overlap_rows` rows of each chunk are repeated at the start of the next so
+    a record split across the boundary is still seen whole.
+    """
+    header, rows = roster_rows(text)
+    if estimate_tokens(text) <= chunk_tokens or len(rows) <= 1:
+        return [text]
+
+    budget = chunk_tokens - (estimate_tokens(header) if header else 0)
+    chunks = []
+    current = []
+    size = 0
+    for row in rows:
+        row_tokens = estimate_tokens(row)
+        if current and size + row_tokens > budget and len(current) > overlap_rows:
+            chunks.append(current)
+            current = current[-overlap_rows:] if overlap_rows else []
+            size = sum(estimate_tokens(r) for r in current)
+        current.append(row)
+        size += row_tokens
+    chunks.append(current)
+
+    return ["\n".join(([header] if header else []) + chunk) for chunk in chunks]
+
+
+def student_identity(student):
+    if not isinstance(student, dict):
+        return None
+    return tuple(str(student.get(key) or "").strip().lower()
+                 for key in ("firstName", "lastName", "readingLevel"))
+
+
+def synthetic_student_id(student, teacher_id, occurrence):
+    """
+    Stable ID derived from the teacher and student name, so re-importing the
+    same roster yields the same IDs.
+    """
+    seed = "|".join([str(teacher_id or "")] + list(student_identity(student)) + [str(occurrence)])
+    return "ST" + str(int(hashlib.sha256(seed.encode("utf-8")).hexdigest(), 16) % 1000000).zfill(6)
+
+
+class RosterMerger:
+    """
+    Merges per-chunk extraction results in source order.
+
+    Students the model repeats at a chunk seam (from the overlapping rows) are
+    dropped, and any studentId that does not appear in the source text, that
+    is, one the model invented, is replaced with a stable synthetic ID.
+    """
+
+    def __init__(self, source_text, teacher_id, overlap_rows=0):
+        self.source_text = source_text
+        self.teacher_id = teacher_id
+        self.seam_window = overlap_rows + 1
+        self.previous_tail = []
+        self.ids = set()
+        self.occurrences = {}
+
+    def add_chunk(self, students):
+        """
+        Merge the next chunk's students and return the ones that are new.
+        """
+        merged = []
+        seam = list(self.previous_tail)
+        for position, student in enumerate(students):
+            identity = student_identity(student)
+            if identity is None:
+                merged.append(student)
+                continue
+            if position < self.seam_window and identity in seam:
+                seam.remove(identity)
+                continue
+            merged.append(self.assign_id(student))
+        self.previous_tail = [student_identity(s) for s in students[-self.seam_window:]]
+        return merged
+
+    def in_source(self, value):
+        # Without source text (locally parsed rosters) every ID came from the roster
+        if self.source_text is None:
+            return True
+        return re.search(r"(?<!\w)" + re.escape(value) + r"(?!\w)", self.source_text) is not None
+
+    def assign_id(self, student):
+        """
+        Keep a studentId taken from the roster; otherwise assign a stable one.
+        """
+        identity = student_identity(student)
+        occurrence = self.occurrences.get(identity, 0)
+        self.occurrences[identity] = occurrence + 1
+
+        student_id = str(student.get("studentId") or "").strip()
+        if not student_id or not self.in_source(student_id) or student_id in self.ids:
+            student_id = synthetic_student_id(student, self.teacher_id, occurrence)
+            while student_id in self.ids:
+                occurrence += 1
+                student_id = synthetic_student_id(student, self.teacher_id, occurrence)
+            student["studentId"] = student_id
+        self.ids.add(student_id)
+        return student
+
+
+def student_list_events(students):
+    """
+    Result events for students that were parsed up front.
+    """
+    for index, student in enumerate(students):
+        yield {"type": "student", "index": index, "student": student}
+    yield {"type": "complete", "count": len(students), "failed": 0}
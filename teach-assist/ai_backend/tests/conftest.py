@@ -0,0 +1,129 @@
+"""
+Shared setup for the AI backend tests.
+
+The service modules import each other by name, so the service directory goes
+on the path. No test talks to OpenAI: routes that call it use FakeOpenAI.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("GENERATION_CACHE_DIR", tempfile.mkdtemp(prefix="teachassist-cache-"))
+
+import pytest
+
+
+def chunk(text):
+    """
+    A streamed chat-completion chunk carrying `text`.
+    """
+    delta = types.SimpleNamespace(content=text)
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta, message=delta)], usage=None)
+
+
+class FakeStream:
+    def __init__(self, words, delay):
+        self.words = words
+        self.delay = delay
+        self.closed = False
+
+    def __iter__(self):
+        for word in self.words:
+            time.sleep(self.delay)
+            yield chunk(word)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeAsyncStream(FakeStream):
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for word in self.words:
+            await asyncio.sleep(self.delay)
+            yield chunk(word)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeOpenAI:
+    """
+    Stand-in for the synchronous OpenAI client that streams `words`, one per
+    `delay` seconds; `answers` maps a model to the words it answers with instead.
+    """
+    stream_class = FakeStream
+
+    def __init__(self, words, delay=0.0, answers=None):
+        self.words = words
+        self.delay = delay
+        self.answers = answers or {}
+        self.requests = []
+        self.streams = []
+        self.chat = types.SimpleNamespace(completions=self)
+
+    def respond(self, params):
+        self.requests.append(params)
+        words = list(self.answers.get(params.get("model"), self.words))
+        if params.get("stream"):
+            stream = self.stream_class(words, self.delay)
+            self.streams.append(stream)
+            return stream
+        return chunk("".join(words))
+
+    def create(self, **params):
+        return self.respond(params)
+
+
+class FakeAsyncOpenAI(FakeOpenAI):
+    """
+    FakeOpenAI for the AsyncOpenAI client.
+    """
+    stream_class = FakeAsyncStream
+
+    async def create(self, **params):
+        return self.respond(params)
+
+
+@pytest.fixture
+def fake_openai():
+    """
+    Install a FakeOpenAI as the shared client; call the fixture to configure it.
+    """
+    import openai_client
+
+    previous = openai_client._client
+
+    def install(words=("Hello ", "world"), delay=0.0, answers=None):
+        client = FakeOpenAI(list(words), delay, answers)
+        openai_client.set_client(client)
+        return client
+
+    yield install
+    openai_client.set_client(previous)
+
+
+@pytest.fixture
+def fake_async_openai():
+    """
+    Install a FakeAsyncOpenAI as the shared async client; call the fixture to configure it.
+    """
+    import openai_client
+
+    previous = openai_client._async_client
+
+    def install(words=("Hello ", "world"), delay=0.0, answers=None):
+        client = FakeAsyncOpenAI(list(words), delay, answers)
+        openai_client.set_async_client(client)
+        return client
+
+    yield install
+    openai_client.set_async_client(previous)
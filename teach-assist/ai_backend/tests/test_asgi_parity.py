@@ -0,0 +1,110 @@
+"""
+The ASGI app must keep the request and response contracts of app.py: the
+same routes are called on both with the same upstream answer and their
+responses compared.
+"""
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+WARMUP = {"topic": "Making predictions", "storyTitle": "The Fox", "storyContent": "A fox ran far."}
+ROSTER_TEXT = "Ann Lee reads at level B, and Bo Kim is a level C reader."
+STUDENTS = [
+    {"firstName": "Ann", "lastName": "Lee", "studentId": "", "gradeLevel": "3", "readingLevel": "B",
+     "teacherId": "t1", "periodId": None, "groupIds": [], "intervention": None, "interventionResults": None},
+    {"firstName": "Bo", "lastName": "Kim", "studentId": "S2", "gradeLevel": "3", "readingLevel": "",
+     "teacherId": "t1", "periodId": None, "groupIds": [], "intervention": None, "interventionResults": None},
+]
+
+
+@pytest.fixture
+def clients(fake_openai, fake_async_openai, monkeypatch):
+    """
+    Call one route on app.py and asgi_app.py with the same upstream answer.
+    """
+    from app import app
+    from asgi_app import app as asgi_app
+    from config import SCHEDULER_SETTINGS
+
+    # Fake answers report no usage, so the scheduler's token estimates would
+    # never be reconciled and the roster requests would wait for rate budget
+    monkeypatch.setitem(SCHEDULER_SETTINGS, "enabled", False)
+
+    flask_client = app.test_client()
+    asgi_client = TestClient(asgi_app)
+
+    def call(path, words, **request):
+        fake_openai(words=words)
+        fake_async_openai(words=words)
+        flask_response = flask_client.post(path, **request)
+        asgi_response = asgi_client.post(path, **request)
+        return flask_response, asgi_response
+
+    return call
+
+
+def media_type(content_type):
+    return content_type.split(";")[0].strip()
+
+
+def sse_events(body):
+    """
+    SSE events with consecutive content deltas joined, since frame boundaries depend on timing.
+    """
+    events = []
+    for line in body.splitlines():
+        if not line.startswith("data: "):
+            continue
+        event = json.loads(line[len("data: "):])
+        if set(event) == {"content"} and events and set(events[-1]) == {"content"}:
+            events[-1] = {"content": events[-1]["content"] + event["content"]}
+        else:
+            events.append(event)
+    return events
+
+
+def ndjson_events(body):
+    return [json.loads(line) for line in body.splitlines() if line.strip()]
+
+
+def test_sse_route_matches(clients):
+    flask_response, asgi_response = clients("/generate-warmup", ["### Warm-Up ", "Activity\n", "Predict!"],
+                                            json=dict(WARMUP, regenerate=True))
+    assert flask_response.status_code == asgi_response.status_code == 200
+    assert media_type(flask_response.content_type) == media_type(asgi_response.headers["content-type"]) \
+        == "text/event-stream"
+    events = sse_events(flask_response.get_data(as_text=True))
+    assert events == sse_events(asgi_response.text)
+    assert events[-1] == {"type": "complete", "content": "### Warm-Up Activity\nPredict!"}
+
+
+def test_sse_route_validation_error_matches(clients):
+    flask_response, asgi_response = clients("/generate-warmup", [], json={"topic": "Making predictions"})
+    assert flask_response.status_code == asgi_response.status_code == 400
+    assert flask_response.get_json() == asgi_response.json()
+
+
+@pytest.mark.parametrize("mode", ["stream", None])
+def test_ndjson_roster_route_matches(clients, mode):
+    answer = json.dumps({"students": STUDENTS})
+    # The second student has no reading level; the repair request gets the same answer and cannot fix it
+    words = [answer[i:i + 40] for i in range(0, len(answer), 40)]
+    request = {"text": ROSTER_TEXT, "teacherGrade": "3", "teacherId": "t1"}
+    if mode:
+        request["mode"] = mode
+    flask_response, asgi_response = clients("/parse-students", words, json=request)
+
+    assert flask_response.status_code == asgi_response.status_code == 200
+    assert media_type(flask_response.content_type) == media_type(asgi_response.headers["content-type"])
+    if mode == "stream":
+        assert media_type(flask_response.content_type) == "application/x-ndjson"
+        events = ndjson_events(flask_response.get_data(as_text=True))
+        assert events == ndjson_events(asgi_response.text)
+        assert [event["type"] for event in events] == ["student", "student_error", "complete"]
+    else:
+        body = flask_response.get_json()
+        assert body == asgi_response.json()
+        assert [student["firstName"] for student in body["students"]] == ["Ann"]
+        assert [row["index"] for row in body["failedRows"]] == [1]
@@ -0,0 +1,194 @@
+import json
+import types
+
+import pytest
+
+import batch_jobs
+from batch_jobs import BatchRunner, JobKind, JobStore, job_summary
+from config import BATCH_SETTINGS
+from route_helpers import roster_format_params
+
+
+class FakeBatchClient:
+    """
+    In-process stand-in for the Files and Batch endpoints; `answer(request)`
+    returns each request's output record, or None to leave it out.
+    """
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.uploads = {}
+        self.created = {}
+        self.outputs = {}
+        self.files = types.SimpleNamespace(create=self.create_file, content=self.file_content)
+        self.batches = types.SimpleNamespace(create=self.create_batch, retrieve=self.retrieve_batch)
+
+    def create_file(self, file, purpose):
+        file_id = f"file-{len(self.uploads)}"
+        self.uploads[file_id] = [json.loads(line) for line in file[1].read().decode("utf-8").splitlines()]
+        return types.SimpleNamespace(id=file_id)
+
+    def file_content(self, file_id):
+        return types.SimpleNamespace(text="\n".join(json.dumps(record) for record in self.outputs[file_id]))
+
+    def create_batch(self, input_file_id, endpoint, completion_window):
+        batch = types.SimpleNamespace(id=f"batch-{len(self.created)}", status="in_progress",
+                                      input_file_id=input_file_id, output_file_id=None, error_file_id=None)
+        self.created[batch.id] = batch
+        return batch
+
+    def retrieve_batch(self, batch_id):
+        return self.created[batch_id]
+
+    def requests(self, batch_id):
+        return self.uploads[self.created[batch_id].input_file_id]
+
+    def complete(self, batch_id, status="completed"):
+        batch = self.created[batch_id]
+        records = [self.answer(request) for request in self.uploads[batch.input_file_id]]
+        batch.output_file_id = f"{batch_id}-output"
+        self.outputs[batch.output_file_id] = [record for record in records if record is not None]
+        batch.status = status
+
+
+def completion(request, content):
+    return {"custom_id": request["custom_id"], "error": None,
+            "response": {"status_code": 200, "body": {"choices": [{"message": {"content": content}}]}}}
+
+
+def echo_answer(request):
+    return completion(request, request["body"]["messages"][-1]["content"].upper())
+
+
+@pytest.fixture
+def echo_kind(monkeypatch):
+    def process(item, content):
+        if content == "BAD":
+            raise ValueError("Unusable answer")
+        return {"content": content}
+
+    kind = JobKind("generate_passage", "gpt-4o", lambda item: [{"role": "user", "content": item["text"]}],
+                   process, temperature=0.5)
+    monkeypatch.setitem(batch_jobs.JOB_KINDS, "echo", kind)
+    return kind
+
+
+@pytest.fixture
+def runner(tmp_path, monkeypatch):
+    """
+    A BatchRunner over a fake client, polled by the tests instead of its worker thread.
+    """
+    def make(answer=echo_answer, **settings):
+        client = FakeBatchClient(answer)
+        runner = BatchRunner(lambda: client, JobStore(str(tmp_path)),
+                             dict(BATCH_SETTINGS, poll_interval=0, **settings))
+        monkeypatch.setattr(runner, "_ensure_worker", lambda: None)
+        runner.fake = client
+        return runner
+    return make
+
+
+def test_job_store_round_trips_and_filters_by_status(tmp_path):
+    store = JobStore(str(tmp_path))
+    store.save({"id": "job_a", "status": "queued"})
+    store.save({"id": "job_b", "status": "completed"})
+    assert store.load("job_a")["status"] == "queued"
+    assert store.load("job_missing") is None
+    # A fresh store over the same directory sees the saved jobs
+    assert [job["id"] for job in JobStore(str(tmp_path)).with_status("queued")] == ["job_a"]
+    assert JobStore(str(tmp_path / "none")).with_status("queued") == []
+
+
+def test_create_job_rejects_bad_input(runner, echo_kind):
+    runner = runner(max_items_per_job=2)
+    with pytest.raises(ValueError, match="Unknown job kind"):
+        runner.create_job("nope", [{"text": "a"}])
+    with pytest.raises(ValueError, match="at least one item"):
+        runner.create_job("echo", [])
+    with pytest.raises(ValueError, match="at most 2 items"):
+        runner.create_job("echo", [{"text": "a"}] * 3)
+
+
+def test_queued_jobs_wait_for_the_collection_window(runner, echo_kind):
+    runner = runner(collect_window=3600, max_batch_requests=3)
+    runner.create_job("echo", [{"text": "a"}])
+    assert runner.flush() is None
+    # Enough queued requests submit early
+    runner.create_job("echo", [{"text": "b"}, {"text": "c"}])
+    assert runner.flush() is not None
+    assert runner.flush() is None
+
+
+def test_queued_jobs_are_collected_into_one_batch(runner, echo_kind):
+    runner = runner()
+    first = runner.create_job("echo", [{"text": "a"}, {"text": "b"}], teacher_id="t1")
+    second = runner.create_job("echo", [{"text": "c"}])
+    batch_id = runner.flush(force=True)
+
+    requests = runner.fake.requests(batch_id)
+    assert sorted(request["custom_id"] for request in requests) == sorted(
+        [f"{first['id']}-0", f"{first['id']}-1", f"{second['id']}-0"])
+    assert all(request["url"] == "/v1/chat/completions" for request in requests)
+    assert requests[0]["body"]["model"] == "gpt-4o" and requests[0]["body"]["temperature"] == 0.5
+    assert {runner.get_job(job["id"])["status"] for job in (first, second)} == {"submitted"}
+
+
+def test_results_are_mapped_back_to_their_items(runner, echo_kind):
+    runner = runner()
+    job = runner.create_job("echo", [{"text": "a"}, {"text": "b"}])
+    batch_id = runner.flush(force=True)
+
+    assert runner.get_job(job["id"])["status"] == "submitted"
+    runner.fake.complete(batch_id)
+    summary = job_summary(runner.get_job(job["id"]))
+    assert summary["status"] == "completed"
+    assert summary["failedItems"] == 0
+    assert [item["result"] for item in summary["items"]] == [{"content": "A"}, {"content": "B"}]
+
+
+def test_failed_requests_become_item_errors(runner, echo_kind):
+    def answer(request):
+        text = request["body"]["messages"][-1]["content"]
+        if text == "error":
+            return {"custom_id": request["custom_id"], "response": None,
+                    "error": {"code": "server_error", "message": "boom"}}
+        if text == "rejected":
+            return {"custom_id": request["custom_id"], "error": None,
+                    "response": {"status_code": 400, "body": {"error": {"message": "bad request"}}}}
+        if text == "missing":
+            return None
+        return completion(request, "BAD" if text == "bad" else text)
+
+    runner = runner(answer)
+    job = runner.create_job("echo", [{"text": t} for t in ["ok", "error", "rejected", "missing", "bad"]])
+    runner.fake.complete(runner.flush(force=True))
+    items = job_summary(runner.get_job(job["id"]))["items"]
+
+    assert [item["status"] for item in items] == ["completed", "failed", "failed", "failed", "failed"]
+    assert "boom" in items[1]["error"]
+    assert "bad request" in items[2]["error"]
+    assert items[3]["error"] == "No result returned (batch completed)"
+    assert items[4]["error"] == "Unusable answer"
+    assert runner.get_job(job["id"])["failedItems"] == 4
+
+
+def test_a_job_with_every_item_failed_is_failed(runner, echo_kind):
+    runner = runner(lambda request: None)
+    job = runner.create_job("echo", [{"text": "a"}])
+    runner.fake.complete(runner.flush(force=True), status="expired")
+    job = runner.get_job(job["id"])
+    assert job["status"] == "failed"
+    assert job["items"][0]["error"] == "No result returned (batch expired)"
+
+
+def test_roster_jobs_request_the_roster_schema(runner):
+    student = {"firstName": "Ann", "lastName": "Lee", "studentId": "S1", "gradeLevel": "3",
+               "readingLevel": "C", "teacherId": "t1"}
+    runner = runner(lambda request: completion(request, json.dumps({"students": [student]})))
+    job = runner.create_job("parse_students", [{"text": "First,Last\nAnn,Lee", "teacherId": "t1"}])
+    batch_id = runner.flush(force=True)
+
+    body = runner.fake.requests(batch_id)[0]["body"]
+    assert body["response_format"] == roster_format_params()["response_format"]
+    runner.fake.complete(batch_id)
+    assert runner.get_job(job["id"])["items"][0]["result"] == [student]
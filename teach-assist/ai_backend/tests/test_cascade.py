@@ -0,0 +1,129 @@
+import asyncio
+import json
+
+import pytest
+
+import cascade
+from cascade import CascadeStats, acascade_complete, cascade_complete, cascade_stream, check_chat_opening
+from config import CASCADE_SETTINGS
+from route_helpers import roster_check
+
+MINI, DEFAULT = CASCADE_SETTINGS["endpoints"]["parse_students"]
+ROSTER = "First,Last,ID,Reading\nAnn,Lee,S1,C\nBo,Kim,S2,D"
+MESSAGES = [{"role": "user", "content": ROSTER}]
+
+
+def student(first_name, **fields):
+    return dict({"firstName": first_name, "lastName": "Lee", "studentId": "S1", "gradeLevel": "3",
+                 "readingLevel": "C", "teacherId": "t1"}, **fields)
+
+
+def roster(*students):
+    return [json.dumps({"students": list(students)})]
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    stats = CascadeStats()
+    monkeypatch.setattr(cascade, "cascade_stats", stats)
+    return stats
+
+
+def models(client):
+    return [request["model"] for request in client.requests]
+
+
+def test_a_valid_answer_from_the_first_model_is_accepted(fake_openai, stats):
+    client = fake_openai(answers={MINI: roster(student("Ann"), student("Bo"))})
+    content = cascade_complete(client, "parse_students", MESSAGES, roster_check(ROSTER))
+    assert models(client) == [MINI]
+    assert [s["firstName"] for s in json.loads(content)["students"]] == ["Ann", "Bo"]
+    entry = stats.stats()["parse_students"]
+    assert (entry["requests"], entry["escalated"], entry["reasons"]) == (1, 0, {})
+
+
+def test_an_answer_with_a_blank_required_field_escalates_as_invalid(fake_openai, stats):
+    # Strict structured output returns every key; an unfilled field comes back blank
+    client = fake_openai(answers={MINI: roster(student("Ann"), student("Bo", readingLevel="")),
+                                  DEFAULT: roster(student("Ann"), student("Bo", readingLevel="D"))})
+    content = cascade_complete(client, "parse_students", MESSAGES, roster_check(ROSTER))
+    assert models(client) == [MINI, DEFAULT]
+    assert json.loads(content)["students"][1]["readingLevel"] == "D"
+    assert stats.stats()["parse_students"]["reasons"] == {"invalid": 1}
+
+
+def test_an_answer_missing_roster_rows_escalates_as_low_confidence(fake_openai, stats):
+    client = fake_openai(answers={MINI: roster(student("Ann")), DEFAULT: roster(student("Ann"), student("Bo"))})
+    cascade_complete(client, "parse_students", MESSAGES, roster_check(ROSTER))
+    assert models(client) == [MINI, DEFAULT]
+    assert stats.stats()["parse_students"]["reasons"] == {"low_confidence": 1}
+
+
+def test_the_last_models_answer_is_returned_unchecked(fake_openai, stats):
+    client = fake_openai(answers={MINI: ["not json"], DEFAULT: ["still not json"]})
+    assert cascade_complete(client, "parse_students", MESSAGES, roster_check(ROSTER)) == "still not json"
+
+
+def test_stats_count_requests_escalations_and_cost(fake_openai, stats):
+    client = fake_openai(answers={MINI: roster(student("Ann"), student("Bo"))})
+    cascade_complete(client, "parse_students", MESSAGES, roster_check(ROSTER))
+    client.answers[MINI] = roster(student("Ann"))
+    cascade_complete(client, "parse_students", MESSAGES, roster_check(ROSTER))
+
+    entry = stats.stats()["parse_students"]
+    assert entry["requests"] == 2
+    assert entry["escalated"] == 1
+    assert entry["escalation_rate"] == 0.5
+    assert entry["reasons"] == {"low_confidence": 1}
+    assert entry["average_accepted_ms"] is not None and entry["average_escalated_ms"] is not None
+    # Only the escalated request reached the default model
+    assert entry["average_default_model_ms"] is not None
+    assert 0 < entry["cost_usd"] < entry["default_only_cost_usd"]
+
+
+def test_acascade_complete_escalates_like_cascade_complete(fake_async_openai, stats):
+    client = fake_async_openai(answers={MINI: roster(student("Ann", lastName="")),
+                                        DEFAULT: roster(student("Ann"), student("Bo"))})
+    asyncio.run(acascade_complete("parse_students", MESSAGES, roster_check(ROSTER)))
+    assert models(client) == [MINI, DEFAULT]
+    assert stats.stats()["parse_students"]["reasons"] == {"invalid": 1}
+
+
+@pytest.mark.parametrize("opening, error", [
+    ("", ValueError),
+    ("   ", ValueError),
+    ("I'm sorry, I can't help with that.", cascade.LowConfidence),
+    ("As an AI, I do not have classrooms.", cascade.LowConfidence),
+])
+def test_check_chat_opening_rejects_empty_and_hedged_answers(opening, error):
+    with pytest.raises(error):
+        check_chat_opening(opening)
+
+
+def test_check_chat_opening_accepts_a_direct_answer():
+    check_chat_opening("Try a think-pair-share every five minutes.")
+
+
+def test_a_stream_holds_back_its_opening_until_the_check_passes(fake_openai, stats, monkeypatch):
+    monkeypatch.setitem(CASCADE_SETTINGS, "stream_window_chars", 10)
+    hedge = ["I'm ", "sorry, ", "I ", "cannot ", "say"]
+    answer = ["Try ", "a ", "think-pair-share ", "every ", "day."]
+    client = fake_openai(answers={MINI: hedge, DEFAULT: answer})
+
+    deltas = list(cascade_stream(client, "chat", [{"role": "user", "content": "Ideas?"}], check_chat_opening))
+    # None of the escalated answer was sent, and its stream was closed
+    assert "".join(deltas) == "".join(answer)
+    assert client.streams[0].closed
+    assert stats.stats()["chat"]["reasons"] == {"low_confidence": 1}
+
+
+def test_an_accepted_stream_sends_its_opening_as_one_delta(fake_openai, stats, monkeypatch):
+    monkeypatch.setitem(CASCADE_SETTINGS, "stream_window_chars", 10)
+    answer = ["Try ", "a ", "think-pair-share ", "every ", "day."]
+    client = fake_openai(answers={MINI: answer})
+
+    deltas = list(cascade_stream(client, "chat", [{"role": "user", "content": "Ideas?"}], check_chat_opening))
+    assert deltas[0].startswith("Try a think-pair-share ")
+    assert "".join(deltas) == "".join(answer)
+    assert models(client) == [MINI]
+    assert stats.stats()["chat"]["escalated"] == 0
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+import completions
+from scheduler import SchedulerTimeout
+from shared.tracing import Tracer
+
+
+class CollectingExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+@pytest.fixture
+def spans(monkeypatch):
+    exporter = CollectingExporter()
+    monkeypatch.setattr(completions, "tracer", Tracer("test", exporter))
+    return exporter.spans
+
+
+@pytest.fixture
+def scheduler_times_out(monkeypatch):
+    def acquire(*args, **kwargs):
+        raise SchedulerTimeout("Request waited more than 30s for gpt-4o")
+
+    async def acquire_async(*args, **kwargs):
+        acquire()
+
+    monkeypatch.setattr(completions.scheduler, "acquire", acquire)
+    monkeypatch.setattr(completions.scheduler, "acquire_async", acquire_async)
+
+
+MESSAGES = [{"role": "user", "content": "Write about volcanoes"}]
+
+
+def test_stream_text_ends_its_span_when_scheduling_times_out(fake_openai, spans, scheduler_times_out):
+    client = fake_openai()
+    with pytest.raises(SchedulerTimeout):
+        list(completions.stream_text(client, "generate_passage", MESSAGES, regenerate=True))
+    assert [span.error for span in spans] == ["SchedulerTimeout: Request waited more than 30s for gpt-4o"]
+    assert spans[0].end_ns is not None
+    assert client.requests == []
+
+
+def test_complete_text_ends_its_span_when_scheduling_times_out(fake_openai, spans, scheduler_times_out):
+    with pytest.raises(SchedulerTimeout):
+        completions.complete_text(fake_openai(), "generate_graphic_organizer", MESSAGES, regenerate=True)
+    assert len(spans) == 1 and spans[0].error.startswith("SchedulerTimeout")
+
+
+def test_async_helpers_end_their_spans_when_scheduling_times_out(spans, scheduler_times_out):
+    async def run():
+        with pytest.raises(SchedulerTimeout):
+            await completions.open_text_stream("generate_passage", MESSAGES, regenerate=True)
+        with pytest.raises(SchedulerTimeout):
+            await completions.acomplete_text("generate_graphic_organizer", MESSAGES, regenerate=True)
+
+    asyncio.run(run())
+    assert len(spans) == 2
+    assert all(span.error.startswith("SchedulerTimeout") and span.end_ns is not None for span in spans)
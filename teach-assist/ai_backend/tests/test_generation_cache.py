@@ -0,0 +1,96 @@
+import os
+import time
+
+import pytest
+
+import completions
+import generation_cache as cache_module
+from generation_cache import GenerationCache, generation_cache, make_cache_key
+
+MESSAGES = [
+    {"role": "system", "content": "You write reading passages."},
+    {"role": "user", "content": "Write about\n    volcanoes   for grade 3."},
+]
+
+
+def make_cache(tmp_path, **overrides):
+    settings = dict(directory=str(tmp_path), memory_entries=8, ttl=60, max_disk_bytes=10_000, sweep_interval=600)
+    settings.update(overrides)
+    return GenerationCache(**settings)
+
+
+def test_cache_key_ignores_insignificant_whitespace():
+    reindented = [
+        {"role": "system", "content": "  You write reading passages.\n"},
+        {"role": "user", "content": "Write  about\nvolcanoes for grade 3."},
+    ]
+    assert make_cache_key("generate_passage", "gpt-4o", MESSAGES, 0.7) == \
+        make_cache_key("generate_passage", "gpt-4o", reindented, 0.7)
+
+
+@pytest.mark.parametrize("change", [
+    {"endpoint": "generate_worksheet"},
+    {"model": "gpt-4o-mini"},
+    {"temperature": 0.2},
+    {"max_tokens": 500},
+    {"messages": MESSAGES[:1]},
+])
+def test_cache_key_covers_every_request_parameter(change):
+    request = dict(endpoint="generate_passage", model="gpt-4o", messages=MESSAGES, temperature=0.7, max_tokens=None)
+    assert make_cache_key(**request) != make_cache_key(**dict(request, **change))
+
+
+def test_entries_are_served_from_disk_by_a_fresh_process(tmp_path):
+    make_cache(tmp_path).set("k1", ["Once", " upon"])
+    assert make_cache(tmp_path).get("k1") == ["Once", " upon"]
+
+
+def test_entries_expire_after_the_ttl(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, ttl=60)
+    cache.set("k1", ["text"])
+    later = time.time() + 61
+    monkeypatch.setattr(cache_module.time, "time", lambda: later)
+    assert cache.get("k1") is None
+    assert not os.path.exists(os.path.join(tmp_path, "k1.json"))
+
+
+def test_memory_tier_keeps_the_most_recently_used_entries(tmp_path):
+    cache = make_cache(tmp_path, memory_entries=2)
+    cache.set("k1", ["1"])
+    cache.set("k2", ["2"])
+    cache.get("k1")
+    cache.set("k3", ["3"])
+    assert list(cache._memory) == ["k1", "k3"]
+
+
+def test_disk_tier_is_only_listed_when_its_size_estimate_passes_the_limit(tmp_path, monkeypatch):
+    listings = []
+    listdir = os.listdir
+    monkeypatch.setattr(cache_module.os, "listdir", lambda path: listings.append(path) or listdir(path))
+    cache = make_cache(tmp_path, max_disk_bytes=200)
+
+    for n in range(3):
+        cache.set(f"k{n}", ["x" * 20])
+    assert len(listings) == 1  # The first write measures the directory
+
+    for n in range(3, 10):
+        time.sleep(0.01)  # Distinct modification times, oldest first
+        cache.set(f"k{n}", ["x" * 20])
+    assert len(listings) > 1
+    stored = sorted(name for name in listdir(tmp_path) if name.endswith(".json"))
+    assert sum(os.path.getsize(os.path.join(tmp_path, name)) for name in stored) <= 200
+    assert "k9.json" in stored and "k0.json" not in stored
+
+
+def test_regenerate_skips_the_cached_generation_and_replaces_it(fake_openai):
+    generation_cache.clear()
+    client = fake_openai(words=["first ", "version"])
+    assert "".join(completions.stream_text(client, "generate_passage", MESSAGES, temperature=0.7)) == "first version"
+    assert "".join(completions.stream_text(client, "generate_passage", MESSAGES, temperature=0.7)) == "first version"
+    assert len(client.requests) == 1
+
+    client.words = ["second ", "version"]
+    regenerated = completions.stream_text(client, "generate_passage", MESSAGES, temperature=0.7, regenerate=True)
+    assert "".join(regenerated) == "second version"
+    assert "".join(completions.stream_text(client, "generate_passage", MESSAGES, temperature=0.7)) == "second version"
+    assert len(client.requests) == 2
@@ -0,0 +1,82 @@
+import io
+import json
+import logging
+import logging.handlers
+import queue
+
+import pytest
+
+from config import LOG_SETTINGS
+from logs import DroppingQueueHandler, EventFormatter, EventLogger, redact
+
+
+@pytest.fixture
+def pipeline():
+    """
+    An EventLogger writing through its own bounded queue and listener, as logs.py configures them.
+    """
+    def build(queue_size=100):
+        output = io.StringIO()
+        stream = logging.StreamHandler(output)
+        stream.setFormatter(EventFormatter("json"))
+        handler = DroppingQueueHandler(queue.Queue(queue_size))
+        logger = logging.getLogger(f"test_logs.{id(output)}")
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(handler)
+        listener = logging.handlers.QueueListener(handler.queue, stream)
+        return EventLogger(logger), handler, listener, output
+    return build
+
+
+def lines(output):
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+def test_stopping_the_listener_writes_every_queued_record(pipeline):
+    log, _, listener, output = pipeline()
+    for n in range(50):
+        log.info("chunk_parsed", chunk=n)
+    listener.start()
+    listener.stop()
+    written = lines(output)
+    assert [entry["chunk"] for entry in written] == list(range(50))
+    assert written[0]["event"] == "chunk_parsed" and written[0]["level"] == "info"
+
+
+def test_a_full_queue_drops_records_instead_of_blocking(pipeline):
+    log, handler, listener, output = pipeline(queue_size=2)
+    for n in range(5):
+        log.info("chunk_parsed", chunk=n)
+    assert handler.dropped == 3
+    listener.start()
+    listener.stop()
+    assert [entry["chunk"] for entry in lines(output)] == [0, 1]
+
+
+def test_unsampled_debug_events_are_not_queued(pipeline, monkeypatch):
+    log, handler, _, _ = pipeline()
+    monkeypatch.setitem(LOG_SETTINGS, "debug_sample_rate", 0.0)
+    log.debug("passage_prompt", prompt="Write about volcanoes")
+    assert handler.queue.empty()
+    monkeypatch.setitem(LOG_SETTINGS, "debug_sample_rate", 1.0)
+    log.debug("passage_prompt", prompt="Write about volcanoes")
+    assert handler.queue.get_nowait().fields["sample_rate"] == 1.0
+
+
+def test_fields_are_redacted_when_written(pipeline):
+    log, _, listener, output = pipeline()
+    log.error("roster_failed", authorization="Bearer abc.def", first_name="Ann", students=[1, 2, 3],
+              error="key sk-abcdefghijklmnop rejected for ann@example.com")
+    listener.start()
+    listener.stop()
+    entry = lines(output)[0]
+    assert entry["authorization"] == "[redacted]"
+    assert entry["first_name"] == "[3 chars]"
+    assert entry["students"] == "[3 items]"
+    assert entry["error"] == "key [redacted] rejected for [email]"
+
+
+def test_long_strings_are_truncated(monkeypatch):
+    monkeypatch.setitem(LOG_SETTINGS, "max_field_chars", 10)
+    assert redact("error", "x" * 25) == "xxxxxxxxxx... [15 more chars]"
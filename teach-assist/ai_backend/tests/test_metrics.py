@@ -0,0 +1,101 @@
+import time
+import types
+
+import pytest
+
+from metrics import Histogram, UpstreamMetrics
+
+SETTINGS = {
+    "latency_buckets": [1, 5],
+    "queue_buckets": [0.1, 1],
+    "ttft_buckets": [0.5, 1],
+    "gap_buckets": [0.01, 0.1],
+    "rate_buckets": [10, 100],
+    "token_buckets": [10, 100],
+}
+LABELS = 'endpoint="chat",model="gpt-4o"'
+
+
+def usage(prompt=20, completion=50, cached=0):
+    return types.SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion,
+                                 prompt_tokens_details=types.SimpleNamespace(cached_tokens=cached))
+
+
+def lines(metrics, name):
+    return [line for line in metrics.render().splitlines() if line.startswith(name) and not line.startswith("#")]
+
+
+def test_histogram_buckets_are_cumulative_with_inf():
+    histogram = Histogram("test_seconds", "Test.", [0.5, 1, 2.5])
+    labels = (("endpoint", "chat"),)
+    for value in [0.2, 0.5, 0.7, 3, 10]:
+        histogram.observe(labels, value)
+
+    assert histogram.render() == [
+        "# HELP test_seconds Test.",
+        "# TYPE test_seconds histogram",
+        # A value equal to a bound falls in that bucket
+        'test_seconds_bucket{endpoint="chat",le="0.5"} 2',
+        'test_seconds_bucket{endpoint="chat",le="1"} 3',
+        'test_seconds_bucket{endpoint="chat",le="2.5"} 3',
+        'test_seconds_bucket{endpoint="chat",le="+Inf"} 5',
+        'test_seconds_sum{endpoint="chat"} 14.4',
+        'test_seconds_count{endpoint="chat"} 5',
+    ]
+
+
+def test_render_has_every_metric_with_help_and_type():
+    text = UpstreamMetrics(SETTINGS).render()
+    for name, kind in [("teachai_upstream_request_seconds", "histogram"),
+                       ("teachai_time_to_first_token_seconds", "histogram"),
+                       ("teachai_upstream_errors_total", "counter"),
+                       ("teachai_active_streams", "gauge")]:
+        assert f"# TYPE {name} {kind}" in text
+    assert text.endswith("\n")
+
+
+def test_a_finished_stream_records_latency_gap_and_rate():
+    metrics = UpstreamMetrics(SETTINGS)
+    metrics.record("chat", "gpt-4o", None, time.perf_counter() - 2, usage(completion=50),
+                   first_token=0.5, deltas=11)
+
+    assert f'teachai_upstream_request_seconds_bucket{{{LABELS},le="5"}} 1' in lines(
+        metrics, "teachai_upstream_request_seconds_bucket")
+    assert f'teachai_time_to_first_token_seconds_bucket{{{LABELS},le="0.5"}} 1' in lines(
+        metrics, "teachai_time_to_first_token_seconds_bucket")
+    # About 1.5s of generation over 10 gaps, and 50 tokens in it
+    [gap] = lines(metrics, "teachai_inter_token_gap_seconds_sum")
+    assert float(gap.split()[-1]) == pytest.approx(0.15, abs=0.01)
+    [rate] = lines(metrics, "teachai_completion_tokens_per_second_sum")
+    assert float(rate.split()[-1]) == pytest.approx(50 / 1.5, rel=0.05)
+
+
+def test_an_unfinished_stream_records_ttft_and_tokens_but_not_latency_or_rate():
+    metrics = UpstreamMetrics(SETTINGS)
+    metrics.record("chat", "gpt-4o", None, time.perf_counter() - 2, usage(prompt=20, completion=5, cached=8),
+                   first_token=0.5, deltas=3, finished=False)
+
+    assert f"teachai_time_to_first_token_seconds_count{{{LABELS}}} 1" in lines(
+        metrics, "teachai_time_to_first_token_seconds_count")
+    assert f"teachai_prompt_tokens_sum{{{LABELS}}} 20" in lines(metrics, "teachai_prompt_tokens_sum")
+    assert f"teachai_completion_tokens_sum{{{LABELS}}} 5" in lines(metrics, "teachai_completion_tokens_sum")
+    assert f"teachai_cached_prompt_tokens_sum{{{LABELS}}} 8" in lines(metrics, "teachai_cached_prompt_tokens_sum")
+    for name in ["teachai_upstream_request_seconds_count", "teachai_inter_token_gap_seconds_count",
+                 "teachai_completion_tokens_per_second_count"]:
+        assert lines(metrics, name) == []
+
+
+def test_queue_time_errors_and_active_streams():
+    metrics = UpstreamMetrics(SETTINGS)
+    ticket = types.SimpleNamespace(enqueued_at=10.0, granted_at=10.05)
+    metrics.record("chat", "gpt-4o", ticket, time.perf_counter())
+    metrics.record_error("chat", "gpt-4o", TimeoutError())
+    metrics.stream_opened("chat", "gpt-4o")
+    metrics.stream_opened("chat", "gpt-4o")
+    metrics.stream_closed("chat", "gpt-4o")
+
+    assert f'teachai_upstream_queue_seconds_bucket{{{LABELS},le="0.1"}} 1' in lines(
+        metrics, "teachai_upstream_queue_seconds_bucket")
+    assert lines(metrics, "teachai_upstream_errors_total") == [
+        f'teachai_upstream_errors_total{{{LABELS},error="TimeoutError"}} 1']
+    assert lines(metrics, "teachai_active_streams") == [f"teachai_active_streams{{{LABELS}}} 1"]
@@ -0,0 +1,119 @@
+import pytest
+
+import preflight as preflight_module
+from config import PREFLIGHT_SETTINGS
+from preflight import (
+    TRUNCATION_MARKER, InputTooLarge, PreflightStats, count_message_tokens, count_tokens, minify_text,
+    preflight, truncate_text,
+)
+from route_helpers import warmup_messages
+from student_parsing import parse_students_messages
+
+MODEL = "gpt-4o"
+
+
+class WordEncoding:
+    """
+    Tokenizer stand-in with one token per space-separated word.
+    """
+
+    def encode(self, text, disallowed_special=()):
+        return text.split(" ")
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+@pytest.fixture
+def estimated(monkeypatch):
+    # Count as if tiktoken were unavailable
+    monkeypatch.setitem(preflight_module._encodings, MODEL, None)
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    stats = PreflightStats()
+    monkeypatch.setattr(preflight_module, "preflight_stats", stats)
+    return stats
+
+
+def test_minify_strips_prompt_indentation_and_blank_runs():
+    text = """Write a story.
+            Requirements:
+              - short
+
+
+            - kind
+            """
+    assert minify_text(text) == "Write a story.\nRequirements:\n  - short\n\n- kind"
+
+
+def test_minify_keeps_code_fences_intact():
+    text = "Example:\n    ```\n    def f():\n\n\n        return 1\n    ```\n    Done."
+    assert minify_text(text) == "Example:\n```\ndef f():\n\n\n    return 1\n```\nDone."
+
+
+def test_user_data_keeps_its_relative_indentation_and_tabs():
+    roster = ("First\tLast\tReading\n"
+              "Ann\tLee\t\n"
+              "\tBo\tKim\tD\n"
+              "Notes:\n"
+              "    - reads aloud well\n"
+              "        - prefers nonfiction")
+    content = preflight("parse_students", parse_students_messages(roster, "3", "t1"), MODEL,
+                        record=False)[-1]["content"]
+    assert roster in content
+
+
+def test_estimated_token_counts_without_tiktoken(estimated):
+    assert count_tokens("", MODEL) == 1
+    assert count_tokens("a" * 40, MODEL) == 11
+    messages = [{"role": "system", "content": "a" * 40},
+                {"role": "user", "content": [{"type": "text", "text": "a" * 8},
+                                             {"type": "image_url", "image_url": {"url": "data:"}}]}]
+    # Reply priming, per-message framing, text and a fixed cost per image
+    assert count_message_tokens(messages, MODEL) == 3 + 4 + 11 + 4 + 3 + PREFLIGHT_SETTINGS["image_tokens"]
+
+
+def test_token_counts_use_the_models_tokenizer(monkeypatch):
+    monkeypatch.setitem(preflight_module._encodings, MODEL, WordEncoding())
+    assert count_tokens("one two three", MODEL) == 3
+    assert count_message_tokens([{"role": "user", "content": "one two"}], MODEL) == 3 + 4 + 2
+
+
+def test_truncate_text_ends_at_a_boundary(estimated):
+    text = "First paragraph here.\n\n" + "x" * 400
+    cut = truncate_text(text, 20, MODEL)
+    assert cut.endswith(TRUNCATION_MARKER)
+    assert count_tokens(cut, MODEL) <= 21
+    assert truncate_text("short", 20, MODEL) == "short"
+
+
+def test_over_budget_roster_input_is_rejected(estimated, stats, monkeypatch):
+    monkeypatch.setitem(PREFLIGHT_SETTINGS["max_input_tokens"], "parse_students", 300)
+    roster = "First,Last,Reading\n" + "\n".join(f"Student{i},Lee,C" for i in range(200))
+    with pytest.raises(InputTooLarge) as error:
+        preflight("parse_students", parse_students_messages(roster, "3", "t1"), MODEL)
+    assert error.value.budget == 300 and error.value.tokens > 300
+    assert stats.stats()["parse_students"]["rejected"] == 1
+
+
+def test_over_budget_plain_messages_are_rejected(estimated, monkeypatch):
+    monkeypatch.setitem(PREFLIGHT_SETTINGS["max_input_tokens"], "generate_story", 50)
+    with pytest.raises(InputTooLarge):
+        preflight("generate_story", [{"role": "user", "content": "word " * 500}], MODEL, record=False)
+
+
+def test_over_budget_registry_prompts_are_truncated(estimated, stats, monkeypatch):
+    story = "\n\n".join(f"Paragraph {i}. " + "The fox ran far. " * 20 for i in range(30))
+    messages = warmup_messages("Making predictions", "The Fox", story)
+    budget = count_message_tokens(messages, MODEL) // 2
+    monkeypatch.setitem(PREFLIGHT_SETTINGS["max_input_tokens"], "generate_warmup", budget)
+
+    fitted = preflight("generate_warmup", messages, MODEL)
+    assert count_message_tokens(fitted, MODEL) <= budget
+    assert TRUNCATION_MARKER in fitted[-1]["content"]
+    assert "Paragraph 0." in fitted[-1]["content"]
+    entry = stats.stats()["generate_warmup"]
+    assert (entry["truncated"], entry["rejected"]) == (1, 0)
+    assert entry["saved_tokens"] > 0
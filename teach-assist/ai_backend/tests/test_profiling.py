@@ -0,0 +1,21 @@
+from profiling import profiler
+
+
+def test_generate_passage_profile_samples_generation_threads(fake_openai, monkeypatch):
+    from app import app
+
+    monkeypatch.setitem(profiler.settings, "token", "secret")
+    fake_openai(words=[f"word{i} " for i in range(60)], delay=0.005)
+    client = app.test_client()
+
+    response = client.post("/generate-passage", headers={"X-Profile": "secret"}, json={
+        "reading_level": "600-700", "topic": "Volcanoes", "regenerate": True,
+    })
+    assert "word59" in response.get_data(as_text=True)
+    profile_id = response.headers["X-Profile-Id"]
+    response.close()
+
+    folded = client.get(f"/profiles/{profile_id}", headers={"X-Profile": "secret"}).get_data(as_text=True)
+    # Generation runs on the resumable-stream and single-flight threads, not the request thread
+    assert "_stream_deltas" in folded
+    assert "_stream_deltas.<locals>.produce" in folded
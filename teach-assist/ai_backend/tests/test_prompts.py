@@ -0,0 +1,33 @@
+import pytest
+
+from prompts import PROMPT_VERSIONS, STAAR_QUESTION_GUIDANCE, render_prompt
+from route_helpers import passage_messages
+
+
+def user_content(messages):
+    return messages[-1]["content"]
+
+
+@pytest.mark.parametrize("version", sorted(PROMPT_VERSIONS["passage"]))
+def test_staar_guidance_only_when_staar_questions_are_requested(monkeypatch, version):
+    import route_helpers
+    monkeypatch.setattr(route_helpers, "render_prompt",
+                        lambda name, **values: render_prompt(name, version=version, **values))
+
+    staar = passage_messages("Volcanoes", "600-700", "Informational", True, "STAAR", True)
+    assert STAAR_QUESTION_GUIDANCE in user_content(staar)
+
+    for generate_questions, question_style in [(False, "STAAR"), (True, "SAT")]:
+        messages = passage_messages("Volcanoes", "600-700", "Informational",
+                                    generate_questions, question_style, False)
+        assert STAAR_QUESTION_GUIDANCE not in user_content(messages)
+
+
+def test_render_prompt_rejects_unknown_version():
+    with pytest.raises(ValueError):
+        render_prompt("passage", version=999)
+
+
+def test_unsupported_reading_level_is_rejected():
+    with pytest.raises(ValueError):
+        passage_messages("Volcanoes", "600L", "Informational", False, "STAAR", False)
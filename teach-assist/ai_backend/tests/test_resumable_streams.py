@@ -0,0 +1,80 @@
+import asyncio
+import re
+
+import pytest
+
+from resumable_streams import (
+    ResumableStream,
+    ResumeUnavailable,
+    StreamStore,
+    iter_stream,
+    parse_last_event_id,
+)
+
+
+def finished_stream(count, max_events=100):
+    stream = ResumableStream("s1", max_events)
+    for n in range(count):
+        stream.append({"content": str(n)})
+    stream.finish()
+    return stream
+
+
+def test_follow_replays_the_events_after_the_last_seen_id():
+    stream = finished_stream(5)
+    assert [seq for seq, _ in stream.follow(2)] == [3, 4]
+    assert [payload["content"] for _, payload in stream.follow()] == ["0", "1", "2", "3", "4"]
+
+
+def test_afollow_replays_the_events_after_the_last_seen_id():
+    stream = finished_stream(5)
+
+    async def run():
+        return [seq async for seq, _ in stream.afollow(1)]
+
+    assert asyncio.run(run()) == [2, 3, 4]
+
+
+def test_resuming_past_the_ring_buffer_is_reported():
+    stream = finished_stream(5, max_events=3)
+    with pytest.raises(ResumeUnavailable):
+        list(stream.follow(0))
+    assert list(stream.follow(1)) == [(2, {"content": "2"}), (3, {"content": "3"}), (4, {"content": "4"})]
+    assert "no longer available" in "".join(iter_stream("sse", stream, 0))
+
+
+def test_a_reader_continues_live_after_the_replay():
+    store = StreamStore({"max_events": 100, "max_streams": 10, "ttl": 60, "abandon_after": 60})
+    stream = store.start({"content": str(n)} for n in range(3))
+    assert [seq for seq, _ in stream.follow(-1)] == [0, 1, 2]
+    assert store.get(stream.id) is stream
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("abc:3", ("abc", 3)),
+    ("abc:def:12", ("abc:def", 12)),
+    ("abc", None),
+    ("abc:x", None),
+    (None, None),
+])
+def test_parse_last_event_id(value, expected):
+    assert parse_last_event_id(value) == expected
+
+
+def test_generate_passage_resumes_from_last_event_id(fake_openai):
+    from app import app
+
+    fake_openai(words=[f"word{i} " for i in range(20)])
+    client = app.test_client()
+    request = {"reading_level": "600-700", "topic": "Volcanoes", "regenerate": True}
+
+    body = client.post("/generate-passage", json=request).get_data(as_text=True)
+    ids = re.findall(r"^id: (\S+)$", body, re.M)
+    messages = body.split("\n\n")
+    assert len(ids) > 2
+
+    resumed = client.post("/generate-passage", json=request, headers={"Last-Event-ID": ids[1]})
+    assert resumed.get_data(as_text=True) == "\n\n".join(messages[2:])
+
+    expired = client.post("/generate-passage", json=request, headers={"Last-Event-ID": "expired:0"})
+    assert expired.status_code == 404
@@ -0,0 +1,144 @@
+import io
+import zipfile
+
+import pytest
+
+from roster_ingest import column_index, parse_text_roster, parse_xlsx_roster, split_full_name, xlsx_to_text
+
+
+def names(result):
+    return [(s["firstName"], s["lastName"], s["readingLevel"]) for s in result[1]]
+
+
+def test_csv_roster():
+    result = parse_text_roster("First Name,Last Name,Student ID,Reading Level\n"
+                               "Ann,Lee,S1,C\n"
+                               "Bo,Kim,S2,D\n", "3", "t1")
+    assert result[0] == "csv"
+    assert names(result) == [("Ann", "Lee", "C"), ("Bo", "Kim", "D")]
+    assert [s["studentId"] for s in result[1]] == ["S1", "S2"]
+    assert all(s["gradeLevel"] == "3" and s["teacherId"] == "t1" for s in result[1])
+
+
+def test_tsv_roster_with_full_names_and_grade():
+    result = parse_text_roster("Student Name\tGrade\tF&P Level\n"
+                               "Lee, Ann\t4\tM\n"
+                               "Bo Kim\t4\tN\n", "3", "t1")
+    assert result[0] == "tsv"
+    assert names(result) == [("Ann", "Lee", "M"), ("Bo", "Kim", "N")]
+    assert [s["gradeLevel"] for s in result[1]] == ["4", "4"]
+    # Students without an ID from the roster get a synthetic one
+    assert all(s["studentId"] for s in result[1])
+
+
+def test_quoted_csv_cells_keep_their_commas():
+    result = parse_text_roster('Name,Reading Level\n"Lee, Ann",C\n"Kim, Bo",D\n', "3", "t1")
+    assert names(result) == [("Ann", "Lee", "C"), ("Bo", "Kim", "D")]
+
+
+def test_fixed_width_roster():
+    result = parse_text_roster("First      Last       Reading\n"
+                               "Ann        Lee        C\n"
+                               "Bo         Kim        D\n", "3", "t1")
+    assert result[0] == "fixed-width"
+    assert names(result) == [("Ann", "Lee", "C"), ("Bo", "Kim", "D")]
+
+
+def test_misaligned_fixed_width_rows_fall_back_to_the_model():
+    assert parse_text_roster("First      Last       Reading\n"
+                             "Annabelle-Marie Lee  C\n"
+                             "Bo         Kim        D\n", "3", "t1") is None
+
+
+@pytest.mark.parametrize("text", [
+    # No header row: the first student is not a recognizable header
+    "Ann,Lee,C\nBo,Kim,D\n",
+    # Free-form notes
+    "Ann Lee reads at level C and Bo Kim at level D.\nBoth are in period 2.",
+    # A single line
+    "First,Last,Reading",
+])
+def test_unstructured_text_falls_back_to_the_model(text):
+    assert parse_text_roster(text, "3", "t1") is None
+
+
+def test_too_many_unreadable_rows_fall_back_to_the_model():
+    text = "First,Last,Reading\nAnn,Lee,C\n,Kim,D\nCy,,E\n"
+    assert parse_text_roster(text, "3", "t1") is None
+
+
+def test_a_roster_without_a_reading_level_column_goes_to_the_model():
+    text = "First,Last,Student ID\nAnn,Lee,S1\nBo,Kim,S2\n"
+    assert parse_text_roster(text, "3", "t1") is None
+    # Image rosters only need names
+    assert names(parse_text_roster(text, "3", "t1", require_reading_level=False)) == [
+        ("Ann", "Lee", ""), ("Bo", "Kim", "")]
+
+
+def test_a_blank_reading_level_cell_is_kept_blank():
+    result = parse_text_roster("First,Last,Reading\nAnn,Lee,\nBo,Kim,D\n", "3", "t1")
+    assert names(result) == [("Ann", "Lee", ""), ("Bo", "Kim", "D")]
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Lee, Ann", ("Ann", "Lee")),
+    ("Ann Marie Lee", ("Ann Marie", "Lee")),
+    ("Ann", ("Ann", "")),
+])
+def test_split_full_name(name, expected):
+    assert split_full_name(name) == expected
+
+
+def test_column_index():
+    assert [column_index(ref) for ref in ["A1", "C7", "Z2", "AA10", "AB3"]] == [0, 2, 25, 26, 27]
+
+
+def xlsx(rows):
+    """
+    A minimal workbook: text cells as shared strings, numbers as values, with gaps for empty strings.
+    """
+    shared = []
+    sheet_rows = []
+    for r, row in enumerate(rows, start=1):
+        cells = []
+        for c, value in enumerate(row):
+            ref = f"{chr(ord('A') + c)}{r}"
+            if value == "":
+                continue
+            if isinstance(value, (int, float)):
+                cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+            else:
+                shared.append(value)
+                cells.append(f'<c r="{ref}" t="s"><v>{len(shared) - 1}</v></c>')
+        sheet_rows.append(f'<row r="{r}">{"".join(cells)}</row>')
+    ns = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as workbook:
+        workbook.writestr("xl/sharedStrings.xml",
+                          f'<sst {ns}>{"".join(f"<si><t>{s}</t></si>" for s in shared)}</sst>')
+        workbook.writestr("xl/worksheets/sheet1.xml",
+                          f'<worksheet {ns}><sheetData>{"".join(sheet_rows)}</sheetData></worksheet>')
+    return buffer.getvalue()
+
+
+def test_xlsx_roster():
+    data = xlsx([["First Name", "Last Name", "Grade", "Lexile"],
+                 ["Ann", "Lee", 4.0, "600L"],
+                 ["Bo", "Kim", "", "650L"]])
+    students = parse_xlsx_roster(data, "3", "t1")
+    assert [(s["firstName"], s["gradeLevel"], s["readingLevel"]) for s in students] == [
+        ("Ann", "4", "600L"), ("Bo", "3", "650L")]
+
+
+def test_an_xlsx_roster_without_a_header_is_sent_to_the_model_as_text():
+    data = xlsx([["Ann", "Lee", "C"], ["Bo", "Kim", "D"]])
+    assert parse_xlsx_roster(data, "3", "t1") is None
+    assert xlsx_to_text(data) == "Ann\tLee\tC\nBo\tKim\tD"
+
+
+def test_an_xlsx_without_worksheets_is_rejected():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as workbook:
+        workbook.writestr("xl/workbook.xml", "<workbook/>")
+    with pytest.raises(ValueError):
+        parse_xlsx_roster(buffer.getvalue(), "3", "t1")
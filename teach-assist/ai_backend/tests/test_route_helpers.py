@@ -0,0 +1,75 @@
+import json
+
+from route_helpers import ordered_student_events, repair_student_events, repaired_events
+from student_parsing import validate_student
+
+
+def failed(index):
+    return {"type": "student_error", "index": index, "error": f"Student {index + 1} is not an object",
+            "raw": '{"firstName": "A" "oops"}'}
+
+
+def student(first_name, record_index=None, **fields):
+    value = {"firstName": first_name, "lastName": "Lee", "studentId": "S1", "gradeLevel": "3",
+             "readingLevel": "C", "teacherId": "t1", **fields}
+    if record_index is not None:
+        value["recordIndex"] = record_index
+    return value
+
+
+def answer(*students):
+    return json.dumps({"students": list(students)})
+
+
+def repaired(events):
+    return {event["index"]: event["student"]["firstName"] for event in events if event.get("repaired")}
+
+
+def test_repaired_rows_are_matched_on_the_echoed_index_not_position():
+    events = repaired_events([failed(4), failed(7)], answer(student("Bo", 7), student("Ann", 4)), validate_student)
+    assert [event["index"] for event in events] == [4, 7]
+    assert repaired(events) == {4: "Ann", 7: "Bo"}
+    assert all("recordIndex" not in event["student"] for event in events)
+
+
+def test_rows_without_a_matching_answer_stay_failed():
+    events = repaired_events([failed(4), failed(7)], answer(student("Bo", 7), student("Cy", 12)), validate_student)
+    assert repaired(events) == {7: "Bo"}
+    assert events[0] == failed(4)
+
+
+def test_answers_without_a_usable_index_are_ignored():
+    content = answer(student("Ann"), student("Bo", "7"), student("Cy", True), student("Di", 4), student("Ed", 4))
+    events = repaired_events([failed(4), failed(7)], content, validate_student)
+    # A numeric string counts; the first answer for an index wins
+    assert repaired(events) == {4: "Di", 7: "Bo"}
+
+
+def test_an_invalid_repaired_student_keeps_the_original_error():
+    incomplete = {"firstName": "Ann", "recordIndex": 4}
+    events = repaired_events([failed(4)], answer(incomplete), validate_student)
+    assert events == [failed(4)]
+
+
+def test_a_failed_repair_request_keeps_every_row_failed():
+    assert repaired_events([failed(4), failed(7)], None, validate_student) == [failed(4), failed(7)]
+    assert repaired_events([failed(4)], "not json at all", validate_student) == [failed(4)]
+
+
+def test_a_blank_reading_level_is_sent_for_repair():
+    # Strict structured output returns every key, so a missing value comes back blank
+    blank = student("Ann", readingLevel="", studentId="")
+    events = list(ordered_student_events([(0, [student("Bo"), blank], None)], validate_student))
+    assert events[1]["type"] == "student_error"
+    assert "readingLevel" in events[1]["error"] and "studentId" not in events[1]["error"]
+
+    calls = []
+
+    def repair(records):
+        calls.append(records)
+        return answer(student("Ann", 1, readingLevel="D", studentId=""))
+
+    events = list(repair_student_events(iter(events), repair, validate_student))
+    assert calls == [[(1, json.dumps(blank))]]
+    assert repaired(events[:-1]) == {1: "Ann"}
+    assert events[-1] == {"type": "complete", "count": 2, "failed": 0, "failedChunks": 0, "repaired": 1}
@@ -0,0 +1,83 @@
+import asyncio
+import copy
+
+import pytest
+
+from config import SCHEDULER_SETTINGS
+from scheduler import Scheduler, SchedulerTimeout
+
+MESSAGES = [{"role": "user", "content": "Write about volcanoes"}]
+
+
+def make_scheduler(**overrides):
+    settings = copy.deepcopy(SCHEDULER_SETTINGS)
+    # One request per minute: after the first grant nothing refills during a test
+    settings["rate_limits"] = {"gpt-4o": {"rpm": 1, "tpm": 10_000_000}}
+    settings.update(overrides)
+    return Scheduler(settings)
+
+
+def queue(scheduler, requests):
+    """
+    Enqueue (endpoint, teacher) requests while the model's budget is empty.
+    """
+    with scheduler._condition:
+        scheduler._bucket("gpt-4o").requests = 0
+        return [scheduler._enqueue(endpoint, "gpt-4o", MESSAGES, None, teacher) for endpoint, teacher in requests]
+
+
+def grant_order(scheduler, tickets):
+    """
+    Release one request at a time and record which ticket each release grants.
+    """
+    order = []
+    for _ in tickets:
+        with scheduler._condition:
+            scheduler._bucket("gpt-4o").requests = 1
+            scheduler._dispatch()
+        order.extend(ticket for ticket in tickets if ticket.granted and ticket not in order)
+    return order
+
+
+def test_a_teachers_backlog_does_not_starve_another_teacher():
+    scheduler = make_scheduler()
+    a1, a2, a3, b1 = queue(scheduler, [("parse_students", "A")] * 3 + [("parse_students", "B")])
+    assert grant_order(scheduler, [a1, a2, a3, b1]) == [a1, b1, a2, a3]
+
+
+def test_teacher_weights_scale_the_fair_share():
+    scheduler = make_scheduler(teacher_weights={"A": 2.0})
+    a1, a2, a3, b1, b2 = queue(scheduler, [("parse_students", "A")] * 3 + [("parse_students", "B")] * 2)
+    assert grant_order(scheduler, [a1, a2, a3, b1, b2]) == [a1, a2, b1, a3, b2]
+
+
+def test_higher_priority_lanes_are_served_first():
+    scheduler = make_scheduler()
+    bulk, streaming, chat = queue(scheduler, [("parse_students", "A"), ("generate_passage", "A"), ("chat", "A")])
+    assert grant_order(scheduler, [bulk, streaming, chat]) == [chat, streaming, bulk]
+
+
+def test_acquire_times_out_and_leaves_the_queue():
+    scheduler = make_scheduler(max_queue_wait=0.05)
+    scheduler._bucket("gpt-4o").requests = 0
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire("generate_passage", "gpt-4o", MESSAGES, teacher_id="A")
+    lanes = scheduler.stats()["lanes"]
+    assert lanes["streaming"]["queue_depth"] == 0
+    assert lanes["streaming"]["abandoned"] == 1
+
+
+def test_acquire_async_times_out_and_leaves_the_queue():
+    scheduler = make_scheduler(max_queue_wait=0.05)
+    scheduler._bucket("gpt-4o").requests = 0
+    with pytest.raises(SchedulerTimeout):
+        asyncio.run(scheduler.acquire_async("chat", "gpt-4o", MESSAGES, teacher_id="A"))
+    assert scheduler.stats()["lanes"]["interactive"]["abandoned"] == 1
+
+
+def test_reported_usage_returns_unused_tokens_to_the_budget():
+    scheduler = make_scheduler(rate_limits={"gpt-4o": {"rpm": 500, "tpm": 10_000}})
+    ticket = scheduler.acquire("generate_passage", "gpt-4o", MESSAGES, teacher_id="A")
+    before = scheduler._bucket("gpt-4o").tokens
+    scheduler.complete(ticket, type("Usage", (), {"total_tokens": 100})())
+    assert scheduler._bucket("gpt-4o").tokens == pytest.approx(before + ticket.estimated_tokens - 100, abs=5)
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def wait_until_idle(flights, timeout=5):
+    deadline = time.monotonic() + timeout
+    while flights.in_flight() and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return flights.in_flight() == 0
+
+
+class Producer:
+    """
+    Upstream stand-in that sends its first chunk, then waits for `release` before the rest.
+    """
+
+    def __init__(self, chunks=("a", "b", "c"), error=None):
+        self.chunks = list(chunks)
+        self.error = error
+        self.calls = 0
+        self.closed = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        try:
+            yield self.chunks[0]
+            assert self.release.wait(5)
+            yield from self.chunks[1:]
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.closed.set()
+
+
+def test_a_late_follower_replays_what_was_already_streamed():
+    flights = SingleFlight()
+    producer = Producer()
+    leader = flights.stream("key", producer)
+    assert next(leader) == "a"
+
+    follower = flights.stream("key", producer)
+    producer.release.set()
+    assert list(follower) == ["a", "b", "c"]
+    assert list(leader) == ["b", "c"]
+    assert producer.calls == 1
+    assert wait_until_idle(flights)
+
+
+def test_the_stream_continues_while_any_subscriber_remains():
+    flights = SingleFlight()
+    producer = Producer()
+    leader = flights.stream("key", producer)
+    assert next(leader) == "a"
+    follower = flights.stream("key", producer)
+    assert next(follower) == "a"
+
+    leader.close()
+    producer.release.set()
+    assert list(follower) == ["b", "c"]
+
+
+def test_the_upstream_is_abandoned_when_the_last_subscriber_leaves():
+    flights = SingleFlight()
+    producer = Producer()
+    leader = flights.stream("key", producer)
+    assert next(leader) == "a"
+
+    leader.close()
+    producer.release.set()
+    assert producer.closed.wait(5)
+    assert wait_until_idle(flights)
+
+    # The next identical request starts a fresh flight
+    producer.release.clear()
+    fresh = flights.stream("key", producer)
+    producer.release.set()
+    assert list(fresh) == ["a", "b", "c"]
+    assert producer.calls == 2
+
+
+def test_an_upstream_error_reaches_every_subscriber():
+    flights = SingleFlight()
+    producer = Producer(error=RuntimeError("upstream failed"))
+    leader = flights.stream("key", producer)
+    assert next(leader) == "a"
+    follower = flights.stream("key", producer)
+    producer.release.set()
+    for subscriber in (leader, follower):
+        with pytest.raises(RuntimeError, match="upstream failed"):
+            list(subscriber)
+
+
+def test_astream_shares_one_producer_and_cancels_it_when_everyone_leaves():
+    flights = SingleFlight()
+    calls = []
+    closed = asyncio.Event()
+
+    async def produce():
+        calls.append(1)
+        try:
+            for text in ("a", "b", "c"):
+                await asyncio.sleep(0.01)
+                yield text
+        finally:
+            closed.set()
+
+    async def read_all():
+        return [text async for text in flights.astream("key", produce)]
+
+    async def run():
+        first, second = await asyncio.gather(read_all(), read_all())
+        assert first == second == ["a", "b", "c"]
+        assert len(calls) == 1
+
+        closed.clear()
+        subscriber = flights.astream("key", produce)
+        assert await subscriber.__anext__() == "a"
+        await subscriber.aclose()
+        await asyncio.wait_for(closed.wait(), 5)
+        assert flights.in_flight() == 0
+
+    asyncio.run(run())
@@ -0,0 +1,37 @@
+import time
+
+import pytest
+
+WARMUP = {"topic": "Making predictions", "storyTitle": "The Fox", "storyContent": "A fox ran far."}
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.mark.parametrize("regenerate", [True, False], ids=["direct", "coalesced"])
+def test_closing_a_warmup_stream_closes_the_upstream_response(fake_openai, regenerate):
+    from app import app
+
+    client = app.test_client()
+    fake = fake_openai(words=[f"word{i} " for i in range(200)], delay=0.005)
+    before = client.get("/streams/stats").get_json()["endpoints"].get("generate_warmup", {}).get("aborted", 0)
+
+    response = client.post("/generate-warmup", json=dict(WARMUP, topic=f"Predictions {regenerate}",
+                                                         regenerate=regenerate))
+    first = next(iter(response.response))
+    assert b"word0" in first
+    response.close()
+
+    # A coalesced stream is produced on another thread, which sees the close shortly after
+    assert wait_for(lambda: fake.streams and fake.streams[0].closed)
+    assert wait_for(lambda: client.get("/streams/stats").get_json()["endpoints"]
+                    .get("generate_warmup", {}).get("aborted", 0) == before + 1)
+    entry = client.get("/streams/stats").get_json()["endpoints"]["generate_warmup"]
+    assert entry["streamed_tokens"] > 0 and entry["saved_tokens"] > 0
+    assert len(fake.requests) == 1
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from config import STREAM_SETTINGS
+from stream_frames import acoalesce, coalesce
+
+
+@pytest.fixture
+def frames(monkeypatch):
+    """
+    Set the flush interval and frame size used by coalesce for the "test" endpoint.
+    """
+    def configure(interval, max_chars=1024):
+        monkeypatch.setitem(STREAM_SETTINGS, "flush_intervals", {"test": interval})
+        monkeypatch.setitem(STREAM_SETTINGS, "max_frame_chars", max_chars)
+    return configure
+
+
+def test_first_delta_is_sent_alone_and_the_rest_are_joined(frames):
+    frames(interval=60)
+    assert list(coalesce(["Once", " upon", " a", " time"], "test")) == ["Once", " upon a time"]
+
+
+def test_a_full_frame_is_sent_before_its_interval(frames):
+    frames(interval=60, max_chars=4)
+    assert list(coalesce(["a", "bb", "cc", "dddd", "e"], "test")) == ["a", "bbcc", "dddd", "e"]
+
+
+def test_a_zero_interval_sends_every_delta(frames):
+    frames(interval=0)
+    assert list(coalesce(["a", "b", "c"], "test")) == ["a", "b", "c"]
+
+
+def test_closing_the_frames_closes_the_upstream_deltas(frames):
+    frames(interval=60)
+    closed = []
+
+    def deltas():
+        try:
+            yield from ["a", "b", "c"]
+        finally:
+            closed.append(True)
+
+    stream = coalesce(deltas(), "test")
+    assert next(stream) == "a"
+    stream.close()
+    assert closed == [True]
+
+
+def test_acoalesce_sends_a_frame_when_upstream_stalls(frames):
+    frames(interval=0.05)
+
+    async def deltas():
+        yield "a"
+        await asyncio.sleep(0.01)
+        yield "b"
+        yield "c"
+        await asyncio.sleep(0.3)
+        yield "d"
+
+    async def run():
+        return [frame async for frame in acoalesce(deltas(), "test")]
+
+    assert asyncio.run(run()) == ["a", "bc", "d"]
+
+
+def test_acoalesce_raises_upstream_errors_after_the_buffered_text(frames):
+    frames(interval=0.01)
+
+    async def deltas():
+        yield "a"
+        yield "b"
+        raise RuntimeError("upstream failed")
+
+    async def run():
+        received = []
+        with pytest.raises(RuntimeError, match="upstream failed"):
+            async for frame in acoalesce(deltas(), "test"):
+                received.append(frame)
+        return "".join(received)
+
+    assert asyncio.run(run()) == "ab"
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from student_parsing import load_element, repair_json_element, repair_students_messages, validate_student
+
+
+@pytest.mark.parametrize("raw, expected", [
+    # Trailing commas
+    ('{"firstName": "Ann", "lastName": "Lee",}', {"firstName": "Ann", "lastName": "Lee"}),
+    ('{"groupIds": ["g1", "g2",], "firstName": "Ann"},', {"groupIds": ["g1", "g2"], "firstName": "Ann"}),
+    # Cut off inside a value: the half-written field is dropped
+    ('{"firstName": "Ann", "readingLevel": "Le', {"firstName": "Ann"}),
+    # Cut off after a key or a colon
+    ('{"firstName": "Ann", "lastName"', {"firstName": "Ann"}),
+    ('{"firstName": "Ann", "lastName":', {"firstName": "Ann"}),
+    # Cut off inside a nested array
+    ('{"firstName": "Ann", "groupIds": ["g1",', {"firstName": "Ann", "groupIds": ["g1"]}),
+    # Escaped quotes stay inside their string
+    ('{"firstName": "A\\"nn", "lastName": "Lee"', {"firstName": 'A"nn', "lastName": "Lee"}),
+])
+def test_repair_json_element(raw, expected):
+    assert json.loads(repair_json_element(raw)) == expected
+
+
+def test_load_element_only_repairs_malformed_elements():
+    assert load_element('{"firstName": "Ann,"}') == {"firstName": "Ann,"}
+    assert load_element('{"firstName": "Ann",}') == {"firstName": "Ann"}
+    with pytest.raises(ValueError):
+        load_element('{"firstName" "Ann"}')
+
+
+def test_repair_prompt_numbers_records_by_roster_index():
+    records = [(4, '{"firstName": "Ann", "lastName": "Lee"}'), (9, '{"firstName": "Bo"')]
+    prompt = repair_students_messages(records, "First,Last\nAnn,Lee\nBo,Kim", "3", "t1")[-1]["content"]
+    assert 'Record 4: {"firstName": "Ann", "lastName": "Lee"}\nRoster rows: Ann,Lee' in prompt
+    assert "Record 9:" in prompt
+    assert "recordIndex" in prompt
+
+
+def student(**fields):
+    return dict({"firstName": "Ann", "lastName": "Lee", "studentId": "S1", "gradeLevel": "3",
+                 "readingLevel": "C", "teacherId": "t1"}, **fields)
+
+
+@pytest.mark.parametrize("field, value", [
+    ("readingLevel", ""), ("readingLevel", "  "), ("firstName", ""), ("lastName", ""),
+    ("gradeLevel", ""), ("teacherId", ""), ("gradeLevel", None),
+])
+def test_blank_required_fields_count_as_missing(field, value):
+    with pytest.raises(ValueError, match=f"Student 3 missing required fields: {field}"):
+        validate_student(student(**{field: value}), 2)
+
+
+def test_a_blank_student_id_is_allowed():
+    assert validate_student(student(studentId=""), 0)["studentId"] == ""
+    with pytest.raises(ValueError, match="studentId"):
+        validate_student({key: value for key, value in student().items() if key != "studentId"}, 0)
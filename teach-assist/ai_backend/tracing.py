@@ -0,0 +1,45 @@
+"""
+Distributed tracing for the AI routes.
+
+The tracer, W3C trace context propagation and the exporters live in
+shared/tracing.py, which subscription_backend uses too. This module builds
+the AI backend's tracer from TRACE_SETTINGS and binds the Flask hooks and the
+ASGI middleware to it. Routes get a server span each, and every upstream
+OpenAI request a client span with `scheduled` and `first_token` events.
+
+For local testing:
+    python tracing.py --collect 4318 traces.jsonl    # stand-in OTLP collector writing to a file
+    python tracing.py traces.jsonl                   # print each trace as a tree with durations
+"""
+
+import os
+import sys
+
+# shared/ sits next to the service directories
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import TRACE_SETTINGS
+from shared import tracing as shared_tracing
+from shared.tracing import Tracer, current_span, exporter_from_settings
+
+tracer = Tracer(TRACE_SETTINGS["service"], exporter_from_settings(TRACE_SETTINGS))
+
+
+def trace_flask_app(app) -> None:
+    """
+    Record a server span per request of a Flask app, ended when its response closes.
+    """
+    shared_tracing.trace_flask_app(app, tracer)
+
+
+class TracingMiddleware(shared_tracing.TracingMiddleware):
+    """
+    ASGI middleware recording a server span per request, ended after the response body.
+    """
+
+    def __init__(self, app):
+        super().__init__(app, tracer)
+
+
+if __name__ == "__main__":
+    shared_tracing.main(sys.argv[1:])
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   Box,
   TextField,
@@ -204,6 +204,8 @@ const Passages: React.FC = () => {
   // Content states
   const [isStreaming, setIsStreaming] = useState(false);
   const [streamedContent, setStreamedContent] = useState('');
+  // Generating the same request again asks the server for a fresh passage instead of its cached one
+  const lastRequestRef = useRef('');
   const [error, setError] = useState<string | null>(null);
   const [questions, setQuestions] = useState<Question[]>([]);
   const [isLoading, setIsLoading] = useState(false);
@@ -259,121 +261,150 @@ const Passages: React.FC = () => {
         gradeLevel: teacher?.gradeLevel || 1,
         includeAnswerKey: showAnswerKey
       };
+      const requestKey = JSON.stringify(requestData);
+      const regenerate = requestKey === lastRequestRef.current;
+      lastRequestRef.current = requestKey;
       console.log('Request data:', requestData);
 
-      const response = await fetch('http://localhost:5001/generate-passage', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify(requestData)
-      });
+      let lastEventId = '';
+      let pendingEventId = '';
+      let resumeAttempts = 0;
 
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
-      }
+      // A dropped connection resumes from the last event received instead of regenerating
+      while (true) {
+        const response = await fetch('http://localhost:5001/generate-passage', {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+            ...(lastEventId ? { 'Last-Event-ID': lastEventId } : {}),
+          },
+          body: JSON.stringify({ ...requestData, regenerate })
+        });
 
-      const reader = response.body?.getReader();
-      if (!reader) throw new Error('No reader available');
+        if (!response.ok) {
+          throw new Error(`HTTP error! status: ${response.status}`);
+        }
 
-      const decoder = new TextDecoder();
-      let buffer = '';
+        const reader = response.body?.getReader();
+        if (!reader) throw new Error('No reader available');
 
-      while (true) {
-        const { done, value } = await reader.read();
-        if (done) break;
-
-        buffer += decoder.decode(value, { stream: true });
-        const lines = buffer.split('\n');
-        buffer = lines.pop() || '';
-
-        for (const line of lines) {
-          if (line.startsWith('data: ')) {
-            try {
-              const data = JSON.parse(line.slice(6));
-              console.log('Received data:', data);
-
-              if (data.type === 'error') {
-                setError(data.message);
-                setIsStreaming(false);
-                break;
-              } else if (data.type === 'content') {
-                const content = data.content.replace(/[\[\]"]/g, '');
-                console.log('Content chunk:', content);
-                
-                if (content.includes('[[ANSWER_KEY_START]]')) {
-                  console.log('Found answer key marker');
-                  const [passageContent, answerKeyContent] = content.split('[[ANSWER_KEY_START]]');
-                  setStreamedContent(prev => prev + passageContent);
-                  setIsCollectingAnswerKey(true);
-                  if (answerKeyContent) {
-                    setAnswerKeyBuffer(prev => prev + answerKeyContent);
-                  }
-                } else if (isCollectingAnswerKey) {
-                  setAnswerKeyBuffer(prev => prev + content);
-                } else {
-                  setStreamedContent(prev => prev + content);
-                }
-              } else if (data.type === 'questions') {
-                console.log('Received questions:', data.questions);
-                setQuestions(data.questions);
-              } else if (data.type === 'complete') {
-                console.log('Stream complete. Questions:', questions.length);
-                let formattedAnswerKey = '';
+        const decoder = new TextDecoder();
+        let buffer = '';
+        pendingEventId = '';
+
+        try {
+          while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop() || '';
+
+            for (const line of lines) {
+              // An event's ID only counts as received once its data line has been handled
+              if (line.startsWith('id: ')) {
+                pendingEventId = line.slice(4);
+                continue;
+              }
+              if (line === '' && pendingEventId) {
+                lastEventId = pendingEventId;
+                pendingEventId = '';
+                continue;
+              }
+              if (line.startsWith('data: ')) {
+                try {
+                  const data = JSON.parse(line.slice(6));
+                  console.log('Received data:', data);
+
+                  if (data.type === 'error') {
+                    setError(data.message);
+                    setIsStreaming(false);
+                    break;
+                  } else if (data.type === 'content') {
+                    const content = data.content.replace(/[\[\]"]/g, '');
+                    console.log('Content chunk:', content);
                 
-                if (answerKeyBuffer) {
-                  formattedAnswerKey = answerKeyBuffer
-                    .trim()
-                    .replace(/Question (\d+):/g, '\n\nQuestion $1:')
-                    .replace(/Explanation:/g, '\n\nExplanation:');
-                  console.log('Setting formatted answer key:', formattedAnswerKey);
-                  setAnswerKey(formattedAnswerKey);
-                }
-                setIsStreaming(false);
-                setIsCollectingAnswerKey(false);
-                setAnswerKeyBuffer('');
-
-                // Save the passage after everything is complete
-                if (teacher?._id) {
-                  try {
-                    const title = streamedContent.split('\n')[0].replace(/^# /, '').replace(/\*\*/g, '');
-                    const response = await fetch('http://localhost:5000/api/passages', {
-                      method: 'POST',
-                      headers: {
-                        'Content-Type': 'application/json',
-                        'Authorization': `Bearer ${localStorage.getItem('token')}`,
-                      },
-                      credentials: 'include',
-                      body: JSON.stringify({
-                        teacherId: teacher._id,
-                        title,
-                        passage: streamedContent,
-                        genre,
-                        lexileLevel: readingLevel,
-                        isAIGenerated: true,
-                        includeAnswerKey: showAnswerKey,
-                        answerKey: formattedAnswerKey,
-                        questions
-                      }),
-                    });
-
-                    if (response.ok) {
-                      const savedPassage = await response.json();
-                      setSavedPassageId(savedPassage._id);
-                      console.log('Passage saved successfully with ID:', savedPassage._id);
+                    if (content.includes('[[ANSWER_KEY_START]]')) {
+                      console.log('Found answer key marker');
+                      const [passageContent, answerKeyContent] = content.split('[[ANSWER_KEY_START]]');
+                      setStreamedContent(prev => prev + passageContent);
+                      setIsCollectingAnswerKey(true);
+                      if (answerKeyContent) {
+                        setAnswerKeyBuffer(prev => prev + answerKeyContent);
+                      }
+                    } else if (isCollectingAnswerKey) {
+                      setAnswerKeyBuffer(prev => prev + content);
                     } else {
-                      console.error('Failed to save passage:', await response.json());
+                      setStreamedContent(prev => prev + content);
+                    }
+                  } else if (data.type === 'questions') {
+                    console.log('Received questions:', data.questions);
+                    setQuestions(data.questions);
+                  } else if (data.type === 'complete') {
+                    console.log('Stream complete. Questions:', questions.length);
+                    let formattedAnswerKey = '';
+                
+                    if (answerKeyBuffer) {
+                      formattedAnswerKey = answerKeyBuffer
+                        .trim()
+                        .replace(/Question (\d+):/g, '\n\nQuestion $1:')
+                        .replace(/Explanation:/g, '\n\nExplanation:');
+                      console.log('Setting formatted answer key:', formattedAnswerKey);
+                      setAnswerKey(formattedAnswerKey);
+                    }
+                    setIsStreaming(false);
+                    setIsCollectingAnswerKey(false);
+                    setAnswerKeyBuffer('');
+
+                    // Save the passage after everything is complete
+                    if (teacher?._id) {
+                      try {
+                        const title = streamedContent.split('\n')[0].replace(/^# /, '').replace(/\*\*/g, '');
+                        const response = await fetch('http://localhost:5000/api/passages', {
+                          method: 'POST',
+                          headers: {
+                            'Content-Type': 'application/json',
+                            'Authorization': `Bearer ${localStorage.getItem('token')}`,
+                          },
+                          credentials: 'include',
+                          body: JSON.stringify({
+                            teacherId: teacher._id,
+                            title,
+                            passage: streamedContent,
+                            genre,
+                            lexileLevel: readingLevel,
+                            isAIGenerated: true,
+                            includeAnswerKey: showAnswerKey,
+                            answerKey: formattedAnswerKey,
+                            questions
+                          }),
+                        });
+
+                        if (response.ok) {
+                          const savedPassage = await response.json();
+                          setSavedPassageId(savedPassage._id);
+                          console.log('Passage saved successfully with ID:', savedPassage._id);
+                        } else {
+                          console.error('Failed to save passage:', await response.json());
+                        }
+                      } catch (error) {
+                        console.error('Error auto-saving passage:', error);
+                      }
                     }
-                  } catch (error) {
-                    console.error('Error auto-saving passage:', error);
                   }
+                } catch (e) {
+                  console.error('Error parsing stream data:', e);
+                  setError('Error parsing response data');
                 }
               }
-            } catch (e) {
-              console.error('Error parsing stream data:', e);
-              setError('Error parsing response data');
             }
           }
+          break;
+        } catch (streamError) {
+          if (!lastEventId || resumeAttempts >= 3) throw streamError;
+          resumeAttempts += 1;
+          console.warn('Passage stream interrupted, resuming after', lastEventId);
         }
       }
     } catch (error) {
@@ -77,6 +77,8 @@ const Worksheets: React.FC = () => {
   const [activeTab, setActiveTab] = useState(0);
   const worksheetRef = useRef<HTMLDivElement>(null);
   const answerKeyRef = useRef<HTMLDivElement>(null);
+  // Generating the same request again asks the server for a fresh worksheet instead of its cached one
+  const lastRequestRef = useRef('');
 
   const renderMarkdownContent = (content: string) => {
     return ReactDOMServer.renderToString(
@@ -434,56 +436,78 @@ const Worksheets: React.FC = () => {
     setError(null);
     setContent({ worksheet: '', answerKey: '' });
     let fullContent = '';
+    const requestData = {
+      worksheetType,
+      prompt,
+      teacherGrade: teacher?.gradeLevel,
+      teachingStandards: teacher?.teachingStandards
+    };
+    const requestKey = JSON.stringify(requestData);
+    const regenerate = requestKey === lastRequestRef.current;
+    lastRequestRef.current = requestKey;
 
     try {
-      const response = await fetch('http://localhost:5001/generate-worksheet', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          worksheetType,
-          prompt,
-          teacherGrade: teacher?.gradeLevel,
-          teachingStandards: teacher?.teachingStandards
-        }),
-      });
-
-      const reader = response.body?.getReader();
-      if (!reader) throw new Error('No reader available');
+      let lastEventId = '';
+      let resumeAttempts = 0;
 
+      // A dropped connection resumes from the last line received instead of regenerating
       while (true) {
-        const { done, value } = await reader.read();
-        if (done) break;
-
-        const chunk = new TextDecoder().decode(value);
-        const lines = chunk.split('\n').filter(line => line.trim());
-
-        for (const line of lines) {
-          try {
-            const data = JSON.parse(line);
-            if (data.error) {
-              setError(data.error);
-              break;
-            }
-
-            if (data.done && data.fullContent) {
-              fullContent = data.fullContent;
-            } else {
-              fullContent += data.content || '';
-            }
+        const response = await fetch('http://localhost:5001/generate-worksheet', {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+            ...(lastEventId ? { 'Last-Event-ID': lastEventId } : {}),
+          },
+          body: JSON.stringify({ ...requestData, regenerate }),
+        });
 
-            // Split content when we have the full content
-            if (data.done) {
-              const parts = fullContent.split('[[ANSWER_KEY_START]]');
-              setContent({
-                worksheet: parts[0]?.trim() || '',
-                answerKey: parts[1]?.trim() || ''
-              });
+        const reader = response.body?.getReader();
+        if (!reader) throw new Error('No reader available');
+
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        try {
+          while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+
+            // Keep a partial last line until the rest of it arrives
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop() || '';
+
+            for (const line of lines.filter(line => line.trim())) {
+              try {
+                const data = JSON.parse(line);
+                if (data.error) {
+                  setError(data.error);
+                  break;
+                }
+                if (data.streamId !== undefined) {
+                  lastEventId = `${data.streamId}:${data.seq}`;
+                }
+
+                fullContent += data.content || '';
+
+                // Split content when we have the full content
+                if (data.done) {
+                  const parts = fullContent.split('[[ANSWER_KEY_START]]');
+                  setContent({
+                    worksheet: parts[0]?.trim() || '',
+                    answerKey: parts[1]?.trim() || ''
+                  });
+                }
+              } catch (e) {
+                // Ignore lines that are not valid JSON
+              }
             }
-          } catch (e) {
-            // Ignore parsing errors for incomplete chunks
           }
+          break;
+        } catch (streamError) {
+          if (!lastEventId || resumeAttempts >= 3) throw streamError;
+          resumeAttempts += 1;
+          console.warn('Worksheet stream interrupted, resuming after', lastEventId);
         }
       }
 
@@ -0,0 +1,6 @@
+"""
+Code shared by the Python services (ai_backend and subscription_backend).
+
+The services are deployed from their own directories and import this package
+by putting the repository root on sys.path; see their tracing modules.
+"""
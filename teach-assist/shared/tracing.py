@@ -0,0 +1,488 @@
+"""
+Distributed tracing with W3C trace context, shared by the Python services.
+
+Each request joins the trace of its incoming `traceparent` header, or starts
+a new trace, and records spans:
+  - one per route, ended once the response body has been sent;
+  - one per upstream OpenAI request, with `scheduled` and `first_token`
+    events;
+  - in subscription_backend, one per db_backend request and per GoCardless
+    API call. The db_backend requests carry the traceparent onward.
+Responses return their trace id in X-Trace-Id, so the React client can log it
+or send its own traceparent.
+
+Each service's tracing module builds its Tracer from its TRACE_SETTINGS and
+binds the route hooks below to it. Spans go to the exporter chosen by
+settings["exporter"]:
+  - "file" appends one JSON span per line;
+  - "console" prints the spans;
+  - "otlp" posts OTLP/HTTP JSON batches to a collector;
+  - "none" (the default) turns tracing off.
+Spans are exported in batches from a background thread, never on the
+request path.
+
+For local testing:
+    python tracing.py --collect 4318 traces.jsonl    # stand-in OTLP collector writing to a file
+    python tracing.py traces.jsonl                   # print each trace as a tree with durations
+"""
+
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import re
+import secrets
+import sys
+import threading
+import time
+import urllib.request
+from typing import Callable, Dict, List, Optional
+
+# A plain logger in the teachassist tree: ai_backend's logs.py imports the
+# tracing module, so event fields are passed the way its EventLogger passes them
+log = logging.getLogger("teachassist.tracing")
+
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span():
+    """
+    The active span of this request, or None outside a traced request.
+    """
+    return _current_span.get()
+
+
+class Span:
+    def __init__(self, tracer, name: str, trace_id: str, parent_id: Optional[str], kind: str,
+                 attributes: Optional[dict] = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes) -> None:
+        self.events.append((name, time.time_ns(), attributes))
+
+    def record_error(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {str(error)}"
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.tracer.exporter.export(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "service": self.tracer.service,
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "events": [{"name": name, "timeUnixNano": at, "attributes": attributes}
+                       for name, at, attributes in self.events],
+            "error": self.error,
+        }
+
+
+class NoopSpan:
+    """
+    Stands in for a span when tracing is off.
+    """
+    trace_id = None
+    traceparent = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def add_event(self, name, **attributes):
+        pass
+
+    def record_error(self, error):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class Tracer:
+    def __init__(self, service: str, exporter=None):
+        self.service = service
+        self.exporter = exporter
+        self.enabled = exporter is not None
+
+    def start_span(self, name: str, kind: str = "internal", parent=None,
+                   traceparent: Optional[str] = None, attributes: Optional[dict] = None):
+        """
+        Start a span under `traceparent` (an incoming header), `parent`, or
+        the current span, in that order; a new trace when there is none.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        match = TRACEPARENT_PATTERN.match(traceparent.strip().lower()) if traceparent else None
+        if match:
+            trace_id, parent_id = match.groups()
+        else:
+            parent = parent if parent is not None else current_span()
+            if isinstance(parent, Span):
+                trace_id, parent_id = parent.trace_id, parent.span_id
+            else:
+                trace_id, parent_id = secrets.token_hex(16), None
+        return Span(self, name, trace_id, parent_id, kind, attributes)
+
+    @contextlib.contextmanager
+    def span(self, name: str, kind: str = "internal", **attributes):
+        """
+        Run a block as a child span of the current one.
+        """
+        span = self.start_span(name, kind, attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def inject(self, headers: Optional[dict] = None) -> dict:
+        """
+        Headers with the current span's traceparent added, for outgoing requests.
+        """
+        headers = dict(headers or {})
+        span = current_span()
+        if isinstance(span, Span):
+            headers["traceparent"] = span.traceparent
+        return headers
+
+
+class BatchExporter:
+    """
+    Queues finished spans and hands them to `write` in batches from a background thread.
+    """
+
+    def __init__(self, write: Callable[[List[Span]], None], batch_size: int, flush_interval: float):
+        self._write = write
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._spans = []
+        self._condition = threading.Condition()
+        self._thread = None
+        atexit.register(self.flush)
+
+    def export(self, span: Span) -> None:
+        with self._condition:
+            self._spans.append(span)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+            if len(self._spans) >= self.batch_size:
+                self._condition.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if len(self._spans) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+            self.flush()
+
+    def flush(self) -> None:
+        with self._condition:
+            batch, self._spans = self._spans, []
+        if batch:
+            try:
+                self._write(batch)
+            except Exception as e:
+                log.error("span_export_failed", extra={"fields": {"spans": len(batch), "error": str(e)}})
+
+
+def jsonl_writer(path: str) -> Callable[[List[Span]], None]:
+    def write(batch):
+        with open(path, "a") as f:
+            f.write("".join(json.dumps(span.to_dict()) + "\n" for span in batch))
+    return write
+
+
+def console_writer(batch: List[Span]) -> None:
+    for span in batch:
+        print(json.dumps(span.to_dict()))
+
+
+def otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_attributes(attributes: dict) -> list:
+    return [{"key": key, "value": otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def otlp_payload(service: str, batch: List[Span]) -> dict:
+    """
+    Spans as an OTLP/HTTP JSON ExportTraceServiceRequest.
+    """
+    spans = []
+    for span in batch:
+        spans.append({
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "parentSpanId": span.parent_id or "",
+            "name": span.name,
+            "kind": SPAN_KINDS[span.kind],
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": otlp_attributes(span.attributes),
+            "events": [{"name": name, "timeUnixNano": str(at), "attributes": otlp_attributes(attributes)}
+                       for name, at, attributes in span.events],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        })
+    return {"resourceSpans": [{
+        "resource": {"attributes": otlp_attributes({"service.name": service})},
+        "scopeSpans": [{"scope": {"name": "teachassist"}, "spans": spans}],
+    }]}
+
+
+def otlp_writer(endpoint: str, service: str) -> Callable[[List[Span]], None]:
+    def write(batch):
+        request = urllib.request.Request(
+            endpoint,
+            data=json.dumps(otlp_payload(service, batch)).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=5) as response:
+            response.read()
+    return write
+
+
+def exporter_from_settings(settings: dict):
+    """
+    The BatchExporter for settings["exporter"], or None when tracing is off.
+    """
+    writers = {
+        "file": lambda: jsonl_writer(settings["file"]),
+        "console": lambda: console_writer,
+        "otlp": lambda: otlp_writer(settings["otlp_endpoint"], settings["service"]),
+    }
+    if settings["exporter"] not in writers:
+        return None
+    return BatchExporter(writers[settings["exporter"]](), settings["batch_size"], settings["flush_interval"])
+
+
+def trace_flask_app(app, tracer: Tracer) -> None:
+    """
+    Record a server span per request of a Flask app, ended when its response closes.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def start_route_span():
+        if not tracer.enabled:
+            return
+        # Worker threads are reused, so never parent to the thread's last request
+        _current_span.set(None)
+        rule = request.url_rule.rule if request.url_rule else request.path
+        g.trace_span = tracer.start_span(
+            f"{request.method} {rule}", "server",
+            traceparent=request.headers.get("traceparent"),
+            attributes={"http.method": request.method, "http.route": rule},
+        )
+        _current_span.set(g.trace_span)
+
+    @app.after_request
+    def end_route_span(response):
+        span = g.get('trace_span')
+        if span is not None:
+            span.set_attribute("http.status_code", response.status_code)
+            response.headers['X-Trace-Id'] = span.trace_id
+
+            # Streamed bodies are generated after this returns, still under the route span
+            def close():
+                _current_span.set(None)
+                span.end()
+            response.call_on_close(close)
+        return response
+
+    @app.teardown_request
+    def record_route_error(error):
+        span = g.get('trace_span')
+        if span is not None and error is not None:
+            span.record_error(error)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware recording a server span per request, ended after the response body.
+    """
+
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        span = self.tracer.start_span(
+            f"{scope['method']} {scope['path']}", "server",
+            traceparent=headers.get(b"traceparent", b"").decode() or None,
+            attributes={"http.method": scope["method"], "http.target": scope["path"]},
+        )
+        token = _current_span.set(span)
+
+        async def send_traced(message):
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                message["headers"] = list(message.get("headers") or []) + [
+                    (b"x-trace-id", span.trace_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_traced)
+        except Exception as e:
+            span.record_error(e)
+            raise
+        finally:
+            route = scope.get("route")
+            if getattr(route, "path", None):
+                span.name = f"{scope['method']} {route.path}"
+                span.set_attribute("http.route", route.path)
+            _current_span.reset(token)
+            span.end()
+
+
+def flatten_otlp(payload: dict) -> List[dict]:
+    """
+    Spans of an OTLP/HTTP JSON request in the format the file exporter writes.
+    """
+    def attributes(items):
+        return {item["key"]: next(iter(item["value"].values())) for item in items or []}
+
+    kinds = {number: name for name, number in SPAN_KINDS.items()}
+    spans = []
+    for resource_spans in payload.get("resourceSpans", []):
+        service = attributes(resource_spans.get("resource", {}).get("attributes")).get("service.name")
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for span in scope_spans.get("spans", []):
+                status = span.get("status") or {}
+                spans.append({
+                    "service": service,
+                    "traceId": span["traceId"],
+                    "spanId": span["spanId"],
+                    "parentSpanId": span.get("parentSpanId") or None,
+                    "name": span["name"],
+                    "kind": kinds.get(span.get("kind"), "internal"),
+                    "startTimeUnixNano": int(span["startTimeUnixNano"]),
+                    "endTimeUnixNano": int(span["endTimeUnixNano"]),
+                    "attributes": attributes(span.get("attributes")),
+                    "events": [{"name": event["name"], "timeUnixNano": int(event["timeUnixNano"]),
+                                "attributes": attributes(event.get("attributes"))}
+                               for event in span.get("events", [])],
+                    "error": status.get("message") if status.get("code") == 2 else None,
+                })
+    return spans
+
+
+def collect(port: int, path: str) -> None:
+    """
+    Stand-in OTLP/HTTP collector that appends received spans to `path`.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            spans = flatten_otlp(payload)
+            with lock, open(path, "a") as f:
+                f.write("".join(json.dumps(span) + "\n" for span in spans))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, format, *args):
+            pass
+
+    print(f"Collecting spans on http://localhost:{port}/v1/traces into {path}")
+    ThreadingHTTPServer(("", port), Handler).serve_forever()
+
+
+def print_traces(path: str) -> None:
+    """
+    Print every trace in a span file as an indented tree with durations.
+    """
+    traces: Dict[str, List[dict]] = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                span = json.loads(line)
+                traces.setdefault(span["traceId"], []).append(span)
+
+    for trace_id, spans in traces.items():
+        ids = {span["spanId"] for span in spans}
+        children: Dict[Optional[str], List[dict]] = {}
+        for span in spans:
+            parent = span["parentSpanId"] if span["parentSpanId"] in ids else None
+            children.setdefault(parent, []).append(span)
+        start = min(span["startTimeUnixNano"] for span in spans)
+        print(f"trace {trace_id}")
+
+        def show(span, depth):
+            offset = (span["startTimeUnixNano"] - start) / 1e6
+            duration = (span["endTimeUnixNano"] - span["startTimeUnixNano"]) / 1e6
+            events = "".join(f" {event['name']}@{(event['timeUnixNano'] - span['startTimeUnixNano']) / 1e6:.0f}ms"
+                             for event in span["events"])
+            error = f" ERROR {span['error']}" if span["error"] else ""
+            print(f"{'  ' * (depth + 1)}{span['service']}: {span['name']} +{offset:.0f}ms {duration:.1f}ms{events}{error}")
+            for child in sorted(children.get(span["spanId"], []), key=lambda s: s["startTimeUnixNano"]):
+                show(child, depth + 1)
+
+        for root in sorted(children.get(None, []), key=lambda s: s["startTimeUnixNano"]):
+            show(root, 0)
+
+
+def main(argv: List[str]) -> None:
+    if len(argv) == 3 and argv[0] == "--collect":
+        collect(int(argv[1]), argv[2])
+    elif len(argv) == 1:
+        print_traces(argv[0])
+    else:
+        print("Usage: python tracing.py --collect PORT FILE | python tracing.py FILE")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -4,19 +4,23 @@ import os
 from dotenv import load_dotenv
 import gocardless_pro
 import logging
-import requests
+from tracing import TracedGoCardless, TracedSession, trace_flask_app
 
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Trace-Id"])
+trace_flask_app(app)
 logging.basicConfig(level=logging.INFO)
 
 # Initialize GoCardless client
-gocardless_client = gocardless_pro.Client(
+gocardless_client = TracedGoCardless(gocardless_pro.Client(
     access_token=os.getenv('GOCARDLESS_ACCESS_TOKEN'),
     environment=os.getenv('GOCARDLESS_ENVIRONMENT', 'sandbox')
-)
+))
+
+# Calls to db_backend carry the request's traceparent
+http = TracedSession()
 
 # Define plans at module level
 PLANS = {
@@ -130,7 +134,7 @@ def confirm_subscription():
                 logging.warning("Could not get next billing date from subscription")
             
             # Update teacher's subscription status in our database
-            response = requests.post(
+            response = http.post(
                 f'http://localhost:5000/teachers/{teacher_id}/subscription',
                 headers={'Authorization': auth_token} if auth_token else {},
                 json={
@@ -180,7 +184,7 @@ def get_subscription_status():
             return jsonify({"error": "Teacher ID is required"}), 400
 
         # Get teacher data from our database to check for GoCardless customer ID
-        response = requests.get(
+        response = http.get(
             f'http://localhost:5000/teachers/{teacher_id}',
             headers={'Authorization': auth_token} if auth_token else {}
         )
@@ -300,7 +304,7 @@ def cancel_subscription():
             return jsonify({"error": "Teacher ID is required"}), 400
 
         # Get teacher data to find subscription
-        response = requests.get(
+        response = http.get(
             f'http://localhost:5000/teachers/{teacher_id}',
             headers={'Authorization': auth_token} if auth_token else {}
         )
@@ -339,7 +343,7 @@ def cancel_subscription():
             logging.info(f"Cancelled subscription: {subscription.id}")
 
             # Update teacher's subscription status in our database
-            response = requests.post(
+            response = http.post(
                 f'http://localhost:5000/teachers/{teacher_id}/subscription',
                 headers={'Authorization': auth_token} if auth_token else {},
                 json={
@@ -0,0 +1,34 @@
+"""
+Shared setup for the subscription backend tests.
+
+The service modules import each other by name, so the service directory goes
+on the path.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import tracing
+from shared.tracing import Tracer
+
+
+class CollectingExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+@pytest.fixture
+def spans(monkeypatch):
+    """
+    Record the service's spans in a list instead of exporting them.
+    """
+    exporter = CollectingExporter()
+    monkeypatch.setattr(tracing, "tracer", Tracer("teachassist-subscriptions", exporter))
+    return exporter.spans
@@ -0,0 +1,89 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import flask
+import pytest
+
+import tracing
+from shared.tracing import flatten_otlp, otlp_payload
+from tracing import TracedGoCardless, TracedSession, trace_flask_app
+
+TRACEPARENT = "00-0123456789abcdef0123456789abcdef-0123456789abcdef-01"
+
+
+@pytest.fixture
+def db_backend():
+    """
+    Local HTTP server standing in for db_backend; records the traceparent of each request.
+    """
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            received.append(self.headers.get("traceparent"))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", received
+    server.shutdown()
+
+
+def test_routes_join_the_incoming_trace_and_return_its_id(spans):
+    app = flask.Flask(__name__)
+    trace_flask_app(app)
+
+    @app.route("/subscription-status")
+    def status():
+        return "ok"
+
+    response = app.test_client().get("/subscription-status", headers={"traceparent": TRACEPARENT})
+    response.close()
+    assert response.headers["X-Trace-Id"] == "0123456789abcdef0123456789abcdef"
+    assert [(span.name, span.kind, span.parent_id) for span in spans] == [
+        ("GET /subscription-status", "server", "0123456789abcdef")]
+
+
+def test_db_backend_requests_carry_the_traceparent_onward(spans, db_backend):
+    url, received = db_backend
+    with tracing.tracer.span("GET /subscription-status", "server") as route:
+        response = TracedSession().get(f"{url}/api/teachers")
+    assert response.status_code == 200
+
+    client = spans[0]
+    assert (client.name, client.kind, client.parent_id) == ("HTTP GET", "client", route.span_id)
+    assert client.attributes["http.status_code"] == 200
+    assert received == [client.traceparent]
+
+
+def test_gocardless_calls_run_in_named_spans(spans):
+    class Subscriptions:
+        def create(self, params):
+            return {"id": "SB1", **params}
+
+        def cancel(self, subscription_id):
+            raise RuntimeError("already cancelled")
+
+    class Client:
+        subscriptions = Subscriptions()
+
+    gocardless = TracedGoCardless(Client())
+    assert gocardless.subscriptions.create({"amount": 799}) == {"id": "SB1", "amount": 799}
+    with pytest.raises(RuntimeError):
+        gocardless.subscriptions.cancel("SB1")
+
+    assert [span.name for span in spans] == ["gocardless.subscriptions.create", "gocardless.subscriptions.cancel"]
+    assert spans[0].error is None
+    assert spans[1].error == "RuntimeError: already cancelled"
+
+
+def test_otlp_export_round_trips_through_the_collector_format(spans):
+    with tracing.tracer.span("gocardless.mandates.list", "client", teacher="t1") as span:
+        span.add_event("page", cursor="MD1")
+    exported = flatten_otlp(otlp_payload("teachassist-subscriptions", spans))
+    assert exported == [spans[0].to_dict()]
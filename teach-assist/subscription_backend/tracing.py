@@ -0,0 +1,76 @@
+"""
+Distributed tracing for the subscription routes.
+
+The tracer, W3C trace context propagation and the exporters live in
+shared/tracing.py, which ai_backend uses too. This module builds the
+subscription backend's tracer from environment variables (TRACE_EXPORTER,
+TRACE_FILE, TRACE_OTLP_ENDPOINT) and adds an HTTP session and a GoCardless
+client wrapper that trace outgoing calls. Requests to db_backend carry the
+traceparent onward.
+"""
+
+import os
+import sys
+import tempfile
+
+import requests
+
+# shared/ sits next to the service directories
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import tracing as shared_tracing
+from shared.tracing import Tracer, exporter_from_settings
+
+TRACE_SETTINGS = {
+    "service": os.environ.get("TRACE_SERVICE_NAME", "teachassist-subscriptions"),
+    "exporter": os.environ.get("TRACE_EXPORTER", "none"),  # none, file, console or otlp
+    "file": os.environ.get("TRACE_FILE", os.path.join(tempfile.gettempdir(), "teachassist-traces.jsonl")),
+    "otlp_endpoint": os.environ.get("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"),
+    "batch_size": 100,
+    "flush_interval": 2,
+}
+
+tracer = Tracer(TRACE_SETTINGS["service"], exporter_from_settings(TRACE_SETTINGS))
+
+
+def trace_flask_app(app) -> None:
+    """
+    Record a server span per request of a Flask app, ended when its response closes.
+    """
+    shared_tracing.trace_flask_app(app, tracer)
+
+
+class TracedSession(requests.Session):
+    """
+    requests session that traces each request as a client span and passes its traceparent on.
+    """
+
+    def request(self, method, url, *args, **kwargs):
+        with tracer.span(f"HTTP {method.upper()}", "client", **{"http.method": method.upper(), "http.url": url}) as span:
+            kwargs["headers"] = tracer.inject(kwargs.get("headers"))
+            response = super().request(method, url, *args, **kwargs)
+            span.set_attribute("http.status_code", response.status_code)
+            return response
+
+
+class TracedGoCardless:
+    """
+    Wraps a gocardless_pro.Client so each API call runs in a span such as
+    gocardless.subscriptions.create.
+    """
+
+    def __init__(self, client, path: str = "gocardless"):
+        self._client = client
+        self._path = path
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        path = f"{self._path}.{name}"
+        if not callable(attribute):
+            return TracedGoCardless(attribute, path)
+
+        def call(*args, **kwargs):
+            with tracer.span(path, "client"):
+                return attribute(*args, **kwargs)
+        return call
+